@@ -0,0 +1,28 @@
+"""
+Profils de connexion à la base de données, choisis par la variable DB_CONNEXIONS.
+
+- "courtes" (défaut) : une connexion par requête, fermée à la fin de la requête.
+- "persistantes" : connexion gardée DB_CONN_MAX_AGE secondes par thread, vérifiée
+  avant réutilisation (CONN_HEALTH_CHECKS).
+- "pool" : pool de connexions psycopg 3 par processus (PostgreSQL uniquement),
+  dimensionné par DB_POOL_MIN / DB_POOL_MAX.
+"""
+import os
+
+MODES = ('courtes', 'persistantes', 'pool')
+
+
+def parametres_connexion(mode, moteur, env=os.environ):
+    """Clés à fusionner dans DATABASES['default'] pour le mode demandé."""
+    if mode not in MODES:
+        raise ValueError(f"DB_CONNEXIONS doit valoir {', '.join(MODES)} (reçu : {mode!r}).")
+    if mode == 'persistantes':
+        return {'CONN_MAX_AGE': int(env.get('DB_CONN_MAX_AGE', '60')), 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {}}
+    if mode == 'pool' and moteur.endswith('postgresql'):
+        # Un pool par processus : au moins autant de connexions que de threads gunicorn
+        return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {'pool': {
+            'min_size': int(env.get('DB_POOL_MIN', '2')),
+            'max_size': int(env.get('DB_POOL_MAX', env.get('GUNICORN_THREADS', '4'))),
+            'timeout': int(env.get('DB_POOL_TIMEOUT', '10')),
+        }}}
+    return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
@@ -0,0 +1,34 @@
+"""
+Configuration gunicorn du profil "production" (GUNICORN_PROFIL=production).
+
+Workers à threads (gthread) : un processus par cœur disponible, plus un, et
+GUNICORN_THREADS threads par processus, pour que les attentes base de données
+d'une requête n'immobilisent pas tout un processus. Chaque worker est recyclé
+après GUNICORN_MAX_REQUESTS requêtes (avec une part aléatoire pour étaler les
+redémarrages), ce qui borne l'effet d'une éventuelle fuite mémoire.
+Lancement : gunicorn -c python:aerotrack_erp.gunicorn_conf aerotrack_erp.wsgi:application
+"""
+import os
+
+
+def _coeurs_disponibles():
+    # Respecte les limites de CPU du conteneur quand le système les expose
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', _coeurs_disponibles() + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = 30
+keepalive = 5
+# Fichiers de battement de cœur des workers en mémoire plutôt que sur la couche du conteneur
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
@@ -6,6 +6,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv  # <-- AJOUT
 from django.utils.translation import gettext_lazy as _
+from .connexions import parametres_connexion
 
 # Charge les variables d'environnement depuis le fichier .env
 load_dotenv()  # <-- AJOUT
@@ -49,6 +50,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'suivi_production.middleware.MetriquesRequetesMiddleware',
+    'suivi_production.middleware.ProfilageMiddleware',
+    'suivi_production.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -104,6 +108,10 @@ else:
         }
     }
 
+# Profil de connexion : "courtes" (défaut), "persistantes" ou "pool" (voir aerotrack_erp/connexions.py)
+DB_CONNEXIONS = os.getenv('DB_CONNEXIONS', 'courtes')
+DATABASES['default'].update(parametres_connexion(DB_CONNEXIONS, DATABASES['default']['ENGINE']))
+
 # =============================================================================
 # VALIDATION DE MOT DE PASSE ET INTERNATIONALISATION
 # =============================================================================
@@ -145,4 +153,36 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/dashboard/redirect/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/connexion/'
-SESSION_EXPIRE_AT_BROWSER_CLOSE = True
\ No newline at end of file
+SESSION_EXPIRE_AT_BROWSER_CLOSE = True
+
+# --- Métriques des requêtes (endpoint /metrics au format Prometheus) ---
+METRIQUES_ACTIVES = os.getenv('METRIQUES_ACTIVES', 'True') == 'True'
+METRIQUES_SERVER_TIMING = os.getenv('METRIQUES_SERVER_TIMING', 'False') == 'True'
+# Jeton attendu dans l'en-tête "Authorization: Bearer ..." du collecteur Prometheus
+METRIQUES_JETON = os.getenv('METRIQUES_JETON', '')
+
+# --- API de lecture des intégrations (/api/v1/...) ---
+# Jeton attendu dans l'en-tête "Authorization: Bearer ..." de l'ERP et des outils de BI
+API_LECTURE_JETON = os.getenv('API_LECTURE_JETON', '')
+
+# --- Profilage par échantillonnage des requêtes lentes (désactivé par défaut) ---
+PROFILAGE_ACTIF = os.getenv('PROFILAGE_ACTIF', 'False') == 'True'
+PROFILAGE_SEUIL_MS = int(os.getenv('PROFILAGE_SEUIL_MS', '1000'))
+# Vues (noms d'URL, séparés par des virgules) profilées sur une fraction des requêtes
+PROFILAGE_VUES = [v.strip() for v in os.getenv('PROFILAGE_VUES', '').split(',') if v.strip()]
+PROFILAGE_FRACTION = float(os.getenv('PROFILAGE_FRACTION', '0.01'))
+PROFILAGE_INTERVALLE_MS = int(os.getenv('PROFILAGE_INTERVALLE_MS', '5'))
+PROFILAGE_REPERTOIRE = Path(os.getenv('PROFILAGE_REPERTOIRE', BASE_DIR / 'profils'))
+PROFILAGE_TAILLE_MAX = int(os.getenv('PROFILAGE_TAILLE_MAX', str(5 * 1024 * 1024)))
+PROFILAGE_ROTATIONS = int(os.getenv('PROFILAGE_ROTATIONS', '3'))
+
+# --- TRS (taux de rendement synthétique) des machines ---
+# Plage d'ouverture de l'atelier (heures locales) et jours ouvrés (0 = lundi)
+TRS_HEURE_OUVERTURE = int(os.getenv('TRS_HEURE_OUVERTURE', '6'))
+TRS_HEURE_FERMETURE = int(os.getenv('TRS_HEURE_FERMETURE', '22'))
+TRS_JOURS_OUVRES = [int(j) for j in os.getenv('TRS_JOURS_OUVRES', '0,1,2,3,4').split(',') if j.strip()]
+
+# --- Utilisation des machines ---
+# Équipes des jours ouvrés (TRS_JOURS_OUVRES) : « nom:début-fin » en heures locales, séparées
+# par des virgules ; une fin au-delà de 24 prolonge l'équipe sur le lendemain (ex. Nuit:22-30)
+UTILISATION_EQUIPES = os.getenv('UTILISATION_EQUIPES', 'Matin:6-14,Après-midi:14-22')
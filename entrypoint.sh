@@ -3,5 +3,14 @@
 # On démarre le service cron en arrière-plan
 cron
 
+# Mode optionnel : pointages partitionnés par mois (PostgreSQL uniquement)
+if [ "$POINTAGE_PARTITIONNE" = "True" ]; then
+    python manage.py partitions_pointage --initialiser
+fi
+
 # On lance le serveur Gunicorn en avant-plan (ce processus gardera le conteneur en vie)
+# Profil "production" : workers à threads dimensionnés sur les CPU, recyclage (aerotrack_erp/gunicorn_conf.py)
+if [ "$GUNICORN_PROFIL" = "production" ]; then
+    exec gunicorn -c python:aerotrack_erp.gunicorn_conf aerotrack_erp.wsgi:application
+fi
 exec gunicorn aerotrack_erp.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
@@ -9,7 +9,8 @@ from .models import PosteDeTravail,Anomalie
 # On importe tous les modèles nécessaires en une seule fois
 from .models import (
     Profile, Operateur, OrdreFabrication, Operation, Pointage,
-    MatierePremiere, MatiereRequise, DailyReport
+    MatierePremiere, MatiereRequise, DailyReport, OrdreFabricationArchive, Evenement,
+    GammeType, OperationGammeType, MatiereGammeType,
 )
 
 
@@ -40,6 +41,16 @@ class MatiereRequiseInline(admin.TabularInline):
     model = MatiereRequise
     extra = 1
 
+# Inlines des gammes types : phases dans la gamme, matières dans la phase
+class OperationGammeTypeInline(admin.TabularInline):
+    model = OperationGammeType
+    extra = 1
+    show_change_link = True
+
+class MatiereGammeTypeInline(admin.TabularInline):
+    model = MatiereGammeType
+    extra = 1
+
 
 # --- ENREGISTREMENT DES MODÈLES DE L'APPLICATION ---
 
@@ -64,6 +75,18 @@ class OperationAdmin(admin.ModelAdmin):
     # On ajoute l'inline pour gérer les matières directement depuis la page de l'opération
     inlines = [MatiereRequiseInline]
 
+@admin.register(GammeType)
+class GammeTypeAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'description', 'date_creation')
+    search_fields = ('nom',)
+    inlines = [OperationGammeTypeInline]
+
+@admin.register(OperationGammeType)
+class OperationGammeTypeAdmin(admin.ModelAdmin):
+    list_display = ('titre', 'gamme', 'numero_phase', 'poste')
+    list_filter = ('gamme',)
+    inlines = [MatiereGammeTypeInline]
+
 @admin.register(MatierePremiere)
 class MatierePremiereAdmin(admin.ModelAdmin):
     list_display = ('reference', 'designation', 'quantite_stock', 'unite_mesure')
@@ -109,4 +132,38 @@ class DailyReportAdmin(admin.ModelAdmin):
         'operateurs_actifs'
     )
     list_filter = ('date',)
-    ordering = ('-date',)
\ No newline at end of file
+    ordering = ('-date',)
+
+@admin.register(OrdreFabricationArchive)
+class OrdreFabricationArchiveAdmin(admin.ModelAdmin):
+    """
+    Consultation des OFs archivés. Les archives se déplacent uniquement via les
+    commandes archiver_ofs / restaurer_ofs.
+    """
+    list_display = ('numero_of', 'titre', 'quantite_produite', 'quantite_rebut', 'date_archivage')
+    search_fields = ('numero_of', 'titre')
+    ordering = ('-date_archivage',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Evenement)
+class EvenementAdmin(admin.ModelAdmin):
+    """Consultation du journal des événements de production (en ajout seul)."""
+    list_display = ('id', 'horodatage', 'type', 'ordre_fabrication_id', 'operation_id')
+    list_filter = ('type',)
+    search_fields = ('=ordre_fabrication_id',)
+    ordering = ('-id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,294 @@
+"""
+Suite de benchmarks : services de reporting, exports, vues et APIs.
+
+Chaque cas est chronométré sur une base peuplée par `generer_atelier` à plusieurs
+volumes. Les résultats (temps médian, min, p95 et nombre de requêtes SQL) sont
+écrits en JSON pour comparer les exécutions entre elles.
+Lancement : `python manage.py benchmark_atelier` (voir la commande).
+"""
+from __future__ import annotations
+import json
+import statistics
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import timedelta
+from typing import Callable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, connections, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from aerotrack_erp.connexions import parametres_connexion
+from .models import OrdreFabrication, Operation, Pointage, Anomalie, Profile
+from .services import reporting
+from .services.analyse_anomalies import calculer_analyse
+from .services import couts, cube_rebuts, delais, temps_cycle, trs, utilisation
+from .exports.rebuts import export_rebuts_pdf, export_rebuts_xlsx
+
+
+@dataclass
+class Cas:
+    nom: str
+    categorie: str
+    fonction: Callable[['Contexte'], object]
+    # Remise en état des données avant chaque exécution, hors chronométrage
+    preparer: Optional[Callable[['Contexte'], object]] = None
+
+    def executer(self, ctx: 'Contexte'):
+        if self.preparer:
+            self.preparer(ctx)
+        return self.fonction(ctx)
+
+
+@dataclass
+class Resultat:
+    cas: str
+    categorie: str
+    taille: int
+    repetitions: int
+    ms_median: float
+    ms_min: float
+    ms_p95: float
+    requetes: int
+    variante: str = 'standard'
+
+
+@dataclass
+class Debit:
+    connexions: str
+    taille: int
+    fils: int
+    duree_s: float
+    requetes: int
+    erreurs: int
+    req_par_s: float
+
+
+class Contexte:
+    """Objets partagés par les cas : client connecté en manager, OF et opération de référence."""
+
+    def __init__(self):
+        self.jour = timezone.now().date()
+        user, _ = User.objects.get_or_create(username='benchmark_manager')
+        Profile.objects.get_or_create(user=user, defaults={'role': 'MANAGER'})
+        self.client = Client()
+        self.client.force_login(user)
+        self.of = OrdreFabrication.objects.exclude(statut='ARCHIVE').order_by('-pk').first()
+        self.operation_en_cours = Operation.objects.filter(statut='EN_COURS').select_related('ordre_fabrication').first()
+        self.pointage_ouvert = Pointage.objects.filter(heure_fin__isnull=True).select_related(
+            'operateur', 'operation__ordre_fabrication').first()
+        self.anomalie = Anomalie.objects.order_by('-pk').first()
+        self.etags = {}
+
+    def get(self, url):
+        reponse = self.client.get(url)
+        assert reponse.status_code == 200, f"{url} -> {reponse.status_code}"
+        return b''.join(reponse) if reponse.streaming else reponse.content
+
+    def revalider(self, url):
+        """GET conditionnel avec l'ETag de la réponse précédente : attend un 304."""
+        if url not in self.etags:
+            self.etags[url] = self.client.get(url)['ETag']
+        reponse = self.client.get(url, HTTP_IF_NONE_MATCH=self.etags[url])
+        assert reponse.status_code == 304, f"{url} -> {reponse.status_code}"
+        return reponse.content
+
+    def post_json(self, url, donnees):
+        reponse = self.client.post(url, json.dumps(donnees), content_type='application/json')
+        assert reponse.status_code == 200, f"{url} -> {reponse.status_code}"
+        return reponse.content
+
+
+def _code_pointage(ctx: Contexte):
+    p = ctx.pointage_ouvert
+    return {'code_operateur': p.operateur.code, 'code_of_operation': f"{p.operation.ordre_fabrication.numero_of}/{p.operation.numero_phase}"}
+
+
+def _preparer_pointage(ctx: Contexte):
+    """
+    Remet le pointage de référence en cours, sur une opération en cours et avec un
+    opérateur qualifié pour le poste : chaque répétition mesure la confirmation, pas un refus.
+    """
+    p = ctx.pointage_ouvert
+    maintenant = timezone.now()
+    Pointage.objects.filter(pk=p.pk).update(heure_fin=None, quantite_fabriquee=0, quantite_rebut=0, date_modification=maintenant)
+    Operation.objects.filter(pk=p.operation_id).update(statut='EN_COURS', date_modification=maintenant)
+    p.operateur.postes_qualifies.add(p.operation.poste_id)
+
+
+CAS: List[Cas] = [
+    # --- services/reporting.py ---
+    Cas('compute_kpis_for_date', 'service', lambda ctx: reporting.compute_kpis_for_date(ctx.jour)),
+    Cas('build_7day_series', 'service', lambda ctx: reporting.build_7day_series(ctx.jour)),
+    Cas('build_alertes', 'service', lambda ctx: [list(v) for v in reporting.build_alertes(ctx.jour).values()]),
+    Cas('compute_operational_counters', 'service', lambda ctx: reporting.compute_operational_counters(ctx.jour)),
+    Cas('compute_taux_rebut_ofs', 'service', lambda ctx: reporting.compute_taux_rebut_ofs(reporting.get_ofs_finalises_le(ctx.jour))),
+    Cas('queryset_rebuts_par_of', 'service', lambda ctx: list(reporting.queryset_rebuts_par_of())),
+    Cas('analyse_anomalies_365j', 'service', lambda ctx: calculer_analyse(ctx.jour - timedelta(days=364), ctx.jour)),
+    Cas('cube_rebuts_poste', 'service', lambda ctx: cube_rebuts.tranche('poste')),
+    Cas('cube_rebuts_operateur_x_poste', 'service', lambda ctx: cube_rebuts.tranche('operateur', 'poste')),
+    Cas('trs_machines_365j', 'service', lambda ctx: trs.trs(ctx.jour - timedelta(days=364), ctx.jour)),
+    Cas('trs_tendance_mensuelle', 'service', lambda ctx: trs.tendance_mensuelle()),
+    Cas('utilisation_machines_365j', 'service', lambda ctx: utilisation.utilisation(ctx.jour - timedelta(days=364), ctx.jour)),
+    Cas('utilisation_machines_par_jour_365j', 'service',
+        lambda ctx: utilisation.utilisation(ctx.jour - timedelta(days=364), ctx.jour, granularite='jour')),
+    Cas('etat_machines', 'service', lambda ctx: utilisation.etat_machines()),
+    Cas('couts_par_of', 'service', lambda ctx: couts.couts('of')),
+    Cas('couts_par_mois', 'service', lambda ctx: couts.couts('mois')),
+    Cas('temps_cycle_par_operateur', 'service', lambda ctx: temps_cycle.statistiques('operateur')),
+    Cas('delais_postes_365j', 'service', lambda ctx: delais.delais_postes(ctx.jour - timedelta(days=364), ctx.jour)),
+    Cas('delais_tendance_365j', 'service', lambda ctx: delais.tendance_hebdomadaire(ctx.jour - timedelta(days=364), ctx.jour)),
+    # --- exports ---
+    Cas('export_rebuts_pdf', 'export', lambda ctx: export_rebuts_pdf()),
+    Cas('export_rebuts_xlsx', 'export', lambda ctx: export_rebuts_xlsx()),
+    Cas('export_suivi_csv', 'export', lambda ctx: ctx.get(f'/suivi-atelier/of/{ctx.of.pk}/export/csv/')),
+    # --- vues ---
+    Cas('dashboard_manager', 'vue', lambda ctx: ctx.get('/dashboard/manager/')),
+    Cas('suivi_atelier', 'vue', lambda ctx: ctx.get('/suivi-atelier/')),
+    Cas('suivi_detail_of', 'vue', lambda ctx: ctx.get(f'/suivi-atelier/of/{ctx.of.pk}/')),
+    Cas('of_list', 'vue', lambda ctx: ctx.get('/gestion/of/')),
+    Cas('of_list_recherche', 'vue', lambda ctx: ctx.get('/gestion/of/?q=synth')),
+    Cas('liste_archives', 'vue', lambda ctx: ctx.get('/archives/')),
+    Cas('rapport_production_par_of', 'vue', lambda ctx: ctx.get('/rapports/production-du-jour/')),
+    Cas('rapport_rebuts', 'vue', lambda ctx: ctx.get('/rapports/rebuts/')),
+    Cas('historique', 'vue', lambda ctx: ctx.get('/historique/')),
+    Cas('analyse_anomalies', 'vue', lambda ctx: ctx.get('/rapports/anomalies/')),
+    Cas('cube_rebuts', 'vue', lambda ctx: ctx.get('/rapports/rebuts/cube/?lignes=machine&colonnes=type_operation')),
+    Cas('trs', 'vue', lambda ctx: ctx.get('/rapports/trs/?jours=90')),
+    Cas('utilisation', 'vue', lambda ctx: ctx.get('/rapports/utilisation/?jours=365')),
+    Cas('couts', 'vue', lambda ctx: ctx.get('/rapports/couts/?axe=poste')),
+    # --- APIs ---
+    Cas('api_dashboard_data', 'api', lambda ctx: ctx.get('/api/dashboard-data/')),
+    Cas('api_dashboard_data_304', 'api', lambda ctx: ctx.revalider('/api/dashboard-data/')),
+    Cas('api_utilisation_365j', 'api', lambda ctx: ctx.get('/api/utilisation/?jours=365&granularite=mois')),
+    Cas('api_get_anomalie_detail', 'api', lambda ctx: ctx.get(f'/api/anomalie/{ctx.anomalie.pk}/')),
+    Cas('api_demarrer_tache_phase1', 'api', lambda ctx: ctx.post_json('/api/demarrer_tache/', _code_pointage(ctx)),
+        preparer=_preparer_pointage),
+    Cas('api_terminer_tache_phase1', 'api', lambda ctx: ctx.post_json('/api/terminer_tache/', _code_pointage(ctx)),
+        preparer=_preparer_pointage),
+]
+
+
+def _chronometrer(cas: Cas, ctx: Contexte) -> float:
+    if cas.preparer:
+        cas.preparer(ctx)
+    debut = time.perf_counter()
+    cas.fonction(ctx)
+    return (time.perf_counter() - debut) * 1000
+
+
+def _compter_requetes(cas: Cas, ctx: Contexte) -> int:
+    # Le journal des requêtes est borné : on le vide pour que le comptage reste exact.
+    # Le comptage est lu tout de suite, la requête HTTP suivante videra le journal.
+    if cas.preparer:
+        cas.preparer(ctx)
+    reset_queries()
+    with CaptureQueriesContext(connection) as capture:
+        cas.fonction(ctx)
+    return len(capture.captured_queries)
+
+
+def _resultat(cas: Cas, taille: int, durees: List[float], requetes: int, variante: str = 'standard') -> Resultat:
+    durees = sorted(durees)
+    return Resultat(
+        cas=cas.nom, categorie=cas.categorie, taille=taille, repetitions=len(durees),
+        ms_median=round(statistics.median(durees), 3), ms_min=round(durees[0], 3),
+        ms_p95=round(durees[min(len(durees) - 1, int(len(durees) * 0.95))], 3),
+        requetes=requetes, variante=variante,
+    )
+
+
+def mesurer(cas: Cas, ctx: Contexte, taille: int, repetitions: int) -> Resultat:
+    # Une exécution d'échauffement, puis une exécution à part pour compter les requêtes
+    cas.executer(ctx)
+    requetes = _compter_requetes(cas, ctx)
+    return _resultat(cas, taille, [_chronometrer(cas, ctx) for _ in range(repetitions)], requetes)
+
+
+def executer(taille: int, repetitions: int, filtre: str = '') -> List[Resultat]:
+    """Chronomètre tous les cas (ou ceux dont le nom contient `filtre`) sur la base courante."""
+    ctx = Contexte()
+    return [mesurer(cas, ctx, taille, repetitions) for cas in CAS if filtre in cas.nom]
+
+
+def mesurer_surcout_metriques(taille: int, repetitions: int, filtre: str = '') -> List[Resultat]:
+    """
+    Chronomètre les vues et APIs avec et sans MetriquesRequetesMiddleware, en alternant
+    les deux clients à chaque répétition pour que les variations de charge de la machine
+    touchent les deux variantes de la même façon.
+    """
+    ctx_avec = Contexte()
+    middleware = [m for m in settings.MIDDLEWARE if not m.endswith('.MetriquesRequetesMiddleware')]
+    with override_settings(MIDDLEWARE=middleware):
+        ctx_sans = Contexte()
+        # Le client charge sa chaîne de middlewares à sa première requête
+        ctx_sans.get('/historique/')
+    resultats = []
+    for cas in CAS:
+        if cas.categorie not in ('vue', 'api') or filtre not in cas.nom:
+            continue
+        cas.executer(ctx_avec)
+        cas.executer(ctx_sans)
+        requetes = _compter_requetes(cas, ctx_avec)
+        avec, sans = [], []
+        for _ in range(repetitions):
+            avec.append(_chronometrer(cas, ctx_avec))
+            sans.append(_chronometrer(cas, ctx_sans))
+        resultats += [_resultat(cas, taille, avec, requetes, 'avec_metriques'),
+                      _resultat(cas, taille, sans, requetes, 'sans_metriques')]
+    return resultats
+
+
+def mesurer_debit(mode: str, taille: int, fils: int, duree_s: float, filtre: str = '') -> Debit:
+    """
+    Débit (requêtes/s) des vues et APIs, `fils` clients enchaînant les cas en parallèle,
+    avec le profil de connexion `mode` (voir aerotrack_erp/connexions.py).
+    L'écart entre profils n'apparaît que là où ouvrir une connexion coûte (PostgreSQL) :
+    une base SQLite de test en mémoire n'est jamais fermée.
+    """
+    reglages = connection.settings_dict
+    precedents = {cle: reglages.get(cle) for cle in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+    connections.close_all()
+    reglages.update(parametres_connexion(mode, reglages['ENGINE']))
+    cas_mesures = [cas for cas in CAS if cas.categorie in ('vue', 'api') and filtre in cas.nom]
+    contextes = [Contexte() for _ in range(fils)]
+    compteurs = [[0, 0] for _ in range(fils)]
+    fin = time.perf_counter() + duree_s
+
+    def client(ctx, compteur):
+        try:
+            while time.perf_counter() < fin:
+                for cas in cas_mesures:
+                    try:
+                        cas.executer(ctx)
+                        compteur[0] += 1
+                    except Exception:
+                        compteur[1] += 1
+        finally:
+            connection.close()
+
+    debut = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(ctx, c)) for ctx, c in zip(contextes, compteurs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ecoule = time.perf_counter() - debut
+
+    connections.close_all()
+    if reglages['OPTIONS'].get('pool'):
+        connection.close_pool()
+    reglages.update(precedents)
+    requetes = sum(c[0] for c in compteurs)
+    return Debit(connexions=mode, taille=taille, fils=fils, duree_s=round(ecoule, 2), requetes=requetes,
+                 erreurs=sum(c[1] for c in compteurs), req_par_s=round(requetes / ecoule, 1))
+
+
+def ecrire_resultats(chemin: str, resultats: List[Resultat], meta: dict, debits: List[Debit] = ()) -> None:
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump({**meta, 'resultats': [asdict(r) for r in resultats], 'debits': [asdict(d) for d in debits]},
+                  f, indent=2, ensure_ascii=False)
@@ -0,0 +1,335 @@
+"""
+Générateur de charge HTTP : terminaux d'atelier, tableaux de bord et exports.
+
+Des utilisateurs virtuels (un thread chacun, connexion HTTP persistante) jouent
+contre un serveur lancé à part :
+- les terminaux enchaînent les deux phases de api_demarrer_tache puis de
+  api_terminer_tache sur les opérations de leurs OFs, phase après phase ;
+- les managers interrogent api_dashboard_data à intervalle régulier (avec
+  If-None-Match, comme le navigateur) et lancent de temps en temps un export.
+Les latences sont relevées par point d'accès ; le rapport donne le débit, les
+percentiles p50/p95/p99 et le taux d'erreur.
+Lancement : `python manage.py charge_atelier` (voir la commande).
+"""
+from __future__ import annotations
+import http.client
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, asdict, field
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from django.contrib.auth.models import User
+
+from .models import OrdreFabrication, Operation, Operateur, Profile
+
+PREFIXE_COMPTES = 'charge_'
+_JETON_CSRF = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+# --- Comptes et plan de travail -----------------------------------------------
+
+def preparer_comptes(nb_terminaux: int, nb_managers: int, mot_de_passe: str) -> Tuple[List[str], List[str]]:
+    """Crée (ou réinitialise) les comptes POSTE et MANAGER utilisés par la charge."""
+    def compte(nom, role):
+        user, _ = User.objects.get_or_create(username=nom)
+        user.set_password(mot_de_passe)
+        user.save()
+        Profile.objects.update_or_create(user=user, defaults={'role': role})
+        return nom
+    terminaux = [compte(f'{PREFIXE_COMPTES}poste_{i}', 'POSTE') for i in range(nb_terminaux)]
+    managers = [compte(f'{PREFIXE_COMPTES}manager_{i}', 'MANAGER') for i in range(nb_managers)]
+    return terminaux, managers
+
+
+@dataclass
+class Gamme:
+    numero_of: str
+    phases: List[Tuple[int, int]]  # (numéro de phase, poste) restant à réaliser, dans l'ordre
+
+
+def plan_de_travail(nb_terminaux: int) -> Tuple[List[List[Gamme]], Dict[int, List[str]]]:
+    """
+    Répartit les OFs en cours ou planifiés entre les terminaux (un OF n'est travaillé
+    que par un terminal) et liste, par poste, les codes des opérateurs qualifiés.
+    """
+    phases = defaultdict(list)
+    operations = (Operation.objects
+                  .filter(ordre_fabrication__statut__in=['PLANIFIE', 'PRODUCTION'])
+                  .exclude(statut='TERMINEE')
+                  .order_by('ordre_fabrication__numero_of', 'numero_phase')
+                  .values_list('ordre_fabrication__numero_of', 'numero_phase', 'poste_id'))
+    for numero_of, phase, poste in operations:
+        phases[numero_of].append((phase, poste))
+    lots = [[] for _ in range(nb_terminaux)]
+    for i, (numero_of, gamme) in enumerate(sorted(phases.items())):
+        lots[i % nb_terminaux].append(Gamme(numero_of, gamme))
+    qualifies = defaultdict(list)
+    for code, poste in Operateur.objects.filter(postes_qualifies__isnull=False).values_list('code', 'postes_qualifies'):
+        qualifies[poste].append(code)
+    return lots, dict(qualifies)
+
+
+def cibles_exports() -> List[Tuple[str, str]]:
+    """(nom du point d'accès, chemin) des exports lancés par les managers."""
+    cibles = [('export_rebuts_xlsx', '/rapports/rebuts/export/xlsx/'), ('export_rebuts_pdf', '/rapports/rebuts/export/pdf/')]
+    of = OrdreFabrication.objects.exclude(statut='ARCHIVE').order_by('-pk').first()
+    if of:
+        cibles.append(('export_suivi_csv', f'/suivi-atelier/of/{of.pk}/export/csv/'))
+    return cibles
+
+
+# --- Client HTTP ----------------------------------------------------------------
+
+class SessionHTTP:
+    """Connexion HTTP persistante avec cookies (session, CSRF), comme un navigateur."""
+
+    def __init__(self, base_url: str, statistiques: 'Statistiques', delai: float = 30):
+        decoupe = urlsplit(base_url)
+        self.hote = decoupe.netloc
+        self.https = decoupe.scheme == 'https'
+        self.delai = delai
+        self.stats = statistiques
+        self.cookies: Dict[str, str] = {}
+        self._connexion: Optional[http.client.HTTPConnection] = None
+
+    def _ouvrir(self):
+        classe = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self._connexion = classe(self.hote, timeout=self.delai)
+
+    def requete(self, point: str, methode: str, chemin: str, corps: bytes = None,
+                en_tetes: dict = None) -> Tuple[int, bytes, http.client.HTTPResponse]:
+        """Envoie une requête et l'enregistre sous le nom `point`. Statut 0 : erreur réseau."""
+        en_tetes = dict(en_tetes or {})
+        if self.cookies:
+            en_tetes['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if methode == 'POST':
+            en_tetes['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+            en_tetes['Referer'] = f"{'https' if self.https else 'http'}://{self.hote}/"
+        debut = time.perf_counter()
+        # Une connexion persistante peut avoir été fermée par le serveur : un GET est
+        # rejoué une fois sur une nouvelle connexion, jamais un POST (non idempotent)
+        essais = 2 if methode == 'GET' else 1
+        for essai in range(1, essais + 1):
+            try:
+                if self._connexion is None:
+                    self._ouvrir()
+                self._connexion.request(methode, chemin, body=corps, headers=en_tetes)
+                reponse = self._connexion.getresponse()
+                contenu = reponse.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._connexion = None
+                if essai == essais:
+                    self.stats.enregistrer(point, 0, time.perf_counter() - debut)
+                    return 0, b'', None
+        for valeur in reponse.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(valeur)
+            for nom, morsel in cookie.items():
+                self.cookies[nom] = morsel.value
+        self.stats.enregistrer(point, reponse.status, time.perf_counter() - debut)
+        return reponse.status, contenu, reponse
+
+    def connecter(self, utilisateur: str, mot_de_passe: str) -> bool:
+        _, page, _ = self.requete('connexion', 'GET', '/connexion/')
+        jeton = _JETON_CSRF.search(page.decode('utf-8', 'replace'))
+        corps = urlencode({'username': utilisateur, 'password': mot_de_passe,
+                           'csrfmiddlewaretoken': jeton.group(1) if jeton else ''}).encode()
+        statut, _, _ = self.requete('connexion', 'POST', '/connexion/', corps,
+                                    {'Content-Type': 'application/x-www-form-urlencoded'})
+        return statut == 302 and 'sessionid' in self.cookies
+
+    def post_json(self, point: str, chemin: str, donnees: dict) -> Tuple[int, dict]:
+        statut, contenu, _ = self.requete(point, 'POST', chemin, json.dumps(donnees).encode(),
+                                          {'Content-Type': 'application/json'})
+        try:
+            return statut, json.loads(contenu or b'{}')
+        except ValueError:
+            return statut, {}
+
+
+# --- Statistiques -----------------------------------------------------------------
+
+def _percentile(valeurs: List[float], p: float) -> float:
+    if not valeurs:
+        return 0.0
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+
+@dataclass
+class LignePointAcces:
+    point: str
+    requetes: int
+    erreurs: int       # erreurs réseau et réponses 5xx
+    refus: int         # réponses 4xx (refus métier : pièces indisponibles, phase verrouillée...)
+    taux_erreur: float
+    req_par_s: float
+    ms_p50: float
+    ms_p95: float
+    ms_p99: float
+    statuts: Dict[str, int] = field(default_factory=dict)
+
+
+class Statistiques:
+    """Latences et statuts par point d'accès, partagés par tous les utilisateurs virtuels."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._latences = defaultdict(list)
+        self._statuts = defaultdict(lambda: defaultdict(int))
+
+    def enregistrer(self, point: str, statut: int, duree: float) -> None:
+        with self._verrou:
+            self._latences[point].append(duree * 1000)
+            self._statuts[point][statut] += 1
+
+    def rapport(self, duree: float) -> List[LignePointAcces]:
+        lignes = []
+        with self._verrou:
+            for point, latences in sorted(self._latences.items()):
+                latences = sorted(latences)
+                statuts = self._statuts[point]
+                # 304 (revalidation) et 302 (redirection après connexion) sont des succès
+                erreurs = sum(n for s, n in statuts.items() if s == 0 or s >= 500)
+                refus = sum(n for s, n in statuts.items() if 400 <= s < 500)
+                lignes.append(LignePointAcces(
+                    point=point, requetes=len(latences), erreurs=erreurs, refus=refus,
+                    taux_erreur=round(erreurs / len(latences), 4),
+                    req_par_s=round(len(latences) / duree, 2),
+                    ms_p50=round(_percentile(latences, 50), 1),
+                    ms_p95=round(_percentile(latences, 95), 1),
+                    ms_p99=round(_percentile(latences, 99), 1),
+                    statuts={str(s): n for s, n in sorted(statuts.items())},
+                ))
+        return lignes
+
+
+# --- Utilisateurs virtuels ----------------------------------------------------------
+
+@dataclass
+class Scenario:
+    base_url: str
+    mot_de_passe: str
+    duree: float
+    pause_terminal: float = 2.0       # temps de travail moyen entre démarrage et fin d'une tâche (s)
+    intervalle_dashboard: float = 20.0
+    exports_par_heure: float = 6.0    # par manager
+    montee: float = 5.0               # étalement des démarrages (s)
+
+
+def _attendre(secondes: float, fin: float) -> bool:
+    """Dort `secondes` sans dépasser la fin du scénario ; False si le scénario est terminé."""
+    reste = fin - time.monotonic()
+    time.sleep(max(0.0, min(secondes, reste)))
+    return time.monotonic() < fin
+
+
+def terminal(scenario: Scenario, stats: Statistiques, utilisateur: str, gammes: List[Gamme],
+             qualifies: Dict[int, List[str]], fin: float, rng: random.Random) -> None:
+    session = SessionHTTP(scenario.base_url, stats)
+    if not _attendre(rng.uniform(0, scenario.montee), fin) or not session.connecter(utilisateur, scenario.mot_de_passe):
+        return
+    gammes = [Gamme(g.numero_of, list(g.phases)) for g in gammes]
+    while time.monotonic() < fin and gammes:
+        gamme = gammes[0]
+        if not gamme.phases:
+            gammes.pop(0)
+            continue
+        phase, poste = gamme.phases[0]
+        codes = qualifies.get(poste)
+        if not codes:
+            gamme.phases.clear()
+            continue
+        code_operateur = rng.choice(codes)
+        identifiants = {'code_operateur': code_operateur, 'code_of_operation': f'{gamme.numero_of}/{phase}'}
+
+        statut, rep = session.post_json('demarrer_tache.phase1', '/api/demarrer_tache/', identifiants)
+        disponible = rep.get('quantite_disponible', 0) if statut == 200 else 0
+        if disponible <= 0:
+            # Opération bloquée (pièces prises par un pointage resté ouvert, phase
+            # verrouillée) : les phases suivantes de l'OF le seront aussi, on passe à l'OF suivant
+            gamme.phases.clear()
+            continue
+        statut, _ = session.post_json('demarrer_tache.phase2', '/api/demarrer_tache/', {
+            'action': 'valider_demarrage', 'operation_id': rep['operation_id'],
+            'operateur_id': rep['operateur_id'], 'quantite_prise': disponible,
+        })
+        if statut != 200 or not _attendre(rng.expovariate(1 / scenario.pause_terminal), fin):
+            continue
+
+        statut, rep = session.post_json('terminer_tache.phase1', '/api/terminer_tache/', identifiants)
+        if statut != 200:
+            continue
+        quantite = rep['quantite_a_declarer']
+        rebut = sum(rng.random() < 0.03 for _ in range(quantite))
+        statut, _ = session.post_json('terminer_tache.phase2', '/api/terminer_tache/', {
+            'action': 'valider_fin', 'pointage_id': rep['pointage_id'],
+            'quantite_fabriquee': quantite - rebut, 'quantite_rebut': rebut,
+        })
+        if statut == 200:
+            gamme.phases.pop(0)
+
+
+def manager(scenario: Scenario, stats: Statistiques, utilisateur: str, exports: List[Tuple[str, str]],
+            fin: float, rng: random.Random) -> None:
+    session = SessionHTTP(scenario.base_url, stats)
+    if not _attendre(rng.uniform(0, scenario.montee), fin) or not session.connecter(utilisateur, scenario.mot_de_passe):
+        return
+    etag = None
+    probabilite_export = scenario.exports_par_heure * scenario.intervalle_dashboard / 3600
+    while True:
+        en_tetes = {'Accept-Encoding': 'gzip, br'}
+        if etag:
+            en_tetes['If-None-Match'] = etag
+        statut, _, reponse = session.requete('api_dashboard_data', 'GET', '/api/dashboard-data/', en_tetes=en_tetes)
+        if statut == 200:
+            etag = reponse.getheader('ETag')
+        if exports and rng.random() < probabilite_export:
+            point, chemin = rng.choice(exports)
+            session.requete(point, 'GET', chemin, en_tetes={'Accept-Encoding': 'gzip, br'})
+        if not _attendre(scenario.intervalle_dashboard, fin):
+            break
+
+
+@dataclass
+class ResultatCharge:
+    terminaux: int
+    managers: int
+    duree_s: float
+    req_par_s: float
+    points: List[LignePointAcces]
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def lancer(scenario: Scenario, nb_terminaux: int, nb_managers: int, graine: int = 1) -> ResultatCharge:
+    """Joue un palier de charge et retourne les statistiques par point d'accès."""
+    comptes_terminaux, comptes_managers = preparer_comptes(nb_terminaux, nb_managers, scenario.mot_de_passe)
+    lots, qualifies = plan_de_travail(max(1, nb_terminaux))
+    exports = cibles_exports()
+    stats = Statistiques()
+    debut = time.monotonic()
+    fin = debut + scenario.duree
+    threads = [
+        threading.Thread(target=terminal, args=(scenario, stats, nom, lots[i], qualifies, fin, random.Random(graine + i)))
+        for i, nom in enumerate(comptes_terminaux)
+    ] + [
+        threading.Thread(target=manager, args=(scenario, stats, nom, exports, fin, random.Random(graine + 1000 + j)))
+        for j, nom in enumerate(comptes_managers)
+    ]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+    duree = time.monotonic() - debut
+    points = stats.rapport(duree)
+    total = sum(p.requetes for p in points if p.point != 'connexion')
+    return ResultatCharge(terminaux=nb_terminaux, managers=nb_managers, duree_s=round(duree, 1),
+                          req_par_s=round(total / duree, 2), points=points)
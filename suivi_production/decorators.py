@@ -0,0 +1,24 @@
+"""
+Décorateurs de vues de l'application.
+"""
+from functools import wraps
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .services.version_donnees import etag_donnees
+
+
+def revalidation_par_version(vue):
+    """
+    GET conditionnel (If-None-Match / 304) basé sur la version des données de production.
+    Le navigateur garde la réponse mais la revalide à chaque fois (no-cache) : tant que
+    rien n'a changé, il reçoit un 304 vide et la vue n'est pas exécutée.
+    """
+    vue_conditionnelle = condition(etag_func=etag_donnees)(vue)
+
+    @wraps(vue)
+    def wrapper(request, *args, **kwargs):
+        response = vue_conditionnelle(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
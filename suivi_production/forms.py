@@ -115,4 +115,20 @@ MatiereRequiseFormSet = forms.inlineformset_factory(
         'matiere': forms.Select(attrs={'class': 'form-select'}),
         'quantite_necessaire': forms.NumberInput(attrs={'class': 'form-control'}),
     }
-)
\ No newline at end of file
+)
+
+
+# =============================================================================
+# FORMULAIRE D'IMPORT EN MASSE DES OFs
+# =============================================================================
+
+class ImportOFForm(forms.Form):
+    """Fichier d'OFs à importer en masse (voir services/import_ofs.py)."""
+    fichier = forms.FileField(
+        label="Fichier CSV ou XLSX",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+    simulation = forms.BooleanField(
+        label="Valider seulement (aucun OF créé)", required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
@@ -1,27 +1,30 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
 from suivi_production.models import OrdreFabrication
+from suivi_production.services.archivage import archiver_ofs, TAILLE_LOT
 
 class Command(BaseCommand):
-    help = "Archive les Ordres de Fabrication terminés depuis plus de 30 jours."
+    help = "Déplace vers les tables d'archive les Ordres de Fabrication terminés depuis plus de N jours."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=1, help="Ancienneté minimale (en jours) des OFs terminés à archiver.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'OFs déplacés par transaction.")
 
     def handle(self, *args, **options):
-        # Définir la date limite : il y a 30 jours
-        limite_archivage = timezone.now() - timedelta(days=1)
+        # Définir la date limite
+        limite_archivage = timezone.now() - timedelta(days=options['jours'])
         
-        # Sélectionner les OFs qui sont 'TERMINE' et dont la dernière modification est antérieure à la date limite
-        # On utilise 'date_modification' car c'est la date la plus fiable pour savoir quand l'OF a été "touché" pour la dernière fois.
+        # Sélectionner les OFs 'TERMINE' créés avant la date limite, ainsi que ceux
+        # encore marqués 'ARCHIVE' dans les tables de production (ancien mode d'archivage)
         ofs_a_archiver = OrdreFabrication.objects.filter(
-            statut='TERMINE',
-            date_creation__lt=limite_archivage # <-- CORRIGÉ
+            Q(statut='TERMINE', date_creation__lt=limite_archivage) | Q(statut='ARCHIVE')
         )
         
-        nombre_ofs = ofs_a_archiver.count()
+        nombre_ofs = archiver_ofs(ofs_a_archiver, taille_lot=options['taille_lot'])
         
         if nombre_ofs > 0:
-            # Mettre à jour le statut de tous ces OFs en 'ARCHIVE' en une seule requête
-            ofs_a_archiver.update(statut='ARCHIVE')
             self.stdout.write(self.style.SUCCESS(f'{nombre_ofs} OF(s) ont été archivé(s) avec succès.'))
         else:
-            self.stdout.write(self.style.NOTICE('Aucun OF à archiver.'))
\ No newline at end of file
+            self.stdout.write(self.style.NOTICE('Aucun OF à archiver.'))
@@ -0,0 +1,86 @@
+import platform
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from aerotrack_erp.connexions import MODES
+from suivi_production.benchmarks import executer, mesurer_surcout_metriques, mesurer_debit, ecrire_resultats
+from suivi_production.services.cube_rebuts import rafraichir_cube
+from suivi_production.services.trs import rafraichir_trs
+from suivi_production.services.utilisation import rafraichir_utilisation
+from suivi_production.services.couts import rafraichir_couts
+from suivi_production.services.delais import rafraichir_delais
+from suivi_production.services.donnees_synthetiques import generer_atelier
+
+
+class Command(BaseCommand):
+    help = ("Chronomètre les services de reporting, les exports, les vues et les APIs "
+            "sur une base de test peuplée à plusieurs volumes, et écrit les résultats en JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tailles', type=int, nargs='+', default=[100, 1000, 5000],
+                            help="Nombres d'OFs générés pour chaque palier (cumulatifs).")
+        parser.add_argument('--repetitions', type=int, default=5, help="Mesures par cas (après échauffement et comptage des requêtes).")
+        parser.add_argument('--cas', default='', help="Ne mesure que les cas dont le nom contient ce texte.")
+        parser.add_argument('--surcout-metriques', action='store_true',
+                            help="Rejoue les vues et APIs sans le middleware de métriques pour en mesurer le surcoût.")
+        parser.add_argument('--debit', action='store_true',
+                            help="Mesure aussi le débit (requêtes/s) des vues et APIs pour chaque profil de connexion.")
+        parser.add_argument('--connexions', nargs='+', choices=MODES, default=None,
+                            help="Profils de connexion comparés par --debit (défaut : tous ceux supportés par la base).")
+        parser.add_argument('--fils', type=int, default=4, help="Clients concurrents pour --debit.")
+        parser.add_argument('--duree', type=float, default=5.0, help="Durée de chaque mesure de débit, en secondes.")
+        parser.add_argument('--sortie', default='benchmark.json', help="Fichier JSON de résultats.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # Base de test dédiée : la base de travail n'est jamais modifiée
+        ancien_nom = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        resultats, debits = [], []
+        modes = options['connexions'] or [m for m in MODES if m != 'pool' or connection.vendor == 'postgresql']
+        try:
+            generes = 0
+            for taille in sorted(options['tailles']):
+                generer_atelier(taille - generes, prefixe='BENCH')
+                rafraichir_cube()
+                rafraichir_trs()
+                rafraichir_utilisation()
+                rafraichir_couts()
+                rafraichir_delais()
+                generes = taille
+                self.stdout.write(self.style.NOTICE(f"--- {taille} OF(s) ---"))
+                mesures = executer(taille, options['repetitions'], options['cas'])
+                for r in mesures:
+                    self.stdout.write(f"{r.cas:32} {r.ms_median:10.1f} ms  (p95 {r.ms_p95:.1f})  {r.requetes:4d} requête(s)")
+                resultats += mesures
+                if options['surcout_metriques']:
+                    comparaison = mesurer_surcout_metriques(taille, options['repetitions'], options['cas'])
+                    self._afficher_surcout(comparaison)
+                    resultats += comparaison
+                if options['debit']:
+                    for mode in modes:
+                        d = mesurer_debit(mode, taille, options['fils'], options['duree'], options['cas'])
+                        debits.append(d)
+                        self.stdout.write(f"Débit, connexions {d.connexions:13} {d.req_par_s:8.1f} req/s  "
+                                          f"({d.requetes} requêtes, {d.erreurs} erreur(s), {d.fils} clients)")
+        finally:
+            connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+            teardown_test_environment()
+
+        ecrire_resultats(options['sortie'], resultats, {
+            'date': timezone.now().isoformat(),
+            'base': connection.vendor,
+            'python': platform.python_version(),
+            'tailles': sorted(options['tailles']),
+            'repetitions': options['repetitions'],
+        }, debits)
+        self.stdout.write(self.style.SUCCESS(f"{len(resultats)} mesure(s) écrite(s) dans {options['sortie']}."))
+
+    def _afficher_surcout(self, comparaison):
+        self.stdout.write(self.style.NOTICE("Surcoût du middleware de métriques (médianes) :"))
+        for r, ref in zip(comparaison[::2], comparaison[1::2]):
+            ecart = r.ms_median - ref.ms_median
+            pourcentage = 100 * ecart / ref.ms_median if ref.ms_median else 0
+            self.stdout.write(f"{r.cas:32} {ecart:+8.2f} ms  ({pourcentage:+.1f} %)")
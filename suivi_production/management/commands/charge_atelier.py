@@ -0,0 +1,55 @@
+import json
+from itertools import zip_longest
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from suivi_production.charge import Scenario, lancer
+
+
+class Command(BaseCommand):
+    help = ("Génère une charge HTTP réaliste (terminaux d'atelier, managers sur le tableau de bord, "
+            "exports) contre un serveur lancé à part, et rapporte débit, latences et erreurs par point d'accès. "
+            "Les comptes de charge sont créés dans la base configurée, qui doit être celle du serveur.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Adresse du serveur testé.")
+        parser.add_argument('--terminaux', type=int, nargs='+', default=[10],
+                            help="Nombre de terminaux ; plusieurs valeurs = plusieurs paliers successifs.")
+        parser.add_argument('--managers', type=int, nargs='+', default=[2],
+                            help="Nombre de managers par palier (la dernière valeur est reprise si la liste est plus courte).")
+        parser.add_argument('--duree', type=float, default=60, help="Durée de chaque palier, en secondes.")
+        parser.add_argument('--pause-terminal', type=float, default=2.0, help="Durée moyenne d'une tâche (s).")
+        parser.add_argument('--intervalle-dashboard', type=float, default=20.0, help="Rafraîchissement du tableau de bord (s).")
+        parser.add_argument('--exports-par-heure', type=float, default=6.0, help="Exports lancés par manager et par heure.")
+        parser.add_argument('--mot-de-passe', default='charge-atelier', help="Mot de passe des comptes de charge.")
+        parser.add_argument('--sortie', default='charge.json', help="Fichier JSON de résultats.")
+
+    def handle(self, *args, **options):
+        scenario = Scenario(
+            base_url=options['url'], mot_de_passe=options['mot_de_passe'], duree=options['duree'],
+            pause_terminal=options['pause_terminal'], intervalle_dashboard=options['intervalle_dashboard'],
+            exports_par_heure=options['exports_par_heure'],
+        )
+        terminaux, managers = options['terminaux'], options['managers']
+        paliers = list(zip_longest(terminaux, managers, fillvalue=None))
+        paliers = [(t if t is not None else terminaux[-1], m if m is not None else managers[-1]) for t, m in paliers]
+
+        resultats = []
+        for nb_terminaux, nb_managers in paliers:
+            self.stdout.write(self.style.NOTICE(
+                f"--- {nb_terminaux} terminal(aux), {nb_managers} manager(s), {scenario.duree:.0f} s ---"))
+            resultat = lancer(scenario, nb_terminaux, nb_managers)
+            resultats.append(resultat)
+            self.stdout.write(f"{'point d accès':24} {'req':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'erreurs':>8} {'refus 4xx':>9}")
+            for p in resultat.points:
+                self.stdout.write(f"{p.point:24} {p.requetes:6d} {p.req_par_s:7.2f} {p.ms_p50:7.1f}ms "
+                                  f"{p.ms_p95:7.1f}ms {p.ms_p99:7.1f}ms {p.taux_erreur:8.1%} {p.refus:9d}")
+            self.stdout.write(f"Débit total : {resultat.req_par_s:.2f} req/s")
+
+        with open(options['sortie'], 'w', encoding='utf-8') as f:
+            json.dump({
+                'date': timezone.now().isoformat(),
+                'url': scenario.base_url,
+                'paliers': [r.as_dict() for r in resultats],
+            }, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"{len(resultats)} palier(s) écrit(s) dans {options['sortie']}."))
@@ -14,7 +14,7 @@ class Command(BaseCommand):
         self.stdout.write(f"Génération du rapport pour le {jour_a_traiter.strftime('%d/%m/%Y')}...")
 
         # On récupère tous les pointages terminés ce jour-là (sans se soucier des OFs)
-        pointages_du_jour = Pointage.objects.filter(heure_fin__date=jour_a_traiter)
+        pointages_du_jour = Pointage.objects.termines_le(jour_a_traiter)
 
         # 1. Calcul des quantités
         agregats_production = pointages_du_jour.aggregate(
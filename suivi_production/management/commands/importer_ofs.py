@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from suivi_production.services.import_ofs import ErreurImport, importer_ofs, lire_fichier, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Importe en masse des OFs, leurs opérations et leurs matières depuis un fichier CSV ou XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier .csv (séparateur ';' ou ',') ou .xlsx, une ligne par phase.")
+        parser.add_argument('--simulation', action='store_true', help="Valide le fichier sans rien importer.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre de lignes validées et insérées par lot.")
+
+    def handle(self, *args, **options):
+        chemin = Path(options['fichier'])
+        if not chemin.is_file():
+            raise CommandError(f"Fichier introuvable : {chemin}")
+        try:
+            rapport = importer_ofs(lire_fichier(chemin.read_bytes(), chemin.name), options['taille_lot'], options['simulation'])
+        except ErreurImport as e:
+            raise CommandError(str(e))
+
+        for erreur in rapport.erreurs:
+            self.stdout.write(self.style.WARNING(f'Ligne {erreur.ligne} ({erreur.numero_of or "?"}) : {erreur.message}'))
+        if rapport.nombre_erreurs > len(rapport.erreurs):
+            self.stdout.write(self.style.WARNING(f'... {rapport.nombre_erreurs - len(rapport.erreurs)} autre(s) erreur(s).'))
+        verbe = 'valide(s)' if rapport.simulation else 'importé(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f'{rapport.lignes} ligne(s) lue(s) : {rapport.ofs} OF(s), {rapport.operations} opération(s) et '
+            f'{rapport.matieres} matière(s) {verbe}, {rapport.ofs_rejetes} OF(s) rejeté(s).'
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from suivi_production.services import partitions
+
+class Command(BaseCommand):
+    help = (
+        "Maintient le partitionnement mensuel des pointages (PostgreSQL) : "
+        "création des partitions à venir et détachement des plus anciennes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--initialiser', action='store_true',
+                            help="Convertit la table des pointages en table partitionnée si ce n'est pas déjà fait.")
+        parser.add_argument('--mois-avance', type=int, default=3,
+                            help="Nombre de mois futurs pour lesquels une partition doit exister.")
+        parser.add_argument('--retention-mois', type=int, default=0,
+                            help="Détache les partitions plus anciennes que ce nombre de mois (0 = jamais).")
+
+    def handle(self, *args, **options):
+        if not partitions.est_disponible():
+            self.stdout.write(self.style.NOTICE("Partitionnement ignoré : disponible uniquement sous PostgreSQL."))
+            return
+
+        if not partitions.est_partitionne():
+            if not options['initialiser']:
+                self.stdout.write(self.style.NOTICE("La table des pointages n'est pas partitionnée (utilisez --initialiser)."))
+                return
+            copiees = partitions.convertir_en_partitions(mois_avance=options['mois_avance'])
+            self.stdout.write(self.style.SUCCESS(f"Table des pointages partitionnée ({copiees} pointage(s) recopié(s))."))
+
+        mois_courant = timezone.now().date().replace(day=1)
+        creees = partitions.creer_partitions(partitions.ajouter_mois(mois_courant, options['mois_avance']), depuis=mois_courant)
+        for nom in creees:
+            self.stdout.write(f"Partition créée : {nom}")
+
+        if options['retention_mois'] < 0:
+            raise CommandError("--retention-mois doit être positif.")
+        if options['retention_mois']:
+            limite = partitions.ajouter_mois(mois_courant, -options['retention_mois'])
+            for nom in partitions.detacher_partitions(avant=limite):
+                self.stdout.write(self.style.WARNING(f"Partition détachée : {nom}"))
+
+        self.stdout.write(self.style.SUCCESS("Partitions des pointages à jour."))
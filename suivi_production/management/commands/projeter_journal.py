@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from suivi_production.services.journal import PROJECTIONS, projeter, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Applique aux projections les événements du journal publiés depuis leur dernière position."
+
+    def add_arguments(self, parser):
+        parser.add_argument('projections', nargs='*', help=f"Projections à mettre à jour (toutes par défaut) : {', '.join(PROJECTIONS)}.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'événements appliqués par transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            lus = projeter(options['projections'] or None, options['taille_lot'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for nom, nombre in lus.items():
+            if nombre:
+                self.stdout.write(self.style.SUCCESS(f'{nom} : {nombre} événement(s) appliqué(s).'))
+            else:
+                self.stdout.write(self.style.NOTICE(f'{nom} : déjà à jour.'))
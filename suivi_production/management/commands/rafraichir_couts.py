@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from suivi_production.services.couts import rafraichir_couts, reconstruire_couts, ecarts_couts, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Met à jour les coûts de main-d'œuvre mensuels des OFs modifiés depuis le dernier rafraîchissement."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true', help="Vide les agrégats et les recalcule pour tous les OFs.")
+        parser.add_argument('--verifier', action='store_true',
+                            help="Compare ensuite, OF par OF, les coûts agrégés à ceux des pointages.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'OFs recalculés par transaction.")
+
+    def handle(self, *args, **options):
+        if options['complet']:
+            nombre = reconstruire_couts(options['taille_lot'])
+        else:
+            nombre = rafraichir_couts(options['taille_lot'])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f'{nombre} OF(s) recalculé(s) dans les coûts mensuels.'))
+        else:
+            self.stdout.write(self.style.NOTICE('Coûts mensuels déjà à jour.'))
+
+        if options['verifier']:
+            ecarts = ecarts_couts()
+            for pk, (agrege, pointages) in sorted(ecarts.items()):
+                self.stdout.write(self.style.WARNING(f'OF {pk} : {agrege} € agrégés, {pointages} € selon les pointages.'))
+            if not ecarts:
+                self.stdout.write(self.style.SUCCESS('Coûts agrégés cohérents avec les pointages.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from suivi_production.services.cube_rebuts import rafraichir_cube, reconstruire_cube, ecarts_cube, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Met à jour le cube des rebuts pour les OFs modifiés depuis le dernier rafraîchissement."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true', help="Vide le cube et le recalcule pour tous les OFs.")
+        parser.add_argument('--verifier', action='store_true',
+                            help="Compare ensuite, OF par OF, les rebuts du cube à ceux des pointages.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'OFs recalculés par transaction.")
+
+    def handle(self, *args, **options):
+        if options['complet']:
+            nombre = reconstruire_cube(options['taille_lot'])
+        else:
+            nombre = rafraichir_cube(options['taille_lot'])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f'{nombre} OF(s) recalculé(s) dans le cube des rebuts.'))
+        else:
+            self.stdout.write(self.style.NOTICE('Cube des rebuts déjà à jour.'))
+
+        if options['verifier']:
+            ecarts = ecarts_cube()
+            for pk, (cube, pointages) in sorted(ecarts.items()):
+                self.stdout.write(self.style.WARNING(f'OF {pk} : {cube} rebut(s) dans le cube, {pointages} dans les pointages.'))
+            if not ecarts:
+                self.stdout.write(self.style.SUCCESS('Cube cohérent avec les pointages.'))
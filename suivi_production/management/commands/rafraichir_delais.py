@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from suivi_production.services.delais import (
+    photographier_en_cours, rafraichir_delais, reconstruire_delais, reconstruire_en_cours, TAILLE_LOT,
+)
+
+
+class Command(BaseCommand):
+    help = "Recalcule les délais des OFs modifiés depuis le dernier rafraîchissement et photographie l'en-cours des postes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true',
+                            help="Recalcule les délais de tous les OFs et recompte l'en-cours des postes.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'OFs recalculés par transaction.")
+
+    def handle(self, *args, **options):
+        if options['complet']:
+            reconstruire_en_cours()
+            nombre = reconstruire_delais(options['taille_lot'])
+        else:
+            nombre = rafraichir_delais(options['taille_lot'])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f'{nombre} OF(s) recalculé(s) dans les délais.'))
+        else:
+            self.stdout.write(self.style.NOTICE('Délais déjà à jour.'))
+        postes = photographier_en_cours()
+        self.stdout.write(self.style.SUCCESS(f"En-cours du jour enregistré pour {postes} poste(s)."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from suivi_production.services.temps_cycle import rafraichir_cycles, reconstruire, CLES_PAR_LOT
+
+
+class Command(BaseCommand):
+    help = "Recalcule les esquisses de temps de cycle des clés (poste, type d'opération, opérateur) en file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true',
+                            help="Recalcule toutes les esquisses depuis les pointages clôturés.")
+        parser.add_argument('--taille-lot', type=int, default=CLES_PAR_LOT, help="Nombre de clés recalculées par transaction.")
+
+    def handle(self, *args, **options):
+        if options['complet']:
+            nombre = reconstruire()
+        else:
+            nombre = rafraichir_cycles(options['taille_lot'])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f'{nombre} esquisse(s) de temps de cycle recalculée(s).'))
+        else:
+            self.stdout.write(self.style.NOTICE('Temps de cycle déjà à jour.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from suivi_production.services.utilisation import rafraichir_utilisation, reconstruire_utilisation, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'utilisation des journées machine touchées depuis le dernier rafraîchissement."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depuis', help="Recalcule toutes les journées depuis cette date (AAAA-MM-JJ).")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT,
+                            help="Nombre de journées machine recalculées par transaction.")
+
+    def handle(self, *args, **options):
+        if options['depuis']:
+            debut = parse_date(options['depuis'])
+            if debut is None:
+                raise CommandError("Date invalide pour --depuis (format attendu : AAAA-MM-JJ).")
+            nombre = reconstruire_utilisation(debut, timezone.localdate(), options['taille_lot'])
+        else:
+            nombre = rafraichir_utilisation(options['taille_lot'])
+        if nombre:
+            self.stdout.write(self.style.SUCCESS(f'{nombre} journée(s) machine recalculée(s).'))
+        else:
+            self.stdout.write(self.style.NOTICE('Utilisation déjà à jour.'))
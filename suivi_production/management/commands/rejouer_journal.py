@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from suivi_production.services.journal import PROJECTIONS, rejouer, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Vide les projections et les reconstruit en rejouant tout le journal des événements."
+
+    def add_arguments(self, parser):
+        parser.add_argument('projections', nargs='*', help=f"Projections à reconstruire (toutes par défaut) : {', '.join(PROJECTIONS)}.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'événements appliqués par transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            lus = rejouer(options['projections'] or None, options['taille_lot'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for nom, nombre in lus.items():
+            self.stdout.write(self.style.SUCCESS(f'{nom} : reconstruite depuis {nombre} événement(s).'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from suivi_production.models import OrdreFabricationArchive
+from suivi_production.services.archivage import restaurer_ofs, TAILLE_LOT
+
+class Command(BaseCommand):
+    help = "Replace des Ordres de Fabrication archivés dans les tables de production."
+
+    def add_arguments(self, parser):
+        parser.add_argument('numeros', nargs='*', help="Numéros des OFs à restaurer.")
+        parser.add_argument('--tous', action='store_true', help="Restaure toutes les archives.")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'OFs déplacés par transaction.")
+
+    def handle(self, *args, **options):
+        if not options['numeros'] and not options['tous']:
+            raise CommandError("Indiquez au moins un numéro d'OF ou l'option --tous.")
+
+        archives = OrdreFabricationArchive.objects.all()
+        if not options['tous']:
+            archives = archives.filter(numero_of__in=options['numeros'])
+
+        demandes = archives.count()
+        nombre_ofs = restaurer_ofs(archives, taille_lot=options['taille_lot'])
+
+        if nombre_ofs > 0:
+            self.stdout.write(self.style.SUCCESS(f'{nombre_ofs} OF(s) ont été restauré(s) avec succès.'))
+        if nombre_ofs < demandes:
+            self.stdout.write(self.style.WARNING(f"{demandes - nombre_ofs} OF(s) ignoré(s) : numéro déjà utilisé en production."))
+        if demandes == 0:
+            self.stdout.write(self.style.NOTICE('Aucun OF archivé correspondant.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from suivi_production.services.donnees_synthetiques import generer_atelier
+
+class Command(BaseCommand):
+    help = (
+        "Génère des données d'atelier synthétiques : OFs multi-phases, opérateurs qualifiés, "
+        "pointages répartis sur plusieurs mois avec rebuts, et anomalies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ofs', type=int, default=1000, help="Nombre d'OFs à générer.")
+        parser.add_argument('--jours', type=int, default=180, help="Profondeur d'historique (en jours).")
+        parser.add_argument('--phases-max', type=int, default=6, help="Nombre maximal de phases par gamme (minimum 2).")
+        parser.add_argument('--graine', type=int, default=42, help="Graine du générateur aléatoire.")
+        parser.add_argument('--prefixe', default='SYN', help="Préfixe des numéros d'OF générés.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Génération de {options['ofs']} OF(s) sur {options['jours']} jours...")
+        volumes = generer_atelier(
+            options['ofs'], jours=options['jours'], phases_max=max(2, options['phases_max']),
+            graine=options['graine'], prefixe=options['prefixe'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{volumes.ofs} OF(s), {volumes.operations} opération(s), {volumes.pointages} pointage(s), "
+            f"{volumes.anomalies} anomalie(s) générés ({volumes.operateurs} opérateurs)."
+        ))
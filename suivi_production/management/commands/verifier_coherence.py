@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from suivi_production.services.coherence import CATEGORIES, TAILLE_TRANCHE, verifier_coherence
+
+LIBELLES = {
+    'statut_of': "Statuts d'OF",
+    'date_finalisation': "Dates de première finalisation manquantes",
+    'quantite_entree': "Quantités d'entrée des opérations",
+    'operation_incomplete': "Opérations terminées sans toutes leurs pièces pointées",
+    'sur_production': "Opérations avec plus de pièces pointées qu'en entrée",
+}
+
+
+class Command(BaseCommand):
+    help = ("Vérifie les statuts d'OF, les dates de finalisation et les quantités d'entrée des opérations "
+            "par rapport aux pointages, et rapporte les écarts (--corriger pour les réparer).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corriger', action='store_true',
+                            help="Corrige statuts, dates et quantités d'entrée (les autres écarts restent signalés).")
+        parser.add_argument('--fils', type=int, default=4, help="Tranches vérifiées en parallèle (une seule à la fois sous SQLite).")
+        parser.add_argument('--taille-tranche', type=int, default=TAILLE_TRANCHE, help="Nombre d'OFs par tranche.")
+        parser.add_argument('--details', action='store_true', help="Affiche les premiers écarts de chaque catégorie.")
+
+    def handle(self, *args, **options):
+        rapport = verifier_coherence(options['corriger'], options['fils'], options['taille_tranche'])
+        self.stdout.write(f"{rapport.ofs_verifies} OF(s) vérifié(s).")
+        for categorie in CATEGORIES:
+            nombre = rapport.ecarts[categorie]
+            ligne = f"{LIBELLES[categorie]} : {nombre} écart(s)"
+            if categorie in rapport.corriges and options['corriger']:
+                ligne += f", {rapport.corriges[categorie]} corrigé(s)"
+            self.stdout.write(self.style.WARNING(ligne) if nombre else ligne)
+            if options['details']:
+                for exemple in rapport.exemples[categorie]:
+                    self.stdout.write(f"    {exemple}")
+        if not any(rapport.ecarts.values()):
+            self.stdout.write(self.style.SUCCESS('Aucun écart.'))
+        elif options['corriger']:
+            self.stdout.write(self.style.SUCCESS('Corrections appliquées.'))
+        else:
+            self.stdout.write(self.style.NOTICE('Relancer avec --corriger pour réparer statuts, dates et quantités.'))
@@ -0,0 +1,175 @@
+"""
+Middlewares de l'application.
+"""
+import gzip
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : sans lui, seul gzip est proposé
+    brotli = None
+
+from .services.metriques import REGISTRE
+from .services.profilage import Echantillonneur, enregistrer_piles
+
+
+class _CompteurSQL:
+    """execute_wrapper qui compte les requêtes SQL et leur durée cumulée."""
+    __slots__ = ('nombre', 'duree')
+
+    def __init__(self):
+        self.nombre = 0
+        self.duree = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duree += time.perf_counter() - debut
+            self.nombre += 1
+
+
+class MetriquesRequetesMiddleware:
+    """
+    Mesure, pour chaque requête, la durée de traitement, le nombre de requêtes SQL et
+    le temps SQL, et les range par nom d'URL dans le registre de métriques.
+    Désactivé par METRIQUES_ACTIVES=False ; METRIQUES_SERVER_TIMING ajoute l'en-tête
+    Server-Timing (visible dans l'onglet réseau du navigateur).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRIQUES_ACTIVES', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRIQUES_SERVER_TIMING', False)
+
+    def __call__(self, request):
+        compteur = _CompteurSQL()
+        debut = time.perf_counter()
+        with connection.execute_wrapper(compteur):
+            response = self.get_response(request)
+        duree = time.perf_counter() - debut
+
+        match = request.resolver_match
+        vue = match.view_name if match else 'non_resolue'
+        REGISTRE.enregistrer(vue, response.status_code, duree, compteur.nombre, compteur.duree)
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'app;dur={duree * 1000:.1f}, '
+                f'sql;dur={compteur.duree * 1000:.1f};desc="{compteur.nombre} requetes"'
+            )
+        return response
+
+
+class ProfilageMiddleware:
+    """
+    Profilage par échantillonnage (voir services/profilage.py). Activé par
+    PROFILAGE_ACTIF=True ; désactivé, il est retiré de la chaîne et ne coûte rien.
+    Les piles d'une requête sont gardées si elle dépasse PROFILAGE_SEUIL_MS, ou, pour
+    les vues de PROFILAGE_VUES, avec la probabilité PROFILAGE_FRACTION.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILAGE_ACTIF', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.seuil = settings.PROFILAGE_SEUIL_MS / 1000
+        self.vues = set(settings.PROFILAGE_VUES)
+        self.fraction = settings.PROFILAGE_FRACTION
+        self.echantillonneur = Echantillonneur(settings.PROFILAGE_INTERVALLE_MS / 1000)
+
+    def __call__(self, request):
+        thread_id = threading.get_ident()
+        self.echantillonneur.debuter(thread_id)
+        debut = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            piles = self.echantillonneur.terminer(thread_id)
+        duree = time.perf_counter() - debut
+
+        match = request.resolver_match
+        vue = match.view_name if match else 'non_resolue'
+        if duree >= self.seuil or (vue in self.vues and random.random() < self.fraction):
+            enregistrer_piles(settings.PROFILAGE_REPERTOIRE, vue, piles,
+                              settings.PROFILAGE_TAILLE_MAX, settings.PROFILAGE_ROTATIONS)
+        return response
+
+
+_ENCODAGE = _lazy_re_compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def encodages_acceptes(accept_encoding):
+    """Encodages acceptés par le client (q > 0), d'après l'en-tête Accept-Encoding."""
+    acceptes = set()
+    for partie in accept_encoding.split(','):
+        m = _ENCODAGE.match(partie)
+        if m and float(m.group(2) or 1) > 0:
+            acceptes.add(m.group(1).lower())
+    return acceptes
+
+
+def _brotli_flux(contenu):
+    compresseur = brotli.Compressor()
+    for morceau in contenu:
+        bloc = compresseur.process(morceau)
+        if bloc:
+            yield bloc
+    yield compresseur.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compression brotli (si le module est installé) ou gzip des réponses JSON et CSV,
+    selon l'en-tête Accept-Encoding. Les pages HTML ne sont pas concernées : elles
+    contiennent le jeton CSRF (attaque BREACH).
+    """
+    TYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+    TAILLE_MIN = 200
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding') or not response.get('Content-Type', '').startswith(self.TYPES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        acceptes = encodages_acceptes(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encodage = 'br' if brotli and 'br' in acceptes else 'gzip' if 'gzip' in acceptes else None
+        if encodage is None:
+            return response
+
+        if response.streaming:
+            if encodage == 'br':
+                response.streaming_content = _brotli_flux(response.streaming_content)
+            else:
+                response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < self.TAILLE_MIN:
+                return response
+            if encodage == 'br':
+                compresse = brotli.compress(response.content)
+            else:
+                compresse = gzip.compress(response.content, compresslevel=6, mtime=0)
+            if len(compresse) >= len(response.content):
+                return response
+            response.content = compresse
+            response.headers['Content-Length'] = str(len(compresse))
+
+        # Un ETag fort désigne une représentation précise : il devient faible une fois compressé
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encodage
+        return response
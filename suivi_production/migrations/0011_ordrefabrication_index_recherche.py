@@ -0,0 +1,65 @@
+# Index de recherche plein texte sur les OFs (numero_of, titre).
+#
+# - PostgreSQL : extension pg_trgm + index GIN trigramme sur "numero_of || ' ' || titre".
+# - SQLite : table virtuelle FTS5 (tokenizer trigram) tenue à jour par triggers.
+# Les autres moteurs n'ont pas d'index : la recherche retombe sur icontains.
+
+from django.db import migrations
+
+
+TABLE = 'suivi_production_ordrefabrication'
+FTS = f'{TABLE}_fts'
+
+POSTGRES_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS of_recherche_trgm_idx ON {TABLE} "
+    f"USING gin ((numero_of || ' ' || titre) gin_trgm_ops)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS of_recherche_trgm_idx",
+]
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS} USING fts5("
+    f"numero_of, titre, content='{TABLE}', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS}_ai AFTER INSERT ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS}(rowid, numero_of, titre) VALUES (new.id, new.numero_of, new.titre); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS}_ad AFTER DELETE ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS}({FTS}, rowid, numero_of, titre) VALUES ('delete', old.id, old.numero_of, old.titre); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS}_au AFTER UPDATE OF numero_of, titre ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS}({FTS}, rowid, numero_of, titre) VALUES ('delete', old.id, old.numero_of, old.titre); "
+    f"INSERT INTO {FTS}(rowid, numero_of, titre) VALUES (new.id, new.numero_of, new.titre); END",
+    f"INSERT INTO {FTS}({FTS}) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS}_au",
+    f"DROP TABLE IF EXISTS {FTS}",
+]
+
+
+def _executer(schema_editor, postgres, sqlite):
+    vendor = schema_editor.connection.vendor
+    statements = postgres if vendor == 'postgresql' else sqlite if vendor == 'sqlite' else []
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def creer_index(apps, schema_editor):
+    _executer(schema_editor, POSTGRES_CREATE, SQLITE_CREATE)
+
+
+def supprimer_index(apps, schema_editor):
+    _executer(schema_editor, POSTGRES_DROP, SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0010_operation_matieres_requises_json'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
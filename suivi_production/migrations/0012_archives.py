@@ -0,0 +1,139 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Index de recherche sur les OFs archivés (même principe que 0011)
+TABLE = 'suivi_production_ordrefabricationarchive'
+FTS = f'{TABLE}_fts'
+
+POSTGRES_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS of_archive_recherche_trgm_idx ON {TABLE} "
+    f"USING gin ((numero_of || ' ' || titre) gin_trgm_ops)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS of_archive_recherche_trgm_idx",
+]
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS} USING fts5("
+    f"numero_of, titre, content='{TABLE}', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS}_ai AFTER INSERT ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS}(rowid, numero_of, titre) VALUES (new.id, new.numero_of, new.titre); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS}_ad AFTER DELETE ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS}({FTS}, rowid, numero_of, titre) VALUES ('delete', old.id, old.numero_of, old.titre); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS}_au AFTER UPDATE OF numero_of, titre ON {TABLE} BEGIN "
+    f"INSERT INTO {FTS}({FTS}, rowid, numero_of, titre) VALUES ('delete', old.id, old.numero_of, old.titre); "
+    f"INSERT INTO {FTS}(rowid, numero_of, titre) VALUES (new.id, new.numero_of, new.titre); END",
+]
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS}_au",
+    f"DROP TABLE IF EXISTS {FTS}",
+]
+
+
+def _executer(schema_editor, postgres, sqlite):
+    vendor = schema_editor.connection.vendor
+    statements = postgres if vendor == 'postgresql' else sqlite if vendor == 'sqlite' else []
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def creer_index(apps, schema_editor):
+    _executer(schema_editor, POSTGRES_CREATE, SQLITE_CREATE)
+
+
+def supprimer_index(apps, schema_editor):
+    _executer(schema_editor, POSTGRES_DROP, SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0011_ordrefabrication_index_recherche'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrdreFabricationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('numero_of', models.CharField(db_index=True, max_length=50)),
+                ('titre', models.CharField(max_length=255)),
+                ('quantite_a_produire', models.IntegerField(default=1)),
+                ('statut', models.CharField(choices=[('PLANIFIE', 'Planifié'), ('PRODUCTION', 'En Production'), ('TERMINE', 'Terminé'), ('ARCHIVE', 'Archivé')], default='TERMINE', max_length=20)),
+                ('date_creation', models.DateField()),
+                ('date_premiere_finalisation', models.DateField(blank=True, null=True)),
+                ('date_debut_prevu', models.DateField(blank=True, null=True)),
+                ('date_fin_prevue', models.DateField(blank=True, null=True)),
+                ('plan_pdf', models.FileField(blank=True, null=True, upload_to='plans/')),
+                ('quantite_produite', models.IntegerField(default=0)),
+                ('quantite_rebut', models.IntegerField(default=0)),
+                ('date_archivage', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OperationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('numero_phase', models.IntegerField()),
+                ('statut', models.CharField(choices=[('A_FAIRE', 'À Faire'), ('EN_COURS', 'En Cours'), ('TERMINEE', 'Terminée'), ('RETOUCHE', 'En Retouche')], default='TERMINEE', max_length=20)),
+                ('quantite_entree', models.IntegerField(default=0)),
+                ('type_operation', models.CharField(choices=[('PRODUCTION', 'Activité de Production'), ('CONSOMMATION', 'Consommation Matière (Input)'), ('QUALITE', 'Contrôle Qualité'), ('LOGISTIQUE', 'Approvisionnement (Supply)')], default='PRODUCTION', max_length=20)),
+                ('titre', models.CharField(max_length=255)),
+                ('instructions', models.JSONField(blank=True, null=True)),
+                ('matieres_requises_json', models.JSONField(blank=True, null=True)),
+                ('temps_prevu_minutes', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('machine_assignee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operations_archivees', to='suivi_production.machine')),
+                ('poste', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='operations_archivees', to='suivi_production.postedetravail')),
+                ('ordre_fabrication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='suivi_production.ordrefabricationarchive')),
+            ],
+            options={
+                'ordering': ['numero_phase'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MatiereRequiseArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantite_necessaire', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('matiere', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes_archivees', to='suivi_production.matierepremiere')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matieres', to='suivi_production.operationarchive')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AnomalieArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('description', models.TextField()),
+                ('date_signalement', models.DateTimeField()),
+                ('statut', models.CharField(choices=[('OUVERTE', 'Ouverte'), ('RESOLUE', 'Résolue')], default='OUVERTE', max_length=20)),
+                ('date_resolution', models.DateTimeField(blank=True, null=True)),
+                ('masquee_dashboard', models.BooleanField(default=False)),
+                ('operateur', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='anomalies_archivees', to='suivi_production.operateur')),
+                ('resolu_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='anomalies_archivees_resolues', to=settings.AUTH_USER_MODEL)),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='suivi_production.operationarchive')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PointageArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('heure_debut', models.DateTimeField()),
+                ('heure_fin', models.DateTimeField(blank=True, null=True)),
+                ('quantite_fabriquee', models.IntegerField(default=0)),
+                ('quantite_rebut', models.IntegerField(default=0)),
+                ('quantite_prise_en_charge', models.IntegerField(default=0)),
+                ('operateur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='pointages_archives', to='suivi_production.operateur')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pointages', to='suivi_production.operationarchive')),
+            ],
+        ),
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
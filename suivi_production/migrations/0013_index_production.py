@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0012_archives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomalie',
+            index=models.Index(fields=['statut', 'date_signalement'], name='anomalie_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matierepremiere',
+            index=models.Index(condition=models.Q(('quantite_stock__lte', models.F('seuil_alerte'))), fields=['reference'], name='matiere_stock_bas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordrefabrication',
+            index=models.Index(fields=['date_premiere_finalisation', 'statut'], name='of_finalisation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordrefabrication',
+            index=models.Index(fields=['statut', 'date_creation'], name='of_statut_creation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(condition=models.Q(('heure_fin__isnull', True)), fields=['operation', 'operateur'], name='pointage_en_cours_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['heure_debut'], name='pointage_debut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['heure_fin'], name='pointage_fin_idx'),
+        ),
+    ]
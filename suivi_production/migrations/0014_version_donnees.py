@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0013_index_production'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDonnees',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
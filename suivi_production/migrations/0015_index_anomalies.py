@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0014_version_donnees'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='anomaliearchive',
+            name='date_signalement',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='anomalie',
+            index=models.Index(fields=['date_signalement'], name='anomalie_signalement_idx'),
+        ),
+    ]
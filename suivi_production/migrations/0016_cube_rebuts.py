@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mettre_en_file_ofs_existants(apps, schema_editor):
+    """Le cube est construit au premier rafraîchissement : tous les OFs existants sont mis en file."""
+    EnAttente = apps.get_model('suivi_production', 'CubeRebutEnAttente')
+    for nom in ('OrdreFabrication', 'OrdreFabricationArchive'):
+        ids = apps.get_model('suivi_production', nom).objects.values_list('pk', flat=True)
+        EnAttente.objects.bulk_create([EnAttente(ordre_fabrication_id=pk) for pk in ids],
+                                      batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0015_index_anomalies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubeRebutEnAttente',
+            fields=[
+                ('ordre_fabrication_id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CubeRebut',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('semaine', models.DateField()),
+                ('mois', models.DateField()),
+                ('ordre_fabrication_id', models.BigIntegerField()),
+                ('type_operation', models.CharField(choices=[('PRODUCTION', 'Activité de Production'), ('CONSOMMATION', 'Consommation Matière (Input)'), ('QUALITE', 'Contrôle Qualité'), ('LOGISTIQUE', 'Approvisionnement (Supply)')], max_length=20)),
+                ('quantite_rebut', models.IntegerField(default=0)),
+                ('quantite_fabriquee', models.IntegerField(default=0)),
+                ('nombre_pointages', models.IntegerField(default=0)),
+                ('machine', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.machine')),
+                ('operateur', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.operateur')),
+                ('poste', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ordre_fabrication_id'], name='cube_rebut_of_idx'), models.Index(fields=['jour'], name='cube_rebut_jour_idx')],
+            },
+        ),
+        migrations.RunPython(mettre_en_file_ofs_existants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def ouvrir_statuts_actuels(apps, schema_editor):
+    """L'historique des statuts commence à la migration : statut actuel de chaque machine."""
+    Machine = apps.get_model('suivi_production', 'Machine')
+    Periode = apps.get_model('suivi_production', 'PeriodeStatutMachine')
+    maintenant = timezone.now()
+    Periode.objects.bulk_create([
+        Periode(machine_id=pk, statut=statut, debut=maintenant)
+        for pk, statut in Machine.objects.values_list('pk', 'statut')
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0016_cube_rebuts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodeStatutMachine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('DISPONIBLE', 'Disponible'), ('EN_PANNE', 'En Panne'), ('MAINTENANCE', 'En Maintenance')], max_length=20)),
+                ('debut', models.DateTimeField()),
+                ('fin', models.DateTimeField(blank=True, null=True)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='periodes_statut', to='suivi_production.machine')),
+            ],
+            options={
+                'ordering': ['machine', 'debut'],
+                'indexes': [models.Index(fields=['machine', 'debut'], name='periode_statut_machine_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TRSEnAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.machine')),
+            ],
+            options={
+                'unique_together': {('jour', 'machine')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TRSJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('semaine', models.DateField()),
+                ('mois', models.DateField()),
+                ('temps_requis', models.FloatField(default=0)),
+                ('temps_arret_planifie', models.FloatField(default=0)),
+                ('temps_panne', models.FloatField(default=0)),
+                ('temps_pointe', models.FloatField(default=0)),
+                ('temps_net', models.FloatField(default=0)),
+                ('temps_utile', models.FloatField(default=0)),
+                ('pieces_bonnes', models.IntegerField(default=0)),
+                ('pieces_rebut', models.IntegerField(default=0)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.machine')),
+                ('poste', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['jour', 'machine'], name='trs_jour_machine_idx'), models.Index(fields=['mois'], name='trs_mois_idx')],
+            },
+        ),
+        migrations.RunPython(ouvrir_statuts_actuels, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def figer_taux_existants(apps, schema_editor):
+    """Les pointages déjà clôturés prennent le taux actuel de leur opérateur ; tous les OFs sont mis en file."""
+    Operateur = apps.get_model('suivi_production', 'Operateur')
+    taux = Subquery(Operateur.objects.filter(pk=OuterRef('operateur_id')).values('cout_horaire')[:1])
+    for nom in ('Pointage', 'PointageArchive'):
+        apps.get_model('suivi_production', nom).objects.filter(heure_fin__isnull=False).update(cout_horaire=taux)
+    EnAttente = apps.get_model('suivi_production', 'CoutEnAttente')
+    for nom in ('OrdreFabrication', 'OrdreFabricationArchive'):
+        ids = apps.get_model('suivi_production', nom).objects.values_list('pk', flat=True)
+        EnAttente.objects.bulk_create([EnAttente(ordre_fabrication_id=pk) for pk in ids],
+                                      batch_size=1000, ignore_conflicts=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0017_trs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoutEnAttente',
+            fields=[
+                ('ordre_fabrication_id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pointage',
+            name='cout_horaire',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name='pointagearchive',
+            name='cout_horaire',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.CreateModel(
+            name='CoutMensuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField()),
+                ('ordre_fabrication_id', models.BigIntegerField()),
+                ('operation_id', models.BigIntegerField()),
+                ('duree_secondes', models.FloatField(default=0)),
+                ('duree_prevue_secondes', models.FloatField(default=0)),
+                ('cout', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cout_prevu', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nombre_pointages', models.IntegerField(default=0)),
+                ('operateur', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.operateur')),
+                ('poste', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ordre_fabrication_id'], name='cout_mensuel_of_idx'), models.Index(fields=['mois'], name='cout_mensuel_mois_idx')],
+            },
+        ),
+        migrations.RunPython(figer_taux_existants, migrations.RunPython.noop),
+    ]
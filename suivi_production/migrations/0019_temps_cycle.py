@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0018_couts_main_oeuvre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueCycle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_operation', models.CharField(choices=[('PRODUCTION', 'Activité de Production'), ('CONSOMMATION', 'Consommation Matière (Input)'), ('QUALITE', 'Contrôle Qualité'), ('LOGISTIQUE', 'Approvisionnement (Supply)')], max_length=20)),
+                ('esquisse', models.JSONField(default=dict)),
+                ('nombre', models.IntegerField(default=0)),
+                ('somme_minutes', models.FloatField(default=0)),
+                ('somme_prevue', models.FloatField(default=0)),
+                ('nombre_prevu', models.IntegerField(default=0)),
+                ('operateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.operateur')),
+                ('poste', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'unique_together': {('poste', 'type_operation', 'operateur')},
+            },
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def initialiser_en_cours(apps, schema_editor):
+    """Compte l'en-cours actuel des postes ; tous les OFs sont mis en file pour le calcul des délais."""
+    Operation = apps.get_model('suivi_production', 'Operation')
+    EnCoursPoste = apps.get_model('suivi_production', 'EnCoursPoste')
+    en_attente = Q(statut='A_FAIRE', quantite_entree__gt=0)
+    en_cours = Q(statut__in=('EN_COURS', 'RETOUCHE'))
+    comptes = Operation.objects.order_by().values('poste_id').annotate(
+        operations_en_attente=Count('id', filter=en_attente),
+        operations_en_cours=Count('id', filter=en_cours),
+        pieces_en_attente=Sum('quantite_entree', filter=en_attente),
+        pieces_en_cours=Sum('quantite_entree', filter=en_cours),
+    )
+    EnCoursPoste.objects.bulk_create([
+        EnCoursPoste(**{cle: valeur or 0 for cle, valeur in c.items()}) for c in comptes
+    ], batch_size=1000)
+    EnAttente = apps.get_model('suivi_production', 'DelaiEnAttente')
+    for nom in ('OrdreFabrication', 'OrdreFabricationArchive'):
+        ids = apps.get_model('suivi_production', nom).objects.values_list('pk', flat=True)
+        EnAttente.objects.bulk_create([EnAttente(ordre_fabrication_id=pk) for pk in ids], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0019_temps_cycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DelaiEnAttente',
+            fields=[
+                ('ordre_fabrication_id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EnCoursPoste',
+            fields=[
+                ('poste', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='en_cours', serialize=False, to='suivi_production.postedetravail')),
+                ('operations_en_attente', models.IntegerField(default=0)),
+                ('operations_en_cours', models.IntegerField(default=0)),
+                ('pieces_en_attente', models.IntegerField(default=0)),
+                ('pieces_en_cours', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DelaiPhase',
+            fields=[
+                ('operation_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ordre_fabrication_id', models.BigIntegerField()),
+                ('numero_phase', models.IntegerField()),
+                ('debut', models.DateTimeField()),
+                ('fin', models.DateTimeField(null=True)),
+                ('attente_secondes', models.FloatField(null=True)),
+                ('traitement_secondes', models.FloatField(null=True)),
+                ('semaine', models.DateField()),
+                ('poste', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ordre_fabrication_id'], name='delai_phase_of_idx'), models.Index(fields=['semaine', 'poste'], name='delai_phase_semaine_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EnCoursJournalier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('semaine', models.DateField()),
+                ('operations_en_attente', models.IntegerField(default=0)),
+                ('operations_en_cours', models.IntegerField(default=0)),
+                ('pieces_en_attente', models.IntegerField(default=0)),
+                ('pieces_en_cours', models.IntegerField(default=0)),
+                ('poste', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['semaine', 'poste'], name='en_cours_semaine_idx')],
+                'unique_together': {('jour', 'poste')},
+            },
+        ),
+        migrations.RunPython(initialiser_en_cours, migrations.RunPython.noop),
+    ]
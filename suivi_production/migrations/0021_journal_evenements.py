@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:12
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0020_delais_en_cours'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionProjection',
+            fields=[
+                ('nom', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField(default=0)),
+                ('mise_a_jour', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Evenement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('horodatage', models.DateTimeField(default=django.utils.timezone.now)),
+                ('type', models.CharField(choices=[('POINTAGE_DEMARRE', 'Pointage démarré'), ('POINTAGE_TERMINE', 'Pointage terminé'), ('OPERATION_TERMINEE', 'Opération terminée'), ('PHASE_DEBLOQUEE', 'Phase débloquée'), ('STOCK_CONSOMME', 'Stock consommé'), ('ANOMALIE_SIGNALEE', 'Anomalie signalée'), ('OF_STATUT', "Statut d'OF modifié")], max_length=30)),
+                ('ordre_fabrication_id', models.BigIntegerField(null=True)),
+                ('operation_id', models.BigIntegerField(null=True)),
+                ('donnees', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'ordering': ['pk'],
+                'indexes': [models.Index(fields=['ordre_fabrication_id'], name='evenement_of_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ActiviteJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('pointages_demarres', models.IntegerField(default=0)),
+                ('pointages_termines', models.IntegerField(default=0)),
+                ('pieces_bonnes', models.IntegerField(default=0)),
+                ('pieces_rebut', models.IntegerField(default=0)),
+                ('operations_terminees', models.IntegerField(default=0)),
+                ('phases_debloquees', models.IntegerField(default=0)),
+                ('anomalies', models.IntegerField(default=0)),
+                ('poste', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'unique_together': {('jour', 'poste')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ConsommationMatiere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('quantite', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('nombre_consommations', models.IntegerField(default=0)),
+                ('matiere', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='suivi_production.matierepremiere')),
+            ],
+            options={
+                'unique_together': {('jour', 'matiere')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0021_journal_evenements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GammeType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('description', models.TextField(blank=True)),
+                ('date_creation', models.DateField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['nom'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OperationGammeType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_phase', models.IntegerField()),
+                ('titre', models.CharField(max_length=255)),
+                ('type_operation', models.CharField(choices=[('PRODUCTION', 'Activité de Production'), ('CONSOMMATION', 'Consommation Matière (Input)'), ('QUALITE', 'Contrôle Qualité'), ('LOGISTIQUE', 'Approvisionnement (Supply)')], default='PRODUCTION', max_length=20)),
+                ('temps_prevu_minutes', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('instructions', models.JSONField(blank=True, null=True)),
+                ('gamme', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='suivi_production.gammetype')),
+                ('machine_assignee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='operations_gammes_types', to='suivi_production.machine')),
+                ('poste', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='operations_gammes_types', to='suivi_production.postedetravail')),
+            ],
+            options={
+                'ordering': ['numero_phase'],
+                'unique_together': {('gamme', 'numero_phase')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MatiereGammeType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite_necessaire', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('matiere', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='suivi_production.matierepremiere')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matieres', to='suivi_production.operationgammetype')),
+            ],
+            options={
+                'unique_together': {('operation', 'matiere')},
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:20
+
+from importlib import import_module
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Sous SQLite, ajouter une colonne à suivi_production_ordrefabrication reconstruit la table
+# et supprime les triggers qui tiennent l'index FTS5 de recherche à jour (0011) : ils sont
+# recréés, et l'index reconstruit, après l'ajout (et après la suppression au retour arrière).
+recherche = import_module('suivi_production.migrations.0011_ordrefabrication_index_recherche')
+
+
+def recreer_triggers_recherche(apps, schema_editor):
+    recherche._executer(schema_editor, [], recherche.SQLITE_CREATE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0022_gammes_types'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreer_triggers_recherche),
+        migrations.AddField(
+            model_name='anomalie',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='matierepremiere',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='operation',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ordrefabrication',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='pointage',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='anomalie',
+            index=models.Index(fields=['date_modification', 'id'], name='anomalie_modification_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matierepremiere',
+            index=models.Index(fields=['date_modification', 'id'], name='matiere_modification_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='operation',
+            index=models.Index(fields=['date_modification', 'id'], name='operation_modification_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordrefabrication',
+            index=models.Index(fields=['date_modification', 'id'], name='of_modification_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordrefabricationarchive',
+            index=models.Index(fields=['date_archivage', 'id'], name='of_archive_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['date_modification', 'id'], name='pointage_modification_idx'),
+        ),
+        migrations.RunPython(recreer_triggers_recherche, migrations.RunPython.noop),
+    ]
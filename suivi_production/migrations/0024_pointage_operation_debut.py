@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0023_date_modification_api'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pointage',
+            index=models.Index(fields=['operation', 'heure_debut'], name='pointage_operation_debut_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0024_pointage_operation_debut'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UtilisationEnAttente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.machine')),
+            ],
+            options={
+                'unique_together': {('jour', 'machine')},
+            },
+        ),
+        migrations.CreateModel(
+            name='UtilisationMachine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('mois', models.DateField()),
+                ('equipe', models.CharField(blank=True, max_length=50)),
+                ('temps_ouvert', models.FloatField(default=0)),
+                ('temps_occupe', models.FloatField(default=0)),
+                ('temps_pointe', models.FloatField(default=0)),
+                ('temps_chevauchement', models.FloatField(default=0)),
+                ('temps_creux', models.FloatField(default=0)),
+                ('creux_max', models.FloatField(default=0)),
+                ('pointages', models.IntegerField(default=0)),
+                ('machine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='suivi_production.machine')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['jour', 'machine'], name='utilisation_jour_machine_idx'), models.Index(fields=['mois'], name='utilisation_mois_idx')],
+            },
+        ),
+    ]
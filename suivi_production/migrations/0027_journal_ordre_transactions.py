@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:48
+
+import suivi_production.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suivi_production', '0026_cycle_en_attente'),
+    ]
+
+    operations = [
+        # Les événements existants prennent 0, comme les positions : ils restent consommés
+        # dans l'ordre des identifiants, avant ceux des transactions suivantes
+        migrations.AddField(
+            model_name='evenement',
+            name='numero_transaction',
+            field=models.BigIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='evenement',
+            name='numero_transaction',
+            field=models.BigIntegerField(db_default=suivi_production.models.TransactionCourante(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='positionprojection',
+            name='numero_transaction',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='evenement',
+            index=models.Index(fields=['numero_transaction', 'id'], name='evenement_transaction_idx'),
+        ),
+    ]
@@ -1,10 +1,13 @@
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from datetime import datetime, time, timedelta
 from decimal import Decimal
-from django.db.models import Sum, F
+from django.db.models import Count, Sum, F, Q, OuterRef, Subquery, Value, Case, When, FloatField, IntegerField, DateTimeField, Func
+from django.db.models.functions import Cast, Coalesce, Least
 from django.utils.translation import gettext_lazy as _
 
 # =============================================================================
@@ -35,6 +38,15 @@ class MatierePremiere(models.Model):
     quantite_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     unite_mesure = models.CharField(max_length=20, default='unité')
     seuil_alerte = models.DecimalField(max_digits=10, decimal_places=2, default=10.0)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # API de lecture : synchronisation incrémentale par curseur (date_modification, id)
+            models.Index(fields=['date_modification', 'id'], name='matiere_modification_idx'),
+            # Alerte "stock bas" du tableau de bord : index partiel sur les seules matières sous le seuil
+            models.Index(fields=['reference'], condition=Q(quantite_stock__lte=F('seuil_alerte')), name='matiere_stock_bas_idx'),
+        ]
 
     def __str__(self):
         return f"{self.reference} - {self.designation}"
@@ -61,6 +73,42 @@ class PosteDeTravail(models.Model):
 # MODÈLES DE PROCESSUS (Le cœur de la GPAO)
 # =============================================================================
 
+class OrdreFabricationQuerySet(models.QuerySet):
+    """QuerySet des OFs avec les indicateurs de production calculés en SQL."""
+
+    def with_metrics(self):
+        """
+        Annote chaque OF avec `qte_produite`, `qte_rebut` et `progression`.
+        Ces valeurs sont lues en priorité par les propriétés du modèle
+        (`quantite_produite_actuelle`, `quantite_rebut_totale`, `progression_production`),
+        ce qui évite plusieurs requêtes par OF dans les listes.
+        """
+        derniere_op = Operation.objects.filter(
+            ordre_fabrication=OuterRef('pk'), statut='TERMINEE'
+        ).order_by('-numero_phase').values('pk')[:1]
+        sortie_derniere_op = Pointage.objects.filter(
+            operation_id=OuterRef('derniere_op_terminee_id')
+        ).values('operation_id').annotate(total=Sum('quantite_fabriquee')).values('total')
+        rebut_of = Pointage.objects.filter(
+            operation__ordre_fabrication=OuterRef('pk')
+        ).values('operation__ordre_fabrication').annotate(total=Sum('quantite_rebut')).values('total')
+        return self.annotate(
+            derniere_op_terminee_id=Subquery(derniere_op),
+        ).annotate(
+            qte_produite=Coalesce(Subquery(sortie_derniere_op, output_field=IntegerField()), Value(0)),
+            qte_rebut=Coalesce(Subquery(rebut_of, output_field=IntegerField()), Value(0)),
+        ).annotate(
+            progression=Case(
+                When(quantite_a_produire__lte=0, then=Value(0.0)),
+                default=Least(
+                    Cast(F('qte_produite'), FloatField()) * Value(100.0) / F('quantite_a_produire'),
+                    Value(100.0),
+                ),
+                output_field=FloatField(),
+            ),
+        )
+
+
 class OrdreFabrication(models.Model):
     """Représente un ordre de travail pour produire une certaine quantité d'un produit."""
     STATUT_CHOICES = [('PLANIFIE', _('Planifié')), ('PRODUCTION', _('En Production')), ('TERMINE', _('Terminé')),  ('ARCHIVE', _('Archivé'))]
@@ -73,22 +121,45 @@ class OrdreFabrication(models.Model):
     date_debut_prevu = models.DateField(null=True, blank=True)
     date_fin_prevue = models.DateField(null=True, blank=True)
     plan_pdf = models.FileField(upload_to='plans/', blank=True, null=True)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    objects = OrdreFabricationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_modification', 'id'], name='of_modification_idx'),
+            # KPIs et rapports : OFs finalisés à une date / sur une période (statut filtré par exclusion)
+            models.Index(fields=['date_premiere_finalisation', 'statut'], name='of_finalisation_idx'),
+            # Archivage et listes : OFs d'un statut, par date de création
+            models.Index(fields=['statut', 'date_creation'], name='of_statut_creation_idx'),
+        ]
 
     def __str__(self):
         return f"{self.numero_of} - {self.titre}"
 
     def update_statut(self):
-        if not self.operations.exists(): self.statut = 'PLANIFIE'
-        else:
-            statuts_ops = list(self.operations.values_list('statut', flat=True))
-            if 'EN_COURS' in statuts_ops: self.statut = 'PRODUCTION'
-            elif 'A_FAIRE' in statuts_ops: self.statut = 'PRODUCTION'
-            elif all(s == 'TERMINEE' for s in statuts_ops):
-                if self.statut != 'TERMINE': 
-                    if not self.date_premiere_finalisation:
-                        self.date_premiere_finalisation = timezone.now().date()
-                self.statut = 'TERMINE'
-        self.save()
+        """
+        Recalcule le statut à partir des opérations (une requête d'agrégat). La même règle
+        existe en SQL pour tous les OFs à la fois : services.coherence.statut_attendu.
+        """
+        from .services.journal import publier
+        ancien = self.statut
+        comptes = self.operations.order_by().aggregate(
+            total=Count('id'),
+            actives=Count('id', filter=Q(statut__in=('EN_COURS', 'A_FAIRE'))),
+            terminees=Count('id', filter=Q(statut='TERMINEE')),
+        )
+        if not comptes['total']: self.statut = 'PLANIFIE'
+        elif comptes['actives']: self.statut = 'PRODUCTION'
+        elif comptes['terminees'] == comptes['total']:
+            if self.statut != 'TERMINE':
+                if not self.date_premiere_finalisation:
+                    self.date_premiere_finalisation = timezone.now().date()
+            self.statut = 'TERMINE'
+        with transaction.atomic():
+            self.save(update_fields=['statut', 'date_premiere_finalisation', 'date_modification'])
+            if self.statut != ancien:
+                publier('OF_STATUT', ordre_fabrication_id=self.pk, ancien=ancien, nouveau=self.statut)
 
     @property
     def derniere_operation_terminee(self):
@@ -96,15 +167,19 @@ class OrdreFabrication(models.Model):
 
     @property
     def quantite_produite_actuelle(self):
+        # Valeur pré-calculée par OrdreFabrication.objects.with_metrics()
+        if 'qte_produite' in self.__dict__: return self.qte_produite
         last_op = self.derniere_operation_terminee
         return last_op.quantite_sortie_bonne if last_op else 0
 
     @property
     def quantite_rebut_totale(self):
+        if 'qte_rebut' in self.__dict__: return self.qte_rebut
         return self.operations.aggregate(total=Sum('pointages__quantite_rebut'))['total'] or 0
 
     @property
     def progression_production(self):
+        if 'progression' in self.__dict__: return self.progression
         if self.quantite_a_produire <= 0: return 0
         progression = (self.quantite_produite_actuelle / self.quantite_a_produire) * 100
         return min(progression, 100)
@@ -133,11 +208,12 @@ class Operation(models.Model):
     temps_prevu_minutes = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
     machine_assignee = models.ForeignKey(Machine, on_delete=models.SET_NULL, null=True, blank=True, related_name='operations')
     matieres_requises = models.ManyToManyField(MatierePremiere, through='MatiereRequise', related_name='operations')
-    
+    date_modification = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('ordre_fabrication', 'numero_phase')
         ordering = ['numero_phase']
+        indexes = [models.Index(fields=['date_modification', 'id'], name='operation_modification_idx')]
 
     def __str__(self):
         return f"OF {self.ordre_fabrication.numero_of} / Phase {self.numero_phase} ({self.poste.nom}): {self.titre}"
@@ -162,6 +238,112 @@ class MatiereRequise(models.Model):
     class Meta:
         unique_together = ('operation', 'matiere')
 
+class GammeType(models.Model):
+    """Gamme de fabrication réutilisable, instanciée en un ou plusieurs OFs (services.gammes)."""
+    nom = models.CharField(max_length=100, unique=True)
+    description = models.TextField(blank=True)
+    date_creation = models.DateField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['nom']
+
+    def __str__(self):
+        return self.nom
+
+class OperationGammeType(models.Model):
+    """Phase d'une gamme type : copiée telle quelle dans chaque OF créé depuis la gamme."""
+    gamme = models.ForeignKey(GammeType, related_name='operations', on_delete=models.CASCADE)
+    numero_phase = models.IntegerField()
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.PROTECT, related_name='operations_gammes_types')
+    titre = models.CharField(max_length=255)
+    type_operation = models.CharField(max_length=20, choices=Operation.TYPE_CHOICES, default='PRODUCTION')
+    temps_prevu_minutes = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    machine_assignee = models.ForeignKey(Machine, on_delete=models.SET_NULL, null=True, blank=True, related_name='operations_gammes_types')
+    instructions = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('gamme', 'numero_phase')
+        ordering = ['numero_phase']
+
+    def __str__(self):
+        return f"{self.gamme.nom} / Phase {self.numero_phase} : {self.titre}"
+
+class MatiereGammeType(models.Model):
+    """Matière nécessaire à une phase de gamme type (copiée en MatiereRequise)."""
+    operation = models.ForeignKey(OperationGammeType, related_name='matieres', on_delete=models.CASCADE)
+    matiere = models.ForeignKey(MatierePremiere, on_delete=models.CASCADE)
+    quantite_necessaire = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ('operation', 'matiere')
+
+def bornes_jour(jour):
+    """Début (inclus) et fin (exclue) d'une journée dans le fuseau courant."""
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    return debut, debut + timedelta(days=1)
+
+
+class SecondesEcoulees(Func):
+    """
+    Secondes entre deux dates, calculées par la base. Sous SQLite, la soustraction de
+    dates de Django passe par une fonction Python appelée pour chaque ligne ; julianday()
+    est native et bien plus rapide sur des centaines de milliers de lignes.
+    """
+    arg_joiner = ' - '
+    template = 'EXTRACT(EPOCH FROM (%(expressions)s))'
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(julianday(%(expressions)s)) * 86400.0',
+                           arg_joiner=') - julianday(', **extra_context)
+
+
+class TransactionCourante(Func):
+    """
+    Numéro de la transaction qui écrit la ligne (xid8 de PostgreSQL 13+, croissant et sans
+    bouclage). Sous SQLite, qui valide les écritures une à une, toujours 0.
+    """
+    template = 'pg_current_xact_id()::text::bigint'
+    output_field = models.BigIntegerField()
+    allowed_default = True
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return '0', []
+
+
+class PointageQuerySet(models.QuerySet):
+    """
+    Filtres par journée exprimés en plages sur les colonnes brutes (et non via
+    `__date`), pour profiter des index et de l'élagage des partitions mensuelles.
+    """
+
+    def debutes_le(self, jour):
+        debut, fin = bornes_jour(jour)
+        return self.filter(heure_debut__gte=debut, heure_debut__lt=fin)
+
+    def termines_le(self, jour):
+        debut, fin = bornes_jour(jour)
+        # heure_debut <= heure_fin : la borne haute sur heure_debut permet l'élagage
+        return self.filter(heure_fin__gte=debut, heure_fin__lt=fin, heure_debut__lt=fin)
+
+    def avec_cout(self):
+        """
+        Annote la durée (duree_secondes) et le coût de main-d'œuvre (cout) de chaque
+        pointage, calculés par la base. Taux figé à la clôture ; pour un pointage en
+        cours, taux actuel de l'opérateur et durée jusqu'à maintenant.
+        """
+        duree = SecondesEcoulees(Coalesce('heure_fin', Value(timezone.now(), output_field=DateTimeField())), 'heure_debut')
+        return self.annotate(
+            duree_secondes=duree,
+            cout=Cast(duree * Coalesce('cout_horaire', 'operateur__cout_horaire') / 3600, FloatField()),
+        )
+
+    def delete(self):
+        # Agrégats à corriger autour de la suppression (voir SIGNAUX, pointages_supprimes)
+        with transaction.atomic():
+            pointages_supprimes(self)
+            return super().delete()
+
 class Pointage(models.Model):
     """Enregistre un intervalle de temps travaillé par un opérateur sur une opération."""
     operation = models.ForeignKey(Operation, related_name='pointages', on_delete=models.CASCADE)
@@ -171,6 +353,35 @@ class Pointage(models.Model):
     quantite_fabriquee = models.IntegerField(default=0)
     quantite_rebut = models.IntegerField(default=0)
     quantite_prise_en_charge = models.IntegerField(default=0)
+    # Taux horaire de l'opérateur figé à la clôture : l'historique des coûts ne bouge plus
+    cout_horaire = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    objects = PointageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Pointages en cours (heure_fin IS NULL) : index partiel, qui reste petit
+            models.Index(fields=['operation', 'operateur'], condition=Q(heure_fin__isnull=True), name='pointage_en_cours_idx'),
+            # Filtres par journée (PointageQuerySet.debutes_le / termines_le)
+            models.Index(fields=['heure_debut'], name='pointage_debut_idx'),
+            models.Index(fields=['heure_fin'], name='pointage_fin_idx'),
+            models.Index(fields=['date_modification', 'id'], name='pointage_modification_idx'),
+            # Pointages d'une opération dans l'ordre (chronologie des OFs, table de suivi)
+            models.Index(fields=['operation', 'heure_debut'], name='pointage_operation_debut_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pointage = super().from_db(db, field_names, values)
+        # Valeurs lues en base : les signaux retirent la contribution d'un pointage modifié
+        pointage._charge = dict(zip(field_names, values))
+        return pointage
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pointages_supprimes(Pointage.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
 
     @property
     def duree_minutes(self):
@@ -178,7 +389,8 @@ class Pointage(models.Model):
         return Decimal(duration.total_seconds() / 60)
     @property
     def cout_mo(self):
-        return (self.duree_minutes / Decimal('60')) * self.operateur.cout_horaire
+        taux = self.cout_horaire if self.cout_horaire is not None else self.operateur.cout_horaire
+        return (self.duree_minutes / Decimal('60')) * taux
 
 # =============================================================================
 # MODÈLES UTILISATEURS (Profil)
@@ -208,6 +420,14 @@ class Anomalie(models.Model):
     date_resolution = models.DateTimeField(null=True, blank=True)
     # Indique si l'anomalie a été masquée sur le dashboard sans être résolue (historique d'UI)
     masquee_dashboard = models.BooleanField(default=False)
+    date_modification = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_modification', 'id'], name='anomalie_modification_idx'),
+            models.Index(fields=['statut', 'date_signalement'], name='anomalie_statut_idx'),
+            models.Index(fields=['date_signalement'], name='anomalie_signalement_idx'),
+        ]
 
     def __str__(self):
         return f"Anomalie sur {self.operation.titre} ({self.get_statut_display()})"
@@ -234,7 +454,705 @@ class DailyReport(models.Model):
     def __str__(self):
         return f"Rapport du {self.date.strftime('%d/%m/%Y')}"    
 
+
+class VersionDonnees(models.Model):
+    """
+    Compteur (ligne unique) incrémenté à chaque modification des données de production.
+    Il sert d'ETag aux APIs et aux rapports : tant qu'il ne bouge pas, le client peut
+    réutiliser sa copie (voir services/version_donnees.py).
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Version {self.version}"
+
+
+class CubeRebut(models.Model):
+    """
+    Rebuts et pièces bonnes des pointages clôturés, agrégés par jour de fin, OF, poste,
+    machine, opérateur et type d'opération. Tenu à jour OF par OF à partir des pointages
+    en production et archivés (voir services/cube_rebuts.py).
+    """
+    jour = models.DateField()
+    # Lundi de la semaine et premier du mois de `jour` : regroupements par période sans calcul
+    semaine = models.DateField()
+    mois = models.DateField()
+    # Pas de clé étrangère : l'OF peut être en production ou archivé (même identifiant)
+    ordre_fabrication_id = models.BigIntegerField()
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    machine = models.ForeignKey(Machine, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+')
+    operateur = models.ForeignKey(Operateur, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    type_operation = models.CharField(max_length=20, choices=Operation.TYPE_CHOICES)
+    quantite_rebut = models.IntegerField(default=0)
+    quantite_fabriquee = models.IntegerField(default=0)
+    nombre_pointages = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ordre_fabrication_id'], name='cube_rebut_of_idx'),
+            models.Index(fields=['jour'], name='cube_rebut_jour_idx'),
+        ]
+
+
+class CubeRebutEnAttente(models.Model):
+    """OFs dont les lignes de CubeRebut sont à recalculer (pointage clôturé, gamme modifiée...)."""
+    ordre_fabrication_id = models.BigIntegerField(primary_key=True)
+
+
+class PeriodeStatutMachine(models.Model):
+    """Intervalle pendant lequel une machine a gardé un statut (fin vide : statut actuel)."""
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='periodes_statut')
+    statut = models.CharField(max_length=20, choices=Machine.STATUT_CHOICES)
+    debut = models.DateTimeField()
+    fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['machine', 'debut']
+        indexes = [models.Index(fields=['machine', 'debut'], name='periode_statut_machine_idx')]
+
+    def __str__(self):
+        return f"{self.machine} : {self.get_statut_display()} depuis {self.debut:%d/%m/%Y %H:%M}"
+
+
+class TRSJournalier(models.Model):
+    """
+    Temps (en secondes) et pièces d'une machine sur une journée, par poste, pour le
+    calcul du TRS (voir services/trs.py). poste vide : temps de la machine sans activité.
+    """
+    jour = models.DateField()
+    semaine = models.DateField()
+    mois = models.DateField()
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='+')
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.CASCADE, null=True, related_name='+')
+    temps_requis = models.FloatField(default=0)
+    temps_arret_planifie = models.FloatField(default=0)
+    temps_panne = models.FloatField(default=0)
+    temps_pointe = models.FloatField(default=0)
+    temps_net = models.FloatField(default=0)
+    temps_utile = models.FloatField(default=0)
+    pieces_bonnes = models.IntegerField(default=0)
+    pieces_rebut = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['jour', 'machine'], name='trs_jour_machine_idx'),
+            models.Index(fields=['mois'], name='trs_mois_idx'),
+        ]
+
+
+class TRSEnAttente(models.Model):
+    """Journées machine dont le TRS est à recalculer."""
+    jour = models.DateField()
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('jour', 'machine')
+
+
+class UtilisationMachine(models.Model):
+    """
+    Occupation (en secondes) d'une machine sur une équipe d'une journée (voir
+    services/utilisation.py). equipe vide : activité de la journée hors des équipes.
+    """
+    jour = models.DateField()
+    mois = models.DateField()
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='+')
+    equipe = models.CharField(max_length=50, blank=True)
+    temps_ouvert = models.FloatField(default=0)
+    temps_occupe = models.FloatField(default=0)
+    temps_pointe = models.FloatField(default=0)
+    temps_chevauchement = models.FloatField(default=0)
+    temps_creux = models.FloatField(default=0)
+    creux_max = models.FloatField(default=0)
+    pointages = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['jour', 'machine'], name='utilisation_jour_machine_idx'),
+            models.Index(fields=['mois'], name='utilisation_mois_idx'),
+        ]
+
+
+class UtilisationEnAttente(models.Model):
+    """Journées machine dont l'utilisation est à recalculer."""
+    jour = models.DateField()
+    machine = models.ForeignKey(Machine, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('jour', 'machine')
+
+
+class CoutMensuel(models.Model):
+    """
+    Heures et coût de main-d'œuvre des pointages clôturés par mois de fin, opération et
+    opérateur, avec la part du temps prévu et du coût prévu de l'opération. Tenu à jour
+    OF par OF (voir services/couts.py).
+    """
+    mois = models.DateField()
+    # Pas de clé étrangère : l'OF et l'opération peuvent être archivés (mêmes identifiants)
+    ordre_fabrication_id = models.BigIntegerField()
+    operation_id = models.BigIntegerField()
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    operateur = models.ForeignKey(Operateur, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    duree_secondes = models.FloatField(default=0)
+    duree_prevue_secondes = models.FloatField(default=0)
+    cout = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cout_prevu = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nombre_pointages = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ordre_fabrication_id'], name='cout_mensuel_of_idx'),
+            models.Index(fields=['mois'], name='cout_mensuel_mois_idx'),
+        ]
+
+
+class CoutEnAttente(models.Model):
+    """OFs dont les lignes de CoutMensuel sont à recalculer."""
+    ordre_fabrication_id = models.BigIntegerField(primary_key=True)
+
+
+class StatistiqueCycle(models.Model):
+    """
+    Temps de cycle réels (minutes par pièce) des pointages clôturés d'un poste, d'un
+    type d'opération et d'un opérateur : esquisse de quantiles et sommes pour les
+    moyennes (voir services/temps_cycle.py).
+    """
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.CASCADE, related_name='+')
+    type_operation = models.CharField(max_length=20, choices=Operation.TYPE_CHOICES)
+    operateur = models.ForeignKey(Operateur, on_delete=models.CASCADE, related_name='+')
+    esquisse = models.JSONField(default=dict)
+    nombre = models.IntegerField(default=0)
+    somme_minutes = models.FloatField(default=0)
+    # Temps prévu par pièce des mêmes pointages (ceux dont l'opération a une quantité d'entrée)
+    somme_prevue = models.FloatField(default=0)
+    nombre_prevu = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('poste', 'type_operation', 'operateur')
+
+
+class CycleEnAttente(models.Model):
+    """Clés (poste, type d'opération, opérateur) dont la StatistiqueCycle est à recalculer."""
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.CASCADE, related_name='+')
+    type_operation = models.CharField(max_length=20, choices=Operation.TYPE_CHOICES)
+    operateur = models.ForeignKey(Operateur, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('poste', 'type_operation', 'operateur')
+
+
+class DelaiPhase(models.Model):
+    """
+    Délais d'une phase commencée : attente depuis la fin de la phase précédente et
+    traitement du premier au dernier pointage, en secondes (voir services/delais.py).
+    """
+    # Pas de clé étrangère : l'OF et l'opération peuvent être archivés (mêmes identifiants)
+    operation_id = models.BigIntegerField(primary_key=True)
+    ordre_fabrication_id = models.BigIntegerField()
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    numero_phase = models.IntegerField()
+    debut = models.DateTimeField()
+    fin = models.DateTimeField(null=True)
+    attente_secondes = models.FloatField(null=True)
+    traitement_secondes = models.FloatField(null=True)
+    # Semaine de fin de la phase (de début tant qu'elle n'est pas terminée)
+    semaine = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ordre_fabrication_id'], name='delai_phase_of_idx'),
+            models.Index(fields=['semaine', 'poste'], name='delai_phase_semaine_idx'),
+        ]
+
+
+class DelaiEnAttente(models.Model):
+    """OFs dont les lignes de DelaiPhase sont à recalculer."""
+    ordre_fabrication_id = models.BigIntegerField(primary_key=True)
+
+
+class EnCoursPoste(models.Model):
+    """
+    En-cours actuel d'un poste, tenu à jour à chaque changement d'état d'une opération :
+    opérations débloquées en attente (À faire avec des pièces en entrée) et en cours.
+    """
+    poste = models.OneToOneField(PosteDeTravail, on_delete=models.CASCADE, primary_key=True, related_name='en_cours')
+    operations_en_attente = models.IntegerField(default=0)
+    operations_en_cours = models.IntegerField(default=0)
+    pieces_en_attente = models.IntegerField(default=0)
+    pieces_en_cours = models.IntegerField(default=0)
+
+
+class EnCoursJournalier(models.Model):
+    """Photo quotidienne de EnCoursPoste, pour suivre l'en-cours dans le temps."""
+    jour = models.DateField()
+    semaine = models.DateField()
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.CASCADE, related_name='+')
+    operations_en_attente = models.IntegerField(default=0)
+    operations_en_cours = models.IntegerField(default=0)
+    pieces_en_attente = models.IntegerField(default=0)
+    pieces_en_cours = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('jour', 'poste')
+        indexes = [models.Index(fields=['semaine', 'poste'], name='en_cours_semaine_idx')]
+
+
+class Evenement(models.Model):
+    """
+    Événement de production du journal, écrit dans la transaction de la modification
+    qu'il décrit. Le journal est en ajout seul (voir services/journal.py).
+    """
+    TYPE_CHOICES = (
+        ('POINTAGE_DEMARRE', 'Pointage démarré'),
+        ('POINTAGE_TERMINE', 'Pointage terminé'),
+        ('OPERATION_TERMINEE', 'Opération terminée'),
+        ('PHASE_DEBLOQUEE', 'Phase débloquée'),
+        ('STOCK_CONSOMME', 'Stock consommé'),
+        ('ANOMALIE_SIGNALEE', 'Anomalie signalée'),
+        ('OF_STATUT', "Statut d'OF modifié"),
+    )
+    horodatage = models.DateTimeField(default=timezone.now)
+    type = models.CharField(max_length=30, choices=TYPE_CHOICES)
+    # Pas de clé étrangère : le journal survit à l'archivage et à la suppression des OFs
+    ordre_fabrication_id = models.BigIntegerField(null=True)
+    operation_id = models.BigIntegerField(null=True)
+    donnees = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # Ordre de consommation des projections : (numero_transaction, pk)
+    numero_transaction = models.BigIntegerField(db_default=TransactionCourante(), editable=False)
+
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            models.Index(fields=['ordre_fabrication_id'], name='evenement_of_idx'),
+            models.Index(fields=['numero_transaction', 'id'], name='evenement_transaction_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_type_display()} ({self.horodatage:%d/%m/%Y %H:%M})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Le journal des événements est en ajout seul.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Le journal des événements est en ajout seul.")
+
+
+class PositionProjection(models.Model):
+    """Dernier événement du journal pris en compte par une projection : (numero_transaction, position)."""
+    nom = models.CharField(max_length=50, primary_key=True)
+    numero_transaction = models.BigIntegerField(default=0)
+    position = models.BigIntegerField(default=0)
+    mise_a_jour = models.DateTimeField(auto_now=True)
+
+
+class ActiviteJournaliere(models.Model):
+    """Projection du journal : activité d'un poste sur une journée."""
+    jour = models.DateField()
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    pointages_demarres = models.IntegerField(default=0)
+    pointages_termines = models.IntegerField(default=0)
+    pieces_bonnes = models.IntegerField(default=0)
+    pieces_rebut = models.IntegerField(default=0)
+    operations_terminees = models.IntegerField(default=0)
+    phases_debloquees = models.IntegerField(default=0)
+    anomalies = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('jour', 'poste')
+
+
+class ConsommationMatiere(models.Model):
+    """Projection du journal : matière première consommée par jour."""
+    jour = models.DateField()
+    matiere = models.ForeignKey(MatierePremiere, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    quantite = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    nombre_consommations = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('jour', 'matiere')
+
+# =============================================================================
+# MODÈLES D'ARCHIVE (Stockage froid)
+# =============================================================================
+# Les OFs archivés sont déplacés, avec leurs opérations, pointages, matières et
+# anomalies, dans ces tables (voir services/archivage.py). Les clés primaires
+# d'origine sont conservées pour permettre une restauration à l'identique.
+
+class OrdreFabricationArchive(models.Model):
+    """Copie figée d'un OF archivé, avec ses quantités finales."""
+    id = models.BigIntegerField(primary_key=True)
+    numero_of = models.CharField(max_length=50, db_index=True)
+    titre = models.CharField(max_length=255)
+    quantite_a_produire = models.IntegerField(default=1)
+    statut = models.CharField(max_length=20, choices=OrdreFabrication.STATUT_CHOICES, default='TERMINE')
+    date_creation = models.DateField()
+    date_premiere_finalisation = models.DateField(null=True, blank=True)
+    date_debut_prevu = models.DateField(null=True, blank=True)
+    date_fin_prevue = models.DateField(null=True, blank=True)
+    plan_pdf = models.FileField(upload_to='plans/', blank=True, null=True)
+    # Indicateurs calculés au moment de l'archivage (les archives ne bougent plus)
+    quantite_produite = models.IntegerField(default=0)
+    quantite_rebut = models.IntegerField(default=0)
+    date_archivage = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['date_archivage', 'id'], name='of_archive_date_idx')]
+
+    def __str__(self):
+        return f"{self.numero_of} - {self.titre} (archive)"
+
+    # Mêmes noms que sur OrdreFabrication pour partager les templates
+    @property
+    def quantite_produite_actuelle(self):
+        return self.quantite_produite
+
+    @property
+    def quantite_rebut_totale(self):
+        return self.quantite_rebut
+
+    @property
+    def progression_production(self):
+        if self.quantite_a_produire <= 0: return 0
+        return min(self.quantite_produite / self.quantite_a_produire * 100, 100)
+
+class OperationArchive(models.Model):
+    """Copie d'une opération d'un OF archivé."""
+    id = models.BigIntegerField(primary_key=True)
+    ordre_fabrication = models.ForeignKey(OrdreFabricationArchive, related_name='operations', on_delete=models.CASCADE)
+    numero_phase = models.IntegerField()
+    statut = models.CharField(max_length=20, choices=Operation.STATUT_CHOICES, default='TERMINEE')
+    quantite_entree = models.IntegerField(default=0)
+    type_operation = models.CharField(max_length=20, choices=Operation.TYPE_CHOICES, default='PRODUCTION')
+    poste = models.ForeignKey(PosteDeTravail, on_delete=models.PROTECT, related_name='operations_archivees')
+    titre = models.CharField(max_length=255)
+    instructions = models.JSONField(blank=True, null=True)
+    matieres_requises_json = models.JSONField(blank=True, null=True)
+    temps_prevu_minutes = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
+    machine_assignee = models.ForeignKey(Machine, on_delete=models.SET_NULL, null=True, blank=True, related_name='operations_archivees')
+
+    class Meta:
+        ordering = ['numero_phase']
+
+    def __str__(self):
+        return f"OF {self.ordre_fabrication.numero_of} / Phase {self.numero_phase} (archive): {self.titre}"
+
+class MatiereRequiseArchive(models.Model):
+    """Copie d'une ligne de matière requise d'une opération archivée."""
+    id = models.BigIntegerField(primary_key=True)
+    operation = models.ForeignKey(OperationArchive, on_delete=models.CASCADE, related_name='matieres')
+    matiere = models.ForeignKey(MatierePremiere, on_delete=models.CASCADE, related_name='lignes_archivees')
+    quantite_necessaire = models.DecimalField(max_digits=10, decimal_places=2)
+
+class PointageArchive(models.Model):
+    """Copie d'un pointage d'une opération archivée."""
+    id = models.BigIntegerField(primary_key=True)
+    operation = models.ForeignKey(OperationArchive, related_name='pointages', on_delete=models.CASCADE)
+    operateur = models.ForeignKey(Operateur, related_name='pointages_archives', on_delete=models.PROTECT)
+    heure_debut = models.DateTimeField()
+    heure_fin = models.DateTimeField(null=True, blank=True)
+    quantite_fabriquee = models.IntegerField(default=0)
+    quantite_rebut = models.IntegerField(default=0)
+    quantite_prise_en_charge = models.IntegerField(default=0)
+    cout_horaire = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+
+class AnomalieArchive(models.Model):
+    """Copie d'une anomalie signalée sur une opération archivée."""
+    id = models.BigIntegerField(primary_key=True)
+    operation = models.ForeignKey(OperationArchive, on_delete=models.CASCADE, related_name='anomalies')
+    operateur = models.ForeignKey(Operateur, on_delete=models.SET_NULL, null=True, related_name='anomalies_archivees')
+    description = models.TextField()
+    date_signalement = models.DateTimeField(db_index=True)
+    statut = models.CharField(max_length=20, choices=Anomalie.STATUT_CHOICES, default='OUVERTE')
+    resolu_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='anomalies_archivees_resolues')
+    date_resolution = models.DateTimeField(null=True, blank=True)
+    masquee_dashboard = models.BooleanField(default=False)
+
 # =============================================================================
 # SIGNAUX (Logique automatisée)
 # =============================================================================
 
+# Toute écriture sur ces modèles invalide les ETags des APIs et des rapports.
+# Les écritures en masse (bulk_create, update) ne passent pas par ces signaux :
+# les services concernés appellent incrementer_version() eux-mêmes.
+MODELES_VERSIONNES = (
+    Operateur, MatierePremiere, Machine, PosteDeTravail, OrdreFabrication, Operation,
+    MatiereRequise, Pointage, Anomalie, DailyReport,
+)
+# Pas de post_delete sur les tables feuilles (pointages, anomalies, matières requises) :
+# un écouteur y empêcherait la suppression en cascade rapide (une requête DELETE)
+# lors de l'archivage. Leur suppression passe par celle d'un OF ou d'une opération.
+MODELES_FEUILLES = (MatiereRequise, Pointage, Anomalie)
+
+
+def _donnees_modifiees(sender, **kwargs):
+    from .services.version_donnees import incrementer_version
+    incrementer_version()
+
+
+for _modele in MODELES_VERSIONNES:
+    post_save.connect(_donnees_modifiees, sender=_modele, dispatch_uid=f'version_donnees_save_{_modele.__name__}')
+    if _modele not in MODELES_FEUILLES:
+        post_delete.connect(_donnees_modifiees, sender=_modele, dispatch_uid=f'version_donnees_delete_{_modele.__name__}')
+
+
+# État précédent des opérations et des pointages, pour les agrégats qui retirent une
+# ancienne contribution (machine quittée, intervalle déplacé). Celui d'une opération est
+# relu en base ; celui d'un pointage est celui chargé (Pointage.from_db), sans requête.
+def _operation_avant(sender, instance, **kwargs):
+    instance._avant = None
+    if instance.pk is not None:
+        instance._avant = (
+            Operation.objects.filter(pk=instance.pk)
+            .values('poste_id', 'statut', 'quantite_entree', 'machine_assignee_id').first()
+        )
+
+
+def _pointage_avant(sender, instance, **kwargs):
+    instance._avant = getattr(instance, '_charge', None)
+    instance._charge = {f.attname: getattr(instance, f.attname) for f in instance._meta.concrete_fields}
+    # Clôture : le pointage enregistré est terminé, il ne l'était pas (ou n'existait pas)
+    instance._cloture = instance.heure_fin is not None and (instance._avant is None or instance._avant['heure_fin'] is None)
+
+
+def _intervalles_operation(operation_id, machine_ids):
+    """
+    Intervalles (machine_id, début, fin) de tous les pointages d'une opération, pour
+    chacune des machines `machine_ids` (un pointage en cours court jusqu'à maintenant).
+    """
+    maintenant = timezone.now()
+    pointages = Pointage.objects.filter(operation_id=operation_id).values_list('heure_debut', 'heure_fin')
+    return [(machine_id, debut, fin or maintenant) for debut, fin in pointages for machine_id in machine_ids]
+
+
+def _intervalles_pointage(instance):
+    """
+    Intervalles clôturés (machine_id, début, fin) dont les journées changent avec un
+    pointage : le sien et, s'il a été déplacé, celui lu en base avant l'enregistrement.
+    """
+    intervalles = []
+    if instance.heure_fin is not None:
+        intervalles.append((instance.operation.machine_assignee_id, instance.heure_debut, instance.heure_fin))
+    avant = getattr(instance, '_avant', None)
+    if avant and avant['heure_fin'] is not None:
+        ancien = (avant['operation_id'], avant['heure_debut'], avant['heure_fin'])
+        if ancien != (instance.operation_id, instance.heure_debut, instance.heure_fin):
+            machine_id = (
+                instance.operation.machine_assignee_id if ancien[0] == instance.operation_id
+                else Operation.objects.filter(pk=ancien[0]).values_list('machine_assignee_id', flat=True).first()
+            )
+            intervalles.append((machine_id, ancien[1], ancien[2]))
+    return [i for i in intervalles if i[0]]
+
+
+def pointages_supprimes(pointages) -> None:
+    """
+    Pointages sur le point d'être supprimés : les agrégats qu'ils alimentaient sont
+    marqués avant qu'ils disparaissent (journées TRS et d'utilisation de leurs intervalles
+    clôturés, clés de temps de cycle). Un pointage archivé, qui garde sa clé primaire,
+    reste compté dans les temps de cycle.
+    Appelée par Pointage.delete et PointageQuerySet.delete, et pour ceux d'une opération
+    ou d'un OF supprimés (_pointages_emportes). Pas de post_delete sur Pointage : un
+    écouteur y empêcherait la suppression en cascade rapide (une requête DELETE).
+    """
+    from .services import temps_cycle, trs, utilisation
+    intervalles = list(
+        pointages.filter(heure_fin__isnull=False, operation__machine_assignee__isnull=False)
+        .values_list('operation__machine_assignee_id', 'heure_debut', 'heure_fin')
+    )
+    trs.marquer_intervalles(intervalles)
+    utilisation.marquer_intervalles(intervalles)
+    temps_cycle.marquer(temps_cycle.cles_pointages(pointages.exclude(pk__in=PointageArchive.objects.values('pk'))))
+
+
+def _pointages_emportes(instance, origin):
+    """
+    Pointages emportés par la suppression en cours d'une opération ou d'un OF. Une seule
+    lecture par suppression : celle de `origin` (objet ou queryset d'OFs ou d'opérations
+    sur lequel delete() a été appelé) couvre toutes les instances ; None pour les suivantes.
+    """
+    modele = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if modele not in (OrdreFabrication, Operation):
+        return Pointage.objects.filter(operation_id=instance.pk)
+    if getattr(origin, '_pointages_lus', False):
+        return None
+    origin._pointages_lus = True
+    cles = origin.values('pk') if isinstance(origin, models.QuerySet) else [origin.pk]
+    if modele is OrdreFabrication:
+        return Pointage.objects.filter(operation__ordre_fabrication_id__in=cles)
+    return Pointage.objects.filter(operation_id__in=cles)
+
+
+pre_save.connect(_operation_avant, sender=Operation, dispatch_uid='operation_avant')
+pre_save.connect(_pointage_avant, sender=Pointage, dispatch_uid='pointage_avant')
+
+
+# Cube des rebuts : l'OF concerné est mis en file dans la même transaction que la
+# modification ; ses lignes du cube seront recalculées au prochain rafraîchissement.
+def _cube_rebuts_pointage(sender, instance, **kwargs):
+    if instance.heure_fin is not None:
+        from .services.cube_rebuts import marquer_ofs
+        marquer_ofs([instance.operation.ordre_fabrication_id])
+
+
+def _cube_rebuts_operation(sender, instance, **kwargs):
+    from .services.cube_rebuts import marquer_ofs
+    marquer_ofs([instance.ordre_fabrication_id])
+
+
+def _cube_rebuts_of(sender, instance, **kwargs):
+    from .services.cube_rebuts import marquer_ofs
+    marquer_ofs([instance.pk])
+
+
+post_save.connect(_cube_rebuts_pointage, sender=Pointage, dispatch_uid='cube_rebuts_pointage')
+post_save.connect(_cube_rebuts_operation, sender=Operation, dispatch_uid='cube_rebuts_operation_save')
+post_delete.connect(_cube_rebuts_operation, sender=Operation, dispatch_uid='cube_rebuts_operation_delete')
+post_delete.connect(_cube_rebuts_of, sender=OrdreFabrication, dispatch_uid='cube_rebuts_of_delete')
+
+
+# TRS : historique des statuts machine et journées à recalculer. Un pointage clôturé
+# ou déplacé marque ses journées (un pointage supprimé : pointages_supprimes) ; une
+# opération qui change de machine marque celles de tous ses pointages sur l'ancienne et
+# la nouvelle machine, une opération supprimée (avec son OF) celles de sa machine, avant
+# que ses pointages disparaissent.
+def _trs_statut_machine(sender, instance, **kwargs):
+    from .services.trs import enregistrer_statut
+    enregistrer_statut(instance)
+
+
+def _trs_pointage(sender, instance, **kwargs):
+    from .services.trs import marquer_intervalles
+    marquer_intervalles(_intervalles_pointage(instance))
+
+
+def _trs_operation(sender, instance, **kwargs):
+    avant = getattr(instance, '_avant', None)
+    if avant and avant['machine_assignee_id'] != instance.machine_assignee_id:
+        from .services.trs import marquer_intervalles
+        marquer_intervalles(_intervalles_operation(instance.pk, (avant['machine_assignee_id'], instance.machine_assignee_id)))
+
+
+def _pointages_operation_supprimee(sender, instance, origin=None, **kwargs):
+    pointages = _pointages_emportes(instance, origin)
+    if pointages is not None:
+        pointages_supprimes(pointages)
+
+
+post_save.connect(_trs_statut_machine, sender=Machine, dispatch_uid='trs_statut_machine')
+post_save.connect(_trs_pointage, sender=Pointage, dispatch_uid='trs_pointage')
+post_save.connect(_trs_operation, sender=Operation, dispatch_uid='trs_operation_save')
+pre_delete.connect(_pointages_operation_supprimee, sender=Operation, dispatch_uid='pointages_operation_delete')
+
+
+# Utilisation des machines : journées à recalculer, marquées comme celles du TRS (un
+# pointage clôturé, déplacé ou supprimé, une opération qui change de machine)
+def _utilisation_pointage(sender, instance, **kwargs):
+    from .services.utilisation import marquer_intervalles
+    marquer_intervalles(_intervalles_pointage(instance))
+
+
+def _utilisation_operation(sender, instance, **kwargs):
+    avant = getattr(instance, '_avant', None)
+    if avant and avant['machine_assignee_id'] != instance.machine_assignee_id:
+        from .services.utilisation import marquer_intervalles
+        marquer_intervalles(_intervalles_operation(instance.pk, (avant['machine_assignee_id'], instance.machine_assignee_id)))
+
+
+post_save.connect(_utilisation_pointage, sender=Pointage, dispatch_uid='utilisation_pointage')
+post_save.connect(_utilisation_operation, sender=Operation, dispatch_uid='utilisation_operation_save')
+
+
+# Coûts de main-d'œuvre : taux figé à la clôture, puis OF mis en file de recalcul.
+def _figer_taux_horaire(sender, instance, **kwargs):
+    if instance.heure_fin is not None and instance.cout_horaire is None:
+        instance.cout_horaire = Operateur.objects.filter(pk=instance.operateur_id).values_list('cout_horaire', flat=True).first()
+
+
+def _couts_pointage(sender, instance, **kwargs):
+    if instance.heure_fin is not None:
+        from .services.couts import marquer_ofs
+        marquer_ofs([instance.operation.ordre_fabrication_id])
+
+
+def _couts_operation(sender, instance, **kwargs):
+    from .services.couts import marquer_ofs
+    marquer_ofs([instance.ordre_fabrication_id])
+
+
+def _couts_of(sender, instance, **kwargs):
+    from .services.couts import marquer_ofs
+    marquer_ofs([instance.pk])
+
+
+pre_save.connect(_figer_taux_horaire, sender=Pointage, dispatch_uid='figer_taux_horaire')
+post_save.connect(_couts_pointage, sender=Pointage, dispatch_uid='couts_pointage')
+post_save.connect(_couts_operation, sender=Operation, dispatch_uid='couts_operation_save')
+post_delete.connect(_couts_operation, sender=Operation, dispatch_uid='couts_operation_delete')
+post_delete.connect(_couts_of, sender=OrdreFabrication, dispatch_uid='couts_of_delete')
+
+
+# Temps de cycle : un pointage met sa clé en file à sa clôture (_pointage_avant). Un
+# pointage déjà compté puis modifié y met sa clé d'avant et celle d'après ; un pointage
+# supprimé, celle qu'il avait (pointages_supprimes).
+_CHAMPS_CYCLE = ('operation_id', 'operateur_id', 'heure_debut', 'heure_fin', 'quantite_fabriquee', 'quantite_rebut')
+
+
+def _temps_cycle_pointage(sender, instance, **kwargs):
+    avant = getattr(instance, '_avant', None)
+    if getattr(instance, '_cloture', False):
+        from .services.temps_cycle import marquer_pointages
+        marquer_pointages([instance])
+    elif avant and avant['heure_fin'] is not None and any(avant[c] != getattr(instance, c) for c in _CHAMPS_CYCLE):
+        operation = instance.operation
+        ancienne = (
+            (operation.poste_id, operation.type_operation) if avant['operation_id'] == operation.pk
+            else Operation.objects.filter(pk=avant['operation_id']).values_list('poste_id', 'type_operation').first()
+        )
+        cles = {(operation.poste_id, operation.type_operation, instance.operateur_id)}
+        if ancienne:
+            cles.add((*ancienne, avant['operateur_id']))
+        from .services.temps_cycle import marquer
+        marquer(cles)
+
+
+post_save.connect(_temps_cycle_pointage, sender=Pointage, dispatch_uid='temps_cycle_pointage')
+
+
+# Délais et en-cours : OF mis en file à chaque pointage (début ou fin de phase), et
+# compteurs d'en-cours des postes ajustés de la différence d'état de l'opération.
+def _delais_pointage(sender, instance, **kwargs):
+    from .services.delais import marquer_ofs
+    marquer_ofs([instance.operation.ordre_fabrication_id])
+
+
+def _delais_operation(sender, instance, **kwargs):
+    from .services.delais import marquer_ofs
+    marquer_ofs([instance.ordre_fabrication_id])
+
+
+def _delais_of(sender, instance, **kwargs):
+    from .services.delais import marquer_ofs
+    marquer_ofs([instance.pk])
+
+
+def _en_cours_operation(sender, instance, **kwargs):
+    from .services.delais import changer_etat
+    avant = getattr(instance, '_avant', None)
+    apres = (instance.poste_id, instance.statut, instance.quantite_entree)
+    changer_etat((avant['poste_id'], avant['statut'], avant['quantite_entree']) if avant else None, apres)
+
+
+def _en_cours_operation_supprimee(sender, instance, **kwargs):
+    from .services.delais import changer_etat
+    changer_etat((instance.poste_id, instance.statut, instance.quantite_entree), None)
+
+
+post_save.connect(_delais_pointage, sender=Pointage, dispatch_uid='delais_pointage')
+post_save.connect(_delais_operation, sender=Operation, dispatch_uid='delais_operation_save')
+post_delete.connect(_delais_operation, sender=Operation, dispatch_uid='delais_operation_delete')
+post_delete.connect(_delais_of, sender=OrdreFabrication, dispatch_uid='delais_of_delete')
+post_save.connect(_en_cours_operation, sender=Operation, dispatch_uid='en_cours_operation_save')
+post_delete.connect(_en_cours_operation_supprimee, sender=Operation, dispatch_uid='en_cours_operation_delete')
@@ -0,0 +1,244 @@
+"""
+Analyse des anomalies : volumes et temps moyen de résolution (MTTR) par poste,
+machine, opérateur et OF, classement de Pareto et tendance hebdomadaire.
+
+Les regroupements sont faits en SQL, sur les anomalies en production et sur celles
+des OFs archivés : par opération (les ventilations par poste, machine et OF en sont
+déduites sans relire les anomalies), par opérateur et par semaine, soit trois
+parcours par table quelle que soit le nombre d'axes. Le résultat est mis en
+cache sous la version des données (services/version_donnees.py) : il reste valable
+tant qu'aucune écriture n'a eu lieu.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, asdict, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Count, DateField, F, Func, Q, Sum
+from django.utils import timezone
+
+from .version_donnees import version_courante
+from ..models import Anomalie, AnomalieArchive, Operateur, Operation, OperationArchive, SecondesEcoulees
+
+AXES = ('poste', 'machine', 'operateur', 'of')
+# axe -> (clé, libellé) lus sur l'opération de l'anomalie (mêmes noms sur OperationArchive)
+CHAMPS_OPERATION = {
+    'poste': ('poste_id', 'poste__nom'),
+    'machine': ('machine_assignee_id', 'machine_assignee__nom'),
+    'of': ('ordre_fabrication_id', 'ordre_fabrication__numero_of'),
+}
+SEUIL_PARETO = 80.0
+LIGNES_PAR_AXE = 50
+TAILLE_LOT = 900  # identifiants par requête IN (limite de paramètres SQLite)
+DUREE_CACHE = 3600
+
+
+class _Semaine(Func):
+    """Lundi de la semaine (UTC) d'une date ; sous SQLite, date() native plutôt que TruncWeek."""
+    template = "CAST(DATE_TRUNC('week', %(expressions)s) AS date)"
+    output_field = DateField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="date(%(expressions)s, 'weekday 0', '-6 days')",
+                           **extra_context)
+
+
+_DUREE_RESOLUTION = SecondesEcoulees(F('date_resolution'), F('date_signalement'))
+_RESOLUE = Q(statut='RESOLUE', date_resolution__isnull=False)
+_AGREGATS = {
+    'nombre': Count('id'),
+    'ouvertes': Count('id', filter=Q(statut='OUVERTE')),
+    'resolues': Count('id', filter=_RESOLUE),
+    'duree_resolution': Sum(_DUREE_RESOLUTION, filter=_RESOLUE),
+}
+
+
+@dataclass
+class LigneVentilation:
+    cle: Optional[int]
+    libelle: str
+    nombre: int
+    ouvertes: int
+    resolues: int
+    mttr_heures: Optional[float]
+    part: float = 0.0         # % du total de l'axe
+    cumul: float = 0.0        # % cumulé dans l'ordre de Pareto
+    pareto: bool = False      # fait partie des causes qui cumulent SEUIL_PARETO % des anomalies
+
+
+@dataclass
+class SemaineAnomalies:
+    semaine: str              # lundi de la semaine, ISO
+    nombre: int
+    resolues: int
+    mttr_heures: Optional[float]
+
+
+@dataclass
+class AnalyseAnomalies:
+    debut: str
+    fin: str
+    total: int
+    ouvertes: int
+    mttr_heures: Optional[float]
+    ventilations: Dict[str, List[LigneVentilation]] = field(default_factory=dict)
+    tendance: List[SemaineAnomalies] = field(default_factory=list)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _heures(secondes, resolues: int) -> Optional[float]:
+    if not resolues or secondes is None:
+        return None
+    return round(secondes / resolues / 3600, 2)
+
+
+def _bases(debut: date, fin: date):
+    # Bornes en datetime (et non __date) pour que l'index sur date_signalement serve
+    periode = Q(
+        date_signalement__gte=timezone.make_aware(datetime.combine(debut, time.min)),
+        date_signalement__lt=timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min)),
+    )
+    return [Anomalie.objects.filter(periode), AnomalieArchive.objects.filter(periode)]
+
+
+def _additionner(cumul: Dict, ligne: Dict) -> None:
+    for nom in ('nombre', 'ouvertes', 'resolues'):
+        cumul[nom] += ligne[nom]
+    if ligne['duree_resolution'] is not None:
+        cumul['duree_resolution'] = (cumul['duree_resolution'] or 0.0) + ligne['duree_resolution']
+
+
+def _grouper(debut: date, fin: date, cle) -> Tuple[Dict, List[List]]:
+    """
+    Agrégats par valeur de `cle` (nom de champ ou expression), production et archive
+    additionnées. Renvoie aussi les clés vues dans chaque table, dans le même ordre.
+    """
+    fusion, cles_par_table = {}, []
+    for qs in _bases(debut, fin):
+        if not isinstance(cle, str):
+            qs = qs.annotate(groupe=cle)
+        nom = cle if isinstance(cle, str) else 'groupe'
+        lignes = list(qs.order_by().values(nom).annotate(**_AGREGATS))
+        cles_par_table.append([l[nom] for l in lignes])
+        for ligne in lignes:
+            if ligne[nom] in fusion:
+                _additionner(fusion[ligne[nom]], ligne)
+            else:
+                fusion[ligne[nom]] = ligne
+    return fusion, cles_par_table
+
+
+def _lire_par_lots(modele, ids, champs) -> Dict[int, Dict]:
+    ids = [pk for pk in ids if pk is not None]
+    valeurs = {}
+    for i in range(0, len(ids), TAILLE_LOT):
+        for ligne in modele.objects.filter(id__in=ids[i:i + TAILLE_LOT]).values('id', *champs):
+            valeurs[ligne['id']] = ligne
+    return valeurs
+
+
+def _lignes_pareto(groupes: Dict) -> List[LigneVentilation]:
+    """Lignes triées par nombre décroissant, avec part, cumul et appartenance au Pareto."""
+    lignes = [
+        LigneVentilation(
+            cle=cle, libelle=libelle or '—', nombre=g['nombre'], ouvertes=g['ouvertes'],
+            resolues=g['resolues'], mttr_heures=_heures(g['duree_resolution'], g['resolues']),
+        )
+        for (cle, libelle), g in groupes.items()
+    ]
+    lignes.sort(key=lambda l: (-l.nombre, l.libelle))
+    total = sum(l.nombre for l in lignes)
+    cumul = 0
+    for ligne in lignes:
+        ligne.pareto = cumul * 100 < SEUIL_PARETO * total
+        cumul += ligne.nombre
+        ligne.part = round(ligne.nombre * 100 / total, 2)
+        ligne.cumul = round(cumul * 100 / total, 2)
+    return lignes
+
+
+def ventilations(debut: date, fin: date) -> Dict[str, List[LigneVentilation]]:
+    """Anomalies de la période regroupées par axe, chacune dans l'ordre de Pareto."""
+    groupes = {axe: {} for axe in AXES}
+
+    def ajouter(axe, cle, libelle, ligne):
+        if (cle, libelle) in groupes[axe]:
+            _additionner(groupes[axe][(cle, libelle)], ligne)
+        else:
+            groupes[axe][(cle, libelle)] = dict(ligne)
+
+    # Par opération, puis report sur le poste, la machine et l'OF de chaque opération.
+    # Les identifiants d'opérations sont conservés à l'archivage : pas de collision.
+    par_operation, ids_par_table = _grouper(debut, fin, 'operation_id')
+    champs = [champ for paire in CHAMPS_OPERATION.values() for champ in paire]
+    operations = {}
+    for modele, ids in zip((Operation, OperationArchive), ids_par_table):
+        operations.update(_lire_par_lots(modele, ids, champs))
+    for pk, ligne in par_operation.items():
+        for axe, (cle, libelle) in CHAMPS_OPERATION.items():
+            ajouter(axe, operations[pk][cle], operations[pk][libelle], ligne)
+
+    par_operateur, _ = _grouper(debut, fin, 'operateur_id')
+    operateurs = _lire_par_lots(Operateur, par_operateur, ['code'])
+    for pk, ligne in par_operateur.items():
+        ajouter('operateur', pk, operateurs[pk]['code'] if pk in operateurs else None, ligne)
+
+    return {axe: _lignes_pareto(groupes[axe]) for axe in AXES}
+
+
+def _semaines(debut: date, fin: date) -> Dict:
+    semaines, _ = _grouper(debut, fin, _Semaine('date_signalement'))
+    return semaines
+
+
+def _tendance(semaines: Dict) -> List[SemaineAnomalies]:
+    return [
+        SemaineAnomalies(
+            semaine=semaine.isoformat(), nombre=g['nombre'], resolues=g['resolues'],
+            mttr_heures=_heures(g['duree_resolution'], g['resolues']),
+        )
+        for semaine, g in sorted(semaines.items())
+    ]
+
+
+def tendance_hebdomadaire(debut: date, fin: date) -> List[SemaineAnomalies]:
+    return _tendance(_semaines(debut, fin))
+
+
+def _tronquer(lignes: List[LigneVentilation]) -> List[LigneVentilation]:
+    """Les axes très dispersés (OFs) sont tronqués : le reste est regroupé en une ligne."""
+    if len(lignes) <= LIGNES_PAR_AXE:
+        return lignes
+    reste = lignes[LIGNES_PAR_AXE:]
+    resolues = sum(l.resolues for l in reste)
+    heures = sum((l.mttr_heures or 0) * l.resolues for l in reste)
+    return lignes[:LIGNES_PAR_AXE] + [LigneVentilation(
+        cle=None, libelle=f'Autres ({len(reste)})', nombre=sum(l.nombre for l in reste),
+        ouvertes=sum(l.ouvertes for l in reste), resolues=resolues,
+        mttr_heures=round(heures / resolues, 2) if resolues else None,
+        part=round(sum(l.part for l in reste), 2), cumul=100.0,
+    )]
+
+
+def calculer_analyse(debut: date, fin: date) -> AnalyseAnomalies:
+    semaines = _semaines(debut, fin)
+    # Les totaux de la période sont la somme des semaines : pas de parcours supplémentaire
+    totaux = {'nombre': 0, 'ouvertes': 0, 'resolues': 0, 'duree_resolution': None}
+    for ligne in semaines.values():
+        _additionner(totaux, ligne)
+    return AnalyseAnomalies(
+        debut=debut.isoformat(), fin=fin.isoformat(),
+        total=totaux['nombre'], ouvertes=totaux['ouvertes'],
+        mttr_heures=_heures(totaux['duree_resolution'], totaux['resolues']),
+        ventilations={axe: _tronquer(lignes) for axe, lignes in ventilations(debut, fin).items()},
+        tendance=_tendance(semaines),
+    )
+
+
+def analyse_anomalies(debut: date, fin: date) -> AnalyseAnomalies:
+    """Analyse de la période [debut, fin], en cache jusqu'à la prochaine modification des données."""
+    cle = f'analyse_anomalies:{version_courante()}:{debut.isoformat()}:{fin.isoformat()}'
+    return cache.get_or_set(cle, lambda: calculer_analyse(debut, fin), DUREE_CACHE)
@@ -0,0 +1,195 @@
+"""
+API de lecture versionnée pour les intégrations (ERP, outils de BI).
+
+Chaque ressource (RESSOURCES) expose un modèle en lecture seule, trié par
+(date_modification, id) et paginé par curseur sur ce couple : une page coûte une
+descente dans l'index, quelle que soit sa position, et une ligne modifiée repasse
+en fin de liste. Pour synchroniser, l'intégration lit les pages jusqu'à `fin`, garde le
+dernier curseur et repart de lui à la synchronisation suivante ; `updated_since` sert
+au premier passage. `fields=` restreint les colonnes lues et rendues.
+
+date_modification est fixée à l'écriture mais visible au commit : une ligne d'une
+transaction longue (import en masse) peut apparaître derrière un curseur déjà rendu.
+Seules les lignes plus vieilles que MARGE_VISIBILITE sont donc rendues.
+
+Les OFs archivés quittent la ressource `ofs` ; ils apparaissent dans `ofs_archives`,
+triée par date d'archivage.
+"""
+from __future__ import annotations
+import base64
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Anomalie, MatierePremiere, Operation, OrdreFabrication, OrdreFabricationArchive, Pointage
+
+VERSION = 1
+LIMITE_DEFAUT = 500
+LIMITE_MAX = 5000               # réponse JSON
+LIMITE_MAX_NDJSON = 100_000     # réponse NDJSON, envoyée au fil de la lecture
+TAILLE_LECTURE = 2000
+MARGE_VISIBILITE = timedelta(seconds=60)
+
+
+class ErreurRequete(ValueError):
+    """Paramètre de requête invalide (ressource, champ, curseur, date, limite)."""
+
+
+@dataclass(frozen=True)
+class Ressource:
+    modele: type
+    champs: Tuple[str, ...]
+    champ_modification: str = 'date_modification'
+
+    def queryset(self) -> QuerySet:
+        return self.modele.objects.all()
+
+
+RESSOURCES: Dict[str, Ressource] = {
+    'ofs': Ressource(OrdreFabrication, (
+        'id', 'numero_of', 'titre', 'quantite_a_produire', 'statut', 'date_creation', 'date_premiere_finalisation',
+        'date_debut_prevu', 'date_fin_prevue', 'date_modification',
+    )),
+    'operations': Ressource(Operation, (
+        'id', 'ordre_fabrication_id', 'numero_phase', 'titre', 'type_operation', 'statut', 'poste_id',
+        'machine_assignee_id', 'quantite_entree', 'temps_prevu_minutes', 'date_modification',
+    )),
+    'pointages': Ressource(Pointage, (
+        'id', 'operation_id', 'operateur_id', 'heure_debut', 'heure_fin', 'quantite_prise_en_charge',
+        'quantite_fabriquee', 'quantite_rebut', 'cout_horaire', 'date_modification',
+    )),
+    'anomalies': Ressource(Anomalie, (
+        'id', 'operation_id', 'operateur_id', 'description', 'statut', 'date_signalement', 'resolu_par_id',
+        'date_resolution', 'date_modification',
+    )),
+    'stock': Ressource(MatierePremiere, (
+        'id', 'reference', 'designation', 'quantite_stock', 'unite_mesure', 'seuil_alerte', 'date_modification',
+    )),
+    'ofs_archives': Ressource(OrdreFabricationArchive, (
+        'id', 'numero_of', 'titre', 'quantite_a_produire', 'statut', 'date_creation', 'date_premiere_finalisation',
+        'date_debut_prevu', 'date_fin_prevue', 'quantite_produite', 'quantite_rebut', 'date_archivage',
+    ), champ_modification='date_archivage'),
+}
+
+
+@dataclass
+class PageLecture:
+    lignes: List[Dict[str, object]]
+    curseur: str            # position après la dernière ligne rendue (celle reçue si la page est vide)
+    fin: bool               # plus aucune ligne visible après `curseur`
+
+    def as_dict(self) -> Dict[str, object]:
+        return {'version': VERSION, 'donnees': self.lignes, 'curseur': self.curseur, 'fin': self.fin}
+
+
+def encoder_curseur(modification: datetime, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{modification.isoformat()}|{pk}".encode()).decode()
+
+
+def decoder_curseur(curseur: str) -> Tuple[datetime, int]:
+    try:
+        modification, pk = base64.urlsafe_b64decode(curseur.encode()).decode().split('|')
+        position = parse_datetime(modification), int(pk)
+    except Exception:
+        position = None, None
+    if position[0] is None:
+        raise ErreurRequete("Curseur invalide.")
+    return position
+
+
+def _ressource(nom: str) -> Ressource:
+    try:
+        return RESSOURCES[nom]
+    except KeyError:
+        raise ErreurRequete(f"Ressource inconnue ({nom}), attendu : {', '.join(RESSOURCES)}.")
+
+
+def _champs(ressource: Ressource, fields: str) -> Tuple[str, ...]:
+    if not fields:
+        return ressource.champs
+    demandes = tuple(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    inconnus = [f for f in demandes if f not in ressource.champs]
+    if inconnus:
+        raise ErreurRequete(f"Champ(s) inconnu(s) : {', '.join(inconnus)}.")
+    return demandes
+
+
+def _date(valeur: str) -> datetime:
+    moment = parse_datetime(valeur)
+    if moment is None:
+        raise ErreurRequete(f"updated_since : date invalide ({valeur}), format ISO 8601 attendu.")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def _lignes_visibles(ressource: Ressource, curseur: str, updated_since: str, marge: timedelta) -> QuerySet:
+    champ = ressource.champ_modification
+    qs = ressource.queryset().filter(**{f'{champ}__lte': timezone.now() - marge}).order_by(champ, 'pk')
+    if updated_since:
+        qs = qs.filter(**{f'{champ}__gte': _date(updated_since)})
+    if curseur:
+        modification, pk = decoder_curseur(curseur)
+        qs = qs.filter(Q(**{f'{champ}__gt': modification}) | Q(**{champ: modification, 'pk__gt': pk}))
+    return qs
+
+
+def _limite(limite: Optional[str], maximum: int) -> int:
+    try:
+        valeur = int(limite) if limite else LIMITE_DEFAUT
+    except ValueError:
+        raise ErreurRequete(f"limite : entier attendu ({limite}).")
+    if not 0 < valeur <= maximum:
+        raise ErreurRequete(f"limite : entre 1 et {maximum}.")
+    return valeur
+
+
+def _preparer(nom: str, curseur: str, updated_since: str, fields: str, marge: timedelta):
+    ressource = _ressource(nom)
+    champs = _champs(ressource, fields)
+    qs = _lignes_visibles(ressource, curseur, updated_since, marge)
+    # Les colonnes du curseur sont lues même si `fields` les omet
+    lues = tuple(dict.fromkeys(champs + ('id', ressource.champ_modification)))
+    return ressource, champs, qs.values(*lues)
+
+
+def page(nom: str, curseur: str = '', updated_since: str = '', fields: str = '', limite: Optional[str] = None,
+         marge: timedelta = MARGE_VISIBILITE) -> PageLecture:
+    """Page JSON d'une ressource : au plus `limite` lignes après `curseur`."""
+    ressource, champs, qs = _preparer(nom, curseur, updated_since, fields, marge)
+    taille = _limite(limite, LIMITE_MAX)
+    lignes = list(qs[:taille + 1])
+    fin = len(lignes) <= taille
+    lignes = lignes[:taille]
+    if lignes:
+        curseur = encoder_curseur(lignes[-1][ressource.champ_modification], lignes[-1]['id'])
+    return PageLecture([{c: l[c] for c in champs} for l in lignes], curseur, fin)
+
+
+def page_ndjson(nom: str, curseur: str = '', updated_since: str = '', fields: str = '', limite: Optional[str] = None,
+                marge: timedelta = MARGE_VISIBILITE) -> Tuple[Iterator[Dict[str, object]], str, bool]:
+    """
+    Grande page envoyée au fil de la lecture : (lignes, curseur, fin). La borne de la page
+    est lue d'abord (une requête sur l'index) pour que curseur et fin partent dans les
+    en-têtes, avant les lignes.
+    """
+    ressource, champs, qs = _preparer(nom, curseur, updated_since, fields, marge)
+    taille = _limite(limite, LIMITE_MAX_NDJSON)
+    champ = ressource.champ_modification
+    bornes = list(qs.values_list(champ, 'id')[taille - 1:taille + 1])
+    if bornes:
+        modification, pk = bornes[0]
+        qs = qs.filter(Q(**{f'{champ}__lt': modification}) | Q(**{champ: modification, 'pk__lte': pk}))
+        return _iterer(qs, champs), encoder_curseur(modification, pk), len(bornes) < 2
+    # Moins de `taille` lignes : la page se termine sur la dernière ligne visible
+    derniere = qs.order_by(f'-{champ}', '-pk').values_list(champ, 'id').first()
+    if derniere:
+        curseur = encoder_curseur(*derniere)
+    return _iterer(qs, champs), curseur, True
+
+
+def _iterer(qs: QuerySet, champs: Sequence[str]) -> Iterator[Dict[str, object]]:
+    for ligne in qs.iterator(chunk_size=TAILLE_LECTURE):
+        yield {c: ligne[c] for c in champs}
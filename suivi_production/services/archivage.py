@@ -0,0 +1,104 @@
+"""
+Déplacement des OFs entre les tables de production et les tables d'archive.
+
+Chaque lot d'OFs est traité dans sa propre transaction : copie en bulk_create des
+OFs, opérations, matières requises, pointages et anomalies, puis suppression des
+lignes d'origine. Les clés primaires sont conservées dans les deux sens.
+"""
+from __future__ import annotations
+from typing import Iterable, List
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .version_donnees import incrementer_version
+from ..models import (
+    OrdreFabrication, Operation, MatiereRequise, Pointage, Anomalie,
+    OrdreFabricationArchive, OperationArchive, MatiereRequiseArchive, PointageArchive, AnomalieArchive,
+)
+
+TAILLE_LOT = 200
+TAILLE_INSERT = 1000
+
+
+def _champs_communs(source, cible) -> List[str]:
+    attnames_source = {f.attname for f in source._meta.concrete_fields}
+    return [f.attname for f in cible._meta.concrete_fields if f.attname in attnames_source]
+
+
+def _copier(source_qs: QuerySet, cible) -> int:
+    """Copie les lignes de `source_qs` vers le modèle `cible` (mêmes noms de colonnes)."""
+    champs = _champs_communs(source_qs.model, cible)
+    lignes = [cible(**valeurs) for valeurs in source_qs.values(*champs).iterator(chunk_size=TAILLE_INSERT)]
+    cible.objects.bulk_create(lignes, batch_size=TAILLE_INSERT)
+    return len(lignes)
+
+
+def _retablir_dates(modele, champ: str, valeurs: dict) -> None:
+    """Réécrit un champ auto_now_add écrasé par bulk_create (une requête par date distincte)."""
+    par_date = {}
+    for pk, d in valeurs.items():
+        par_date.setdefault(d, []).append(pk)
+    for d, pks in par_date.items():
+        modele.objects.filter(pk__in=pks).update(**{champ: d})
+
+
+def _lots(ids: List[int], taille: int) -> Iterable[List[int]]:
+    for i in range(0, len(ids), taille):
+        yield ids[i:i + taille]
+
+
+def archiver_ofs(ofs: QuerySet, taille_lot: int = TAILLE_LOT) -> int:
+    """Déplace les OFs de `ofs` (et toutes leurs données) vers les tables d'archive."""
+    ids = list(ofs.order_by('pk').values_list('pk', flat=True))
+    for lot in _lots(ids, taille_lot):
+        with transaction.atomic():
+            champs = _champs_communs(OrdreFabrication, OrdreFabricationArchive)
+            ofs_lot = OrdreFabrication.objects.filter(pk__in=lot).with_metrics().values(*champs, 'qte_produite', 'qte_rebut')
+            OrdreFabricationArchive.objects.bulk_create([
+                OrdreFabricationArchive(
+                    **{c: of[c] for c in champs},
+                    quantite_produite=of['qte_produite'],
+                    quantite_rebut=of['qte_rebut'],
+                )
+                for of in ofs_lot
+            ], batch_size=TAILLE_INSERT)
+            _copier(Operation.objects.filter(ordre_fabrication_id__in=lot), OperationArchive)
+            _copier(MatiereRequise.objects.filter(operation__ordre_fabrication_id__in=lot), MatiereRequiseArchive)
+            _copier(Pointage.objects.filter(operation__ordre_fabrication_id__in=lot), PointageArchive)
+            _copier(Anomalie.objects.filter(operation__ordre_fabrication_id__in=lot), AnomalieArchive)
+            # La suppression de l'OF emporte opérations, pointages, matières et anomalies (CASCADE)
+            OrdreFabrication.objects.filter(pk__in=lot).delete()
+            incrementer_version()
+    return len(ids)
+
+
+def restaurer_ofs(archives: QuerySet, taille_lot: int = TAILLE_LOT) -> int:
+    """
+    Replace les OFs archivés de `archives` dans les tables de production.
+    Les OFs dont le numéro a été réutilisé entre-temps sont ignorés.
+    Retourne le nombre d'OFs restaurés.
+    """
+    numeros_pris = OrdreFabrication.objects.filter(
+        numero_of__in=archives.values('numero_of')
+    ).values('numero_of')
+    ids = list(archives.exclude(numero_of__in=numeros_pris).order_by('pk').values_list('pk', flat=True))
+    for lot in _lots(ids, taille_lot):
+        with transaction.atomic():
+            champs = _champs_communs(OrdreFabricationArchive, OrdreFabrication)
+            archives_lot = list(OrdreFabricationArchive.objects.filter(pk__in=lot).values(*champs))
+            OrdreFabrication.objects.bulk_create([
+                OrdreFabrication(**{**a, 'statut': 'TERMINE' if a['statut'] == 'ARCHIVE' else a['statut']})
+                for a in archives_lot
+            ], batch_size=TAILLE_INSERT)
+            _retablir_dates(OrdreFabrication, 'date_creation', {a['id']: a['date_creation'] for a in archives_lot})
+            _copier(OperationArchive.objects.filter(ordre_fabrication_id__in=lot), Operation)
+            _copier(MatiereRequiseArchive.objects.filter(operation__ordre_fabrication_id__in=lot), MatiereRequise)
+            _copier(PointageArchive.objects.filter(operation__ordre_fabrication_id__in=lot), Pointage)
+            anomalies = AnomalieArchive.objects.filter(operation__ordre_fabrication_id__in=lot)
+            dates_signalement = dict(anomalies.values_list('pk', 'date_signalement'))
+            _copier(anomalies, Anomalie)
+            _retablir_dates(Anomalie, 'date_signalement', dates_signalement)
+            OrdreFabricationArchive.objects.filter(pk__in=lot).delete()
+            incrementer_version()
+    return len(ids)
@@ -0,0 +1,151 @@
+"""
+Chronologie (Gantt) d'un OF : périodes d'activité de chaque opération.
+
+Pour chaque opération, les pointages (plusieurs opérateurs peuvent travailler en même
+temps sur une phase) sont réduits en :
+- intervalles occupés : union des pointages qui se chevauchent ou se touchent ;
+- niveaux de parallélisme : segments de temps avec le nombre de pointages simultanés ;
+- creux : temps morts entre deux intervalles occupés.
+Les pointages sont lus en une requête, triés par opération puis par début (index
+(operation, heure_debut)), et parcourus une seule fois : un tas des fins de pointages
+actifs donne le niveau courant (balayage en O(n log k), k pointages simultanés). Un
+pointage en cours est compté jusqu'à maintenant. Rien n'est chargé en objets ni
+conservé au-delà de l'opération en cours de balayage.
+"""
+from __future__ import annotations
+import heapq
+from dataclasses import dataclass, asdict, field
+from datetime import date, datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db.models import DateTimeField, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from ..models import Operation, Pointage, bornes_jour
+
+Intervalle = Tuple[datetime, datetime]
+
+
+@dataclass
+class Segment:
+    debut: datetime
+    fin: datetime
+    niveau: int
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+@dataclass
+class ChronologieOperation:
+    operation_id: int
+    numero_phase: int
+    titre: str
+    poste: str
+    statut: str
+    pointages: int = 0
+    debut: Optional[datetime] = None
+    fin: Optional[datetime] = None
+    minutes_pointees: float = 0.0   # somme des durées de pointages
+    minutes_occupees: float = 0.0   # durée de l'union des pointages
+    minutes_creux: float = 0.0
+    parallelisme_max: int = 0
+    intervalles: List[Intervalle] = field(default_factory=list)
+    niveaux: List[Segment] = field(default_factory=list)
+    creux: List[Intervalle] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def _minutes(debut: datetime, fin: datetime) -> float:
+    return (fin - debut).total_seconds() / 60
+
+
+def _segments(intervalles: Iterable[Intervalle]) -> Iterator[Segment]:
+    fins: List[datetime] = []   # tas des fins des intervalles actifs
+    curseur = None
+    for debut, fin in intervalles:
+        while fins and fins[0] <= debut:
+            t = heapq.heappop(fins)
+            if t > curseur:
+                yield Segment(curseur, t, len(fins) + 1)
+            curseur = t
+        if fins and debut > curseur:
+            yield Segment(curseur, debut, len(fins))
+        curseur = debut
+        heapq.heappush(fins, max(fin, debut))
+    while fins:
+        t = heapq.heappop(fins)
+        if t > curseur:
+            yield Segment(curseur, t, len(fins) + 1)
+        curseur = t
+
+
+def balayer(intervalles: Iterable[Intervalle]) -> Iterator[Segment]:
+    """
+    Segments de parallélisme d'intervalles triés par début : chaque segment porte le
+    nombre d'intervalles actifs, les segments contigus de même niveau sont fusionnés
+    et les périodes sans activité omises.
+    """
+    courant = None
+    for segment in _segments(intervalles):
+        if courant and courant.fin == segment.debut and courant.niveau == segment.niveau:
+            courant.fin = segment.fin
+            continue
+        if courant:
+            yield courant
+        courant = segment
+    if courant:
+        yield courant
+
+
+def _resumer(ligne: ChronologieOperation, intervalles: List[Intervalle]) -> None:
+    ligne.pointages = len(intervalles)
+    ligne.minutes_pointees = round(sum(_minutes(d, f) for d, f in intervalles), 2)
+    for segment in balayer(intervalles):
+        ligne.niveaux.append(segment)
+        ligne.parallelisme_max = max(ligne.parallelisme_max, segment.niveau)
+        if ligne.intervalles and ligne.intervalles[-1][1] == segment.debut:
+            ligne.intervalles[-1] = (ligne.intervalles[-1][0], segment.fin)
+        else:
+            if ligne.intervalles:
+                ligne.creux.append((ligne.intervalles[-1][1], segment.debut))
+            ligne.intervalles.append((segment.debut, segment.fin))
+    if ligne.intervalles:
+        ligne.debut, ligne.fin = ligne.intervalles[0][0], ligne.intervalles[-1][1]
+    ligne.minutes_occupees = round(sum(_minutes(d, f) for d, f in ligne.intervalles), 2)
+    ligne.minutes_creux = round(sum(_minutes(d, f) for d, f in ligne.creux), 2)
+
+
+def chronologie_of(of_id: int, debut: Optional[date] = None, fin: Optional[date] = None,
+                   operation_id: Optional[int] = None) -> List[ChronologieOperation]:
+    """
+    Chronologie des opérations d'un OF, par phase. `debut`/`fin` (inclus) restreignent
+    aux pointages commencés sur la période ; `operation_id` à une seule opération.
+    """
+    operations = Operation.objects.filter(ordre_fabrication_id=of_id).order_by('numero_phase')
+    pointages = Pointage.objects.filter(operation__ordre_fabrication_id=of_id)
+    if operation_id is not None:
+        operations = operations.filter(pk=operation_id)
+        pointages = pointages.filter(operation_id=operation_id)
+    if debut:
+        pointages = pointages.filter(heure_debut__gte=bornes_jour(debut)[0])
+    if fin:
+        pointages = pointages.filter(heure_debut__lt=bornes_jour(fin)[1])
+    lignes = {
+        op['pk']: ChronologieOperation(op['pk'], op['numero_phase'], op['titre'], op['poste__nom'], op['statut'])
+        for op in operations.values('pk', 'numero_phase', 'titre', 'poste__nom', 'statut')
+    }
+    maintenant = Value(timezone.now(), output_field=DateTimeField())
+    flux = (
+        pointages.order_by('operation_id', 'heure_debut')
+        .values_list('operation_id', 'heure_debut', Coalesce('heure_fin', maintenant))
+        .iterator(chunk_size=2000)
+    )
+    for operation_id, groupe in groupby(flux, key=itemgetter(0)):
+        _resumer(lignes[operation_id], [(d, f) for _, d, f in groupe])
+    return list(lignes.values())
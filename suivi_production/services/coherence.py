@@ -0,0 +1,219 @@
+"""
+Contrôle de cohérence des OFs et de leurs opérations, avec correction ensembliste.
+
+Après un arrêt brutal ou des corrections à la main, trois valeurs dérivées peuvent
+s'écarter de ce que les vues auraient écrit :
+- le statut de l'OF (règle de OrdreFabrication.update_statut, évaluée en SQL par
+  `statut_attendu`, un OF planifié pas encore démarré restant planifié) ;
+- la date de première finalisation d'un OF terminé, restée vide (elle reçoit le jour
+  du dernier pointage de l'OF) ;
+- la quantité d'entrée des opérations (synchroniser_gamme et la clôture d'une phase :
+  la première phase à faire reçoit la quantité à produire, une phase dont la précédente
+  est terminée reçoit ses pièces bonnes, une phase à faire derrière une phase non
+  terminée attend avec 0).
+Les opérations terminées avec moins de pièces pointées que leur entrée, et celles qui
+ont plus de pièces pointées qu'en entrée, sont signalées sans être corrigées.
+
+Les OFs sont parcourus par tranches d'identifiants, réparties sur plusieurs fils
+(une connexion chacun). Par tranche : une requête pour les statuts, une pour les
+dates, une pour les opérations (fenêtres Lag sur les totaux de pointages), puis en
+correction une mise à jour ensembliste par valeur. Les corrections contournant les
+signaux, l'en-cours des postes, les files de recalcul (cube, coûts, délais), le journal
+et la version des données sont tenus à jour ici.
+"""
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict, field
+from typing import Dict, Iterator, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import (
+    Case, CharField, Exists, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce, Lag, RowNumber, TruncDate
+from django.utils import timezone
+
+from . import couts, cube_rebuts, delais
+from .version_donnees import incrementer_version
+from ..models import Evenement, Operation, OrdreFabrication, Pointage
+
+TAILLE_TRANCHE = 2000   # OFs par tranche
+EXEMPLES_MAX = 50       # écarts détaillés par catégorie (les autres sont comptés)
+
+CATEGORIES = ('statut_of', 'date_finalisation', 'quantite_entree', 'operation_incomplete', 'sur_production')
+CORRIGEABLES = ('statut_of', 'date_finalisation', 'quantite_entree')
+
+
+@dataclass
+class RapportCoherence:
+    ofs_verifies: int = 0
+    ecarts: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(CATEGORIES, 0))
+    corriges: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(CORRIGEABLES, 0))
+    exemples: Dict[str, List[str]] = field(default_factory=lambda: {c: [] for c in CATEGORIES})
+
+    def signaler(self, categorie: str, exemple: str) -> None:
+        self.ecarts[categorie] += 1
+        if len(self.exemples[categorie]) < EXEMPLES_MAX:
+            self.exemples[categorie].append(exemple)
+
+    def fusionner(self, autre: 'RapportCoherence') -> None:
+        self.ofs_verifies += autre.ofs_verifies
+        for categorie in CATEGORIES:
+            self.ecarts[categorie] += autre.ecarts[categorie]
+            self.exemples[categorie] = (self.exemples[categorie] + autre.exemples[categorie])[:EXEMPLES_MAX]
+        for categorie in CORRIGEABLES:
+            self.corriges[categorie] += autre.corriges[categorie]
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def statut_attendu():
+    """
+    Statut d'un OF selon ses opérations, en SQL : règle de OrdreFabrication.update_statut,
+    un OF planifié dont aucune opération n'a démarré restant planifié (il passe en
+    production au premier démarrage).
+    """
+    operations = Operation.objects.filter(ordre_fabrication=OuterRef('pk'))
+    return Case(
+        When(~Exists(operations), then=Value('PLANIFIE')),
+        When(Q(statut='PLANIFIE') & ~Exists(operations.exclude(statut='A_FAIRE')), then=Value('PLANIFIE')),
+        When(Exists(operations.filter(statut__in=('A_FAIRE', 'EN_COURS'))), then=Value('PRODUCTION')),
+        When(~Exists(operations.exclude(statut='TERMINEE')), then=Value('TERMINE')),
+        default=F('statut'),
+        output_field=CharField(),
+    )
+
+
+def _dernier_jour_pointe():
+    return Subquery(
+        Pointage.objects.filter(operation__ordre_fabrication=OuterRef('pk'), heure_fin__isnull=False)
+        .order_by('-heure_fin').annotate(jour=TruncDate('heure_fin')).values('jour')[:1]
+    )
+
+
+def _tranches(taille: int) -> Iterator[Tuple[int, int]]:
+    bornes = OrdreFabrication.objects.aggregate(premier=Min('pk'), dernier=Max('pk'))
+    if bornes['premier'] is None:
+        return
+    for debut in range(bornes['premier'], bornes['dernier'] + 1, taille):
+        yield debut, debut + taille
+
+
+def _statuts(ofs, rapport: RapportCoherence, corriger: bool) -> List[int]:
+    ecarts = list(
+        ofs.annotate(attendu=statut_attendu()).exclude(statut=F('attendu'))
+        .values_list('pk', 'numero_of', 'statut', 'attendu')
+    )
+    for _, numero_of, statut, attendu in ecarts:
+        rapport.signaler('statut_of', f"{numero_of} : {statut} au lieu de {attendu}")
+    if corriger and ecarts:
+        ids = [pk for pk, *_ in ecarts]
+        # Recalculé au moment de l'écriture : un pointage concurrent ne sera pas écrasé
+        rapport.corriges['statut_of'] = OrdreFabrication.objects.filter(pk__in=ids).update(
+            statut=statut_attendu(), date_modification=timezone.now(),
+        )
+        Evenement.objects.bulk_create([
+            Evenement(type='OF_STATUT', ordre_fabrication_id=pk, donnees={'ancien': statut, 'nouveau': attendu, 'correction': True})
+            for pk, _, statut, attendu in ecarts
+        ])
+    return [pk for pk, *_ in ecarts]
+
+
+def _dates_finalisation(ofs, rapport: RapportCoherence, corriger: bool) -> List[int]:
+    sans_date = ofs.filter(statut='TERMINE', date_premiere_finalisation__isnull=True)
+    ecarts = list(sans_date.values_list('pk', 'numero_of'))
+    for _, numero_of in ecarts:
+        rapport.signaler('date_finalisation', f"{numero_of} : terminé sans date de première finalisation")
+    if corriger and ecarts:
+        rapport.corriges['date_finalisation'] = sans_date.update(
+            date_premiere_finalisation=Coalesce(_dernier_jour_pointe(), Value(timezone.localdate())),
+            date_modification=timezone.now(),
+        )
+    return [pk for pk, _ in ecarts]
+
+
+def _operations(debut: int, fin: int, rapport: RapportCoherence, corriger: bool) -> List[int]:
+    bon = Coalesce(Sum('pointages__quantite_fabriquee'), 0)
+    par_of = {'partition_by': [F('ordre_fabrication_id')], 'order_by': F('numero_phase').asc()}
+    lignes = (
+        Operation.objects.filter(ordre_fabrication_id__gte=debut, ordre_fabrication_id__lt=fin)
+        .exclude(ordre_fabrication__statut='ARCHIVE').order_by()
+        .values('pk', 'ordre_fabrication_id', 'ordre_fabrication__numero_of', 'ordre_fabrication__quantite_a_produire',
+                'numero_phase', 'poste_id', 'statut', 'quantite_entree')
+        .annotate(bon=bon, rebut=Coalesce(Sum('pointages__quantite_rebut'), 0))
+        .annotate(
+            rang=Window(RowNumber(), **par_of),
+            statut_precedent=Window(Lag('statut'), **par_of),
+            bon_precedent=Window(Lag(Sum('pointages__quantite_fabriquee')), output_field=IntegerField(), **par_of),
+        )
+    )
+    corrections = {}
+    for op in lignes:
+        nom = f"{op['ordre_fabrication__numero_of']}/{op['numero_phase']}"
+        if op['rang'] == 1:
+            attendu = op['ordre_fabrication__quantite_a_produire'] if op['statut'] == 'A_FAIRE' else None
+        elif op['statut_precedent'] == 'TERMINEE':
+            attendu = op['bon_precedent'] or 0
+        else:
+            attendu = 0 if op['statut'] == 'A_FAIRE' else None
+        if attendu is not None and attendu != op['quantite_entree']:
+            rapport.signaler('quantite_entree', f"{nom} : entrée {op['quantite_entree']} au lieu de {attendu}")
+            corrections[op['pk']] = (op, attendu)
+        pointe = op['bon'] + op['rebut']
+        if op['statut'] == 'TERMINEE' and pointe < op['quantite_entree']:
+            rapport.signaler('operation_incomplete', f"{nom} : terminée avec {pointe} pièce(s) pointée(s) sur {op['quantite_entree']}")
+        elif pointe > op['quantite_entree']:
+            rapport.signaler('sur_production', f"{nom} : {pointe} pièce(s) pointée(s) pour {op['quantite_entree']} en entrée")
+    if not (corriger and corrections):
+        return []
+    rapport.corriges['quantite_entree'] = Operation.objects.filter(pk__in=list(corrections)).update(
+        quantite_entree=Case(*[When(pk=pk, then=Value(attendu)) for pk, (_, attendu) in corrections.items()],
+                             output_field=IntegerField()),
+        date_modification=timezone.now(),
+    )
+    for op, attendu in corrections.values():
+        delais.changer_etat((op['poste_id'], op['statut'], op['quantite_entree']), (op['poste_id'], op['statut'], attendu))
+    return [op['ordre_fabrication_id'] for op, _ in corrections.values()]
+
+
+def _verifier_tranche(debut: int, fin: int, corriger: bool, dans_un_fil: bool) -> RapportCoherence:
+    rapport = RapportCoherence()
+    try:
+        with transaction.atomic():
+            ofs = OrdreFabrication.objects.filter(pk__gte=debut, pk__lt=fin).exclude(statut='ARCHIVE')
+            rapport.ofs_verifies = ofs.count()
+            if not rapport.ofs_verifies:
+                return rapport
+            # Statuts d'abord : un OF repassé à TERMINE reçoit sa date dans la même tranche
+            modifies = set(_statuts(ofs, rapport, corriger))
+            modifies.update(_dates_finalisation(ofs, rapport, corriger))
+            quantites = _operations(debut, fin, rapport, corriger)
+            if quantites:
+                for service in (cube_rebuts, couts, delais):
+                    service.marquer_ofs(quantites)
+            if corriger and (modifies or quantites):
+                incrementer_version()
+        return rapport
+    finally:
+        if dans_un_fil:
+            connection.close()
+
+
+def verifier_coherence(corriger: bool = False, fils: int = 1, taille_tranche: int = TAILLE_TRANCHE) -> RapportCoherence:
+    """
+    Vérifie (et, avec `corriger`, répare) tous les OFs de production, tranche par tranche.
+    Chaque tranche est vérifiée et corrigée dans sa propre transaction.
+    """
+    rapport = RapportCoherence()
+    tranches = list(_tranches(taille_tranche))
+    if connection.vendor == 'sqlite':
+        fils = 1  # un seul écrivain à la fois : les fils s'attendraient sur le verrou de la base
+    if fils <= 1:
+        resultats = [_verifier_tranche(debut, fin, corriger, False) for debut, fin in tranches]
+    else:
+        with ThreadPoolExecutor(max_workers=fils) as executeur:
+            resultats = list(executeur.map(lambda t: _verifier_tranche(*t, corriger, True), tranches))
+    for resultat in resultats:
+        rapport.fusionner(resultat)
+    return rapport
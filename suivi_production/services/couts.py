@@ -0,0 +1,245 @@
+"""
+Coûts de main-d'œuvre : heures et coût des pointages par OF, opération, poste,
+opérateur et mois, comparés au prévu.
+
+Le coût d'un pointage est sa durée multipliée par le taux horaire de l'opérateur figé
+à la clôture (Pointage.cout_horaire) : changer un taux ne réécrit pas l'historique.
+Durées et coûts sont calculés par la base, puis pré-agrégés par mois, opération et
+opérateur (CoutMensuel) ; les rapports ne sont que des GROUP BY sur cette table.
+
+Le prévu d'une opération est son temps prévu, valorisé au taux moyen réellement
+payé sur l'opération : l'écart prévu/réel mesure donc le dépassement de temps. Il est
+réparti entre les lignes de l'opération au prorata de leur durée. Les opérations non
+commencées n'ont ni réel ni prévu.
+
+Mise à jour incrémentale par OF, comme le cube des rebuts (services/cube_rebuts.py) :
+les signaux de models.py mettent l'OF en file (CoutEnAttente) et `rafraichir_couts`
+recalcule ses lignes depuis les pointages en production et archivés.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from dataclasses import dataclass, asdict, field
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db.models import Count, DateField, F, FloatField, Sum
+from django.db.models.functions import Cast, TruncMonth
+
+from . import files_recalcul
+from ..models import (
+    CoutEnAttente, CoutMensuel, Operateur, Operation, OperationArchive, OrdreFabrication,
+    OrdreFabricationArchive, Pointage, PointageArchive, PosteDeTravail, SecondesEcoulees,
+)
+
+TAILLE_LOT = 200
+TAILLE_IN = 900  # identifiants par requête IN (limite de paramètres SQLite)
+LIGNES_MAX = 200
+
+# axe -> champ de CoutMensuel
+AXES = {
+    'mois': 'mois',
+    'of': 'ordre_fabrication_id',
+    'operation': 'operation_id',
+    'poste': 'poste_id',
+    'operateur': 'operateur_id',
+}
+# Axe proposé quand on descend dans une ligne (drill-down)
+AXE_SUIVANT = {'mois': 'poste', 'poste': 'operateur', 'operateur': 'of', 'of': 'operation', 'operation': 'operateur'}
+
+_DUREE = SecondesEcoulees(F('heure_fin'), F('heure_debut'))
+_CENTIMES = Decimal('0.01')
+
+
+# --- Mise à jour -------------------------------------------------------------------
+
+def marquer_ofs(ids: Iterable[int]) -> None:
+    """Met des OFs en file de recalcul (sans effet s'ils y sont déjà)."""
+    files_recalcul.marquer_ofs(CoutEnAttente, ids)
+
+
+def _lignes_couts(ids: List[int]) -> List[CoutMensuel]:
+    """Lignes CoutMensuel des OFs `ids`, calculées depuis leurs pointages clôturés."""
+    groupes, prevus = [], {}
+    for pointages, operations in ((Pointage, Operation), (PointageArchive, OperationArchive)):
+        groupes += list(
+            pointages.objects
+            .filter(operation__ordre_fabrication_id__in=ids, heure_fin__isnull=False)
+            .annotate(mois=TruncMonth('heure_fin', output_field=DateField()))
+            .order_by()
+            .values('mois', 'operation_id', 'operation__ordre_fabrication_id', 'operation__poste_id', 'operateur_id')
+            .annotate(
+                duree=Sum(_DUREE),
+                cout=Sum(Cast(_DUREE * F('cout_horaire'), FloatField()) / 3600),
+                nombre=Count('id'),
+            )
+        )
+        prevus.update(operations.objects.filter(ordre_fabrication_id__in=ids).values_list('pk', 'temps_prevu_minutes'))
+
+    duree_par_operation = defaultdict(float)
+    for g in groupes:
+        duree_par_operation[g['operation_id']] += g['duree'] or 0.0
+    lignes = []
+    for g in groupes:
+        duree, cout = g['duree'] or 0.0, g['cout'] or 0.0
+        total = duree_par_operation[g['operation_id']]
+        # Part du prévu de l'opération revenant à cette ligne ; à taux égal, coût prévu = coût × prévu / réel
+        ratio = float(prevus.get(g['operation_id'], 0)) * 60 / total if total > 0 else 0.0
+        lignes.append(CoutMensuel(
+            mois=g['mois'],
+            ordre_fabrication_id=g['operation__ordre_fabrication_id'], operation_id=g['operation_id'],
+            poste_id=g['operation__poste_id'], operateur_id=g['operateur_id'],
+            duree_secondes=duree, duree_prevue_secondes=duree * ratio,
+            cout=Decimal(cout).quantize(_CENTIMES), cout_prevu=Decimal(cout * ratio).quantize(_CENTIMES),
+            nombre_pointages=g['nombre'],
+        ))
+    return lignes
+
+
+def rafraichir_couts(taille_lot: int = TAILLE_LOT, limite: Optional[int] = None) -> int:
+    """Recalcule les coûts mensuels des OFs en file (au plus `limite`). Renvoie leur nombre."""
+    return files_recalcul.rafraichir_ofs(CoutEnAttente, CoutMensuel, _lignes_couts, taille_lot, limite)
+
+
+def reconstruire_couts(taille_lot: int = TAILLE_LOT) -> int:
+    """Vide les agrégats et les recalcule pour tous les OFs, en production et archivés."""
+    files_recalcul.marquer_tous_les_ofs(CoutEnAttente, CoutMensuel)
+    return rafraichir_couts(taille_lot)
+
+
+# --- Lecture -----------------------------------------------------------------------
+
+@dataclass
+class LigneCout:
+    cle: object
+    libelle: str
+    heures: float
+    heures_prevues: float
+    cout: float
+    cout_prevu: float
+    ecart: float                      # réel - prévu
+    ecart_pct: Optional[float]        # en % du prévu
+    nombre_pointages: int
+
+
+@dataclass
+class Couts:
+    axe: str
+    filtres: Dict[str, str]
+    debut: Optional[str]
+    fin: Optional[str]
+    total: LigneCout
+    lignes: List[LigneCout] = field(default_factory=list)
+    nombre_lignes: int = 0            # avant troncature à LIGNES_MAX
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _ligne(cle, libelle, g) -> LigneCout:
+    cout, prevu = float(g['cout'] or 0), float(g['cout_prevu'] or 0)
+    return LigneCout(
+        cle=cle, libelle=libelle,
+        heures=round((g['duree'] or 0) / 3600, 2), heures_prevues=round((g['duree_prevue'] or 0) / 3600, 2),
+        cout=round(cout, 2), cout_prevu=round(prevu, 2), ecart=round(cout - prevu, 2),
+        ecart_pct=round((cout - prevu) * 100 / prevu, 1) if prevu else None,
+        nombre_pointages=g['nombre'] or 0,
+    )
+
+
+def _lire_par_lots(qs, ids, *champs) -> Dict:
+    ids = [pk for pk in ids if pk is not None]
+    valeurs = {}
+    for i in range(0, len(ids), TAILLE_IN):
+        for ligne in qs.filter(pk__in=ids[i:i + TAILLE_IN]).values_list('pk', *champs):
+            valeurs[ligne[0]] = ligne[1:]
+    return valeurs
+
+
+def _libelles(axe: str, cles: List) -> Dict:
+    if axe == 'mois':
+        return {m: m.strftime('%m/%Y') for m in cles}
+    if axe == 'poste':
+        return dict(PosteDeTravail.objects.filter(pk__in=cles).values_list('pk', 'nom'))
+    if axe == 'operateur':
+        return {pk: f'{code} - {prenom} {nom}' for pk, code, prenom, nom in
+                Operateur.objects.filter(pk__in=cles).values_list('pk', 'code', 'prenom', 'nom')}
+    libelles = {}
+    if axe == 'of':
+        for modele in (OrdreFabrication, OrdreFabricationArchive):
+            libelles.update({pk: v[0] for pk, v in _lire_par_lots(modele.objects, cles, 'numero_of').items()})
+    else:
+        for modele in (Operation, OperationArchive):
+            valeurs = _lire_par_lots(modele.objects, cles, 'ordre_fabrication__numero_of', 'numero_phase', 'titre')
+            libelles.update({pk: f'{of} / Ph. {phase} - {titre}' for pk, (of, phase, titre) in valeurs.items()})
+    return libelles
+
+
+def couts(axe: str = 'of', filtres: Optional[Dict[str, str]] = None,
+          debut: Optional[date] = None, fin: Optional[date] = None) -> Couts:
+    """
+    Heures et coûts réels et prévus par `axe` (voir AXES), sur les mois de `debut` à
+    `fin` (inclus) et restreints par `filtres` ({axe: identifiant}). Les lignes sont
+    triées par coût décroissant (par mois croissant pour l'axe 'mois').
+    """
+    if axe not in AXES:
+        raise ValueError(f"Axe inconnu : {axe}")
+    filtres = {cle: valeur for cle, valeur in (filtres or {}).items() if valeur not in (None, '')}
+    qs = CoutMensuel.objects.order_by()
+    for cle, valeur in filtres.items():
+        if cle not in AXES or cle == 'mois':
+            raise ValueError(f"Filtre inconnu : {cle}")
+        try:
+            qs = qs.filter(**{AXES[cle]: int(valeur)})
+        except ValueError:
+            raise ValueError(f"Valeur invalide pour le filtre {cle} : {valeur}")
+    if debut:
+        qs = qs.filter(mois__gte=debut.replace(day=1))
+    if fin:
+        qs = qs.filter(mois__lte=fin.replace(day=1))
+
+    sommes = dict(duree=Sum('duree_secondes'), duree_prevue=Sum('duree_prevue_secondes'),
+                  cout=Sum('cout'), cout_prevu=Sum('cout_prevu'), nombre=Sum('nombre_pointages'))
+    groupes = list(qs.values(AXES[axe]).annotate(**sommes))
+    if axe == 'mois':
+        groupes.sort(key=lambda g: g['mois'])
+    else:
+        groupes.sort(key=lambda g: -(g['cout'] or 0))
+    retenus = groupes[:LIGNES_MAX]
+    libelles = _libelles(axe, [g[AXES[axe]] for g in retenus])
+    lignes = []
+    for g in retenus:
+        cle = g[AXES[axe]]
+        lignes.append(_ligne(cle.isoformat() if axe == 'mois' else cle, libelles.get(cle, '—'), g))
+    return Couts(
+        axe=axe, filtres=filtres,
+        debut=debut.isoformat() if debut else None, fin=fin.isoformat() if fin else None,
+        total=_ligne(None, 'Total', qs.aggregate(**sommes)), lignes=lignes, nombre_lignes=len(groupes),
+    )
+
+
+def ecarts_couts(ids: Optional[Iterable[int]] = None) -> Dict[int, tuple]:
+    """
+    OFs en production dont le coût agrégé diffère (au centime près par ligne) du coût
+    recalculé sur leurs pointages clôturés : {id: (coût agrégé, coût des pointages)}.
+    """
+    agreges = CoutMensuel.objects.order_by()
+    pointages = Pointage.objects.filter(heure_fin__isnull=False).order_by()
+    if ids is not None:
+        ids = list(ids)
+        agreges = agreges.filter(ordre_fabrication_id__in=ids)
+        pointages = pointages.filter(operation__ordre_fabrication_id__in=ids)
+    selon_agregats = {pk: (float(cout), n) for pk, cout, n in agreges.values_list('ordre_fabrication_id')
+                      .annotate(cout=Sum('cout'), lignes=Count('id'))}
+    selon_pointages = dict(
+        pointages.values_list('operation__ordre_fabrication_id')
+        .annotate(cout=Sum(Cast(_DUREE * F('cout_horaire'), FloatField()) / 3600))
+    )
+    en_production = set(OrdreFabrication.objects.values_list('pk', flat=True))
+    ecarts = {}
+    for pk in (set(selon_agregats) | set(selon_pointages)) & en_production:
+        agrege, lignes = selon_agregats.get(pk, (0.0, 0))
+        reel = selon_pointages.get(pk) or 0.0
+        if abs(agrege - reel) > 0.01 * max(lignes, 1):
+            ecarts[pk] = (round(agrege, 2), round(reel, 2))
+    return ecarts
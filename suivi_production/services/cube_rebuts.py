@@ -0,0 +1,272 @@
+"""
+Cube des rebuts : rebuts et pièces bonnes des pointages clôturés, pré-agrégés par
+jour, OF, poste, machine, opérateur et type d'opération (modèle CubeRebut).
+
+Mise à jour incrémentale : toute modification d'un pointage clôturé, d'une opération
+ou la suppression d'un OF met l'OF en file (CubeRebutEnAttente, dans la même
+transaction, voir les signaux de models.py). `rafraichir_cube` recalcule ensuite les
+lignes des OFs en file, à partir des pointages en production et archivés : le cube
+donne donc, OF par OF, les mêmes totaux que les pointages eux-mêmes.
+
+Les tranches (une ou deux dimensions, filtres, période) sont des GROUP BY sur le
+cube, sans jointure vers les pointages.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, asdict, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from . import files_recalcul
+from ..models import (
+    CubeRebut, CubeRebutEnAttente, Machine, Operateur, Operation, OrdreFabrication,
+    OrdreFabricationArchive, Pointage, PointageArchive, PosteDeTravail,
+)
+
+TAILLE_LOT = 200
+SEUIL_PARETO = 80.0
+
+# dimension -> champ du cube
+DIMENSIONS = {
+    'periode': 'jour',
+    'poste': 'poste_id',
+    'machine': 'machine_id',
+    'operateur': 'operateur_id',
+    'type_operation': 'type_operation',
+    'of': 'ordre_fabrication_id',
+}
+GRANULARITES = ('jour', 'semaine', 'mois')
+# Dimension proposée quand on descend dans une ligne (drill-down)
+DIMENSION_SUIVANTE = {
+    'periode': 'poste', 'poste': 'machine', 'machine': 'operateur',
+    'operateur': 'of', 'of': 'type_operation', 'type_operation': 'poste',
+}
+
+
+# --- Mise à jour -------------------------------------------------------------------
+
+def marquer_ofs(ids: Iterable[int]) -> None:
+    """Met des OFs en file de recalcul (sans effet s'ils y sont déjà)."""
+    files_recalcul.marquer_ofs(CubeRebutEnAttente, ids)
+
+
+def _lignes_cube(ids: List[int]) -> List[CubeRebut]:
+    """Lignes du cube des OFs `ids`, calculées depuis leurs pointages clôturés."""
+    lignes = []
+    for modele in (Pointage, PointageArchive):
+        groupes = (
+            modele.objects
+            .filter(operation__ordre_fabrication_id__in=ids, heure_fin__isnull=False)
+            .annotate(jour=TruncDate('heure_fin'))
+            .order_by()
+            .values('jour', 'operation__ordre_fabrication_id', 'operation__poste_id',
+                    'operation__machine_assignee_id', 'operateur_id', 'operation__type_operation')
+            .annotate(rebut=Sum('quantite_rebut'), fabrique=Sum('quantite_fabriquee'), nombre=Count('id'))
+        )
+        lignes.extend(
+            CubeRebut(
+                jour=g['jour'], semaine=g['jour'] - timedelta(days=g['jour'].weekday()), mois=g['jour'].replace(day=1),
+                ordre_fabrication_id=g['operation__ordre_fabrication_id'],
+                poste_id=g['operation__poste_id'], machine_id=g['operation__machine_assignee_id'],
+                operateur_id=g['operateur_id'], type_operation=g['operation__type_operation'],
+                quantite_rebut=g['rebut'] or 0, quantite_fabriquee=g['fabrique'] or 0,
+                nombre_pointages=g['nombre'],
+            )
+            for g in groupes
+        )
+    return lignes
+
+
+def rafraichir_cube(taille_lot: int = TAILLE_LOT, limite: Optional[int] = None) -> int:
+    """Recalcule le cube des OFs en file (au plus `limite`, voir files_recalcul). Renvoie leur nombre."""
+    return files_recalcul.rafraichir_ofs(CubeRebutEnAttente, CubeRebut, _lignes_cube, taille_lot, limite)
+
+
+def reconstruire_cube(taille_lot: int = TAILLE_LOT) -> int:
+    """Vide le cube et le recalcule pour tous les OFs, en production et archivés."""
+    files_recalcul.marquer_tous_les_ofs(CubeRebutEnAttente, CubeRebut)
+    return rafraichir_cube(taille_lot)
+
+
+def ecarts_cube(ids: Optional[Iterable[int]] = None) -> Dict[int, tuple]:
+    """
+    OFs en production dont les rebuts du cube diffèrent de la somme de leurs pointages
+    clôturés : {id: (rebut du cube, rebut des pointages)}. Vide si le cube est à jour.
+    """
+    cube = CubeRebut.objects.order_by()
+    pointages = Pointage.objects.filter(heure_fin__isnull=False).order_by()
+    if ids is not None:
+        ids = list(ids)
+        cube = cube.filter(ordre_fabrication_id__in=ids)
+        pointages = pointages.filter(operation__ordre_fabrication_id__in=ids)
+    selon_cube = dict(cube.values_list('ordre_fabrication_id').annotate(Sum('quantite_rebut')))
+    selon_pointages = dict(
+        pointages.values_list('operation__ordre_fabrication_id').annotate(Sum('quantite_rebut'))
+    )
+    en_production = set(OrdreFabrication.objects.values_list('pk', flat=True))
+    return {
+        pk: (selon_cube.get(pk, 0), selon_pointages.get(pk, 0))
+        for pk in (set(selon_cube) | set(selon_pointages)) & en_production
+        if selon_cube.get(pk, 0) != selon_pointages.get(pk, 0)
+    }
+
+
+# --- Lecture -----------------------------------------------------------------------
+
+@dataclass
+class Membre:
+    dimension: str
+    cle: object
+    libelle: str
+
+
+@dataclass
+class LigneTranche:
+    ligne: Membre
+    colonne: Optional[Membre]
+    rebut: int
+    fabrique: int
+    pointages: int
+    taux_rebut: float         # rebut / (rebut + bonnes), en %
+    part: float = 0.0         # % des rebuts de la tranche
+    cumul: float = 0.0        # % cumulé dans l'ordre de Pareto (tranches à une dimension)
+    pareto: bool = False
+
+
+@dataclass
+class Tranche:
+    lignes: str
+    colonnes: Optional[str]
+    granularite: str
+    filtres: Dict[str, str]
+    total_rebut: int
+    total_fabrique: int
+    taux_rebut: float
+    cellules: List[LigneTranche] = field(default_factory=list)
+    pareto: List[LigneTranche] = field(default_factory=list)   # totaux par ligne, classés
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _taux(rebut: int, fabrique: int) -> float:
+    total = rebut + fabrique
+    return round(rebut * 100 / total, 2) if total else 0.0
+
+
+def _expression(dimension: str, granularite: str):
+    return F(granularite if dimension == 'periode' else DIMENSIONS[dimension])
+
+
+def bornes_periode(debut_iso: str, granularite: str) -> Tuple[str, str]:
+    """Premier et dernier jour (ISO) de la période qui commence à `debut_iso`."""
+    debut = date.fromisoformat(debut_iso)
+    if granularite == 'semaine':
+        fin = debut + timedelta(days=6)
+    elif granularite == 'mois':
+        fin = (debut.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    else:
+        fin = debut
+    return debut.isoformat(), fin.isoformat()
+
+
+def _libelles(dimension: str, cles: set) -> Dict:
+    cles = {c for c in cles if c is not None}
+    if dimension == 'periode':
+        return {c: c.isoformat() for c in cles}
+    if dimension == 'type_operation':
+        return dict(Operation.TYPE_CHOICES)
+    if dimension == 'of':
+        libelles = dict(OrdreFabricationArchive.objects.filter(pk__in=cles).values_list('pk', 'numero_of'))
+        libelles.update(OrdreFabrication.objects.filter(pk__in=cles).values_list('pk', 'numero_of'))
+        return libelles
+    modele, champ = {'poste': (PosteDeTravail, 'nom'), 'machine': (Machine, 'nom'),
+                     'operateur': (Operateur, 'code')}[dimension]
+    return dict(modele.objects.filter(pk__in=cles).values_list('pk', champ))
+
+
+def _membre(dimension: str, cle, libelles: Dict) -> Membre:
+    return Membre(dimension, cle.isoformat() if isinstance(cle, date) else cle,
+                  str(libelles.get(cle, '—')) if cle is not None else '—')
+
+
+def tranche(lignes: str, colonnes: Optional[str] = None, filtres: Optional[Dict[str, str]] = None,
+            debut: Optional[date] = None, fin: Optional[date] = None, granularite: str = 'mois') -> Tranche:
+    """
+    Rebuts regroupés selon une dimension (`lignes`) ou deux (`lignes` x `colonnes`),
+    restreints par `filtres` ({dimension: valeur}) et par la période [debut, fin].
+    Les lignes sont classées par rebut décroissant (Pareto).
+    """
+    if lignes not in DIMENSIONS or (colonnes and (colonnes not in DIMENSIONS or colonnes == lignes)):
+        raise ValueError("Dimension inconnue ou répétée.")
+    if granularite not in GRANULARITES:
+        raise ValueError("Granularité inconnue.")
+    filtres = {d: v for d, v in (filtres or {}).items() if d in DIMENSIONS and d != 'periode' and v not in (None, '')}
+
+    qs = CubeRebut.objects.order_by()
+    if debut:
+        qs = qs.filter(jour__gte=debut)
+    if fin:
+        qs = qs.filter(jour__lte=fin)
+    for dimension, valeur in filtres.items():
+        qs = qs.filter(**{f'{DIMENSIONS[dimension]}__isnull': True} if valeur == 'aucune'
+                       else {DIMENSIONS[dimension]: valeur})
+
+    dimensions = [lignes] + ([colonnes] if colonnes else [])
+    qs = qs.annotate(**{f'd_{d}': _expression(d, granularite) for d in dimensions})
+    groupes = list(
+        qs.values(*[f'd_{d}' for d in dimensions])
+        .annotate(rebut=Sum('quantite_rebut'), fabrique=Sum('quantite_fabriquee'), pointages=Sum('nombre_pointages'))
+    )
+    libelles = {d: _libelles(d, {g[f'd_{d}'] for g in groupes}) for d in dimensions}
+    total_rebut = sum(g['rebut'] for g in groupes)
+    total_fabrique = sum(g['fabrique'] for g in groupes)
+
+    def ligne_tranche(ligne, colonne, rebut, fabrique, pointages):
+        return LigneTranche(
+            ligne=ligne, colonne=colonne, rebut=rebut, fabrique=fabrique, pointages=pointages,
+            taux_rebut=_taux(rebut, fabrique),
+            part=round(rebut * 100 / total_rebut, 2) if total_rebut else 0.0,
+        )
+
+    cellules = [
+        ligne_tranche(
+            _membre(lignes, g[f'd_{lignes}'], libelles[lignes]),
+            _membre(colonnes, g[f'd_{colonnes}'], libelles[colonnes]) if colonnes else None,
+            g['rebut'], g['fabrique'], g['pointages'],
+        )
+        for g in groupes
+    ]
+
+    # Totaux par ligne, classés par rebut décroissant, avec le cumul de Pareto
+    par_ligne = {}
+    for c in cellules:
+        cle = (c.ligne.cle, c.ligne.libelle)
+        if cle in par_ligne:
+            t = par_ligne[cle]
+            t.rebut += c.rebut
+            t.fabrique += c.fabrique
+            t.pointages += c.pointages
+        else:
+            par_ligne[cle] = LigneTranche(ligne=c.ligne, colonne=None, rebut=c.rebut,
+                                          fabrique=c.fabrique, pointages=c.pointages, taux_rebut=0.0)
+    pareto = sorted(par_ligne.values(), key=lambda t: (-t.rebut, t.ligne.libelle))
+    if lignes == 'periode':
+        pareto.sort(key=lambda t: t.ligne.cle or '')
+    cumul = 0
+    for t in sorted(pareto, key=lambda t: -t.rebut):
+        t.taux_rebut = _taux(t.rebut, t.fabrique)
+        t.pareto = t.rebut > 0 and cumul * 100 < SEUIL_PARETO * total_rebut
+        cumul += t.rebut
+        t.part = round(t.rebut * 100 / total_rebut, 2) if total_rebut else 0.0
+        t.cumul = round(cumul * 100 / total_rebut, 2) if total_rebut else 0.0
+
+    cellules.sort(key=lambda c: (-c.rebut, c.ligne.libelle, c.colonne.libelle if c.colonne else ''))
+    return Tranche(
+        lignes=lignes, colonnes=colonnes, granularite=granularite, filtres=filtres,
+        total_rebut=total_rebut, total_fabrique=total_fabrique,
+        taux_rebut=_taux(total_rebut, total_fabrique),
+        cellules=cellules if colonnes else [], pareto=pareto,
+    )
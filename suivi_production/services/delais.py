@@ -0,0 +1,278 @@
+"""
+Délais de fabrication et en-cours (WIP) par OF, phase et poste.
+
+Pour chaque phase commencée d'un OF :
+- traitement : du premier début au dernier fin de pointage, une fois la phase terminée ;
+- attente : de la fin de la phase précédente (dernière phase terminée avant elle) au
+  premier pointage, nulle si la phase a démarré avant la fin de la précédente (pièces
+  passées par lots). La première phase n'a pas d'attente mesurable ;
+- délai : attente + traitement.
+Les débuts et fins de phase sont des agrégats groupés par opération, et la fin de la
+phase précédente une fonction de fenêtre (LAG partitionné par OF, trié par phase) : la
+base calcule tout en une requête par lot d'OFs. Les lignes (DelaiPhase) sont tenues à
+jour OF par OF, comme les coûts (services/couts.py) : les signaux de models.py mettent
+l'OF en file (DelaiEnAttente) et `rafraichir_delais` recalcule ses phases.
+
+L'en-cours d'un poste (EnCoursPoste) compte les opérations débloquées qui l'attendent
+(À faire avec des pièces en entrée) et celles en cours. Chaque sauvegarde d'opération
+ajuste les compteurs de la différence entre son état avant et après, sans recompter le
+poste ; `photographier_en_cours` en garde une photo par jour (EnCoursJournalier).
+
+Les rapports sont des GROUP BY sur ces deux tables, avec des fonctions de fenêtre pour
+le rang des postes et l'évolution d'une semaine à l'autre.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, DateTimeField, F, Max, Min, Q, Sum, When, Window
+from django.db.models.functions import Coalesce, Lag, Rank
+from django.utils import timezone
+
+from . import files_recalcul
+from ..models import (
+    DelaiEnAttente, DelaiPhase, EnCoursJournalier, EnCoursPoste, Operation, OperationArchive,
+    PosteDeTravail,
+)
+
+TAILLE_LOT = 200
+TAILLE_INSERT = 1000
+COMPTEURS = ('operations_en_attente', 'operations_en_cours', 'pieces_en_attente', 'pieces_en_cours')
+
+# (poste_id, statut, quantite_entree) d'une opération
+Etat = Tuple[int, str, int]
+
+
+# --- En-cours ----------------------------------------------------------------------
+
+def _contribution(statut: str, quantite_entree: int) -> Tuple[int, int, int, int]:
+    """Part d'une opération dans les COMPTEURS de son poste."""
+    if statut == 'A_FAIRE' and quantite_entree > 0:
+        return 1, 0, quantite_entree, 0
+    if statut in ('EN_COURS', 'RETOUCHE'):
+        return 0, 1, 0, quantite_entree
+    return 0, 0, 0, 0
+
+
+def _ajuster(poste_id: int, delta: Iterable[int]) -> None:
+    variations = {c: F(c) + d for c, d in zip(COMPTEURS, delta) if d}
+    if variations:
+        EnCoursPoste.objects.bulk_create([EnCoursPoste(poste_id=poste_id)], ignore_conflicts=True)
+        EnCoursPoste.objects.filter(poste_id=poste_id).update(**variations)
+
+
+def changer_etat(avant: Optional[Etat], apres: Optional[Etat]) -> None:
+    """Ajuste l'en-cours des postes pour une opération passée de l'état `avant` à `apres` (None : absente)."""
+    ancien = _contribution(*avant[1:]) if avant else (0, 0, 0, 0)
+    nouveau = _contribution(*apres[1:]) if apres else (0, 0, 0, 0)
+    if avant and apres and avant[0] == apres[0]:
+        _ajuster(apres[0], (n - a for n, a in zip(nouveau, ancien)))
+        return
+    if avant:
+        _ajuster(avant[0], (-a for a in ancien))
+    if apres:
+        _ajuster(apres[0], nouveau)
+
+
+def ajouter_en_cours(operations: Iterable[Operation]) -> None:
+    """Compte dans l'en-cours des opérations créées en masse (bulk_create n'envoie pas de signaux)."""
+    par_poste = defaultdict(lambda: [0, 0, 0, 0])
+    for op in operations:
+        par_poste[op.poste_id] = [t + c for t, c in zip(par_poste[op.poste_id], _contribution(op.statut, op.quantite_entree))]
+    for poste_id, delta in par_poste.items():
+        _ajuster(poste_id, delta)
+
+
+def reconstruire_en_cours() -> int:
+    """Recompte l'en-cours de tous les postes depuis les opérations (après une écriture en masse)."""
+    en_attente = Q(statut='A_FAIRE', quantite_entree__gt=0)
+    en_cours = Q(statut__in=('EN_COURS', 'RETOUCHE'))
+    comptes = (
+        Operation.objects.order_by().values('poste_id')
+        .annotate(
+            operations_en_attente=Count('id', filter=en_attente),
+            operations_en_cours=Count('id', filter=en_cours),
+            pieces_en_attente=Coalesce(Sum('quantite_entree', filter=en_attente), 0),
+            pieces_en_cours=Coalesce(Sum('quantite_entree', filter=en_cours), 0),
+        )
+    )
+    with transaction.atomic():
+        EnCoursPoste.objects.all().delete()
+        EnCoursPoste.objects.bulk_create([EnCoursPoste(**c) for c in comptes], batch_size=TAILLE_INSERT)
+    return len(comptes)
+
+
+def photographier_en_cours(jour: Optional[date] = None) -> int:
+    """Enregistre (ou remplace) la photo de l'en-cours des postes pour `jour` (aujourd'hui par défaut)."""
+    jour = jour or timezone.localdate()
+    with transaction.atomic():
+        EnCoursJournalier.objects.filter(jour=jour).delete()
+        photos = EnCoursJournalier.objects.bulk_create([
+            EnCoursJournalier(jour=jour, semaine=jour - timedelta(days=jour.weekday()), poste_id=e['poste_id'],
+                              **{c: e[c] for c in COMPTEURS})
+            for e in EnCoursPoste.objects.values('poste_id', *COMPTEURS)
+        ])
+    return len(photos)
+
+
+# --- Délais par phase --------------------------------------------------------------
+
+def _semaine(instant) -> date:
+    jour = timezone.localdate(instant)
+    return jour - timedelta(days=jour.weekday())
+
+
+def _phases(modele, ids: List[int]) -> List[DelaiPhase]:
+    """Lignes DelaiPhase des phases commencées des OFs `ids` (opérations `modele`)."""
+    # Fin d'une phase : dernier pointage, seulement une fois la phase terminée
+    fin = Case(When(statut='TERMINEE', then=Max('pointages__heure_fin')), output_field=DateTimeField())
+    lignes = (
+        modele.objects.filter(ordre_fabrication_id__in=ids)
+        .order_by()
+        .values('pk', 'ordre_fabrication_id', 'poste_id', 'numero_phase', 'statut')
+        .annotate(debut=Min('pointages__heure_debut'), fin=fin)
+        .filter(debut__isnull=False)
+        .annotate(fin_precedente=Window(Lag(fin), partition_by=F('ordre_fabrication_id'), order_by=F('numero_phase').asc()))
+    )
+    phases = []
+    for l in lignes:
+        debut, fin_phase, precedente = l['debut'], l['fin'], l['fin_precedente']
+        phases.append(DelaiPhase(
+            operation_id=l['pk'], ordre_fabrication_id=l['ordre_fabrication_id'], poste_id=l['poste_id'],
+            numero_phase=l['numero_phase'], debut=debut, fin=fin_phase,
+            attente_secondes=max((debut - precedente).total_seconds(), 0.0) if precedente else None,
+            traitement_secondes=(fin_phase - debut).total_seconds() if fin_phase else None,
+            semaine=_semaine(fin_phase or debut),
+        ))
+    return phases
+
+
+def _lignes_delais(ids: List[int]) -> List[DelaiPhase]:
+    return _phases(Operation, ids) + _phases(OperationArchive, ids)
+
+
+def marquer_ofs(ids: Iterable[int]) -> None:
+    """Met des OFs en file de recalcul (sans effet s'ils y sont déjà)."""
+    files_recalcul.marquer_ofs(DelaiEnAttente, ids)
+
+
+def rafraichir_delais(taille_lot: int = TAILLE_LOT, limite: Optional[int] = None) -> int:
+    """Recalcule les phases (DelaiPhase) des OFs en file, au plus `limite`. Renvoie leur nombre."""
+    return files_recalcul.rafraichir_ofs(DelaiEnAttente, DelaiPhase, _lignes_delais, taille_lot, limite)
+
+
+def reconstruire_delais(taille_lot: int = TAILLE_LOT) -> int:
+    """Vide les délais et les recalcule pour tous les OFs, en production et archivés."""
+    files_recalcul.marquer_tous_les_ofs(DelaiEnAttente, DelaiPhase)
+    return rafraichir_delais(taille_lot)
+
+
+# --- Lecture -----------------------------------------------------------------------
+
+def _heures(secondes: Optional[float]) -> Optional[float]:
+    return round(secondes / 3600, 2) if secondes is not None else None
+
+
+@dataclass
+class LigneDelai:
+    cle: object
+    libelle: str
+    phases: int                         # phases terminées sur la période
+    attente_h: Optional[float]          # moyennes par phase
+    traitement_h: Optional[float]
+    delai_h: Optional[float]
+    rang: Optional[int] = None          # 1 : poste au délai moyen le plus long
+    evolution_h: Optional[float] = None  # écart du délai moyen à la semaine précédente
+    operations_en_attente: float = 0    # en-cours actuel (par poste) ou moyen (par semaine)
+    operations_en_cours: float = 0
+    pieces_en_attente: float = 0
+    pieces_en_cours: float = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# Délai d'une phase terminée (la première phase n'a que du traitement)
+_DELAI = Coalesce(F('attente_secondes'), 0.0) + F('traitement_secondes')
+_MOYENNES = {
+    'attente': Avg('attente_secondes'),
+    'traitement': Avg('traitement_secondes'),
+    'delai': Avg(_DELAI),
+    'phases': Count('operation_id'),
+}
+
+
+def _phases_terminees(debut: date, fin: date, poste_id: Optional[int] = None):
+    qs = DelaiPhase.objects.filter(
+        semaine__gte=debut - timedelta(days=debut.weekday()), semaine__lte=fin, fin__isnull=False,
+    )
+    return qs.filter(poste_id=poste_id) if poste_id else qs
+
+
+def delais_postes(debut: date, fin: date) -> List[LigneDelai]:
+    """Attente, traitement et délai moyens par poste sur les semaines de [debut, fin], avec l'en-cours actuel."""
+    groupes = (
+        _phases_terminees(debut, fin).order_by().values('poste_id').annotate(**_MOYENNES)
+        .annotate(rang=Window(Rank(), order_by=Avg(_DELAI).desc()))
+    )
+    par_poste = {g['poste_id']: g for g in groupes}
+    en_cours = {e['poste_id']: e for e in EnCoursPoste.objects.values('poste_id', *COMPTEURS)}
+    lignes = []
+    for poste_id, nom in PosteDeTravail.objects.filter(pk__in=set(par_poste) | set(en_cours)).values_list('pk', 'nom'):
+        g = par_poste.get(poste_id, {})
+        lignes.append(LigneDelai(
+            cle=poste_id, libelle=nom, phases=g.get('phases', 0), attente_h=_heures(g.get('attente')),
+            traitement_h=_heures(g.get('traitement')), delai_h=_heures(g.get('delai')), rang=g.get('rang'),
+            **{c: en_cours.get(poste_id, {}).get(c, 0) for c in COMPTEURS},
+        ))
+    lignes.sort(key=lambda l: (l.rang is None, l.rang or 0, l.libelle))
+    return lignes
+
+
+def tendance_hebdomadaire(debut: date, fin: date, poste_id: Optional[int] = None) -> List[LigneDelai]:
+    """Délais moyens et en-cours moyen (photos quotidiennes) semaine par semaine, atelier ou poste."""
+    groupes = (
+        _phases_terminees(debut, fin, poste_id).order_by().values('semaine').annotate(**_MOYENNES)
+        .annotate(precedent=Window(Lag(Avg(_DELAI)), order_by=F('semaine').asc()))
+    )
+    photos = EnCoursJournalier.objects.filter(jour__gte=debut, jour__lte=fin)
+    if poste_id:
+        photos = photos.filter(poste_id=poste_id)
+    # Moyenne par jour de la somme des postes : total de la semaine / nombre de jours photographiés
+    en_cours = {
+        p['semaine']: p for p in photos.order_by().values('semaine')
+        .annotate(jours=Count('jour', distinct=True), **{c: Sum(c) for c in COMPTEURS})
+    }
+    semaines = {g['semaine']: g for g in groupes}
+    lignes = []
+    for semaine in sorted(set(semaines) | set(en_cours)):
+        g, p = semaines.get(semaine, {}), en_cours.get(semaine)
+        delai = g.get('delai')
+        precedent = g.get('precedent')
+        lignes.append(LigneDelai(
+            cle=semaine.isoformat(), libelle=semaine.strftime('%d/%m/%Y'), phases=g.get('phases', 0),
+            attente_h=_heures(g.get('attente')), traitement_h=_heures(g.get('traitement')), delai_h=_heures(delai),
+            evolution_h=_heures(delai - precedent) if delai is not None and precedent is not None else None,
+            **{c: round(p[c] / p['jours'], 1) if p else 0 for c in COMPTEURS},
+        ))
+    return lignes
+
+
+def delais_of(of_id: int) -> Dict:
+    """Phases d'un OF (en production ou archivé) avec leurs délais, calculés à la volée, et son délai global."""
+    phases = _phases(Operation, [of_id]) or _phases(OperationArchive, [of_id])
+    terminees = [p for p in phases if p.fin]
+    return {
+        'phases': [
+            {'numero_phase': p.numero_phase, 'poste': p.poste_id, 'debut': p.debut.isoformat(),
+             'fin': p.fin.isoformat() if p.fin else None, 'attente_h': _heures(p.attente_secondes),
+             'traitement_h': _heures(p.traitement_secondes)}
+            for p in phases
+        ],
+        'delai_h': _heures((max(p.fin for p in terminees) - min(p.debut for p in phases)).total_seconds()) if terminees else None,
+        'attente_h': _heures(sum(p.attente_secondes or 0 for p in phases)),
+        'traitement_h': _heures(sum(p.traitement_secondes or 0 for p in phases)),
+    }
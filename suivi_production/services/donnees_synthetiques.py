@@ -0,0 +1,172 @@
+"""
+Génération de données d'atelier synthétiques (volumes de production réalistes).
+
+Utilisé par la commande `seed_atelier` et par la suite de benchmarks. Tout est
+inséré en bulk_create ; le générateur est déterministe pour une graine donnée.
+"""
+from __future__ import annotations
+import random
+from dataclasses import dataclass, asdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .couts import marquer_ofs as marquer_ofs_couts
+from .cube_rebuts import marquer_ofs
+from .delais import marquer_ofs as marquer_ofs_delais, reconstruire_en_cours
+from .temps_cycle import marquer_pointages as marquer_pointages_cycles
+from .trs import marquer_pointages
+from .utilisation import marquer_pointages as marquer_pointages_utilisation
+from .version_donnees import incrementer_version
+from ..models import (
+    PosteDeTravail, Machine, Operateur, MatierePremiere, OrdreFabrication, Operation,
+    MatiereRequise, Pointage, Anomalie,
+)
+
+POSTES = ['Découpe', 'Pliage', 'Soudure', 'Usinage', 'Traitement de surface', 'Peinture', 'Assemblage', 'Contrôle Qualité']
+MACHINES_PAR_POSTE = 2
+TAILLE_INSERT = 2000
+
+
+@dataclass
+class VolumesGeneres:
+    ofs: int = 0
+    operations: int = 0
+    pointages: int = 0
+    anomalies: int = 0
+    operateurs: int = 0
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _referentiel(rng: random.Random, nb_operateurs: int):
+    postes = [PosteDeTravail.objects.get_or_create(nom=nom)[0] for nom in POSTES]
+    machines = {}
+    for poste in postes:
+        machines[poste.pk] = [
+            Machine.objects.get_or_create(nom=f'{poste.nom} M{i + 1}')[0] for i in range(MACHINES_PAR_POSTE)
+        ]
+    existants = Operateur.objects.filter(code__startswith='SYN').count()
+    nouveaux = Operateur.objects.bulk_create([
+        Operateur(code=f'SYN{existants + i:05d}', nom=f'Opérateur{existants + i}', prenom='Synthétique',
+                  cout_horaire=Decimal(rng.randint(25, 55)))
+        for i in range(max(0, nb_operateurs - existants))
+    ])
+    for operateur in nouveaux:
+        operateur.postes_qualifies.set(rng.sample(postes, rng.randint(2, 4)))
+    operateurs = list(Operateur.objects.filter(code__startswith='SYN').prefetch_related('postes_qualifies'))
+    qualifies = {poste.pk: [o for o in operateurs if poste in o.postes_qualifies.all()] or operateurs for poste in postes}
+    MatierePremiere.objects.bulk_create([
+        MatierePremiere(reference=f'SYN-MAT-{i:03d}', designation=f'Matière synthétique {i}',
+                        quantite_stock=Decimal(rng.randint(0, 5000)), seuil_alerte=Decimal(100))
+        for i in range(50)
+    ], ignore_conflicts=True)
+    matieres = list(MatierePremiere.objects.filter(reference__startswith='SYN-MAT-'))
+    return postes, machines, qualifies, matieres, len(operateurs)
+
+
+def generer_atelier(nb_ofs: int, jours: int = 180, phases_max: int = 6, graine: int = 42,
+                    prefixe: str = 'SYN') -> VolumesGeneres:
+    """
+    Crée `nb_ofs` OFs avec des gammes de 2 à `phases_max` phases réparties sur les
+    `jours` derniers jours : ~70 % terminés, ~25 % en production, ~5 % planifiés.
+    Les phases réalisées reçoivent 1 à 4 pointages avec rebuts ; ~5 % des
+    opérations portent une anomalie (résolue dans 80 % des cas).
+    """
+    rng = random.Random(graine)
+    maintenant = timezone.now()
+    volumes = VolumesGeneres()
+    with transaction.atomic():
+        postes, machines, qualifies, matieres, volumes.operateurs = _referentiel(rng, max(10, nb_ofs // 20))
+        debut_index = OrdreFabrication.objects.filter(numero_of__startswith=f'{prefixe}-').count()
+
+        plans = []
+        for i in range(nb_ofs):
+            tirage = rng.random()
+            etat = 'TERMINE' if tirage < 0.70 else 'PRODUCTION' if tirage < 0.95 else 'PLANIFIE'
+            debut = maintenant - timedelta(days=rng.uniform(3, jours), hours=rng.uniform(0, 8))
+            of = OrdreFabrication(numero_of=f'{prefixe}-{debut_index + i:07d}', titre=f'Pièce synthétique {rng.randint(1, 500)}',
+                                  quantite_a_produire=rng.randint(10, 200), statut=etat)
+            plans.append((of, etat, debut, rng.randint(2, phases_max)))
+        OrdreFabrication.objects.bulk_create([p[0] for p in plans], batch_size=TAILLE_INSERT)
+
+        operations, deroulements = [], []
+        for of, etat, debut, nb_phases in plans:
+            phases_faites = nb_phases if etat == 'TERMINE' else rng.randint(0, nb_phases - 1) if etat == 'PRODUCTION' else 0
+            entree = of.quantite_a_produire
+            instant = debut
+            for n in range(1, nb_phases + 1):
+                poste = rng.choice(postes)
+                temps_prevu = Decimal(rng.choice([15, 30, 45, 60, 90, 120]))
+                statut = 'TERMINEE' if n <= phases_faites else 'EN_COURS' if n == phases_faites + 1 and etat == 'PRODUCTION' else 'A_FAIRE'
+                op = Operation(ordre_fabrication=of, numero_phase=n, poste=poste, titre=f'Phase {n} - {poste.nom}',
+                               temps_prevu_minutes=temps_prevu, machine_assignee=rng.choice(machines[poste.pk]),
+                               type_operation='QUALITE' if poste.nom == 'Contrôle Qualité' else 'PRODUCTION',
+                               statut=statut, quantite_entree=entree if statut != 'A_FAIRE' or n == 1 else 0)
+                operations.append(op)
+                if statut == 'A_FAIRE':
+                    continue
+                rebut = int(entree * rng.uniform(0, 0.06))
+                bonnes = entree - rebut
+                deroulements.append((op, statut, instant, entree, bonnes, rebut))
+                instant += timedelta(minutes=float(temps_prevu) * rng.uniform(0.8, 1.5) + rng.uniform(10, 600))
+                entree = bonnes
+            if etat == 'TERMINE':
+                of.date_premiere_finalisation = min(instant, maintenant).date()
+        Operation.objects.bulk_create(operations, batch_size=TAILLE_INSERT)
+        OrdreFabrication.objects.bulk_update(
+            [p[0] for p in plans if p[1] == 'TERMINE'], ['date_premiere_finalisation'], batch_size=TAILLE_INSERT)
+
+        lignes_matiere = [
+            MatiereRequise(operation=op, matiere=m, quantite_necessaire=Decimal(rng.randint(1, 5)))
+            for op in operations if op.numero_phase == 1 for m in rng.sample(matieres, 2)
+        ]
+        pointages, anomalies = [], []
+        for op, statut, instant, entree, bonnes, rebut in deroulements:
+            nb = rng.randint(1, 4)
+            duree_totale = float(op.temps_prevu_minutes) * rng.uniform(0.7, 1.6)
+            for k in range(nb):
+                part_bonnes = bonnes // nb + (bonnes % nb if k == nb - 1 else 0)
+                part_rebut = rebut // nb + (rebut % nb if k == nb - 1 else 0)
+                heure_debut = min(instant + timedelta(minutes=duree_totale * k / nb), maintenant - timedelta(minutes=5))
+                ouvert = statut == 'EN_COURS' and k == nb - 1
+                heure_fin = None if ouvert else min(heure_debut + timedelta(minutes=duree_totale / nb), maintenant)
+                operateur = rng.choice(qualifies[op.poste_id])
+                pointages.append(Pointage(
+                    operation=op, operateur=operateur, heure_debut=heure_debut, heure_fin=heure_fin,
+                    quantite_prise_en_charge=part_bonnes + part_rebut,
+                    quantite_fabriquee=0 if ouvert else part_bonnes, quantite_rebut=0 if ouvert else part_rebut,
+                    cout_horaire=None if ouvert else operateur.cout_horaire,
+                ))
+            if rng.random() < 0.05:
+                resolue = rng.random() < 0.8
+                anomalies.append((Anomalie(
+                    operation=op, operateur=pointages[-1].operateur, description='Anomalie synthétique',
+                    statut='RESOLUE' if resolue else 'OUVERTE',
+                    date_resolution=min(instant + timedelta(hours=rng.uniform(1, 72)), maintenant) if resolue else None,
+                ), instant))
+        Pointage.objects.bulk_create(pointages, batch_size=TAILLE_INSERT)
+        MatiereRequise.objects.bulk_create(lignes_matiere, batch_size=TAILLE_INSERT)
+        Anomalie.objects.bulk_create([a for a, _ in anomalies], batch_size=TAILLE_INSERT)
+        # date_signalement est en auto_now_add : on la replace à l'instant du pointage
+        for anomalie, instant in anomalies:
+            anomalie.date_signalement = instant
+        Anomalie.objects.bulk_update([a for a, _ in anomalies], ['date_signalement'], batch_size=TAILLE_INSERT)
+        # bulk_create n'envoie pas de signaux : mise en file explicite pour les agrégats
+        marquer_ofs(p[0].pk for p in plans)
+        marquer_ofs_couts(p[0].pk for p in plans)
+        marquer_ofs_delais(p[0].pk for p in plans)
+        marquer_pointages(pointages)
+        marquer_pointages_utilisation(pointages)
+        marquer_pointages_cycles(pointages)
+        reconstruire_en_cours()
+        incrementer_version()
+
+    volumes.ofs = len(plans)
+    volumes.operations = len(operations)
+    volumes.pointages = len(pointages)
+    volumes.anomalies = len(anomalies)
+    return volumes
@@ -0,0 +1,137 @@
+"""
+Files de recalcul des agrégats tenus à jour par clé.
+
+Les signaux mettent en file les clés touchées par une écriture : un OF pour le cube des
+rebuts, les coûts et les délais, une journée machine (jour, machine) pour le TRS et
+l'utilisation, un triplet (poste, type d'opération, opérateur) pour les temps de
+cycle. La clé est unique dans sa file : la remettre en file est sans effet
+(ignore_conflicts), dans la transaction de l'écriture. `rafraichir_file` vide ensuite
+la file par lots, une transaction par lot : les lignes des clés du lot sont supprimées
+et recalculées, puis les clés retirées de la file. Sous PostgreSQL, des
+rafraîchissements concurrents se partagent la file (SKIP LOCKED).
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, Type
+
+from django.db import models, transaction
+
+from .version_donnees import incrementer_version
+from ..models import Machine, OrdreFabrication, OrdreFabricationArchive, Pointage
+
+TAILLE_INSERT = 1000
+
+# Journées touchées par un intervalle [debut, fin]
+Jours = Callable[[datetime, datetime], List[date]]
+
+
+def rafraichir_file(file: Type[models.Model], champs: Sequence[str], recalculer: Callable[[list], None],
+                    taille_lot: int, limite: Optional[int] = None) -> int:
+    """
+    Vide `file` par lots de `taille_lot` clés, dans l'ordre de `champs` : `recalculer`
+    reçoit les clés du lot (valeur du champ, ou tuple s'il y en a plusieurs). `limite`
+    borne le nombre de clés traitées (rafraîchissement à la lecture). Renvoie ce nombre.
+    """
+    traitees = 0
+    while limite is None or traitees < limite:
+        taille = taille_lot if limite is None else min(taille_lot, limite - traitees)
+        with transaction.atomic():
+            en_attente = list(
+                file.objects.select_for_update(skip_locked=True)
+                .order_by(*champs).values_list('pk', *champs)[:taille]
+            )
+            if not en_attente:
+                break
+            recalculer([ligne[1] if len(champs) == 1 else ligne[1:] for ligne in en_attente])
+            file.objects.filter(pk__in=[ligne[0] for ligne in en_attente]).delete()
+        traitees += len(en_attente)
+    return traitees
+
+
+def marquer_cles(file: Type[models.Model], champs: Sequence[str], cles: Iterable[tuple]) -> None:
+    """Met en file des clés (valeurs de `champs`) ; celles déjà en file sont ignorées."""
+    file.objects.bulk_create(
+        [file(**dict(zip(champs, cle))) for cle in cles], batch_size=TAILLE_INSERT, ignore_conflicts=True,
+    )
+
+
+# --- Files par OF ------------------------------------------------------------------
+
+def marquer_ofs(file: Type[models.Model], ids: Iterable[int]) -> None:
+    """Met des OFs en file (sans effet s'ils y sont déjà)."""
+    file.objects.bulk_create(
+        [file(ordre_fabrication_id=pk) for pk in ids], batch_size=TAILLE_INSERT, ignore_conflicts=True,
+    )
+
+
+def rafraichir_ofs(file: Type[models.Model], agregat: Type[models.Model],
+                   lignes: Callable[[List[int]], List[models.Model]], taille_lot: int,
+                   limite: Optional[int] = None) -> int:
+    """
+    Remplace les lignes d'`agregat` des OFs en file par `lignes(ids)` et incrémente la
+    version des données à chaque lot. Renvoie le nombre d'OFs.
+    """
+    def recalculer(ids):
+        agregat.objects.filter(ordre_fabrication_id__in=ids).delete()
+        agregat.objects.bulk_create(lignes(ids), batch_size=TAILLE_INSERT)
+        # Les rapports en cache (ETag) ont pu être servis avant ce lot
+        incrementer_version()
+    return rafraichir_file(file, ['ordre_fabrication_id'], recalculer, taille_lot, limite)
+
+
+def marquer_tous_les_ofs(file: Type[models.Model], agregat: Type[models.Model]) -> None:
+    """Vide `agregat` et met en file tous les OFs, en production et archivés (reconstruction)."""
+    with transaction.atomic():
+        agregat.objects.all().delete()
+        for modele in (OrdreFabrication, OrdreFabricationArchive):
+            marquer_ofs(file, modele.objects.values_list('pk', flat=True))
+
+
+# --- Files par journée machine -----------------------------------------------------
+
+def marquer_journees(file: Type[models.Model], paires: Iterable[Tuple[date, int]]) -> None:
+    """Met en file des couples (jour, machine_id) ; les couples déjà en file sont ignorés."""
+    file.objects.bulk_create(
+        [file(jour=jour, machine_id=machine_id) for jour, machine_id in paires],
+        batch_size=TAILLE_INSERT, ignore_conflicts=True,
+    )
+
+
+def marquer_intervalles(file: Type[models.Model], lignes: Iterable[Tuple[Optional[int], datetime, datetime]],
+                        jours: Jours) -> None:
+    """Met en file les journées touchées par des intervalles (machine_id, debut, fin) ; sans machine, ignorés."""
+    marquer_journees(file, ((jour, machine_id) for machine_id, debut, fin in lignes if machine_id
+                            for jour in jours(debut, fin)))
+
+
+def marquer_pointages(file: Type[models.Model], pointages: Iterable[Pointage], jours: Jours) -> None:
+    """Met en file les journées des pointages clôturés (insertions en masse, sans signaux)."""
+    marquer_intervalles(file, (
+        (p.operation.machine_assignee_id, p.heure_debut, p.heure_fin) for p in pointages if p.heure_fin is not None
+    ), jours)
+
+
+def marquer_periode(file: Type[models.Model], debut: date, fin: date) -> None:
+    """Met en file les journées de [debut, fin] de toutes les machines."""
+    machines = list(Machine.objects.values_list('pk', flat=True))
+    marquer_journees(file, ((debut + timedelta(days=n), m) for n in range((fin - debut).days + 1) for m in machines))
+
+
+def rafraichir_journees(file: Type[models.Model], agregat: Type[models.Model],
+                        calculer_journee: Callable[[date, List[int]], List[models.Model]], taille_lot: int,
+                        limite: Optional[int] = None) -> int:
+    """
+    Remplace les lignes d'`agregat` des journées machine en file par
+    `calculer_journee(jour, machine_ids)`. Renvoie le nombre de journées machine.
+    """
+    def recalculer(paires):
+        par_jour = defaultdict(list)
+        for jour, machine_id in paires:
+            par_jour[jour].append(machine_id)
+        lignes = []
+        for jour, machine_ids in par_jour.items():
+            agregat.objects.filter(jour=jour, machine_id__in=machine_ids).delete()
+            lignes.extend(calculer_journee(jour, machine_ids))
+        agregat.objects.bulk_create(lignes, batch_size=TAILLE_INSERT)
+    return rafraichir_file(file, ['jour', 'machine_id'], recalculer, taille_lot, limite)
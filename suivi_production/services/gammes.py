@@ -0,0 +1,227 @@
+"""
+Gammes types : bibliothèque de gammes réutilisables et création d'OFs en masse.
+
+Une gamme type (GammeType) porte les phases (OperationGammeType) et leurs matières
+(MatiereGammeType) d'un produit récurrent. `instancier_gamme` en crée un ou plusieurs OFs
+en une fois : la gamme est lue en deux requêtes, puis OFs, opérations et MatiereRequise
+sont insérés par bulk_create, lot par lot, dans une seule transaction.
+
+`inserer_ofs` est l'écriture en masse commune à l'instanciation et à l'import de fichiers
+(services.import_ofs). Elle tient lieu de synchroniser_gamme pour des OFs neufs, une fois
+par lot : la première phase reçoit la quantité à produire, les suivantes attendent la fin
+de la précédente. bulk_create n'envoyant pas de signaux, l'en-cours des postes et la
+version des données sont mis à jour explicitement.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+
+from .delais import ajouter_en_cours
+from .version_donnees import incrementer_version
+from ..models import (
+    GammeType, MatiereGammeType, MatiereRequise, Operation, OperationGammeType, OrdreFabrication,
+    OrdreFabricationArchive,
+)
+
+TAILLE_INSERT = 1000
+TAILLE_LOT = 500        # OFs insérés par lot lors d'une instanciation
+OFS_MAX = 2000          # OFs créés au plus par instanciation
+
+# Une phase à créer : l'opération (sans OF) et ses matières {matiere_id: quantité}
+Phase = Tuple[Operation, Dict[int, Decimal]]
+
+
+class ErreurGamme(ValueError):
+    """Demande d'instanciation invalide (gamme vide, OF en double, quantité invalide...)."""
+
+
+@dataclass
+class ResultatInsertion:
+    ofs: List[OrdreFabrication]
+    operations: List[Operation]
+    matieres: int
+
+
+def inserer_ofs(ofs: Sequence[OrdreFabrication], gammes: Sequence[Sequence[Phase]]) -> ResultatInsertion:
+    """
+    Insère des OFs neufs et leurs gammes (`gammes[i]` : phases de `ofs[i]`, dans l'ordre des
+    phases) avec une requête par table et par tranche de TAILLE_INSERT lignes. Lève
+    ErreurGamme, sans rien écrire, si un numéro a été pris entre-temps.
+    """
+    try:
+        return _inserer_ofs(ofs, gammes)
+    except IntegrityError:
+        # Un numéro créé par une écriture concurrente depuis la vérification des demandes
+        existants = _existants(of.numero_of for of in ofs)
+        if not existants:
+            raise
+        raise ErreurGamme(_message_existants(existants))
+
+
+def _inserer_ofs(ofs: Sequence[OrdreFabrication], gammes: Sequence[Sequence[Phase]]) -> ResultatInsertion:
+    operations, matieres = [], []
+    with transaction.atomic():
+        crees = OrdreFabrication.objects.bulk_create(ofs, batch_size=TAILLE_INSERT)
+        for of, phases in zip(crees, gammes):
+            for rang, (operation, lignes_matiere) in enumerate(phases):
+                operation.ordre_fabrication = of
+                operation.quantite_entree = of.quantite_a_produire if rang == 0 else 0
+                operation.matieres_requises_json = {str(pk): float(q) for pk, q in lignes_matiere.items()} or None
+                operations.append(operation)
+                matieres += [
+                    MatiereRequise(operation=operation, matiere_id=pk, quantite_necessaire=q)
+                    for pk, q in lignes_matiere.items()
+                ]
+        Operation.objects.bulk_create(operations, batch_size=TAILLE_INSERT)
+        MatiereRequise.objects.bulk_create(matieres, batch_size=TAILLE_INSERT)
+        ajouter_en_cours(operations)
+        incrementer_version()
+    return ResultatInsertion(crees, operations, len(matieres))
+
+
+# =============================================================================
+# BIBLIOTHÈQUE DE GAMMES
+# =============================================================================
+
+@transaction.atomic
+def gamme_depuis_of(of: OrdreFabrication, nom: str, description: str = '') -> GammeType:
+    """Enregistre la gamme d'un OF existant (phases et matières) comme gamme type."""
+    operations = list(of.operations.order_by('numero_phase').prefetch_related('matiererequise_set'))
+    if not operations:
+        raise ErreurGamme(f"L'OF {of.numero_of} n'a aucune opération.")
+    gamme = GammeType.objects.create(nom=nom, description=description)
+    phases = OperationGammeType.objects.bulk_create([
+        OperationGammeType(
+            gamme=gamme, numero_phase=op.numero_phase, poste_id=op.poste_id, titre=op.titre,
+            type_operation=op.type_operation, temps_prevu_minutes=op.temps_prevu_minutes,
+            machine_assignee_id=op.machine_assignee_id, instructions=op.instructions,
+        )
+        for op in operations
+    ])
+    MatiereGammeType.objects.bulk_create([
+        MatiereGammeType(operation=phase, matiere_id=mr.matiere_id, quantite_necessaire=mr.quantite_necessaire)
+        for phase, op in zip(phases, operations) for mr in op.matiererequise_set.all()
+    ])
+    return gamme
+
+
+def lister_gammes() -> List[Dict[str, object]]:
+    return [
+        {
+            'id': gamme.pk, 'nom': gamme.nom, 'description': gamme.description,
+            'phases': [
+                {
+                    'numero_phase': phase.numero_phase, 'poste': phase.poste.nom, 'titre': phase.titre,
+                    'temps_prevu_minutes': float(phase.temps_prevu_minutes),
+                    'matieres': {m.matiere.reference: float(m.quantite_necessaire) for m in phase.matieres.all()},
+                }
+                for phase in gamme.operations.all()
+            ],
+        }
+        for gamme in GammeType.objects.prefetch_related('operations__poste', 'operations__matieres__matiere')
+    ]
+
+
+# =============================================================================
+# INSTANCIATION
+# =============================================================================
+
+def _date(valeur, champ: str) -> Optional[date]:
+    if valeur in (None, ''):
+        return None
+    jour = parse_date(str(valeur)) if not isinstance(valeur, date) else valeur
+    if jour is None:
+        raise ErreurGamme(f"{champ} : date invalide ({valeur}), format attendu AAAA-MM-JJ.")
+    return jour
+
+
+def _quantite(valeur) -> int:
+    try:
+        quantite = int(valeur)
+    except (TypeError, ValueError):
+        raise ErreurGamme(f"quantite_a_produire : entier attendu ({valeur}).")
+    if quantite <= 0:
+        raise ErreurGamme("quantite_a_produire : quantité positive obligatoire.")
+    return quantite
+
+
+def _ofs_demandes(gamme: GammeType, demandes: Iterable[Dict[str, object]], defauts: Dict[str, object]) -> List[OrdreFabrication]:
+    ofs, numeros = [], set()
+    for demande in demandes:
+        valeurs = {**defauts, **demande}
+        numero_of = str(valeurs.get('numero_of') or '').strip()
+        if not numero_of:
+            raise ErreurGamme("numero_of : valeur obligatoire pour chaque OF.")
+        if len(numero_of) > 50:
+            raise ErreurGamme(f"numero_of : 50 caractères au plus ({numero_of}).")
+        if numero_of in numeros:
+            raise ErreurGamme(f"OF {numero_of} demandé deux fois.")
+        numeros.add(numero_of)
+        ofs.append(OrdreFabrication(
+            numero_of=numero_of, titre=str(valeurs.get('titre') or gamme.nom)[:255],
+            quantite_a_produire=_quantite(valeurs.get('quantite_a_produire')),
+            date_debut_prevu=_date(valeurs.get('date_debut_prevu'), 'date_debut_prevu'),
+            date_fin_prevue=_date(valeurs.get('date_fin_prevue'), 'date_fin_prevue'),
+        ))
+    if not ofs:
+        raise ErreurGamme("Aucun OF demandé.")
+    if len(ofs) > OFS_MAX:
+        raise ErreurGamme(f"{len(ofs)} OFs demandés : au plus {OFS_MAX} par instanciation.")
+    existants = _existants(numeros)
+    if existants:
+        raise ErreurGamme(_message_existants(existants))
+    return ofs
+
+
+def _existants(numeros: Iterable[str]) -> set:
+    """Numéros déjà pris par un OF, en cours ou archivé."""
+    numeros = list(numeros)
+    existants = set(OrdreFabrication.objects.filter(numero_of__in=numeros).values_list('numero_of', flat=True))
+    existants |= set(OrdreFabricationArchive.objects.filter(numero_of__in=numeros).values_list('numero_of', flat=True))
+    return existants
+
+
+def _message_existants(existants: set) -> str:
+    return f"OF(s) déjà existant(s) : {', '.join(sorted(existants)[:20])}."
+
+
+def demandes_numerotees(prefixe: str, nombre: int, premier: int = 1) -> List[Dict[str, object]]:
+    """Demandes de `nombre` OFs numérotés à la suite : OF-001, OF-002... pour le préfixe 'OF-'."""
+    largeur = max(3, len(str(premier + nombre - 1)))
+    return [{'numero_of': f"{prefixe}{numero:0{largeur}d}"} for numero in range(premier, premier + nombre)]
+
+
+def instancier_gamme(gamme: GammeType, demandes: Iterable[Dict[str, object]], **defauts) -> List[OrdreFabrication]:
+    """
+    Crée un OF par demande ({numero_of, titre, quantite_a_produire, date_debut_prevu,
+    date_fin_prevue}, les clés absentes étant prises dans `defauts`, le titre par défaut
+    étant le nom de la gamme), avec une copie de la gamme. Tout ou rien : une demande
+    invalide lève ErreurGamme avant toute écriture.
+    """
+    ofs = _ofs_demandes(gamme, demandes, defauts)
+    phases = list(gamme.operations.order_by('numero_phase').prefetch_related('matieres'))
+    if not phases:
+        raise ErreurGamme(f"La gamme {gamme.nom} n'a aucune phase.")
+    modele = [(phase, {m.matiere_id: m.quantite_necessaire for m in phase.matieres.all()}) for phase in phases]
+
+    def copie():
+        return [
+            (Operation(
+                numero_phase=phase.numero_phase, poste_id=phase.poste_id, titre=phase.titre,
+                type_operation=phase.type_operation, temps_prevu_minutes=phase.temps_prevu_minutes,
+                machine_assignee_id=phase.machine_assignee_id, instructions=phase.instructions,
+            ), matieres)
+            for phase, matieres in modele
+        ]
+
+    crees = []
+    with transaction.atomic():
+        for debut in range(0, len(ofs), TAILLE_LOT):
+            lot = ofs[debut:debut + TAILLE_LOT]
+            crees += inserer_ofs(lot, [copie() for _ in lot]).ofs
+    return crees
@@ -0,0 +1,359 @@
+"""
+Import en masse d'OFs, de leurs gammes et de leurs matières depuis un fichier CSV ou XLSX.
+
+Une ligne du fichier décrit une phase d'OF (COLONNES). Les colonnes de l'OF sont lues sur
+sa première ligne ; une phase répétée avec une autre matière ajoute une ligne de matière
+à la même opération. Exemple :
+
+    numero_of;titre;quantite_a_produire;numero_phase;poste;titre_operation;temps_prevu_minutes;matiere;quantite_necessaire
+    OF-100;Support;50;1;Découpe;Coupe;120;TOLE-2MM;0.5
+    OF-100;;;1;;;;VIS-M6;4
+    OF-100;;;2;Pliage;Pliage;60;;
+
+Les lignes sont traitées par lots (un lot ne coupe jamais un OF) : validation, résolution
+des postes, machines et matières par une requête par lot (les références déjà vues
+restent en cache), puis insertion en masse des OFs, opérations et matières dans une
+transaction par lot (services.gammes.inserer_ofs). Un OF dont une ligne est en erreur
+n'est pas importé ; les erreurs sont rendues ligne par ligne et les autres OFs du lot
+sont importés.
+
+Comme dans le formulaire d'OF (synchroniser_gamme), la première phase reçoit la quantité
+à produire et les suivantes attendent la fin de la précédente.
+"""
+from __future__ import annotations
+import csv
+import io
+import itertools
+import zipfile
+from dataclasses import dataclass, asdict, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .gammes import ErreurGamme, inserer_ofs
+from ..models import (
+    Machine, MatierePremiere, Operation, OrdreFabrication, OrdreFabricationArchive, PosteDeTravail,
+)
+
+TAILLE_LOT = 5000
+ERREURS_MAX = 1000  # au-delà, les erreurs sont comptées sans être détaillées
+
+COLONNES = (
+    'numero_of', 'titre', 'quantite_a_produire', 'date_debut_prevu', 'date_fin_prevue',
+    'numero_phase', 'poste', 'titre_operation', 'type_operation', 'temps_prevu_minutes', 'machine',
+    'matiere', 'quantite_necessaire',
+)
+COLONNES_OBLIGATOIRES = ('numero_of', 'numero_phase')
+TYPES_OPERATION = {code for code, _ in Operation.TYPE_CHOICES}
+
+
+class ErreurImport(ValueError):
+    """Valeur invalide dans une ligne du fichier."""
+
+
+@dataclass
+class ErreurLigne:
+    ligne: int                  # numéro de ligne dans le fichier (en-tête = 1)
+    numero_of: str
+    message: str
+
+
+@dataclass
+class RapportImport:
+    lignes: int = 0
+    ofs: int = 0
+    operations: int = 0
+    matieres: int = 0
+    ofs_rejetes: int = 0
+    nombre_erreurs: int = 0
+    erreurs: List[ErreurLigne] = field(default_factory=list)
+    simulation: bool = False
+
+    def ajouter_erreur(self, ligne: int, numero_of: str, message: str) -> None:
+        self.nombre_erreurs += 1
+        if len(self.erreurs) < ERREURS_MAX:
+            self.erreurs.append(ErreurLigne(ligne, numero_of, message))
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# --- Lecture du fichier ------------------------------------------------------------
+
+def _normaliser(entete) -> str:
+    return str(entete or '').strip().lower().replace(' ', '_')
+
+
+def _decoder(contenu: bytes) -> str:
+    """Texte d'un CSV en UTF-8 (avec ou sans BOM), ou en Windows-1252 comme l'enregistre Excel."""
+    for encodage in ('utf-8-sig', 'cp1252'):
+        try:
+            return contenu.decode(encodage)
+        except UnicodeDecodeError:
+            pass
+    raise ErreurImport("Encodage du fichier non reconnu : CSV en UTF-8 ou Windows-1252 attendu.")
+
+
+def _lignes_csv(contenu: bytes) -> Iterator[Dict[str, str]]:
+    texte = io.StringIO(_decoder(contenu))
+    premiere = texte.readline()
+    texte.seek(0)
+    separateur = ';' if premiere.count(';') >= premiere.count(',') else ','
+    lecteur = csv.reader(texte, delimiter=separateur)
+    try:
+        entetes = [_normaliser(e) for e in next(lecteur, [])]
+        for valeurs in lecteur:
+            yield dict(zip(entetes, valeurs))
+    except csv.Error as e:
+        raise ErreurImport(f"Fichier CSV illisible (ligne {lecteur.line_num}) : {e}")
+
+
+def _lignes_xlsx(contenu: bytes) -> Iterator[Dict[str, object]]:
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+    # Archive ou XML corrompus : l'erreur levée dépend de la partie du classeur touchée
+    illisible = (zipfile.BadZipFile, InvalidFileException, SyntaxError, KeyError, ValueError, OSError)
+    try:
+        classeur = load_workbook(io.BytesIO(contenu), read_only=True, data_only=True)
+    except illisible as e:
+        raise ErreurImport(f"Fichier XLSX illisible : {e}")
+    try:
+        lignes = classeur.active.iter_rows(values_only=True)
+        entetes = [_normaliser(e) for e in next(lignes, ())]
+        for valeurs in lignes:
+            yield dict(zip(entetes, valeurs))
+    except illisible as e:
+        raise ErreurImport(f"Fichier XLSX illisible : {e}")
+    finally:
+        classeur.close()
+
+
+def lire_fichier(contenu: bytes, nom: str) -> Iterator[Dict[str, object]]:
+    """
+    Lignes du fichier (CSV séparé par ';' ou ',', ou XLSX) en dictionnaires {colonne: valeur}.
+    Un fichier illisible lève ErreurImport, dès l'appel s'il ne peut pas être ouvert.
+    """
+    if nom.lower().endswith('.xlsx'):
+        lignes = _lignes_xlsx(contenu)
+    elif nom.lower().endswith(('.csv', '.txt')):
+        lignes = _lignes_csv(contenu)
+    else:
+        raise ErreurImport("Format non pris en charge : fichier .csv ou .xlsx attendu.")
+    # Ouverture (décodage, archive XLSX) et en-têtes lus tout de suite, avant tout import
+    premiere = next(lignes, None)
+    return itertools.chain([] if premiere is None else [premiere], lignes)
+
+
+# --- Validation --------------------------------------------------------------------
+
+def _texte(valeur) -> str:
+    if valeur is None:
+        return ''
+    if isinstance(valeur, float) and valeur.is_integer():
+        valeur = int(valeur)
+    return str(valeur).strip()
+
+
+def _entier(valeur, colonne: str) -> Optional[int]:
+    texte = _texte(valeur)
+    if not texte:
+        return None
+    try:
+        return int(texte)
+    except ValueError:
+        raise ErreurImport(f"{colonne} : entier attendu ({texte}).")
+
+
+def _decimal(valeur, colonne: str) -> Optional[Decimal]:
+    texte = _texte(valeur).replace(',', '.')
+    if not texte:
+        return None
+    try:
+        return Decimal(texte)
+    except InvalidOperation:
+        raise ErreurImport(f"{colonne} : nombre attendu ({texte}).")
+
+
+def _date(valeur, colonne: str) -> Optional[date]:
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    texte = _texte(valeur)
+    if not texte:
+        return None
+    for format_date in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texte, format_date).date()
+        except ValueError:
+            continue
+    raise ErreurImport(f"{colonne} : date attendue au format AAAA-MM-JJ ou JJ/MM/AAAA ({texte}).")
+
+
+def _convertir(brute: Dict[str, object]) -> Dict[str, object]:
+    """Valeurs typées d'une ligne ; lève ErreurImport si une valeur est invalide."""
+    ligne = {
+        'numero_of': _texte(brute.get('numero_of')),
+        'titre': _texte(brute.get('titre')),
+        'quantite_a_produire': _entier(brute.get('quantite_a_produire'), 'quantite_a_produire'),
+        'date_debut_prevu': _date(brute.get('date_debut_prevu'), 'date_debut_prevu'),
+        'date_fin_prevue': _date(brute.get('date_fin_prevue'), 'date_fin_prevue'),
+        'numero_phase': _entier(brute.get('numero_phase'), 'numero_phase'),
+        'poste': _texte(brute.get('poste')),
+        'titre_operation': _texte(brute.get('titre_operation')),
+        'type_operation': _texte(brute.get('type_operation')).upper(),
+        'temps_prevu_minutes': _decimal(brute.get('temps_prevu_minutes'), 'temps_prevu_minutes'),
+        'machine': _texte(brute.get('machine')),
+        'matiere': _texte(brute.get('matiere')),
+        'quantite_necessaire': _decimal(brute.get('quantite_necessaire'), 'quantite_necessaire'),
+    }
+    for colonne in COLONNES_OBLIGATOIRES:
+        if ligne[colonne] in ('', None):
+            raise ErreurImport(f"{colonne} : valeur obligatoire.")
+    if ligne['type_operation'] and ligne['type_operation'] not in TYPES_OPERATION:
+        raise ErreurImport(f"type_operation : valeur inconnue ({ligne['type_operation']}).")
+    if ligne['matiere'] and not (ligne['quantite_necessaire'] and ligne['quantite_necessaire'] > 0):
+        raise ErreurImport("quantite_necessaire : quantité positive attendue pour la matière.")
+    return ligne
+
+
+class _References:
+    """Postes (par nom), machines (par nom) et matières (par référence), résolus une fois par lot."""
+
+    def __init__(self):
+        self.caches = {'poste': {}, 'machine': {}, 'matiere': {}}
+        self.modeles = {'poste': (PosteDeTravail, 'nom'), 'machine': (Machine, 'nom'), 'matiere': (MatierePremiere, 'reference')}
+
+    def charger(self, lignes: Iterable[Dict[str, object]]) -> None:
+        for cle, (modele, champ) in self.modeles.items():
+            cache = self.caches[cle]
+            manquants = {l[cle] for l in lignes if l[cle]} - set(cache)
+            if manquants:
+                cache.update(modele.objects.filter(**{f'{champ}__in': manquants}).values_list(champ, 'pk'))
+
+    def pk(self, cle: str, valeur: str) -> Optional[int]:
+        return self.caches[cle].get(valeur) if valeur else None
+
+
+# --- Import ------------------------------------------------------------------------
+
+def _lots(lignes: Iterable[Dict[str, object]], taille_lot: int) -> Iterator[List[Tuple[int, Dict[str, object]]]]:
+    """Lignes numérotées, par lots d'au moins `taille_lot` lignes qui ne coupent pas un OF."""
+    lot = []
+    for numero, brute in enumerate(lignes, start=2):
+        if not any(_texte(v) for v in brute.values()):
+            continue
+        if len(lot) >= taille_lot and _texte(brute.get('numero_of')) != _texte(lot[-1][1].get('numero_of')):
+            yield lot
+            lot = []
+        lot.append((numero, brute))
+    if lot:
+        yield lot
+
+
+def _importer_lot(lot, references: _References, deja_vus: set, rapport: RapportImport, simulation: bool) -> None:
+    # 1. Conversion et regroupement par OF, puis par phase
+    ofs: Dict[str, Dict] = {}
+    rejetes = set()
+    for numero, brute in lot:
+        numero_of = _texte(brute.get('numero_of'))
+        try:
+            ligne = _convertir(brute)
+        except ErreurImport as e:
+            rapport.ajouter_erreur(numero, numero_of, str(e))
+            rejetes.add(numero_of)
+            continue
+        ligne['numero'] = numero
+        ofs.setdefault(numero_of, {'lignes': []})['lignes'].append(ligne)
+    references.charger([l for of in ofs.values() for l in of['lignes']])
+
+    existants = set(OrdreFabrication.objects.filter(numero_of__in=list(ofs)).values_list('numero_of', flat=True))
+    existants |= set(OrdreFabricationArchive.objects.filter(numero_of__in=list(ofs)).values_list('numero_of', flat=True))
+
+    # 2. Validation des OFs complets
+    valides = []
+    for numero_of, of in ofs.items():
+        lignes = of['lignes']
+        premiere = lignes[0]
+        erreurs = []
+        if numero_of in existants:
+            erreurs.append((premiere['numero'], "OF déjà existant."))
+        elif numero_of in deja_vus:
+            erreurs.append((premiere['numero'], "OF déjà présent plus haut dans le fichier, dans un autre lot : ses lignes doivent se suivre."))
+        if not premiere['titre']:
+            erreurs.append((premiere['numero'], "titre : valeur obligatoire sur la première ligne de l'OF."))
+        if not premiere['quantite_a_produire'] or premiere['quantite_a_produire'] <= 0:
+            erreurs.append((premiere['numero'], "quantite_a_produire : quantité positive obligatoire sur la première ligne de l'OF."))
+        phases: Dict[int, Dict] = {}
+        for ligne in lignes:
+            phase = phases.get(ligne['numero_phase'])
+            if phase is None:
+                phase = phases[ligne['numero_phase']] = {'ligne': ligne, 'matieres': {}}
+                if references.pk('poste', ligne['poste']) is None:
+                    erreurs.append((ligne['numero'], f"poste : inconnu ({ligne['poste'] or 'vide'})."))
+                if ligne['machine'] and references.pk('machine', ligne['machine']) is None:
+                    erreurs.append((ligne['numero'], f"machine : inconnue ({ligne['machine']})."))
+            if ligne['matiere']:
+                matiere_id = references.pk('matiere', ligne['matiere'])
+                if matiere_id is None:
+                    erreurs.append((ligne['numero'], f"matiere : référence inconnue ({ligne['matiere']})."))
+                elif matiere_id in phase['matieres']:
+                    erreurs.append((ligne['numero'], f"matiere : {ligne['matiere']} déjà indiquée pour la phase {ligne['numero_phase']}."))
+                else:
+                    phase['matieres'][matiere_id] = ligne['quantite_necessaire']
+        deja_vus.add(numero_of)
+        for numero, message in erreurs:
+            rapport.ajouter_erreur(numero, numero_of, message)
+        if erreurs or numero_of in rejetes:
+            rejetes.add(numero_of)
+        else:
+            valides.append((premiere, phases))
+    rapport.ofs_rejetes += len(rejetes)
+    if simulation or not valides:
+        rapport.ofs += len(valides)
+        rapport.operations += sum(len(phases) for _, phases in valides)
+        rapport.matieres += sum(len(p['matieres']) for _, phases in valides for p in phases.values())
+        return
+
+    # 3. Insertion en masse
+    ofs, gammes = [], []
+    for premiere, phases in valides:
+        ofs.append(OrdreFabrication(
+            numero_of=premiere['numero_of'], titre=premiere['titre'], quantite_a_produire=premiere['quantite_a_produire'],
+            date_debut_prevu=premiere['date_debut_prevu'], date_fin_prevue=premiere['date_fin_prevue'],
+        ))
+        gamme = []
+        for numero_phase in sorted(phases):
+            ligne = phases[numero_phase]['ligne']
+            gamme.append((Operation(
+                numero_phase=numero_phase, poste_id=references.pk('poste', ligne['poste']),
+                titre=ligne['titre_operation'] or f'Phase {numero_phase}',
+                type_operation=ligne['type_operation'] or 'PRODUCTION',
+                temps_prevu_minutes=ligne['temps_prevu_minutes'] or 0,
+                machine_assignee_id=references.pk('machine', ligne['machine']),
+            ), phases[numero_phase]['matieres']))
+        gammes.append(gamme)
+    try:
+        resultat = inserer_ofs(ofs, gammes)
+    except ErreurGamme as e:
+        # Un OF du lot a été créé par ailleurs depuis la validation : le lot n'est pas écrit
+        for premiere, _ in valides:
+            rapport.ajouter_erreur(premiere['numero'], premiere['numero_of'], str(e))
+        rapport.ofs_rejetes += len(valides)
+        return
+    rapport.ofs += len(resultat.ofs)
+    rapport.operations += len(resultat.operations)
+    rapport.matieres += resultat.matieres
+
+
+def importer_ofs(lignes: Iterable[Dict[str, object]], taille_lot: int = TAILLE_LOT, simulation: bool = False) -> RapportImport:
+    """
+    Importe les OFs décrits par `lignes` (dictionnaires {colonne: valeur}, voir COLONNES).
+    En `simulation`, valide tout le fichier sans rien écrire.
+    """
+    rapport = RapportImport(simulation=simulation)
+    references, deja_vus = _References(), set()
+    for lot in _lots(lignes, taille_lot):
+        rapport.lignes += len(lot)
+        _importer_lot(lot, references, deja_vus, rapport, simulation)
+    return rapport
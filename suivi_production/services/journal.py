@@ -0,0 +1,166 @@
+"""
+Journal des événements de production et projections rejouables.
+
+Chaque changement d'état de l'atelier (pointage démarré ou terminé, opération
+terminée, phase suivante débloquée, stock consommé, anomalie signalée, statut d'OF)
+ajoute un Evenement dans la transaction même de la modification : si elle est annulée,
+l'événement l'est aussi. Le journal n'est jamais modifié ni purgé.
+
+Une projection construit un modèle de lecture à partir du journal. Elle garde la
+position du dernier événement appliqué (PositionProjection) et ne consomme ensuite que
+les suivants, par lots, chaque lot et l'avancée de la position étant validés ensemble.
+`rejouer` vide le modèle de lecture, remet la position à zéro et reprend tout le
+journal : le résultat est le même qu'une consommation au fil de l'eau.
+
+Les identifiants sont attribués à l'insertion mais visibles au commit : un événement
+peut apparaître après un identifiant plus grand, et une position en identifiants le
+sauterait. Chaque événement porte donc le numéro de la transaction qui l'a écrit et
+les projections le consomment dans l'ordre (numero_transaction, identifiant). Sous
+PostgreSQL, seuls les événements des transactions plus anciennes que la plus ancienne
+encore en cours (xmin de l'instantané) sont lus : toute transaction qui validera plus
+tard a un numéro plus grand, rien ne peut plus s'insérer derrière la position. Une
+transaction longue, même sans événement, retarde les projections sans rien faire
+perdre. SQLite valide les écritures une à une : l'ordre des identifiants y est celui
+des commits.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import F, Q, QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from ..models import ActiviteJournaliere, ConsommationMatiere, Evenement, PositionProjection
+
+TAILLE_LOT = 1000
+
+
+def publier(type_evenement: str, ordre_fabrication_id: Optional[int] = None, operation_id: Optional[int] = None,
+            **donnees) -> Evenement:
+    """Ajoute un événement au journal. À appeler dans la transaction de la modification décrite."""
+    return Evenement.objects.create(
+        type=type_evenement, ordre_fabrication_id=ordre_fabrication_id, operation_id=operation_id, donnees=donnees,
+    )
+
+
+# --- Projections -------------------------------------------------------------------
+
+class Projection:
+    """Modèle de lecture alimenté par le journal : `appliquer` doit être additif et sans effet de bord externe."""
+    nom = ''
+    types = ()
+
+    def vider(self) -> None:
+        raise NotImplementedError
+
+    def appliquer(self, evenements: List[Evenement]) -> None:
+        raise NotImplementedError
+
+
+def _cumuler(modele, cle_champs, cumuls: Dict[tuple, Dict[str, object]]) -> None:
+    """Ajoute `cumuls` ({clé: {champ: incrément}}) aux lignes de `modele`, créées au besoin."""
+    modele.objects.bulk_create(
+        [modele(**dict(zip(cle_champs, cle))) for cle in cumuls], batch_size=TAILLE_LOT, ignore_conflicts=True,
+    )
+    for cle, increments in cumuls.items():
+        modele.objects.filter(**dict(zip(cle_champs, cle))).update(
+            **{champ: F(champ) + valeur for champ, valeur in increments.items() if valeur}
+        )
+
+
+class ActiviteJournaliereProjection(Projection):
+    nom = 'activite_journaliere'
+    types = ('POINTAGE_DEMARRE', 'POINTAGE_TERMINE', 'OPERATION_TERMINEE', 'PHASE_DEBLOQUEE', 'ANOMALIE_SIGNALEE')
+
+    def vider(self):
+        ActiviteJournaliere.objects.all().delete()
+
+    def appliquer(self, evenements):
+        cumuls = defaultdict(lambda: defaultdict(int))
+        for e in evenements:
+            d = e.donnees
+            ligne = cumuls[(timezone.localdate(e.horodatage), d['poste_id'])]
+            if e.type == 'POINTAGE_DEMARRE':
+                ligne['pointages_demarres'] += 1
+            elif e.type == 'POINTAGE_TERMINE':
+                ligne['pointages_termines'] += 1
+                ligne['pieces_bonnes'] += d['quantite_fabriquee']
+                ligne['pieces_rebut'] += d['quantite_rebut']
+            elif e.type == 'OPERATION_TERMINEE':
+                ligne['operations_terminees'] += 1
+            elif e.type == 'PHASE_DEBLOQUEE':
+                ligne['phases_debloquees'] += 1
+            else:
+                ligne['anomalies'] += 1
+        _cumuler(ActiviteJournaliere, ('jour', 'poste_id'), cumuls)
+
+
+class ConsommationMatiereProjection(Projection):
+    nom = 'consommation_matiere'
+    types = ('STOCK_CONSOMME',)
+
+    def vider(self):
+        ConsommationMatiere.objects.all().delete()
+
+    def appliquer(self, evenements):
+        cumuls = defaultdict(lambda: defaultdict(int))
+        for e in evenements:
+            ligne = cumuls[(timezone.localdate(e.horodatage), e.donnees['matiere_id'])]
+            ligne['quantite'] += Decimal(e.donnees['quantite'])
+            ligne['nombre_consommations'] += 1
+        _cumuler(ConsommationMatiere, ('jour', 'matiere_id'), cumuls)
+
+
+PROJECTIONS = {p.nom: p for p in (ActiviteJournaliereProjection(), ConsommationMatiereProjection())}
+
+
+def _projections(noms: Optional[Iterable[str]]) -> List[Projection]:
+    inconnues = set(noms or ()) - set(PROJECTIONS)
+    if inconnues:
+        raise ValueError(f"Projection inconnue : {', '.join(sorted(inconnues))}")
+    return [PROJECTIONS[nom] for nom in (noms or PROJECTIONS)]
+
+
+def _definitifs(evenements: QuerySet) -> QuerySet:
+    """Événements des transactions terminées avant la plus ancienne encore en cours."""
+    if connection.vendor != 'postgresql':
+        return evenements
+    return evenements.filter(
+        numero_transaction__lt=RawSQL('pg_snapshot_xmin(pg_current_snapshot())::text::bigint', []),
+    )
+
+
+def projeter(noms: Optional[Iterable[str]] = None, taille_lot: int = TAILLE_LOT) -> Dict[str, int]:
+    """Applique aux projections les événements publiés depuis leur position. Renvoie {nom: événements lus}."""
+    lus = {}
+    for projection in _projections(noms):
+        lus[projection.nom] = 0
+        while True:
+            with transaction.atomic():
+                position, _ = PositionProjection.objects.get_or_create(nom=projection.nom)
+                position = PositionProjection.objects.select_for_update().get(pk=projection.nom)
+                evenements = list(_definitifs(Evenement.objects.filter(
+                    Q(numero_transaction__gt=position.numero_transaction)
+                    | Q(numero_transaction=position.numero_transaction, pk__gt=position.position)
+                )).order_by('numero_transaction', 'pk')[:taille_lot])
+                if not evenements:
+                    break
+                projection.appliquer([e for e in evenements if e.type in projection.types])
+                position.numero_transaction, position.position = evenements[-1].numero_transaction, evenements[-1].pk
+                position.save()
+            lus[projection.nom] += len(evenements)
+    return lus
+
+
+def rejouer(noms: Optional[Iterable[str]] = None, taille_lot: int = TAILLE_LOT) -> Dict[str, int]:
+    """Reconstruit les projections depuis le début du journal."""
+    projections = _projections(noms)
+    with transaction.atomic():
+        for projection in projections:
+            projection.vider()
+            PositionProjection.objects.update_or_create(nom=projection.nom,
+                                                        defaults={'numero_transaction': 0, 'position': 0})
+    return projeter([p.nom for p in projections], taille_lot)
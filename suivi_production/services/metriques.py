@@ -0,0 +1,101 @@
+"""
+Métriques de requêtes HTTP en mémoire, exposées au format texte Prometheus.
+
+Pour chaque nom d'URL, on tient trois histogrammes à seaux fixes : durée de la
+requête, nombre de requêtes SQL et temps SQL cumulé. Les valeurs sont propres à
+chaque processus (un worker gunicorn = un jeu de compteurs) ; Prometheus agrège.
+"""
+from __future__ import annotations
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+SEAUX_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SEAUX_SQL = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogramme:
+    __slots__ = ('seaux', 'comptes', 'somme', 'total')
+
+    def __init__(self, seaux: Tuple[float, ...]):
+        self.seaux = seaux
+        self.comptes = [0] * (len(seaux) + 1)  # dernier seau : +Inf
+        self.somme = 0.0
+        self.total = 0
+
+    def observer(self, valeur: float) -> None:
+        self.comptes[bisect_left(self.seaux, valeur)] += 1
+        self.somme += valeur
+        self.total += 1
+
+    def lignes(self, nom: str, etiquettes: str) -> List[str]:
+        lignes, cumul = [], 0
+        for borne, compte in zip(self.seaux, self.comptes):
+            cumul += compte
+            lignes.append(f'{nom}_bucket{{{etiquettes},le="{borne}"}} {cumul}')
+        lignes.append(f'{nom}_bucket{{{etiquettes},le="+Inf"}} {self.total}')
+        lignes.append(f'{nom}_sum{{{etiquettes}}} {self.somme:.6f}')
+        lignes.append(f'{nom}_count{{{etiquettes}}} {self.total}')
+        return lignes
+
+
+class _MetriquesVue:
+    __slots__ = ('duree', 'sql_requetes', 'sql_duree', 'codes')
+
+    def __init__(self):
+        self.duree = Histogramme(SEAUX_DUREE)
+        self.sql_requetes = Histogramme(SEAUX_SQL)
+        self.sql_duree = Histogramme(SEAUX_DUREE)
+        self.codes: Dict[int, int] = {}
+
+
+FAMILLES = (
+    ('gmao_requete_duree_secondes', 'duree', "Durée de traitement des requêtes HTTP, par vue."),
+    ('gmao_requete_sql_nombre', 'sql_requetes', "Nombre de requêtes SQL émises par requête HTTP, par vue."),
+    ('gmao_requete_sql_duree_secondes', 'sql_duree', "Temps passé en SQL par requête HTTP, par vue."),
+)
+
+
+def _echapper(valeur: str) -> str:
+    return valeur.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registre:
+    """Métriques de toutes les vues d'un processus. Thread-safe (un verrou par écriture)."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._vues: Dict[str, _MetriquesVue] = {}
+
+    def enregistrer(self, vue: str, code: int, duree: float, sql_requetes: int, sql_duree: float) -> None:
+        with self._verrou:
+            metriques = self._vues.get(vue)
+            if metriques is None:
+                metriques = self._vues[vue] = _MetriquesVue()
+            metriques.duree.observer(duree)
+            metriques.sql_requetes.observer(sql_requetes)
+            metriques.sql_duree.observer(sql_duree)
+            metriques.codes[code] = metriques.codes.get(code, 0) + 1
+
+    def reinitialiser(self) -> None:
+        with self._verrou:
+            self._vues.clear()
+
+    def exposer(self) -> str:
+        """Rendu au format d'exposition texte de Prometheus (version 0.0.4)."""
+        with self._verrou:
+            vues = sorted(self._vues.items())
+            lignes = []
+            for nom, attribut, aide in FAMILLES:
+                lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} histogram']
+                for vue, metriques in vues:
+                    lignes += getattr(metriques, attribut).lignes(nom, f'vue="{_echapper(vue)}"')
+            lignes += ['# HELP gmao_reponses_total Réponses HTTP par vue et code de statut.',
+                       '# TYPE gmao_reponses_total counter']
+            for vue, metriques in vues:
+                for code, compte in sorted(metriques.codes.items()):
+                    lignes.append(f'gmao_reponses_total{{vue="{_echapper(vue)}",code="{code}"}} {compte}')
+        return '\n'.join(lignes) + '\n'
+
+
+REGISTRE = Registre()
@@ -0,0 +1,179 @@
+"""
+Partitionnement mensuel de la table des pointages (PostgreSQL uniquement).
+
+La table `suivi_production_pointage` peut être convertie en table partitionnée
+par plage sur `heure_debut`, avec une partition par mois et une partition par
+défaut. Les requêtes filtrées par plage sur `heure_debut` (voir
+PointageQuerySet.debutes_le / termines_le) ne lisent alors que les mois concernés.
+Les index déclarés sur Pointage (Meta.indexes) sont recréés sur la table partitionnée
+et donc sur chacune de ses partitions. Sous SQLite, ce module ne fait rien.
+"""
+from __future__ import annotations
+from datetime import date
+from typing import List, Optional, Tuple
+
+from django.db import connection, transaction
+
+from ..models import Pointage
+
+TABLE = Pointage._meta.db_table
+TABLE_ANCIENNE = f'{TABLE}_ancien'
+SEQUENCE = f'{TABLE}_part_id_seq'
+PARTITION_DEFAUT = f'{TABLE}_defaut'
+
+
+def _nom_partition(mois: date) -> str:
+    return f'{TABLE}_p{mois.year:04d}_{mois.month:02d}'
+
+
+def _mois_partition(nom: str) -> Optional[date]:
+    """Mois d'une partition d'après son nom (voir _nom_partition), None pour les autres tables."""
+    if not nom.startswith(f'{TABLE}_p'):
+        return None
+    try:
+        annee, mois = nom[len(TABLE) + 2:].split('_')
+        return date(int(annee), int(mois), 1)
+    except ValueError:
+        return None
+
+
+def _mois_suivant(mois: date) -> date:
+    return date(mois.year + (mois.month == 12), mois.month % 12 + 1, 1)
+
+
+def ajouter_mois(mois: date, n: int) -> date:
+    index = mois.year * 12 + mois.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def est_disponible() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def est_partitionne() -> bool:
+    if not est_disponible():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def lister_partitions() -> List[Tuple[str, date]]:
+    """Partitions mensuelles attachées, sous forme (nom, premier jour du mois), triées."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [TABLE],
+        )
+        noms = [row[0] for row in cursor.fetchall()]
+    # La partition par défaut n'a pas de mois
+    partitions = [(nom, _mois_partition(nom)) for nom in noms if _mois_partition(nom)]
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def _creer_partition(cursor, mois: date) -> None:
+    """
+    Crée la partition du mois. Les lignes du mois déjà tombées dans la partition par
+    défaut (pointages saisis avant la création de leur partition) y sont déplacées :
+    PostgreSQL refuse sinon la nouvelle partition.
+    """
+    nom = _nom_partition(mois)
+    cursor.execute('SELECT to_regclass(%s)', [f'"{nom}"'])
+    if cursor.fetchone()[0] is not None:
+        return
+    debut, fin = f'{mois.isoformat()} 00:00:00+00', f'{_mois_suivant(mois).isoformat()} 00:00:00+00'
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM "{PARTITION_DEFAUT}" WHERE heure_debut >= %s AND heure_debut < %s)',
+        [debut, fin],
+    )
+    a_deplacer = cursor.fetchone()[0]
+    if a_deplacer:
+        cursor.execute(f'CREATE TEMPORARY TABLE "{nom}_transit" (LIKE "{TABLE}") ON COMMIT DROP')
+        cursor.execute(
+            f'WITH deplacees AS (DELETE FROM "{PARTITION_DEFAUT}" WHERE heure_debut >= %s AND heure_debut < %s RETURNING *) '
+            f'INSERT INTO "{nom}_transit" SELECT * FROM deplacees',
+            [debut, fin],
+        )
+    cursor.execute(f'CREATE TABLE "{nom}" PARTITION OF "{TABLE}" FOR VALUES FROM (\'{debut}\') TO (\'{fin}\')')
+    if a_deplacer:
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{nom}_transit"')
+        cursor.execute(f'DROP TABLE "{nom}_transit"')
+
+
+def creer_partitions(jusqu_a: date, depuis: date = None) -> List[str]:
+    """Crée les partitions mensuelles manquantes de `depuis` (mois courant par défaut) à `jusqu_a` inclus."""
+    mois = (depuis or date.today()).replace(day=1)
+    existantes = {m for _, m in lister_partitions()}
+    creees = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        while mois <= jusqu_a:
+            if mois not in existantes:
+                _creer_partition(cursor, mois)
+                creees.append(_nom_partition(mois))
+            mois = _mois_suivant(mois)
+    return creees
+
+
+def detacher_partitions(avant: date) -> List[str]:
+    """
+    Détache les partitions dont le mois se termine avant `avant`. Les tables détachées
+    sont conservées telles quelles (à sauvegarder ou supprimer par l'exploitant).
+    """
+    detachees = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for nom, mois in lister_partitions():
+            if _mois_suivant(mois) <= avant:
+                cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{nom}"')
+                detachees.append(nom)
+    return detachees
+
+
+def convertir_en_partitions(mois_avance: int = 3) -> int:
+    """
+    Convertit la table des pointages en table partitionnée par mois sur `heure_debut`.
+    Les lignes existantes sont recopiées ; retourne leur nombre.
+    La clé primaire devient (id, heure_debut), comme l'exige PostgreSQL. Les index de
+    Pointage._meta.indexes sont recréés après la suppression de l'ancienne table, qui
+    en porte les noms jusque-là.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{TABLE_ANCIENNE}"')
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}"')
+        cursor.execute(f'SELECT setval(%s, COALESCE((SELECT max(id) FROM "{TABLE_ANCIENNE}"), 0) + 1, false)', [SEQUENCE])
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{TABLE_ANCIENNE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (heure_debut)'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}".id')
+        # L'ancienne table garde le nom de contrainte "<table>_pkey" jusqu'à sa suppression
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_part_pkey" PRIMARY KEY (id, heure_debut)')
+        for colonne, cible in (('operation_id', 'suivi_production_operation'), ('operateur_id', 'suivi_production_operateur')):
+            cursor.execute(
+                f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_{colonne}_fk" FOREIGN KEY ({colonne}) '
+                f'REFERENCES "{cible}" (id) DEFERRABLE INITIALLY DEFERRED'
+            )
+            cursor.execute(f'CREATE INDEX "{TABLE}_{colonne}_idx" ON "{TABLE}" ({colonne})')
+        cursor.execute(f'CREATE TABLE "{PARTITION_DEFAUT}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'SELECT min(heure_debut) FROM "{TABLE_ANCIENNE}"')
+        premier = cursor.fetchone()[0]
+        mois = (premier.date() if premier else date.today()).replace(day=1)
+        fin = ajouter_mois(date.today().replace(day=1), mois_avance)
+        while mois <= fin:
+            _creer_partition(cursor, mois)
+            mois = _mois_suivant(mois)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{TABLE_ANCIENNE}"')
+        copiees = cursor.rowcount
+        cursor.execute(f'DROP TABLE "{TABLE_ANCIENNE}"')
+        with connection.schema_editor() as editeur:
+            for index in Pointage._meta.indexes:
+                editeur.add_index(Pointage, index)
+    return copiees
@@ -0,0 +1,122 @@
+"""
+Production finale : pièces sorties de la dernière phase des OFs, sur une période.
+
+Une pièce est produite quand elle sort de la dernière phase de son OF. Les pointages
+clôturés dans la période sont filtrés en une seule requête : une sous-requête corrélée
+lit le numéro de la dernière phase de l'OF (index unique (ordre_fabrication,
+numero_phase)) au lieu d'un agrégat par pointage. Les bornes de la période portent sur
+heure_fin et heure_debut, comme PointageQuerySet.termines_le, pour servir les index et
+l'élagage des partitions mensuelles.
+
+Les OFs archivés restent comptés : la même requête est faite sur les pointages et
+opérations d'archive. Chaque source est groupée par la base (une ligne par OF, jour ou
+poste) ; les deux groupements sont ensuite fusionnés, classés par pièces bonnes (rang
+à ex aequo, comme la fonction fenêtre Rank) et paginés.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, asdict
+from datetime import date
+from typing import Dict, List, Type
+
+from django.db import models
+from django.db.models import Count, OuterRef, QuerySet, Subquery, Sum
+from django.db.models.functions import TruncDate
+
+from ..models import Operation, OperationArchive, Pointage, PointageArchive, bornes_jour
+
+# groupe -> (colonnes du GROUP BY, colonne de la clé, colonne du libellé)
+GROUPES = {
+    'of': (('operation__ordre_fabrication_id', 'operation__ordre_fabrication__numero_of',
+            'operation__ordre_fabrication__titre'), 'operation__ordre_fabrication_id', 'operation__ordre_fabrication__numero_of'),
+    'jour': (('jour',), 'jour', 'jour'),
+    'poste': (('operation__poste_id', 'operation__poste__nom'), 'operation__poste_id', 'operation__poste__nom'),
+}
+LIGNES_PAR_PAGE = 50
+# (pointages, opérations) en production puis archivés
+SOURCES = ((Pointage, Operation), (PointageArchive, OperationArchive))
+CUMULS = ('pointages', 'pieces_bonnes', 'pieces_rebut')
+
+
+@dataclass
+class LigneProduction:
+    cle: object
+    libelle: str
+    pointages: int
+    pieces_bonnes: int
+    pieces_rebut: int
+    taux_rebut: float
+    rang: int
+    titre: str = ''
+    archive: bool = False
+
+    def as_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def pointages_finaux(debut: date, fin: date, pointages: Type[models.Model] = Pointage,
+                     operations: Type[models.Model] = Operation) -> QuerySet:
+    """
+    Pointages clôturés entre `debut` et `fin` (inclus) sur la dernière phase de leur OF,
+    parmi `pointages` (PointageArchive avec OperationArchive pour les OFs archivés).
+    """
+    derniere_phase = (
+        operations.objects.filter(ordre_fabrication_id=OuterRef('operation__ordre_fabrication_id'))
+        .order_by('-numero_phase').values('numero_phase')[:1]
+    )
+    debut_periode, fin_periode = bornes_jour(debut)[0], bornes_jour(fin)[1]
+    return pointages.objects.filter(
+        heure_fin__gte=debut_periode, heure_fin__lt=fin_periode, heure_debut__lt=fin_periode,
+        operation__numero_phase=Subquery(derniere_phase),
+    )
+
+
+def production_finale(debut: date, fin: date, groupe: str = 'of') -> List[Dict[str, object]]:
+    """Lignes groupées (valeurs) de la production finale, OFs archivés compris, de la plus forte à la plus faible."""
+    colonnes, cle, _ = GROUPES[groupe]
+    fusion = {}
+    for pointages, operations in SOURCES:
+        qs = pointages_finaux(debut, fin, pointages, operations)
+        if groupe == 'jour':
+            qs = qs.annotate(jour=TruncDate('heure_fin'))
+        qs = qs.order_by().values(*colonnes).annotate(
+            pointages=Count('id'), pieces_bonnes=Sum('quantite_fabriquee'), pieces_rebut=Sum('quantite_rebut'),
+        )
+        for v in qs:
+            ligne = fusion.setdefault(v[cle], dict(v, **{c: 0 for c in CUMULS}, archive=pointages is PointageArchive))
+            for champ in CUMULS:
+                ligne[champ] += v[champ] or 0
+    valeurs = sorted(fusion.values(), key=lambda v: -v['pieces_bonnes'])
+    for i, v in enumerate(valeurs):
+        precedente = valeurs[i - 1] if i else None
+        v['rang'] = precedente['rang'] if precedente and precedente['pieces_bonnes'] == v['pieces_bonnes'] else i + 1
+    # Les jours se lisent dans l'ordre du calendrier, le reste par volume
+    if groupe == 'jour':
+        return sorted(valeurs, key=lambda v: v['jour'])
+    return sorted(valeurs, key=lambda v: (v['rang'], v[colonnes[1]]))
+
+
+def lignes(valeurs, groupe: str) -> List[LigneProduction]:
+    """LigneProduction des valeurs d'une page de `production_finale`."""
+    _, cle, libelle = GROUPES[groupe]
+    resultat = []
+    for v in valeurs:
+        total = (v['pieces_bonnes'] or 0) + (v['pieces_rebut'] or 0)
+        resultat.append(LigneProduction(
+            cle=v[cle], libelle=str(v[libelle]), pointages=v['pointages'], pieces_bonnes=v['pieces_bonnes'] or 0,
+            pieces_rebut=v['pieces_rebut'] or 0, taux_rebut=round((v['pieces_rebut'] or 0) * 100 / total, 1) if total else 0.0,
+            rang=v['rang'], titre=v.get('operation__ordre_fabrication__titre', ''), archive=v['archive'],
+        ))
+    return resultat
+
+
+def totaux(debut: date, fin: date) -> Dict[str, int]:
+    """Totaux de la période ; un OF est soit en production, soit archivé : les OFs distincts s'additionnent."""
+    resultat = dict.fromkeys(CUMULS + ('ofs',), 0)
+    for pointages, operations in SOURCES:
+        cumuls = pointages_finaux(debut, fin, pointages, operations).aggregate(
+            pointages=Count('id'), pieces_bonnes=Sum('quantite_fabriquee'), pieces_rebut=Sum('quantite_rebut'),
+            ofs=Count('operation__ordre_fabrication_id', distinct=True),
+        )
+        for champ, valeur in cumuls.items():
+            resultat[champ] += valeur or 0
+    return resultat
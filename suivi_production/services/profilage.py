@@ -0,0 +1,163 @@
+"""
+Profilage par échantillonnage des requêtes lentes.
+
+Un thread d'échantillonnage relève périodiquement la pile Python des threads qui
+traitent une requête (sys._current_frames). À la fin de la requête, les piles
+relevées sont conservées si la requête a dépassé le seuil de latence, ou si sa vue
+fait partie des vues tirées au sort ; sinon elles sont jetées.
+
+Les piles conservées sont ajoutées au format "collapsed" (une ligne
+"cadre;cadre;cadre nombre", lisible par flamegraph.pl ou speedscope) dans un
+fichier par vue. Chaque fichier tourne quand il dépasse une taille maximale.
+"""
+from __future__ import annotations
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+EXTENSION = '.folded'
+
+
+def _nom_cadre(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def pile_repliee(frame) -> str:
+    """Pile d'appels de `frame`, de la racine vers le cadre courant, au format collapsed."""
+    cadres = []
+    while frame is not None:
+        cadres.append(_nom_cadre(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(cadres))
+
+
+class Echantillonneur:
+    """
+    Thread unique par processus, démarré à la première requête suivie. Il ne tourne
+    que tant qu'au moins une requête est en cours de suivi.
+    """
+
+    def __init__(self, intervalle: float):
+        self.intervalle = intervalle
+        self._verrou = threading.Lock()
+        self._suivis: Dict[int, Counter] = {}
+        self._reveil = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def debuter(self, thread_id: int) -> None:
+        with self._verrou:
+            self._suivis[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._boucle, name='profilage-echantillonneur', daemon=True)
+                self._thread.start()
+        self._reveil.set()
+
+    def terminer(self, thread_id: int) -> Counter:
+        with self._verrou:
+            return self._suivis.pop(thread_id, Counter())
+
+    def _boucle(self) -> None:
+        while True:
+            with self._verrou:
+                if not self._suivis:
+                    self._reveil.clear()
+            self._reveil.wait()
+            time.sleep(self.intervalle)
+            frames = sys._current_frames()
+            with self._verrou:
+                for thread_id, piles in self._suivis.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        piles[pile_repliee(frame)] += 1
+            del frames
+
+
+# --- Stockage sur disque -------------------------------------------------------
+
+_VUE_INVALIDE = re.compile(r'[^\w.-]')
+
+
+def _fichier(repertoire: Path, vue: str) -> Path:
+    return Path(repertoire) / (_VUE_INVALIDE.sub('_', vue) + EXTENSION)
+
+
+def _tourner(fichier: Path, rotations: int) -> None:
+    for i in range(rotations - 1, 0, -1):
+        ancien = fichier.with_name(f'{fichier.name}.{i}')
+        if ancien.exists():
+            os.replace(ancien, fichier.with_name(f'{fichier.name}.{i + 1}'))
+    if rotations:
+        os.replace(fichier, fichier.with_name(f'{fichier.name}.1'))
+    else:
+        fichier.unlink()
+
+
+def enregistrer_piles(repertoire: Path, vue: str, piles: Counter, taille_max: int, rotations: int) -> None:
+    """Ajoute les piles d'une requête au fichier de la vue, en une seule écriture."""
+    if not piles:
+        return
+    Path(repertoire).mkdir(parents=True, exist_ok=True)
+    fichier = _fichier(repertoire, vue)
+    try:
+        if fichier.stat().st_size >= taille_max:
+            _tourner(fichier, rotations)
+    except FileNotFoundError:
+        pass
+    bloc = ''.join(f'{pile} {nombre}\n' for pile, nombre in piles.items())
+    with open(fichier, 'a', encoding='utf-8') as f:
+        f.write(bloc)
+
+
+@dataclass
+class ProfilVue:
+    vue: str
+    echantillons: int
+    taille: int
+    modifie_le: datetime
+
+
+def _fichiers_vue(repertoire: Path, vue: str) -> List[Path]:
+    fichier = _fichier(repertoire, vue)
+    return [f for f in [fichier, *sorted(fichier.parent.glob(fichier.name + '.*'))] if f.exists()]
+
+
+def agreger_piles(repertoire: Path, vue: str) -> Counter:
+    """Piles cumulées d'une vue (fichier courant et rotations)."""
+    piles = Counter()
+    for fichier in _fichiers_vue(repertoire, vue):
+        with open(fichier, encoding='utf-8') as f:
+            for ligne in f:
+                pile, _, nombre = ligne.rstrip('\n').rpartition(' ')
+                if pile and nombre.isdigit():
+                    piles[pile] += int(nombre)
+    return piles
+
+
+def lister_profils(repertoire: Path) -> List[ProfilVue]:
+    repertoire = Path(repertoire)
+    if not repertoire.is_dir():
+        return []
+    profils = []
+    for fichier in sorted(repertoire.glob('*' + EXTENSION)):
+        vue = fichier.name[:-len(EXTENSION)]
+        fichiers = _fichiers_vue(repertoire, vue)
+        profils.append(ProfilVue(
+            vue=vue,
+            echantillons=sum(agreger_piles(repertoire, vue).values()),
+            taille=sum(f.stat().st_size for f in fichiers),
+            modifie_le=datetime.fromtimestamp(max(f.stat().st_mtime for f in fichiers)),
+        ))
+    return profils
+
+
+def exporter_piles(piles: Counter) -> str:
+    return ''.join(f'{pile} {nombre}\n' for pile, nombre in piles.most_common())
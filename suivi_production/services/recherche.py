@@ -0,0 +1,142 @@
+"""
+Recherche indexée des Ordres de Fabrication sur `numero_of` et `titre`.
+
+Selon le moteur de base de données :
+- PostgreSQL : filtre ILIKE servi par l'index GIN trigramme, classement par word_similarity ;
+- SQLite : table FTS5 (tokenizer trigram) tenue à jour par triggers, classement bm25 ;
+- sinon (ou pour les termes trop courts) : repli sur icontains, sans classement.
+
+Les résultats sont paginés par curseur (rang, pk) : le coût d'une page ne dépend pas
+de sa position dans la liste. Le rang est arrondi en entier dans la requête elle-même
+(ECHELLE_RANG) : le curseur garde la valeur exacte comparée par la base, sans
+aller-retour d'un flottant (float4 sous PostgreSQL) qui sauterait ou répéterait des
+ex æquo en limite de page.
+"""
+from __future__ import annotations
+import base64
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import BigIntegerField, BooleanField, FloatField, Func, Q, QuerySet, Value
+from django.db.models.functions import Cast, Round
+from django.db.models.expressions import RawSQL
+
+# Le tokenizer trigram (FTS5 comme pg_trgm) n'indexe pas les termes plus courts
+LONGUEUR_MIN_TERME = 3
+# Précision du rang entier : 6 décimales, au-delà de celle d'un float4
+ECHELLE_RANG = 1_000_000
+
+
+@dataclass
+class PageRecherche:
+    resultats: List
+    curseur_suivant: Optional[str]
+
+
+class _ILike(Func):
+    arg_joiner = ' ILIKE '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+
+def encoder_curseur(rang: int, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{rang}:{pk}".encode()).decode()
+
+
+def decoder_curseur(curseur: str) -> Optional[Tuple[int, int]]:
+    """Retourne (rang, pk) ou None si le curseur est absent ou invalide."""
+    if not curseur:
+        return None
+    try:
+        rang, pk = base64.urlsafe_b64decode(curseur.encode()).decode().split(':')
+        return int(rang), int(pk)
+    except Exception:
+        return None
+
+
+def _table_fts(model) -> Optional[str]:
+    """Nom de la table FTS5 associée au modèle, si elle existe (SQLite uniquement)."""
+    if connection.vendor != 'sqlite':
+        return None
+    nom = f"{model._meta.db_table}_fts"
+    return nom if nom in connection.introspection.table_names() else None
+
+
+def _echapper_like(terme: str) -> str:
+    return terme.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def annoter_recherche(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Filtre `queryset` sur les termes de `query` et annote `rang`, entier (plus grand =
+    plus pertinent).
+    """
+    termes = query.split()
+    indexables = [t for t in termes if len(t) >= LONGUEUR_MIN_TERME]
+    table = queryset.model._meta.db_table
+    qs = queryset
+    rang = Value(0.0, output_field=FloatField())
+
+    fts = _table_fts(queryset.model) if indexables else None
+    if indexables and connection.vendor == 'postgresql':
+        document = RawSQL(f'("{table}"."numero_of" || \' \' || "{table}"."titre")', [])
+        for terme in indexables:
+            qs = qs.filter(_ILike(document, Value(f"%{_echapper_like(terme)}%")))
+        rang = Func(Value(query), document, function='WORD_SIMILARITY', output_field=FloatField())
+    elif fts:
+        match = ' '.join('"%s"' % t.replace('"', '""') for t in indexables)
+        qs = qs.filter(pk__in=RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [match]))
+        rang = RawSQL(
+            f'SELECT -rank FROM "{fts}" WHERE "{fts}" MATCH %s AND rowid = "{table}"."id"',
+            [match], output_field=FloatField(),
+        )
+    else:
+        indexables = []
+
+    for terme in termes:
+        if terme not in indexables:
+            qs = qs.filter(Q(numero_of__icontains=terme) | Q(titre__icontains=terme))
+    return qs.annotate(rang=Cast(Round(rang * ECHELLE_RANG), BigIntegerField()))
+
+
+def filtrer_numero(queryset: QuerySet, numero: str) -> QuerySet:
+    """
+    OFs de `queryset` dont le numéro contient `numero` (numero_of__icontains), lus par
+    l'index de recherche quand le terme est assez long pour y figurer.
+    """
+    numero = numero.strip()
+    qs = queryset.filter(numero_of__icontains=numero)
+    if len(numero) < LONGUEUR_MIN_TERME:
+        return qs
+    table = queryset.model._meta.db_table
+    fts = _table_fts(queryset.model)
+    if connection.vendor == 'postgresql':
+        # L'index trigramme porte sur numero_of || ' ' || titre : icontains reste le filtre exact
+        document = RawSQL(f'("{table}"."numero_of" || \' \' || "{table}"."titre")', [])
+        return qs.filter(_ILike(document, Value(f"%{_echapper_like(numero)}%")))
+    if fts:
+        match = 'numero_of : "%s"' % numero.replace('"', '""')
+        return qs.filter(pk__in=RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [match]))
+    return qs
+
+
+def paginer_par_curseur(queryset: QuerySet, curseur: str = "", limite: int = 24) -> PageRecherche:
+    """Page de résultats triés par (rang, pk) décroissants, à partir de `curseur`."""
+    qs = queryset.order_by('-rang', '-pk')
+    position = decoder_curseur(curseur)
+    if position:
+        rang, pk = position
+        qs = qs.filter(Q(rang__lt=rang) | Q(rang=rang, pk__lt=pk))
+    resultats = list(qs[:limite + 1])
+    curseur_suivant = None
+    if len(resultats) > limite:
+        resultats = resultats[:limite]
+        dernier = resultats[-1]
+        curseur_suivant = encoder_curseur(dernier.rang, dernier.pk)
+    return PageRecherche(resultats=resultats, curseur_suivant=curseur_suivant)
+
+
+def rechercher_ofs(queryset: QuerySet, query: str, curseur: str = "", limite: int = 24) -> PageRecherche:
+    """Recherche classée dans `queryset`, paginée par curseur."""
+    return paginer_par_curseur(annoter_recherche(queryset, query), curseur=curseur, limite=limite)
@@ -8,6 +8,7 @@ from django.db.models import Sum, F, QuerySet
 from django.utils import timezone
 
 from ..models import OrdreFabrication, Pointage, Anomalie, MatierePremiere
+from .recherche import filtrer_numero
 
 
 @dataclass
@@ -28,7 +29,7 @@ def get_ofs_finalises_le(jour: date) -> QuerySet:
 def compute_operational_counters(jour: date) -> Tuple[int, int]:
     base = Pointage.objects.exclude(operation__ordre_fabrication__statut='ARCHIVE')
     ops_en_cours = base.filter(heure_fin__isnull=True).count()
-    operateurs_actifs = base.filter(heure_debut__date=jour).values('operateur').distinct().count()
+    operateurs_actifs = base.debutes_le(jour).values('operateur').distinct().count()
     return ops_en_cours, operateurs_actifs
 
 
@@ -104,7 +105,7 @@ def build_alertes(jour: date):
 def queryset_rebuts_par_of(numero: str = "", date_str: str = ""):
     """Construit le QuerySet des OF avec rebuts > 0, filtres par numéro et date de première finalisation.
 
-    - numero: filtre contient sur numero_of
+    - numero: filtre contient sur numero_of (servi par l'index de recherche)
     - date_str: 'YYYY-MM-DD' pour filtrer date_premiere_finalisation
     Retourne un QuerySet annoté avec total_rebut et prêt pour tri.
     """
@@ -112,7 +113,7 @@ def queryset_rebuts_par_of(numero: str = "", date_str: str = ""):
         .annotate(total_rebut=Sum('operations__pointages__quantite_rebut')) \
         .filter(total_rebut__gt=0)
     if numero:
-        qs = qs.filter(numero_of__icontains=numero.strip())
+        qs = filtrer_numero(qs, numero)
     if date_str:
         try:
             filter_date = timezone.datetime.strptime(date_str.strip(), '%Y-%m-%d').date()
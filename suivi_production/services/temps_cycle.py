@@ -0,0 +1,270 @@
+"""
+Temps de cycle réels : minutes par pièce des pointages clôturés, par poste, type
+d'opération et opérateur, comparées au temps prévu des gammes.
+
+Chaque combinaison (poste, type d'opération, opérateur) garde une esquisse de
+quantiles (StatistiqueCycle) : les médianes, p90 et écarts au prévu se lisent sans
+parcourir les pointages. Comme les autres agrégats (services/files_recalcul.py), la
+clôture d'un pointage ne fait que mettre sa clé en file (CycleEnAttente), de même
+qu'un pointage déjà compté puis modifié ou supprimé ; les clés en file sont
+recalculées à la lecture et par la tâche cron.
+
+L'esquisse est un histogramme à classes logarithmiques (principe de DDSketch) : toute
+valeur est restituée à ERREUR_RELATIVE près, la taille ne dépend que de l'étendue
+des valeurs (une centaine de classes de 0,1 à 1000 min/pièce) et deux esquisses se
+fusionnent en additionnant leurs classes. Les regroupements par poste, par type ou
+par opérateur sont donc des fusions des esquisses fines.
+"""
+from __future__ import annotations
+import math
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import files_recalcul
+from .version_donnees import incrementer_version
+from ..models import CycleEnAttente, Operateur, Operation, Pointage, PointageArchive, PosteDeTravail, StatistiqueCycle
+
+ERREUR_RELATIVE = 0.02
+_GAMMA = (1 + ERREUR_RELATIVE) / (1 - ERREUR_RELATIVE)
+_LOG_GAMMA = math.log(_GAMMA)
+VALEUR_MIN = 1e-3               # minutes par pièce ; en dessous, ramené à ce plancher
+MIN_ECHANTILLONS = 5            # en dessous, pas de suggestion à ce niveau de détail
+TAILLE_LOT = 2000              # pointages lus par requête lors d'un recalcul
+CLES_PAR_LOT = 50              # clés recalculées par transaction
+
+# axe -> champ de StatistiqueCycle
+AXES = {'poste': 'poste_id', 'type_operation': 'type_operation', 'operateur': 'operateur_id'}
+Cle = Tuple[int, str, int]
+CHAMPS_CLE = ['poste_id', 'type_operation', 'operateur_id']
+
+
+class Esquisse:
+    """Esquisse de quantiles fusionnable : {indice de classe: effectif}."""
+
+    def __init__(self, classes: Optional[Dict] = None):
+        self.classes = {int(i): n for i, n in (classes or {}).items()}
+
+    @staticmethod
+    def _indice(valeur: float) -> int:
+        return math.ceil(math.log(max(valeur, VALEUR_MIN)) / _LOG_GAMMA)
+
+    @property
+    def nombre(self) -> int:
+        return sum(self.classes.values())
+
+    def ajouter(self, valeur: float, effectif: int = 1) -> None:
+        i = self._indice(valeur)
+        self.classes[i] = self.classes.get(i, 0) + effectif
+
+    def fusionner(self, autre: 'Esquisse') -> 'Esquisse':
+        for i, n in autre.classes.items():
+            self.classes[i] = self.classes.get(i, 0) + n
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.nombre
+        if not total:
+            return None
+        rang = q * (total - 1)
+        cumul = 0
+        for i in sorted(self.classes):
+            cumul += self.classes[i]
+            if cumul > rang:
+                # Milieu (au sens relatif) de la classe ]gamma^(i-1), gamma^i]
+                return 2 * _GAMMA ** i / (_GAMMA + 1)
+        return 2 * _GAMMA ** max(self.classes) / (_GAMMA + 1)
+
+    def en_json(self) -> Dict[str, int]:
+        return {str(i): n for i, n in sorted(self.classes.items())}
+
+
+# --- Mise à jour -------------------------------------------------------------------
+
+def _mesure(duree_secondes: float, pieces: int, temps_prevu, quantite_entree: int) -> Optional[Tuple[float, Optional[float]]]:
+    """(minutes réelles par pièce, minutes prévues par pièce) d'un pointage, None s'il ne compte pas."""
+    if pieces <= 0 or duree_secondes <= 0:
+        return None
+    prevu = float(temps_prevu) / quantite_entree if quantite_entree and temps_prevu else None
+    return duree_secondes / 60 / pieces, prevu
+
+
+def _accumuler(cumuls: Dict, cle: Cle, mesure) -> None:
+    reel, prevu = mesure
+    cumul = cumuls.setdefault(cle, {'esquisse': Esquisse(), 'somme': 0.0, 'somme_prevue': 0.0, 'nombre_prevu': 0})
+    cumul['esquisse'].ajouter(reel)
+    cumul['somme'] += reel
+    if prevu is not None:
+        cumul['somme_prevue'] += prevu
+        cumul['nombre_prevu'] += 1
+
+
+def marquer(cles: Iterable[Cle]) -> None:
+    """Met en file des clés (poste, type d'opération, opérateur) ; celles déjà en file sont ignorées."""
+    files_recalcul.marquer_cles(CycleEnAttente, CHAMPS_CLE, cles)
+
+
+def marquer_pointages(pointages: Iterable[Pointage]) -> None:
+    """Met en file les clés des pointages clôturés (clôture, insertions en masse sans signaux)."""
+    marquer({
+        (p.operation.poste_id, p.operation.type_operation, p.operateur_id) for p in pointages if p.heure_fin is not None
+    })
+
+
+def _cumuls(filtre: Q, taille_lot: int) -> Dict:
+    """Cumuls par clé des pointages clôturés, en production et archivés, qui satisfont `filtre`."""
+    cumuls = {}
+    for modele in (Pointage, PointageArchive):
+        lignes = (
+            modele.objects.filter(filtre, heure_fin__isnull=False).order_by()
+            .values_list('heure_debut', 'heure_fin', 'quantite_fabriquee', 'quantite_rebut', 'operateur_id',
+                         'operation__poste_id', 'operation__type_operation', 'operation__temps_prevu_minutes',
+                         'operation__quantite_entree')
+        )
+        for debut, fin, bonnes, rebut, operateur_id, poste_id, type_operation, prevu, entree in lignes.iterator(chunk_size=taille_lot):
+            mesure = _mesure((fin - debut).total_seconds(), bonnes + rebut, prevu, entree)
+            if mesure:
+                _accumuler(cumuls, (poste_id, type_operation, operateur_id), mesure)
+    return cumuls
+
+
+def _filtre_cles(cles: Iterable[Cle], prefixe: str = '') -> Q:
+    filtre = Q(pk__in=[])
+    for poste_id, type_operation, operateur_id in cles:
+        filtre |= Q(**{f'{prefixe}poste_id': poste_id, f'{prefixe}type_operation': type_operation,
+                       'operateur_id': operateur_id})
+    return filtre
+
+
+def _remplacer(stats, cumuls: Dict) -> None:
+    with transaction.atomic():
+        stats.delete()
+        StatistiqueCycle.objects.bulk_create([
+            StatistiqueCycle(
+                poste_id=poste_id, type_operation=type_operation, operateur_id=operateur_id,
+                esquisse=c['esquisse'].en_json(), nombre=c['esquisse'].nombre, somme_minutes=c['somme'],
+                somme_prevue=c['somme_prevue'], nombre_prevu=c['nombre_prevu'],
+            )
+            for (poste_id, type_operation, operateur_id), c in cumuls.items()
+        ], batch_size=1000)
+
+
+def reconstruire(taille_lot: int = TAILLE_LOT) -> int:
+    """Recalcule toutes les esquisses depuis les pointages clôturés, en production et archivés."""
+    cumuls = _cumuls(Q(), taille_lot)
+    _remplacer(StatistiqueCycle.objects.all(), cumuls)
+    return len(cumuls)
+
+
+def reconstruire_cles(cles: Iterable[Cle], taille_lot: int = TAILLE_LOT) -> None:
+    """
+    Recalcule les esquisses des seules clés `cles` depuis leurs pointages. La
+    contribution d'un pointage modifié n'est pas retirée telle quelle : l'opération
+    (poste, temps prévu) a pu changer depuis la clôture.
+    """
+    cles = set(cles)
+    if cles:
+        _remplacer(StatistiqueCycle.objects.filter(_filtre_cles(cles)),
+                   _cumuls(_filtre_cles(cles, 'operation__'), taille_lot))
+
+
+def rafraichir_cycles(taille_lot: int = CLES_PAR_LOT, limite: Optional[int] = None) -> int:
+    """Recalcule les esquisses des clés en file (au plus `limite`). Renvoie leur nombre."""
+    def recalculer(cles):
+        reconstruire_cles(cles)
+        incrementer_version()
+    return files_recalcul.rafraichir_file(CycleEnAttente, CHAMPS_CLE, recalculer, taille_lot, limite)
+
+
+def cles_pointages(pointages) -> List[Cle]:
+    """Clés (poste, type d'opération, opérateur) des pointages clôturés du queryset `pointages`."""
+    return list(
+        pointages.filter(heure_fin__isnull=False).order_by()
+        .values_list('operation__poste_id', 'operation__type_operation', 'operateur_id').distinct()
+    )
+
+
+# --- Lecture -----------------------------------------------------------------------
+
+@dataclass
+class LigneCycle:
+    cle: object
+    libelle: str
+    nombre: int                     # pointages mesurés
+    p50: Optional[float]            # minutes par pièce
+    p90: Optional[float]
+    moyenne: Optional[float]
+    prevu: Optional[float]          # temps prévu moyen par pièce
+    ecart_pct: Optional[float]      # écart de la médiane au prévu, en % du prévu
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _fusion(stats: Iterable[StatistiqueCycle]) -> Dict:
+    cumul = {'esquisse': Esquisse(), 'somme': 0.0, 'somme_prevue': 0.0, 'nombre_prevu': 0}
+    for s in stats:
+        cumul['esquisse'].fusionner(Esquisse(s.esquisse))
+        cumul['somme'] += s.somme_minutes
+        cumul['somme_prevue'] += s.somme_prevue
+        cumul['nombre_prevu'] += s.nombre_prevu
+    return cumul
+
+
+def _ligne(cle, libelle, cumul) -> LigneCycle:
+    esquisse = cumul['esquisse']
+    nombre = esquisse.nombre
+    p50 = esquisse.quantile(0.5)
+    prevu = cumul['somme_prevue'] / cumul['nombre_prevu'] if cumul['nombre_prevu'] else None
+    arrondi = lambda v: round(v, 2) if v is not None else None
+    return LigneCycle(
+        cle=cle, libelle=libelle, nombre=nombre, p50=arrondi(p50), p90=arrondi(esquisse.quantile(0.9)),
+        moyenne=arrondi(cumul['somme'] / nombre if nombre else None), prevu=arrondi(prevu),
+        ecart_pct=round((p50 - prevu) * 100 / prevu, 1) if p50 is not None and prevu else None,
+    )
+
+
+def _libelles(axe: str) -> Dict:
+    if axe == 'poste':
+        return dict(PosteDeTravail.objects.values_list('pk', 'nom'))
+    if axe == 'operateur':
+        return dict(Operateur.objects.values_list('pk', 'code'))
+    return dict(Operation.TYPE_CHOICES)
+
+
+def statistiques(axe: str = 'poste', filtres: Optional[Dict[str, object]] = None) -> List[LigneCycle]:
+    """Temps de cycle par `axe` (voir AXES), restreints par `filtres` ({axe: valeur})."""
+    if axe not in AXES:
+        raise ValueError(f"Axe inconnu : {axe}")
+    qs = StatistiqueCycle.objects.all()
+    for cle, valeur in (filtres or {}).items():
+        if cle not in AXES:
+            raise ValueError(f"Filtre inconnu : {cle}")
+        qs = qs.filter(**{AXES[cle]: valeur})
+    groupes = defaultdict(list)
+    for stat in qs:
+        groupes[getattr(stat, AXES[axe])].append(stat)
+    libelles = _libelles(axe)
+    lignes = [_ligne(cle, libelles.get(cle, '—'), _fusion(stats)) for cle, stats in groupes.items()]
+    lignes.sort(key=lambda l: (-l.nombre, l.libelle))
+    return lignes
+
+
+def suggestion(poste_id: int, type_operation: str, quantite: int) -> Optional[Dict]:
+    """
+    Temps prévu réaliste pour `quantite` pièces : médiane et p90 observés sur le poste
+    pour ce type d'opération, ou sur le poste seul si l'historique est trop maigre.
+    """
+    stats = list(StatistiqueCycle.objects.filter(poste_id=poste_id))
+    for niveau, retenues in (('poste_type', [s for s in stats if s.type_operation == type_operation]), ('poste', stats)):
+        cumul = _fusion(retenues)
+        if cumul['esquisse'].nombre >= MIN_ECHANTILLONS:
+            ligne = _ligne(None, '', cumul)
+            return {
+                'niveau': niveau, 'nombre': ligne.nombre, 'p50_par_piece': ligne.p50, 'p90_par_piece': ligne.p90,
+                'temps_p50': round(ligne.p50 * quantite, 1), 'temps_p90': round(ligne.p90 * quantite, 1),
+            }
+    return None
@@ -0,0 +1,326 @@
+"""
+TRS (taux de rendement synthétique, ou OEE) des machines et des postes.
+
+Pour une machine et une journée :
+- temps d'ouverture : plage TRS_HEURE_OUVERTURE-TRS_HEURE_FERMETURE des jours ouvrés,
+  étendue aux pointages faits en dehors (heures supplémentaires, week-end) ;
+- temps requis : ouverture moins les arrêts planifiés (statut MAINTENANCE) ;
+- temps de fonctionnement : requis moins les pannes (statut EN_PANNE) ;
+- temps net : temps standard des pièces déclarées, bonnes et rebutées (temps prévu de
+  l'opération rapporté à sa quantité d'entrée) ;
+- temps utile : temps standard des seules pièces bonnes.
+Disponibilité = fonctionnement / requis, performance = net / fonctionnement,
+qualité = utile / net, et TRS = utile / requis (produit des trois).
+
+Seules les journées où la machine a travaillé ou est tombée en panne sont comptées :
+une machine sans charge ni incident ne fait pas baisser le TRS. Les opérations sans
+machine assignée n'entrent pas dans le calcul. Le TRS d'un poste est celui des
+machines utilisées par ses opérations, leur temps requis étant réparti entre postes
+au prorata du temps pointé.
+
+Les statuts machine sont historisés en intervalles (PeriodeStatutMachine). Les résultats
+sont gardés par journée (TRSJournalier) et recalculés à la demande pour les seules
+journées marquées (TRSEnAttente) par un pointage clôturé, modifié ou supprimé, un
+changement de statut ou de machine d'une opération :
+une tendance sur douze mois n'est qu'une somme sur ces agrégats.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from . import files_recalcul
+from ..models import (
+    Machine, PeriodeStatutMachine, Pointage, PointageArchive, PosteDeTravail, TRSEnAttente, TRSJournalier,
+)
+
+AXES = ('machine', 'poste')
+GRANULARITES = ('jour', 'semaine', 'mois')
+TAILLE_LOT = 200
+# Un pointage plus long n'est pas cherché au-delà (borne basse de la recherche par jour)
+DUREE_MAX_POINTAGE = timedelta(days=7)
+
+Intervalle = Tuple[datetime, datetime]
+
+
+# --- Intervalles -------------------------------------------------------------------
+
+def _union(intervalles: Iterable[Intervalle]) -> List[Intervalle]:
+    """Intervalles triés et fusionnés (chevauchants ou jointifs)."""
+    fusion = []
+    for debut, fin in sorted(i for i in intervalles if i[1] > i[0]):
+        if fusion and debut <= fusion[-1][1]:
+            if fin > fusion[-1][1]:
+                fusion[-1] = (fusion[-1][0], fin)
+        else:
+            fusion.append((debut, fin))
+    return fusion
+
+
+def _intersection(a: List[Intervalle], b: List[Intervalle]) -> List[Intervalle]:
+    """Intersection de deux listes d'intervalles triées et fusionnées."""
+    resultat, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        debut, fin = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if debut < fin:
+            resultat.append((debut, fin))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return resultat
+
+
+def _duree(intervalles: Iterable[Intervalle]) -> float:
+    return sum((fin - debut).total_seconds() for debut, fin in intervalles)
+
+
+def _bornes_jour(jour: date) -> Intervalle:
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    return debut, timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min))
+
+
+def _jours(debut: datetime, fin: datetime) -> List[date]:
+    premier, dernier = timezone.localdate(debut), timezone.localdate(fin)
+    return [premier + timedelta(days=n) for n in range((dernier - premier).days + 1)]
+
+
+# --- Statuts machine et file de recalcul ---------------------------------------------
+
+def marquer(paires: Iterable[Tuple[date, int]]) -> None:
+    """Met en file des couples (jour, machine_id) ; les couples déjà en file sont ignorés."""
+    files_recalcul.marquer_journees(TRSEnAttente, paires)
+
+
+def marquer_intervalle(machine_id: int, debut: datetime, fin: datetime) -> None:
+    """Marque à recalculer les journées de `machine_id` couvertes par [debut, fin]."""
+    marquer_intervalles([(machine_id, debut, fin)])
+
+
+def marquer_intervalles(lignes: Iterable[Tuple[Optional[int], datetime, datetime]]) -> None:
+    """Marque les journées couvertes par des intervalles (machine_id, debut, fin) ; sans machine, ignorés."""
+    files_recalcul.marquer_intervalles(TRSEnAttente, lignes, _jours)
+
+
+def marquer_pointages(pointages: Iterable[Pointage]) -> None:
+    """Marque les journées des pointages clôturés (insertions en masse, sans signaux)."""
+    files_recalcul.marquer_pointages(TRSEnAttente, pointages, _jours)
+
+
+def enregistrer_statut(machine: Machine) -> None:
+    """Clôt l'intervalle de statut en cours s'il a changé et en ouvre un nouveau."""
+    en_cours = PeriodeStatutMachine.objects.filter(machine=machine, fin__isnull=True).order_by('-debut').first()
+    if en_cours and en_cours.statut == machine.statut:
+        return
+    maintenant = timezone.now()
+    if en_cours:
+        en_cours.fin = maintenant
+        en_cours.save(update_fields=['fin'])
+        if en_cours.statut != 'DISPONIBLE':
+            marquer_intervalle(machine.pk, en_cours.debut, maintenant)
+    PeriodeStatutMachine.objects.create(machine=machine, statut=machine.statut, debut=maintenant)
+    if machine.statut != 'DISPONIBLE':
+        marquer_intervalle(machine.pk, maintenant, maintenant)
+
+
+def _marquer_arrets_en_cours() -> None:
+    """
+    Journées d'un arrêt toujours en cours, qui évoluent sans nouvel événement : celles
+    écoulées depuis la dernière journée en file ou calculée de la machine. Les journées
+    plus anciennes de l'arrêt, calculées une fois écoulées, ne bougent plus.
+    """
+    maintenant = timezone.now()
+    arrets = PeriodeStatutMachine.objects.filter(fin__isnull=True).exclude(statut='DISPONIBLE')
+    for machine_id, debut in arrets.values_list('machine_id', 'debut'):
+        premier = timezone.localdate(debut)
+        derniers = [
+            modele.objects.filter(machine_id=machine_id, jour__gte=premier).aggregate(dernier=Max('jour'))['dernier']
+            for modele in (TRSEnAttente, TRSJournalier)
+        ]
+        depuis = max([d for d in derniers if d] + [premier])
+        marquer_intervalle(machine_id, max(debut, _bornes_jour(depuis)[0]), maintenant)
+
+
+# --- Calcul d'une journée ----------------------------------------------------------
+
+def _ouverture(jour: date, debut: datetime) -> List[Intervalle]:
+    if jour.weekday() not in settings.TRS_JOURS_OUVRES:
+        return []
+    return [(debut + timedelta(hours=settings.TRS_HEURE_OUVERTURE), debut + timedelta(hours=settings.TRS_HEURE_FERMETURE))]
+
+
+def calculer_journee(jour: date, machine_ids: List[int]) -> List[TRSJournalier]:
+    """Lignes TRSJournalier de la journée pour les machines `machine_ids`."""
+    debut, fin = _bornes_jour(jour)
+    borne = min(fin, timezone.now())
+
+    def ecreter(a, b):
+        return (max(a, debut), min(b or borne, borne))
+
+    activites = defaultdict(lambda: defaultdict(list))         # machine -> poste -> intervalles
+    production = defaultdict(lambda: defaultdict(lambda: [0.0, 0.0, 0, 0]))  # net, utile, bonnes, rebut
+    for modele in (Pointage, PointageArchive):
+        pointages = (
+            modele.objects
+            .filter(operation__machine_assignee_id__in=machine_ids,
+                    heure_debut__gte=debut - DUREE_MAX_POINTAGE, heure_debut__lt=fin)
+            .filter(Q(heure_fin__gte=debut) | Q(heure_fin__isnull=True))
+            .values_list('operation__machine_assignee_id', 'operation__poste_id', 'heure_debut', 'heure_fin',
+                         'quantite_fabriquee', 'quantite_rebut', 'operation__temps_prevu_minutes',
+                         'operation__quantite_entree')
+        )
+        for machine_id, poste_id, h_debut, h_fin, bonnes, rebut, prevu, entree in pointages:
+            activites[machine_id][poste_id].append(ecreter(h_debut, h_fin))
+            # Les pièces comptent le jour où elles sont déclarées (fin du pointage)
+            if h_fin is not None and debut <= h_fin < fin:
+                standard_piece = float(prevu) * 60 / entree if entree else 0.0
+                cumul = production[machine_id][poste_id]
+                cumul[0] += standard_piece * (bonnes + rebut)
+                cumul[1] += standard_piece * bonnes
+                cumul[2] += bonnes
+                cumul[3] += rebut
+
+    arrets = defaultdict(lambda: defaultdict(list))             # machine -> statut -> intervalles
+    periodes = (
+        PeriodeStatutMachine.objects
+        .filter(machine_id__in=machine_ids, debut__lt=fin)
+        .filter(Q(fin__gt=debut) | Q(fin__isnull=True))
+        .exclude(statut='DISPONIBLE')
+        .values_list('machine_id', 'statut', 'debut', 'fin')
+    )
+    for machine_id, statut, p_debut, p_fin in periodes:
+        arrets[machine_id][statut].append(ecreter(p_debut, p_fin))
+
+    ouverture = [ecreter(a, b) for a, b in _ouverture(jour, debut)]
+    lignes = []
+    for machine_id in machine_ids:
+        par_poste = {poste: _duree(_union(intervalles)) for poste, intervalles in activites[machine_id].items()}
+        activite = _union(i for intervalles in activites[machine_id].values() for i in intervalles)
+        ouvert = _union(ouverture + activite)
+        planifie = _duree(_intersection(ouvert, _union(arrets[machine_id]['MAINTENANCE'])))
+        panne = _duree(_intersection(ouvert, _union(arrets[machine_id]['EN_PANNE'])))
+        if not activite and not panne and not production[machine_id]:
+            continue
+        requis = _duree(ouvert) - planifie
+        total_pointe = sum(par_poste.values())
+        postes = set(par_poste) | set(production[machine_id])
+        if not postes:
+            postes = {None}
+        for poste_id in postes:
+            part = par_poste.get(poste_id, 0.0) / total_pointe if total_pointe else (1.0 if poste_id is None else 0.0)
+            net, utile, bonnes, rebut = production[machine_id][poste_id]
+            lignes.append(TRSJournalier(
+                jour=jour, semaine=jour - timedelta(days=jour.weekday()), mois=jour.replace(day=1),
+                machine_id=machine_id, poste_id=poste_id,
+                temps_requis=requis * part, temps_arret_planifie=planifie * part, temps_panne=panne * part,
+                temps_pointe=par_poste.get(poste_id, 0.0), temps_net=net, temps_utile=utile,
+                pieces_bonnes=bonnes, pieces_rebut=rebut,
+            ))
+    return lignes
+
+
+def rafraichir_trs(taille_lot: int = TAILLE_LOT, limite: Optional[int] = None) -> int:
+    """
+    Recalcule les journées machine en attente, par lots. Renvoie leur nombre. Une
+    journée pas encore écoulée (le temps d'ouverture avance) est remise en file, pour le
+    prochain rafraîchissement.
+    """
+    _marquer_arrets_en_cours()
+    maintenant = timezone.now()
+    en_cours = []
+
+    def calculer(jour, machine_ids):
+        if _bornes_jour(jour)[1] > maintenant:
+            en_cours.extend((jour, machine_id) for machine_id in machine_ids)
+        return calculer_journee(jour, machine_ids)
+
+    traitees = files_recalcul.rafraichir_journees(TRSEnAttente, TRSJournalier, calculer, taille_lot, limite)
+    marquer(en_cours)
+    return traitees
+
+
+def reconstruire_trs(debut: date, fin: date, taille_lot: int = TAILLE_LOT) -> int:
+    """Marque toutes les journées machine de [debut, fin] et les recalcule."""
+    files_recalcul.marquer_periode(TRSEnAttente, debut, fin)
+    return rafraichir_trs(taille_lot)
+
+
+# --- Lecture -----------------------------------------------------------------------
+
+@dataclass
+class LigneTRS:
+    cle: Optional[int]
+    libelle: str
+    periode: Optional[str]
+    temps_requis_h: float
+    temps_panne_h: float
+    disponibilite: Optional[float]   # en %
+    performance: Optional[float]
+    qualite: Optional[float]
+    trs: Optional[float]
+    pieces_bonnes: int
+    pieces_rebut: int
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _ratio(numerateur: float, denominateur: float) -> Optional[float]:
+    return round(numerateur * 100 / denominateur, 1) if denominateur > 0 else None
+
+
+def trs(debut: date, fin: date, axe: Optional[str] = 'machine', granularite: Optional[str] = None,
+        filtres: Optional[Dict[str, int]] = None) -> List[LigneTRS]:
+    """
+    TRS de la période [debut, fin] par machine ou par poste (`axe`, ou tout l'atelier si
+    vide), éventuellement découpé par jour, semaine ou mois (`granularite`), à partir
+    des agrégats journaliers.
+    """
+    if axe not in AXES + (None,) or granularite not in GRANULARITES + (None,):
+        raise ValueError("Axe ou granularité inconnus.")
+    qs = TRSJournalier.objects.filter(jour__gte=debut, jour__lte=fin).order_by()
+    if axe == 'poste':
+        qs = qs.filter(poste__isnull=False)
+    for dimension, valeur in (filtres or {}).items():
+        qs = qs.filter(**{f'{dimension}_id': valeur})
+    champs = ([f'{axe}_id'] if axe else []) + ([granularite] if granularite else [])
+    sommes = dict(
+        requis=Sum('temps_requis'), panne=Sum('temps_panne'), net=Sum('temps_net'), utile=Sum('temps_utile'),
+        bonnes=Sum('pieces_bonnes'), rebut=Sum('pieces_rebut'),
+    )
+    if champs:
+        groupes = qs.values(*champs).annotate(**sommes)
+    else:
+        total = qs.aggregate(**sommes)
+        groupes = [total] if total['requis'] is not None else []
+    libelles = {}
+    if axe:
+        libelles = dict((Machine if axe == 'machine' else PosteDeTravail).objects.values_list('pk', 'nom'))
+    lignes = []
+    for g in groupes:
+        cle = g[f'{axe}_id'] if axe else None
+        fonctionnement = g['requis'] - g['panne']
+        lignes.append(LigneTRS(
+            cle=cle, libelle=libelles.get(cle, '—') if axe else 'Atelier',
+            periode=g[granularite].isoformat() if granularite else None,
+            temps_requis_h=round(g['requis'] / 3600, 1), temps_panne_h=round(g['panne'] / 3600, 1),
+            disponibilite=_ratio(fonctionnement, g['requis']), performance=_ratio(g['net'], fonctionnement),
+            qualite=_ratio(g['utile'], g['net']), trs=_ratio(g['utile'], g['requis']),
+            pieces_bonnes=g['bonnes'], pieces_rebut=g['rebut'],
+        ))
+    lignes.sort(key=lambda l: (l.libelle, l.periode or ''))
+    return lignes
+
+
+def tendance_mensuelle(axe: Optional[str] = None, mois: int = 12) -> List[LigneTRS]:
+    """TRS mois par mois sur les `mois` derniers mois (mois en cours compris)."""
+    aujourd_hui = timezone.localdate()
+    debut = aujourd_hui.replace(day=1)
+    for _ in range(mois - 1):
+        debut = (debut - timedelta(days=1)).replace(day=1)
+    return trs(debut, aujourd_hui, axe=axe, granularite='mois')
@@ -0,0 +1,391 @@
+"""
+Utilisation des machines : temps occupé, creux et chevauchements, par équipe et par jour.
+
+Une machine est occupée quand au moins un pointage est ouvert sur une opération qui
+lui est assignée. Pour une journée, ses pointages (en cours et archivés) sont réduits
+en un index d'intervalles (IndexIntervalles) : les segments de parallélisme du
+balayage de services/chronologie.py, triés, avec les cumuls des temps occupé, pointé
+et en chevauchement (deux pointages ou plus en même temps). Le temps de chaque
+catégorie sur une fenêtre se lit par recherche dichotomique, sans reparcourir les
+pointages : chaque équipe de la journée est une fenêtre.
+
+Les équipes (UTILISATION_EQUIPES) couvrent les jours ouvrés du TRS ; une équipe de nuit
+peut finir le lendemain et reste comptée sur son jour de début. Le temps occupé en
+dehors des équipes (heures supplémentaires, week-end) est gardé à part (équipe vide),
+sans temps d'ouverture : il n'entre pas dans le taux d'utilisation. Une machine sans
+aucun pointage a bien ses lignes d'équipe, à 0 % : ses creux comptent.
+
+Comme pour le TRS, les résultats sont gardés par journée (UtilisationMachine) et
+recalculés pour les seules journées marquées (UtilisationEnAttente) par un pointage
+clôturé, modifié ou supprimé, ou une opération qui change de machine, plus la journée en cours et celles écoulées depuis le dernier calcul : une
+année de toutes les machines n'est qu'une somme sur ces agrégats. L'état en direct
+(machines occupées ou inactives maintenant) est lu sur les pointages ouverts.
+"""
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from functools import partial
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from . import files_recalcul
+from .chronologie import balayer
+from .trs import DUREE_MAX_POINTAGE
+from ..models import Machine, Pointage, PointageArchive, UtilisationEnAttente, UtilisationMachine
+
+AXES = ('machine', 'equipe')
+GRANULARITES = ('jour', 'mois')
+TAILLE_LOT = 200
+# Dernière fin de pointage cherchée au plus loin pour l'état en direct
+HORIZON_ETAT = timedelta(days=7)
+
+Intervalle = Tuple[datetime, datetime]
+Fenetre = Tuple[str, datetime, datetime]
+
+
+# =====================================================================================
+# ÉQUIPES
+# =====================================================================================
+
+def equipes() -> List[Tuple[str, int, int]]:
+    """Équipes (nom, heure de début, heure de fin) de UTILISATION_EQUIPES."""
+    resultat = []
+    for element in settings.UTILISATION_EQUIPES.split(','):
+        if not element.strip():
+            continue
+        try:
+            nom, plage = element.rsplit(':', 1)
+            debut, fin = (int(h) for h in plage.split('-'))
+        except ValueError:
+            raise ImproperlyConfigured(f"UTILISATION_EQUIPES : « {element} » invalide (format attendu nom:début-fin).")
+        if not nom.strip() or not 0 <= debut < fin <= debut + 24:
+            raise ImproperlyConfigured(f"UTILISATION_EQUIPES : plage horaire invalide pour « {element} ».")
+        resultat.append((nom.strip(), debut, fin))
+    return resultat
+
+
+def _debut_jour(jour: date) -> datetime:
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def _debordement() -> timedelta:
+    """Durée pendant laquelle les équipes d'un jour débordent sur le lendemain."""
+    return timedelta(hours=max([fin - 24 for _, _, fin in equipes()] + [0]))
+
+
+def fenetres(jour: date) -> List[Fenetre]:
+    """Équipes de la journée (aucune hors des jours ouvrés)."""
+    if jour.weekday() not in settings.TRS_JOURS_OUVRES:
+        return []
+    debut = _debut_jour(jour)
+    return [(nom, debut + timedelta(hours=h_debut), debut + timedelta(hours=h_fin)) for nom, h_debut, h_fin in equipes()]
+
+
+def _hors_equipes(jour: date, borne: datetime) -> List[Intervalle]:
+    """Parties de la journée calendaire (jusqu'à `borne`) couvertes par aucune équipe, veille comprise."""
+    debut, fin = _debut_jour(jour), min(_debut_jour(jour + timedelta(days=1)), borne)
+    couvertes = sorted((a, b) for _, a, b in fenetres(jour - timedelta(days=1)) + fenetres(jour))
+    resultat, curseur = [], debut
+    for a, b in couvertes:
+        if a > curseur:
+            resultat.append((curseur, min(a, fin)))
+        curseur = max(curseur, b)
+    if curseur < fin:
+        resultat.append((curseur, fin))
+    return [(a, b) for a, b in resultat if a < b]
+
+
+# =====================================================================================
+# INDEX D'INTERVALLES
+# =====================================================================================
+
+class IndexIntervalles:
+    """
+    Pointages d'une machine indexés pour des requêtes par fenêtre de temps : segments de
+    parallélisme triés et cumuls (occupé, pointé, chevauchement) en tête de chaque
+    segment. Construction en O(n log n), chaque requête en O(log n).
+    """
+
+    def __init__(self, intervalles: Iterable[Intervalle]):
+        intervalles = sorted(intervalles)
+        self.segments = list(balayer(intervalles))
+        self._debuts = [s.debut for s in self.segments]
+        self._cumuls = [(0.0, 0.0, 0.0)]
+        for segment in self.segments:
+            self._cumuls.append(self._ajouter(self._cumuls[-1], segment, segment.fin))
+        self._debuts_pointages = [debut for debut, _ in intervalles]
+        self._fins_pointages = sorted(fin for _, fin in intervalles)
+
+    @staticmethod
+    def _ajouter(cumul, segment, jusqu_a):
+        duree = (jusqu_a - segment.debut).total_seconds()
+        occupe, pointe, chevauchement = cumul
+        return occupe + duree, pointe + duree * segment.niveau, chevauchement + (duree if segment.niveau > 1 else 0.0)
+
+    def _cumul(self, instant: datetime):
+        i = bisect_right(self._debuts, instant)
+        if i == 0:
+            return self._cumuls[0]
+        segment = self.segments[i - 1]
+        return self._ajouter(self._cumuls[i - 1], segment, min(instant, segment.fin))
+
+    def temps(self, debut: datetime, fin: datetime) -> Tuple[float, float, float]:
+        """Secondes occupées, pointées (somme des pointages) et en chevauchement sur [debut, fin]."""
+        avant, apres = self._cumul(debut), self._cumul(fin)
+        return tuple(b - a for a, b in zip(avant, apres))
+
+    def niveau(self, instant: datetime) -> int:
+        """Nombre de pointages ouverts à `instant`."""
+        i = bisect_right(self._debuts, instant)
+        return self.segments[i - 1].niveau if i and instant < self.segments[i - 1].fin else 0
+
+    def nombre(self, debut: datetime, fin: datetime) -> int:
+        """Pointages ayant une part sur [debut, fin[."""
+        return bisect_left(self._debuts_pointages, fin) - bisect_right(self._fins_pointages, debut)
+
+    def creux(self, debut: datetime, fin: datetime) -> List[Intervalle]:
+        """Périodes sans pointage sur [debut, fin]."""
+        resultat, curseur = [], debut
+        for i in range(max(bisect_right(self._debuts, debut) - 1, 0), len(self.segments)):
+            segment = self.segments[i]
+            if segment.debut >= fin:
+                break
+            if segment.debut > curseur:
+                resultat.append((curseur, segment.debut))
+            curseur = max(curseur, segment.fin)
+        if curseur < fin:
+            resultat.append((curseur, fin))
+        return resultat
+
+
+# =====================================================================================
+# FILE DE RECALCUL
+# =====================================================================================
+
+def marquer(paires: Iterable[Tuple[date, int]]) -> None:
+    """Met en file des couples (jour, machine_id) ; les couples déjà en file sont ignorés."""
+    files_recalcul.marquer_journees(UtilisationEnAttente, paires)
+
+
+def _jours(debut: datetime, fin: datetime, debordement: timedelta) -> List[date]:
+    # La veille d'un pointage est touchée par une équipe de nuit qui déborde
+    premier, dernier = timezone.localdate(debut - debordement), timezone.localdate(fin)
+    return [premier + timedelta(days=n) for n in range((dernier - premier).days + 1)]
+
+
+def marquer_intervalle(machine_id: int, debut: datetime, fin: datetime) -> None:
+    """Marque à recalculer les journées de `machine_id` touchées par [debut, fin]."""
+    marquer_intervalles([(machine_id, debut, fin)])
+
+
+def marquer_intervalles(lignes: Iterable[Tuple[Optional[int], datetime, datetime]]) -> None:
+    """Marque les journées touchées par des intervalles (machine_id, debut, fin) ; sans machine, ignorés."""
+    files_recalcul.marquer_intervalles(UtilisationEnAttente, lignes, partial(_jours, debordement=_debordement()))
+
+
+def marquer_pointages(pointages: Iterable[Pointage]) -> None:
+    """Marque les journées des pointages clôturés (insertions en masse, sans signaux)."""
+    files_recalcul.marquer_pointages(UtilisationEnAttente, pointages, partial(_jours, debordement=_debordement()))
+
+
+def _marquer_journees_a_jour() -> None:
+    """
+    Journées qui évoluent sans clôture de pointage, pour toutes les machines : celles
+    écoulées depuis la dernière calculée (elle comprise, calculée en cours de journée)
+    jusqu'à aujourd'hui, et la veille si son équipe de nuit déborde sur aujourd'hui.
+    """
+    aujourd_hui = timezone.localdate()
+    dernier = UtilisationMachine.objects.aggregate(dernier=Max('jour'))['dernier'] or aujourd_hui
+    premier = min(dernier, aujourd_hui - (timedelta(days=1) if _debordement() else timedelta(0)))
+    files_recalcul.marquer_periode(UtilisationEnAttente, premier, aujourd_hui)
+
+
+# =====================================================================================
+# CALCUL D'UNE JOURNÉE
+# =====================================================================================
+
+def _ligne(jour: date, machine_id: int, equipe: str, index: IndexIntervalles, periodes: List[Intervalle],
+           ouvert: bool) -> UtilisationMachine:
+    ligne = UtilisationMachine(jour=jour, mois=jour.replace(day=1), machine_id=machine_id, equipe=equipe)
+    for debut, fin in periodes:
+        occupe, pointe, chevauchement = index.temps(debut, fin)
+        ligne.temps_occupe += occupe
+        ligne.temps_pointe += pointe
+        ligne.temps_chevauchement += chevauchement
+        ligne.pointages += index.nombre(debut, fin)
+        if ouvert:
+            ligne.temps_ouvert += (fin - debut).total_seconds()
+            for a, b in index.creux(debut, fin):
+                ligne.creux_max = max(ligne.creux_max, (b - a).total_seconds())
+    ligne.temps_creux = ligne.temps_ouvert - ligne.temps_occupe if ouvert else 0.0
+    return ligne
+
+
+def calculer_journee(jour: date, machine_ids: List[int]) -> List[UtilisationMachine]:
+    """Lignes UtilisationMachine de la journée (équipes, puis hors équipe) pour `machine_ids`."""
+    debut = _debut_jour(jour)
+    equipes_du_jour = fenetres(jour)
+    fin = max([_debut_jour(jour + timedelta(days=1))] + [b for _, _, b in equipes_du_jour])
+    borne = min(fin, timezone.now())
+    if borne <= debut:
+        return []
+
+    intervalles = defaultdict(list)
+    for modele in (Pointage, PointageArchive):
+        pointages = (
+            modele.objects
+            .filter(operation__machine_assignee_id__in=machine_ids,
+                    heure_debut__gte=debut - DUREE_MAX_POINTAGE, heure_debut__lt=borne)
+            .filter(Q(heure_fin__gt=debut) | Q(heure_fin__isnull=True))
+            .values_list('operation__machine_assignee_id', 'heure_debut', 'heure_fin')
+        )
+        for machine_id, h_debut, h_fin in pointages:
+            a, b = max(h_debut, debut), min(h_fin or borne, borne)
+            if a < b:
+                intervalles[machine_id].append((a, b))
+
+    hors_equipes = _hors_equipes(jour, borne)
+    lignes = []
+    for machine_id in machine_ids:
+        index = IndexIntervalles(intervalles[machine_id])
+        for nom, a, b in equipes_du_jour:
+            if a < borne:
+                lignes.append(_ligne(jour, machine_id, nom, index, [(a, min(b, borne))], ouvert=True))
+        hors = _ligne(jour, machine_id, '', index, hors_equipes, ouvert=False)
+        if hors.temps_occupe:
+            lignes.append(hors)
+    return lignes
+
+
+def rafraichir_utilisation(taille_lot: int = TAILLE_LOT, limite: Optional[int] = None) -> int:
+    """Recalcule les journées machine en attente, par lots. Renvoie leur nombre."""
+    _marquer_journees_a_jour()
+    return files_recalcul.rafraichir_journees(UtilisationEnAttente, UtilisationMachine, calculer_journee,
+                                              taille_lot, limite)
+
+
+def reconstruire_utilisation(debut: date, fin: date, taille_lot: int = TAILLE_LOT) -> int:
+    """Marque toutes les journées machine de [debut, fin] et les recalcule."""
+    files_recalcul.marquer_periode(UtilisationEnAttente, debut, fin)
+    return rafraichir_utilisation(taille_lot)
+
+
+# =====================================================================================
+# LECTURE
+# =====================================================================================
+
+@dataclass
+class LigneUtilisation:
+    cle: Optional[object]
+    libelle: str
+    periode: Optional[str]
+    heures_ouvertes: float
+    heures_occupees: float          # sur les équipes
+    heures_hors_equipe: float
+    heures_pointees: float
+    heures_chevauchement: float
+    heures_creux: float
+    creux_max_h: float
+    taux_utilisation: Optional[float]     # occupé / ouvert, en %
+    taux_chevauchement: Optional[float]   # part du temps occupé à plusieurs pointages, en %
+    pointages: int
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def _heures(secondes: Optional[float]) -> float:
+    return round((secondes or 0) / 3600, 1)
+
+
+def _ratio(numerateur: float, denominateur: float) -> Optional[float]:
+    return round(numerateur * 100 / denominateur, 1) if denominateur > 0 else None
+
+
+def utilisation(debut: date, fin: date, axe: Optional[str] = 'machine', granularite: Optional[str] = None,
+                machine_id: Optional[int] = None) -> List[LigneUtilisation]:
+    """
+    Utilisation sur [debut, fin] par machine ou par équipe (`axe`, ou tout l'atelier si
+    vide), éventuellement découpée par jour ou par mois (`granularite`), à partir des
+    agrégats journaliers.
+    """
+    if axe not in AXES + (None,) or granularite not in GRANULARITES + (None,):
+        raise ValueError("Axe ou granularité inconnus.")
+    qs = UtilisationMachine.objects.filter(jour__gte=debut, jour__lte=fin).order_by()
+    if machine_id is not None:
+        qs = qs.filter(machine_id=machine_id)
+    colonne = {'machine': 'machine_id', 'equipe': 'equipe', None: None}[axe]
+    champs = [c for c in (colonne, granularite) if c]
+    sommes = dict(
+        ouvert=Sum('temps_ouvert'), occupe=Sum('temps_occupe', filter=~Q(equipe='')),
+        hors=Sum('temps_occupe', filter=Q(equipe='')), pointe=Sum('temps_pointe'),
+        chevauchement=Sum('temps_chevauchement'), creux=Sum('temps_creux'), creux_max=Max('creux_max'),
+        pointages=Sum('pointages'),
+    )
+    if champs:
+        groupes = qs.values(*champs).annotate(**sommes)
+    else:
+        total = qs.aggregate(**sommes)
+        groupes = [total] if total['ouvert'] is not None else []
+    libelles = dict(Machine.objects.values_list('pk', 'nom')) if axe == 'machine' else {}
+    lignes = []
+    for g in groupes:
+        cle = g[colonne] if colonne else None
+        if axe == 'machine':
+            libelle = libelles.get(cle, '—')
+        elif axe == 'equipe':
+            libelle = cle or 'Hors équipe'
+        else:
+            libelle = 'Atelier'
+        occupe, hors = g['occupe'] or 0, g['hors'] or 0
+        lignes.append(LigneUtilisation(
+            cle=cle, libelle=libelle, periode=g[granularite].isoformat() if granularite else None,
+            heures_ouvertes=_heures(g['ouvert']), heures_occupees=_heures(occupe), heures_hors_equipe=_heures(hors),
+            heures_pointees=_heures(g['pointe']), heures_chevauchement=_heures(g['chevauchement']),
+            heures_creux=_heures(g['creux']), creux_max_h=_heures(g['creux_max']),
+            taux_utilisation=_ratio(occupe, g['ouvert'] or 0), taux_chevauchement=_ratio(g['chevauchement'] or 0, occupe + hors),
+            pointages=g['pointages'] or 0,
+        ))
+    lignes.sort(key=lambda l: (l.libelle, l.periode or ''))
+    return lignes
+
+
+@dataclass
+class EtatMachine:
+    cle: int
+    libelle: str
+    statut: str
+    pointages_en_cours: int
+    derniere_fin: Optional[datetime]   # vide : aucun pointage clôturé depuis HORIZON_ETAT
+
+    @property
+    def occupee(self) -> bool:
+        return self.pointages_en_cours > 0
+
+    def as_dict(self):
+        return dict(asdict(self), occupee=self.occupee)
+
+
+def etat_machines() -> List[EtatMachine]:
+    """État en direct : pointages ouverts sur chaque machine et dernière fin de pointage."""
+    maintenant = timezone.now()
+    sur_machine = Pointage.objects.filter(operation__machine_assignee__isnull=False).order_by()
+    en_cours = dict(
+        sur_machine.filter(heure_fin__isnull=True).values('operation__machine_assignee_id')
+        .annotate(nombre=Count('pk')).values_list('operation__machine_assignee_id', 'nombre')
+    )
+    dernieres = dict(
+        sur_machine.filter(heure_fin__gte=maintenant - HORIZON_ETAT, heure_fin__lte=maintenant)
+        .values('operation__machine_assignee_id').annotate(fin=Max('heure_fin'))
+        .values_list('operation__machine_assignee_id', 'fin')
+    )
+    return [
+        EtatMachine(cle=pk, libelle=nom, statut=statut, pointages_en_cours=en_cours.get(pk, 0), derniere_fin=dernieres.get(pk))
+        for pk, nom, statut in Machine.objects.order_by('nom').values_list('pk', 'nom', 'statut')
+    ]
@@ -0,0 +1,75 @@
+"""
+Version des données de production et ETags des APIs et rapports.
+
+La version est un compteur en base (VersionDonnees), incrémenté après la validation
+de chaque transaction qui modifie les données. Les vues décorées par
+`revalidation_par_version` (decorators.py) calculent leur ETag à partir de cette
+version, ce qui coûte une lecture par clé primaire : quand le client présente le
+même ETag, la réponse 304 part sans exécuter la vue.
+"""
+from __future__ import annotations
+import hashlib
+import threading
+from typing import Optional
+
+from django.contrib import messages
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone, translation
+
+from ..models import VersionDonnees
+
+PK_VERSION = 1
+
+
+def version_courante() -> int:
+    return VersionDonnees.objects.filter(pk=PK_VERSION).values_list('version', flat=True).first() or 0
+
+
+def _incrementer() -> None:
+    if not VersionDonnees.objects.filter(pk=PK_VERSION).update(version=F('version') + 1):
+        VersionDonnees.objects.get_or_create(pk=PK_VERSION, defaults={'version': 1})
+
+
+# Demandes d'incrément du fil courant (une connexion par fil), numérotées
+_demandes = threading.local()
+
+
+class _Increment:
+    """
+    Rappel on_commit d'une demande d'incrément. Les rappels d'une transaction s'exécutent
+    à la suite, juste après sa validation : le premier incrémente pour toutes les demandes
+    faites jusque-là, les suivants n'ont plus rien à faire. Ceux d'une transaction (ou
+    d'un point de sauvegarde) annulée ne sont jamais exécutés et ne masquent rien.
+    """
+
+    def __init__(self):
+        _demandes.numero = self.numero = getattr(_demandes, 'numero', 0) + 1
+
+    def __call__(self):
+        if getattr(_demandes, 'servies', 0) < self.numero:
+            _demandes.servies = _demandes.numero
+            _incrementer()
+
+
+def incrementer_version() -> None:
+    """
+    Invalide les ETags en cours. L'incrément est fait après validation de la transaction
+    courante, une seule fois par transaction : aucun verrou n'est gardé sur le compteur
+    pendant les écritures.
+    """
+    transaction.on_commit(_Increment())
+
+
+def etag_donnees(request, *args, **kwargs) -> Optional[str]:
+    """
+    ETag faible : version des données, jour courant (les pages "du jour" changent à
+    minuit), utilisateur et langue (la barre de navigation et les libellés en dépendent).
+    Pas d'ETag si des messages flash attendent d'être affichés.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    cle = '|'.join(str(v) for v in (
+        version_courante(), timezone.now().date(), request.user.pk, translation.get_language(),
+    ))
+    return 'W/"%s"' % hashlib.blake2s(cle.encode(), digest_size=8).hexdigest()
@@ -0,0 +1,32 @@
+"""Données et connexions communes aux tests (atelier minimal, manager connecté)."""
+from django.contrib.auth.models import User
+from ..models import Operateur, Pointage, PosteDeTravail, Profile
+
+
+def creer_postes(*noms):
+    """Postes de travail `noms`, 'Découpe' et 'Pliage' par défaut."""
+    return [PosteDeTravail.objects.create(nom=nom) for nom in (noms or ('Découpe', 'Pliage'))]
+
+
+def creer_operateurs(nombre=1, **champs):
+    """Opérateurs OP1, OP2... OP`nombre`."""
+    return [Operateur.objects.create(code=f'OP{i}', nom='Nom', prenom='P', **champs) for i in range(1, nombre + 1)]
+
+
+def creer_pointage(operation, operateur, debut, fin=None, **champs):
+    """Pointage de `debut` à `fin`, en cours si `fin` est vide."""
+    return Pointage.objects.create(operation=operation, operateur=operateur, heure_debut=debut, heure_fin=fin, **champs)
+
+
+def creer_manager(username='manager'):
+    """Utilisateur au rôle MANAGER, mot de passe 'pwd'."""
+    user = User.objects.create_user(username, password='pwd')
+    Profile.objects.create(user=user, role='MANAGER')
+    return user
+
+
+def connecter_manager(client, username='manager'):
+    """Crée un manager et le connecte sur `client`."""
+    user = creer_manager(username)
+    client.login(username=username, password='pwd')
+    return user
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation, PosteDeTravail, Operateur, Anomalie
+from ..services.analyse_anomalies import analyse_anomalies, calculer_analyse, ventilations
+from ..services.archivage import archiver_ofs
+from .outils import connecter_manager
+
+
+class AnalyseAnomaliesTests(TestCase):
+    def setUp(self):
+        cache.clear()  # la version des données repart de zéro à chaque test
+        self.maintenant = timezone.now()
+        self.jour = self.maintenant.date()
+        self.operateur = Operateur.objects.create(code='OP1', nom='Nom', prenom='P')
+        self.postes = [PosteDeTravail.objects.create(nom=nom) for nom in ('Découpe', 'Pliage')]
+        self.operations = []
+        for i, poste in enumerate(self.postes):
+            of = OrdreFabrication.objects.create(numero_of=f'OF-{i}', titre='Pièce', quantite_a_produire=10)
+            self.operations.append(Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=poste, titre='Phase'))
+
+    def _anomalie(self, operation, heures_resolution=None):
+        anomalie = Anomalie.objects.create(operation=operation, operateur=self.operateur, description='Problème')
+        if heures_resolution is not None:
+            anomalie.statut = 'RESOLUE'
+            anomalie.date_resolution = anomalie.date_signalement + timedelta(hours=heures_resolution)
+            anomalie.save()
+        return anomalie
+
+    def test_ventilation_mttr_et_pareto(self):
+        for heures in (1, 3, None):
+            self._anomalie(self.operations[0], heures)
+        self._anomalie(self.operations[1], 4)
+        lignes = ventilations(self.jour, self.jour)['poste']
+        self.assertEqual([(l.libelle, l.nombre, l.ouvertes, l.mttr_heures) for l in lignes],
+                         [('Découpe', 3, 1, 2.0), ('Pliage', 1, 0, 4.0)])
+        self.assertEqual([(l.part, l.cumul, l.pareto) for l in lignes], [(75.0, 75.0, True), (25.0, 100.0, True)])
+
+    def test_anomalies_archivees_incluses(self):
+        self._anomalie(self.operations[0], 2)
+        self._anomalie(self.operations[1], 6)
+        archiver_ofs(OrdreFabrication.objects.filter(pk=self.operations[1].ordre_fabrication_id))
+        analyse = calculer_analyse(self.jour, self.jour)
+        self.assertEqual((analyse.total, analyse.ouvertes, analyse.mttr_heures), (2, 0, 4.0))
+        self.assertEqual({l.libelle for l in analyse.ventilations['of']}, {'OF-0', 'OF-1'})
+        [semaine] = analyse.tendance
+        self.assertEqual((semaine.nombre, semaine.resolues), (2, 2))
+
+    def test_cache_invalide_par_version(self):
+        self._anomalie(self.operations[0])
+        self.assertEqual(analyse_anomalies(self.jour, self.jour).total, 1)
+        with self.assertNumQueries(1):  # lecture de la version seule
+            analyse_anomalies(self.jour, self.jour)
+        with self.captureOnCommitCallbacks(execute=True):
+            self._anomalie(self.operations[1])
+        self.assertEqual(analyse_anomalies(self.jour, self.jour).total, 2)
+
+    def test_page_et_api(self):
+        connecter_manager(self.client)
+        self._anomalie(self.operations[0], 1)
+        self.assertContains(self.client.get('/rapports/anomalies/?axe=machine&jours=30'), 'Analyse des anomalies')
+        donnees = self.client.get('/api/anomalies/analyse/').json()
+        self.assertEqual(donnees['total'], 1)
+        self.assertEqual(set(donnees['ventilations']), {'poste', 'machine', 'operateur', 'of'})
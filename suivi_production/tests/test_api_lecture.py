@@ -0,0 +1,71 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ..models import Anomalie, OrdreFabrication, Operation, PosteDeTravail
+from ..services.api_lecture import ErreurRequete, page
+
+
+@override_settings(API_LECTURE_JETON='secret')
+class APILectureTests(TestCase):
+    def setUp(self):
+        poste = PosteDeTravail.objects.create(nom='Découpe')
+        for i in range(5):
+            of = OrdreFabrication.objects.create(numero_of=f'OF-{i}', titre='Pièce', quantite_a_produire=10)
+            Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=poste, titre='Coupe')
+        # Lignes écrites il y a une heure, hors de la marge de visibilité
+        self.avant = timezone.now() - timedelta(hours=1)
+        OrdreFabrication.objects.update(date_modification=self.avant)
+        Operation.objects.update(date_modification=self.avant)
+        self.auth = {'HTTP_AUTHORIZATION': 'Bearer secret'}
+
+    def test_pagination_incrementale(self):
+        premiere = page('ofs', fields='numero_of', limite='2')
+        self.assertEqual([l['numero_of'] for l in premiere.lignes], ['OF-0', 'OF-1'])
+        self.assertEqual(premiere.lignes[0], {'numero_of': 'OF-0'})
+        self.assertFalse(premiere.fin)
+        suite = page('ofs', curseur=premiere.curseur, limite='10')
+        self.assertEqual([l['numero_of'] for l in suite.lignes], ['OF-2', 'OF-3', 'OF-4'])
+        self.assertTrue(suite.fin)
+
+        # Synchronisation suivante : seule la ligne modifiée depuis est rendue
+        of = OrdreFabrication.objects.get(numero_of='OF-1')
+        of.titre = 'Renommé'
+        of.save()
+        self.assertEqual(page('ofs', curseur=suite.curseur).lignes, [])  # encore dans la marge
+        nouvelle = page('ofs', curseur=suite.curseur, marge=timedelta(0))
+        self.assertEqual([(l['numero_of'], l['titre']) for l in nouvelle.lignes], [('OF-1', 'Renommé')])
+        self.assertEqual(page('ofs', curseur=nouvelle.curseur, marge=timedelta(0)).lignes, [])
+        self.assertEqual(len(page('ofs', updated_since=(self.avant + timedelta(minutes=1)).isoformat(), marge=timedelta(0)).lignes), 1)
+
+        for parametres in ({'fields': 'mot_de_passe'}, {'curseur': 'xyz'}, {'limite': '0'}, {'updated_since': 'hier'}):
+            with self.assertRaises(ErreurRequete):
+                page('ofs', **parametres)
+
+    def test_resolution_d_anomalie_synchronisee(self):
+        anomalie = Anomalie.objects.create(operation=Operation.objects.first(), description='Bavure')
+        Anomalie.objects.update(date_modification=self.avant)
+        curseur = page('anomalies', marge=timedelta(0)).curseur
+        self.client.force_login(User.objects.create_user('chef'))
+        self.assertEqual(self.client.post(f'/api/anomalie/{anomalie.pk}/resolve/').json()['status'], 'success')
+        [ligne] = page('anomalies', curseur=curseur, marge=timedelta(0)).lignes
+        self.assertEqual((ligne['id'], ligne['statut']), (anomalie.pk, 'RESOLUE'))
+
+    def test_vue_json_et_ndjson(self):
+        self.assertEqual(self.client.get('/api/v1/ofs/').status_code, 403)
+        reponse = self.client.get('/api/v1/operations/?limite=3&fields=id,ordre_fabrication_id,numero_phase', **self.auth)
+        donnees = reponse.json()
+        self.assertEqual((donnees['version'], len(donnees['donnees']), donnees['fin']), (1, 3, False))
+        self.assertEqual(set(donnees['donnees'][0]), {'id', 'ordre_fabrication_id', 'numero_phase'})
+        self.assertEqual(self.client.get('/api/v1/inconnue/', **self.auth).status_code, 400)
+
+        reponse = self.client.get('/api/v1/ofs/?format=ndjson&limite=3', **self.auth)
+        lignes = [json.loads(l) for l in b''.join(reponse.streaming_content).decode().splitlines()]
+        self.assertEqual([l['numero_of'] for l in lignes], ['OF-0', 'OF-1', 'OF-2'])
+        self.assertEqual(reponse['X-Fin'], 'false')
+        reponse = self.client.get(f"/api/v1/ofs/?format=ndjson&limite=10&curseur={reponse['X-Curseur']}", **self.auth)
+        lignes = [json.loads(l) for l in b''.join(reponse.streaming_content).decode().splitlines()]
+        self.assertEqual([l['numero_of'] for l in lignes], ['OF-3', 'OF-4'])
+        self.assertEqual(reponse['X-Fin'], 'true')
@@ -0,0 +1,58 @@
+import datetime
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from ..models import (
+    OrdreFabrication, Operation, PosteDeTravail, Operateur, Pointage, Anomalie, MatierePremiere, MatiereRequise,
+    OrdreFabricationArchive, PointageArchive,
+)
+from ..services.archivage import archiver_ofs, restaurer_ofs
+
+
+class ArchivageTests(TestCase):
+    def setUp(self):
+        poste = PosteDeTravail.objects.create(nom='Usinage')
+        operateur = Operateur.objects.create(code='OP1', nom='Martin', prenom='Paul')
+        matiere = MatierePremiere.objects.create(reference='AL-01', designation='Tube alu')
+        self.of = OrdreFabrication.objects.create(numero_of='OF-A1', titre='Bras de fixation', quantite_a_produire=10, statut='TERMINE')
+        OrdreFabrication.objects.filter(pk=self.of.pk).update(date_creation=datetime.date(2024, 1, 15))
+        op = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=poste, titre='Tournage', statut='TERMINEE')
+        MatiereRequise.objects.create(operation=op, matiere=matiere, quantite_necessaire=2)
+        debut = timezone.now() - datetime.timedelta(hours=1)
+        Pointage.objects.create(operation=op, operateur=operateur, heure_debut=debut, heure_fin=timezone.now(), quantite_fabriquee=9, quantite_rebut=1)
+        Anomalie.objects.create(operation=op, operateur=operateur, description='Bavure')
+        self.of_actif = OrdreFabrication.objects.create(numero_of='OF-A2', titre='En cours', statut='PRODUCTION')
+
+    def test_archivage_deplace_les_donnees(self):
+        self.assertEqual(archiver_ofs(OrdreFabrication.objects.filter(statut='TERMINE'), taille_lot=1), 1)
+        self.assertFalse(OrdreFabrication.objects.filter(pk=self.of.pk).exists())
+        self.assertFalse(Pointage.objects.exists())
+        archive = OrdreFabricationArchive.objects.get(pk=self.of.pk)
+        self.assertEqual((archive.quantite_produite, archive.quantite_rebut), (9, 1))
+        self.assertEqual(archive.operations.get().matieres.count(), 1)
+        self.assertEqual(PointageArchive.objects.count(), 1)
+        self.assertTrue(OrdreFabrication.objects.filter(pk=self.of_actif.pk).exists())
+
+    def test_restauration_a_l_identique(self):
+        date_signalement = Anomalie.objects.get().date_signalement
+        archiver_ofs(OrdreFabrication.objects.filter(pk=self.of.pk))
+        self.assertEqual(restaurer_ofs(OrdreFabricationArchive.objects.all()), 1)
+        of = OrdreFabrication.objects.get(pk=self.of.pk)
+        self.assertEqual(of.date_creation, datetime.date(2024, 1, 15))
+        self.assertEqual(of.quantite_produite_actuelle, 9)
+        self.assertEqual(of.operations.get().matiererequise_set.count(), 1)
+        self.assertEqual(Anomalie.objects.get().date_signalement, date_signalement)
+        self.assertFalse(OrdreFabricationArchive.objects.exists())
+
+    def test_restauration_ignore_numero_reutilise(self):
+        archiver_ofs(OrdreFabrication.objects.filter(pk=self.of.pk))
+        OrdreFabrication.objects.create(numero_of='OF-A1', titre='Nouveau')
+        self.assertEqual(restaurer_ofs(OrdreFabricationArchive.objects.all()), 0)
+        self.assertTrue(OrdreFabricationArchive.objects.filter(pk=self.of.pk).exists())
+
+    def test_commande_archiver_ofs(self):
+        out = StringIO()
+        call_command('archiver_ofs', '--jours', '1', stdout=out)
+        self.assertIn('1 OF(s)', out.getvalue())
+        self.assertTrue(OrdreFabricationArchive.objects.filter(numero_of='OF-A1').exists())
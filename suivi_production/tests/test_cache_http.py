@@ -0,0 +1,97 @@
+import gzip
+import json
+import unittest
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..middleware import brotli, encodages_acceptes
+from ..models import CubeRebutEnAttente, OrdreFabrication, Operation, PosteDeTravail, Operateur, Pointage
+from ..services.version_donnees import version_courante
+from .outils import connecter_manager
+
+
+class RevalidationTests(TestCase):
+    def setUp(self):
+        connecter_manager(self.client)
+        poste = PosteDeTravail.objects.create(nom='Découpe')
+        of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.operation = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=poste, titre='Phase 1', quantite_entree=10)
+        self.operateur = Operateur.objects.create(code='OP1', nom='Nom', prenom='P')
+
+    def test_304_sans_calcul(self):
+        reponse = self.client.get('/api/dashboard-data/')
+        etag = reponse['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('no-cache', reponse['Cache-Control'])
+        with CaptureQueriesContext(connection) as capture:
+            reponse = self.client.get('/api/dashboard-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 304)
+        self.assertEqual(reponse.content, b'')
+        # Session, utilisateur et version : aucune requête sur les données de production
+        tables = ' '.join(q['sql'] for q in capture.captured_queries)
+        self.assertNotIn('suivi_production_pointage', tables)
+        self.assertNotIn('suivi_production_operation', tables)
+
+    def test_modification_invalide_etag(self):
+        etag = self.client.get('/rapports/rebuts/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Pointage.objects.create(operation=self.operation, operateur=self.operateur, heure_debut=timezone.now(),
+                                    quantite_prise_en_charge=2)
+        self.assertGreater(version_courante(), 0)
+        reponse = self.client.get('/rapports/rebuts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(reponse.status_code, 200)
+        self.assertNotEqual(reponse['ETag'], etag)
+
+    def test_version_incrementee_une_fois_par_transaction(self):
+        CubeRebutEnAttente.objects.all().delete()
+        with CaptureQueriesContext(connection) as capture, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for _ in range(3):
+                    Pointage.objects.create(operation=self.operation, operateur=self.operateur, heure_debut=timezone.now(),
+                                            heure_fin=timezone.now())
+                self.operation.save()
+        self.assertEqual(version_courante(), 1)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE') and 'versiondonnees' in q['sql']
+                             for q in capture.captured_queries), 1)
+        self.assertEqual(CubeRebutEnAttente.objects.count(), 1)
+
+        # Une demande faite dans un point de sauvegarde annulé ne masque pas les suivantes
+        CubeRebutEnAttente.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.operation.save()
+                    raise ValueError
+            except ValueError:
+                pass
+            self.assertFalse(CubeRebutEnAttente.objects.exists())
+            self.operation.save()
+        self.assertTrue(CubeRebutEnAttente.objects.exists())
+        self.assertEqual(version_courante(), 2)
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        connecter_manager(self.client)
+
+    def test_negociation(self):
+        self.assertEqual(encodages_acceptes('gzip, deflate, br;q=0'), {'gzip', 'deflate'})
+        self.assertEqual(encodages_acceptes('br;q=0.8, *'), {'br', '*'})
+
+    def test_json_gzip(self):
+        reponse = self.client.get('/api/dashboard-data/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(reponse['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', reponse['Vary'])
+        self.assertIn('kpis', json.loads(gzip.decompress(reponse.content)))
+
+    @unittest.skipUnless(brotli, "module brotli non installé")
+    def test_json_brotli(self):
+        reponse = self.client.get('/api/dashboard-data/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(reponse['Content-Encoding'], 'br')
+        self.assertIn('kpis', json.loads(brotli.decompress(reponse.content)))
+
+    def test_html_non_compresse(self):
+        reponse = self.client.get('/historique/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(reponse.has_header('Content-Encoding'))
@@ -0,0 +1,29 @@
+from django.test import TestCase
+from ..charge import Statistiques, plan_de_travail, _percentile
+from ..models import OrdreFabrication, Operation, PosteDeTravail, Operateur
+
+
+class StatistiquesTests(TestCase):
+    def test_percentiles_erreurs_et_refus(self):
+        self.assertEqual(_percentile([10, 20, 30, 40, 50], 50), 30)
+        stats = Statistiques()
+        for statut in (200, 304, 400, 500, 0):
+            stats.enregistrer('api', statut, 0.01)
+        [ligne] = stats.rapport(duree=5)
+        self.assertEqual((ligne.requetes, ligne.erreurs, ligne.refus), (5, 2, 1))
+        self.assertEqual(ligne.req_par_s, 1)
+        self.assertEqual(ligne.statuts, {'0': 1, '200': 1, '304': 1, '400': 1, '500': 1})
+
+
+class PlanDeTravailTests(TestCase):
+    def test_un_of_par_terminal(self):
+        poste = PosteDeTravail.objects.create(nom='Découpe')
+        Operateur.objects.create(code='OP1', nom='Nom', prenom='P').postes_qualifies.add(poste)
+        for i in range(3):
+            of = OrdreFabrication.objects.create(numero_of=f'OF-{i}', titre='Pièce', quantite_a_produire=5, statut='PLANIFIE')
+            for phase in (1, 2):
+                Operation.objects.create(ordre_fabrication=of, numero_phase=phase, poste=poste, titre=f'Phase {phase}')
+        lots, qualifies = plan_de_travail(2)
+        self.assertEqual([[g.numero_of for g in lot] for lot in lots], [['OF-0', 'OF-2'], ['OF-1']])
+        self.assertEqual(lots[0][0].phases, [(1, poste.pk), (2, poste.pk)])
+        self.assertEqual(qualifies, {poste.pk: ['OP1']})
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation
+from ..services.chronologie import chronologie_of
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+class ChronologieTests(TestCase):
+    def setUp(self):
+        [poste] = creer_postes('Découpe')
+        self.operateurs = creer_operateurs(3)
+        self.of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.coupe = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=poste, titre='Coupe')
+        self.pliage = Operation.objects.create(ordre_fabrication=self.of, numero_phase=2, poste=poste, titre='Pliage')
+        self.t0 = (timezone.now() - timedelta(days=2)).replace(hour=8, minute=0, second=0, microsecond=0)
+        h = lambda heures: self.t0 + timedelta(hours=heures)
+        # Coupe : 8h-11h à 1, 2 puis 3 opérateurs, 12h-13h seul (creux d'une heure)
+        for operateur, debut, fin in ((0, 0, 3), (1, 1, 2), (2, 1, 2.5), (0, 4, 5)):
+            creer_pointage(self.coupe, self.operateurs[operateur], h(debut), h(fin))
+
+    def test_intervalles_niveaux_et_creux(self):
+        coupe, pliage = chronologie_of(self.of.pk)
+        h = lambda heures: self.t0 + timedelta(hours=heures)
+        self.assertEqual(coupe.intervalles, [(h(0), h(3)), (h(4), h(5))])
+        self.assertEqual(coupe.creux, [(h(3), h(4))])
+        self.assertEqual([(s.debut, s.fin, s.niveau) for s in coupe.niveaux],
+                         [(h(0), h(1), 1), (h(1), h(2), 3), (h(2), h(2.5), 2), (h(2.5), h(3), 1), (h(4), h(5), 1)])
+        self.assertEqual((coupe.pointages, coupe.minutes_pointees, coupe.minutes_occupees, coupe.minutes_creux, coupe.parallelisme_max),
+                         (4, 390.0, 240.0, 60.0, 3))
+        self.assertEqual((pliage.pointages, pliage.intervalles, pliage.debut), (0, [], None))
+
+        # Pointage en cours : compté jusqu'à maintenant ; filtre par jour de début
+        debut = timezone.now() - timedelta(minutes=30)
+        creer_pointage(self.pliage, self.operateurs[1], debut)
+        [pliage] = chronologie_of(self.of.pk, operation_id=self.pliage.pk)
+        self.assertAlmostEqual(pliage.minutes_occupees, 30, delta=1)
+        jour = timezone.localtime(debut).date()
+        self.assertEqual([o.pointages for o in chronologie_of(self.of.pk, debut=jour, fin=jour)], [0, 1])
+
+    def test_api_et_suivi_pagine(self):
+        connecter_manager(self.client)
+        donnees = self.client.get(f'/api/of/{self.of.pk}/chronologie/').json()
+        self.assertEqual(donnees['of']['numero_of'], 'OF-1')
+        self.assertEqual(donnees['operations'][0]['parallelisme_max'], 3)
+        self.assertEqual(len(donnees['operations'][0]['creux']), 1)
+        self.assertEqual(self.client.get('/api/of/999/chronologie/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/of/{self.of.pk}/chronologie/?debut=hier').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/of/{self.of.pk}/chronologie/?fin=2026-02-30').json()['message'],
+                         'Date invalide (AAAA-MM-JJ).')
+
+        self.assertEqual([o['code'] for o in self.client.get('/api/operateurs/?q=op1').json()['operateurs']], ['OP1'])
+        reponse = self.client.get(f'/suivi-atelier/of/{self.of.pk}/?operateur_filtre={self.operateurs[0].pk}')
+        self.assertEqual(reponse.context['page_obj'].paginator.count, 2)
+        self.assertEqual(reponse.context['operateur'], self.operateurs[0])
+        self.assertEqual(self.client.get(f'/suivi-atelier/of/{self.of.pk}/?operateur_filtre=x').context['page_obj'].paginator.count, 4)
+        self.assertEqual(self.client.get(f'/suivi-atelier/of/{self.of.pk}/?date_filtre=2026-02-30').context['page_obj'].paginator.count, 4)
+
+        # Un pointage ouvert s'allonge sans nouvelle écriture : la réponse n'est pas revalidée par version
+        creer_pointage(self.pliage, self.operateurs[1], timezone.now() - timedelta(minutes=30))
+        self.assertNotIn('ETag', self.client.get(f'/api/of/{self.of.pk}/chronologie/'))
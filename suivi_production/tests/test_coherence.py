@@ -0,0 +1,69 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation, PosteDeTravail, Operateur, Pointage, EnCoursPoste, Evenement
+from ..services.coherence import verifier_coherence
+from ..services.delais import reconstruire_en_cours
+
+
+class CoherenceTests(TestCase):
+    def setUp(self):
+        self.poste = PosteDeTravail.objects.create(nom='Découpe')
+        operateur = Operateur.objects.create(code='OP1', nom='Nom', prenom='P')
+        self.hier = (timezone.now() - timedelta(days=1)).replace(hour=8, minute=0)
+        # OF-1 : phase 1 terminée (8 bonnes, 2 rebuts), phase 2 débloquée avec 8 pièces
+        self.of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.coupe = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=self.poste,
+                                              titre='Coupe', quantite_entree=10, statut='TERMINEE')
+        self.pliage = Operation.objects.create(ordre_fabrication=self.of, numero_phase=2, poste=self.poste,
+                                               titre='Pliage', quantite_entree=8)
+        Pointage.objects.create(operation=self.coupe, operateur=operateur, heure_debut=self.hier,
+                                heure_fin=self.hier + timedelta(hours=1), quantite_fabriquee=8, quantite_rebut=2)
+        self.of.update_statut()
+        # OF-2 : entièrement terminé
+        self.termine = OrdreFabrication.objects.create(numero_of='OF-2', titre='Pièce', quantite_a_produire=3)
+        operation = Operation.objects.create(ordre_fabrication=self.termine, numero_phase=1, poste=self.poste,
+                                             titre='Coupe', quantite_entree=3, statut='TERMINEE')
+        Pointage.objects.create(operation=operation, operateur=operateur, heure_debut=self.hier,
+                                heure_fin=self.hier + timedelta(hours=2), quantite_fabriquee=3)
+        self.termine.update_statut()
+
+    def test_base_coherente(self):
+        self.assertEqual((self.of.statut, self.termine.statut), ('PRODUCTION', 'TERMINE'))
+        rapport = verifier_coherence(taille_tranche=1)
+        self.assertEqual(rapport.ofs_verifies, 2)
+        self.assertFalse(any(rapport.ecarts.values()))
+
+    def test_rapport_puis_correction(self):
+        # Dérives d'une correction à la main (écritures en masse, sans signaux)
+        OrdreFabrication.objects.filter(pk=self.of.pk).update(statut='TERMINE')
+        OrdreFabrication.objects.filter(pk=self.termine.pk).update(statut='PRODUCTION', date_premiere_finalisation=None)
+        Operation.objects.filter(pk=self.pliage.pk).update(quantite_entree=10)
+        Pointage.objects.create(operation=self.pliage, operateur=Operateur.objects.get(), heure_debut=self.hier,
+                                heure_fin=self.hier, quantite_fabriquee=12)
+        reconstruire_en_cours()
+
+        sortie = StringIO()
+        call_command('verifier_coherence', '--details', stdout=sortie)
+        self.assertIn('OF-1/2 : entrée 10 au lieu de 8', sortie.getvalue())
+        self.assertEqual(OrdreFabrication.objects.get(pk=self.of.pk).statut, 'TERMINE')  # rapport seul
+
+        # OF-2 repasse à TERMINE puis reçoit sa date dans la même tranche
+        rapport = verifier_coherence(corriger=True)
+        self.assertEqual(rapport.ecarts, {'statut_of': 2, 'date_finalisation': 1, 'quantite_entree': 1,
+                                          'operation_incomplete': 0, 'sur_production': 1})
+        self.assertEqual(rapport.corriges, {'statut_of': 2, 'date_finalisation': 1, 'quantite_entree': 1})
+        self.assertEqual(OrdreFabrication.objects.get(pk=self.of.pk).statut, 'PRODUCTION')
+        termine = OrdreFabrication.objects.get(pk=self.termine.pk)
+        self.assertEqual((termine.statut, termine.date_premiere_finalisation), ('TERMINE', self.hier.date()))
+        self.assertEqual(Operation.objects.get(pk=self.pliage.pk).quantite_entree, 8)
+        self.assertEqual(EnCoursPoste.objects.get(poste=self.poste).pieces_en_attente, 8)
+        self.assertEqual(Evenement.objects.filter(type='OF_STATUT', donnees__correction=True).count(), 2)
+
+        # Seule la surproduction, non corrigeable, reste signalée
+        rapport = verifier_coherence()
+        self.assertEqual(rapport.ecarts['sur_production'], 1)
+        self.assertEqual(sum(rapport.ecarts.values()), 1)
@@ -0,0 +1,25 @@
+from django.test import SimpleTestCase
+from aerotrack_erp.connexions import parametres_connexion
+
+POSTGRES = 'django.db.backends.postgresql'
+
+
+class ParametresConnexionTests(SimpleTestCase):
+    def test_connexions_courtes_par_defaut(self):
+        self.assertEqual(parametres_connexion('courtes', POSTGRES, {})['CONN_MAX_AGE'], 0)
+
+    def test_connexions_persistantes_verifiees(self):
+        parametres = parametres_connexion('persistantes', POSTGRES, {'DB_CONN_MAX_AGE': '120'})
+        self.assertEqual((parametres['CONN_MAX_AGE'], parametres['CONN_HEALTH_CHECKS']), (120, True))
+
+    def test_pool_dimensionne_sur_les_threads_gunicorn(self):
+        parametres = parametres_connexion('pool', POSTGRES, {'GUNICORN_THREADS': '8'})
+        self.assertEqual(parametres['OPTIONS']['pool']['max_size'], 8)
+        self.assertEqual(parametres['CONN_MAX_AGE'], 0)
+
+    def test_pool_ignore_hors_postgresql(self):
+        self.assertEqual(parametres_connexion('pool', 'django.db.backends.sqlite3', {})['OPTIONS'], {})
+
+    def test_mode_inconnu(self):
+        with self.assertRaises(ValueError):
+            parametres_connexion('illimitees', POSTGRES, {})
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+from ..models import (
+    OrdreFabrication, Operation, Operateur, Pointage, CoutEnAttente, CoutMensuel,
+)
+from ..services.archivage import archiver_ofs
+from ..services.couts import rafraichir_couts, couts, ecarts_couts
+from .outils import connecter_manager, creer_pointage, creer_postes
+
+
+class CoutsTests(TestCase):
+    def setUp(self):
+        self.maintenant = timezone.now().replace(microsecond=0)
+        [self.poste] = creer_postes('Découpe')
+        self.operateurs = [Operateur.objects.create(code=f'OP{i}', nom='Nom', prenom='P', cout_horaire=Decimal(taux))
+                           for i, taux in ((1, '30'), (2, '50'))]
+        self.of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        # 2 h prévues
+        self.operation = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=self.poste,
+                                                  titre='Coupe', temps_prevu_minutes=Decimal('120'))
+
+    def _pointage(self, operateur, heures, cloture=True):
+        fin = self.maintenant
+        return creer_pointage(self.operation, operateur, fin - timedelta(hours=heures), fin if cloture else None)
+
+    def test_taux_fige_a_la_cloture(self):
+        pointage = self._pointage(self.operateurs[0], 1, cloture=False)
+        self.assertIsNone(pointage.cout_horaire)
+        pointage.heure_fin = self.maintenant
+        pointage.save()
+        self.assertEqual(pointage.cout_horaire, Decimal('30'))
+        self.operateurs[0].cout_horaire = Decimal('99')
+        self.operateurs[0].save()
+        pointage.refresh_from_db()
+        self.assertEqual(pointage.cout_mo, Decimal('30'))
+        rafraichir_couts()
+        self.assertEqual(couts('of').total.cout, 30.0)
+
+    def test_reel_prevu_et_ventilations(self):
+        self._pointage(self.operateurs[0], 2)     # 60 €
+        self._pointage(self.operateurs[1], 1)     # 50 €
+        self._pointage(self.operateurs[1], 1, cloture=False)
+        rafraichir_couts()
+        self.assertFalse(CoutEnAttente.objects.exists())
+        self.assertEqual(ecarts_couts(), {})
+
+        [ligne] = couts('of').lignes
+        self.assertEqual(ligne.libelle, 'OF-1')
+        self.assertEqual((ligne.heures, ligne.cout, ligne.nombre_pointages), (3.0, 110.0, 2))
+        # 2 h prévues pour 3 h réelles : coût prévu = 110 × 2/3
+        self.assertEqual(ligne.heures_prevues, 2.0)
+        self.assertAlmostEqual(ligne.cout_prevu, 73.33, places=2)
+        self.assertAlmostEqual(ligne.ecart_pct, 50.0, places=1)
+
+        par_operateur = {l.libelle.split(' ')[0]: l.cout for l in couts('operateur').lignes}
+        self.assertEqual(par_operateur, {'OP1': 60.0, 'OP2': 50.0})
+        self.assertEqual([l.cout for l in couts('operateur').lignes], [60.0, 50.0])  # tri par coût décroissant
+        self.assertEqual(couts('operateur', filtres={'operateur': self.operateurs[1].pk}).total.cout, 50.0)
+        [mois] = couts('mois').lignes
+        self.assertEqual(mois.cle, timezone.localdate(self.maintenant).replace(day=1).isoformat())
+        with self.assertRaises(ValueError):
+            couts('inconnu')
+
+    def test_incremental_et_archives(self):
+        self._pointage(self.operateurs[0], 1)
+        rafraichir_couts()
+        self._pointage(self.operateurs[0], 1)
+        self.assertEqual(list(CoutEnAttente.objects.values_list('pk', flat=True)), [self.of.pk])
+        self.assertEqual(rafraichir_couts(), 1)
+        self.assertEqual(couts('of').total.cout, 60.0)
+
+        # Les coûts d'un OF archivé restent dans les agrégats
+        archiver_ofs(OrdreFabrication.objects.all())
+        rafraichir_couts()
+        self.assertEqual(couts('of').total.cout, 60.0)
+        self.assertEqual(CoutMensuel.objects.count(), 1)
+
+    def test_export_csv_calcule_le_cout_en_sql(self):
+        self._pointage(self.operateurs[1], 2)
+        [pointage] = Pointage.objects.avec_cout()
+        self.assertAlmostEqual(pointage.cout, 100.0, places=2)
+        self.assertAlmostEqual(pointage.duree_secondes, 7200.0, places=0)
+
+    def test_page_et_api(self):
+        connecter_manager(self.client)
+        self._pointage(self.operateurs[0], 2)
+        reponse = self.client.get('/rapports/couts/?axe=poste')
+        self.assertContains(reponse, 'Découpe')
+        self.assertContains(reponse, 'axe=operateur')  # lien de drill-down
+        donnees = self.client.get(f'/api/couts/?axe=operation&of={self.of.pk}').json()
+        self.assertEqual(donnees['total']['cout'], 60.0)
+        self.assertEqual(self.client.get('/api/couts/?debut=2024-13').status_code, 400)
+        self.assertEqual(self.client.get('/api/couts/?poste=abc').status_code, 400)
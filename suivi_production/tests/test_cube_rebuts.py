@@ -0,0 +1,110 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from ..models import (
+    OrdreFabrication, Operation, Machine,
+    CubeRebut, CubeRebutEnAttente,
+)
+from ..services.archivage import archiver_ofs
+from ..services.cube_rebuts import rafraichir_cube, ecarts_cube, tranche, bornes_periode
+from ..services.reporting import queryset_rebuts_par_of
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+class CubeRebutsTests(TestCase):
+    def setUp(self):
+        self.maintenant = timezone.now()
+        self.postes = creer_postes()
+        self.machine = Machine.objects.create(nom='Presse 1')
+        self.operateurs = creer_operateurs(2)
+        self.ofs = []
+        for i in range(2):
+            of = OrdreFabrication.objects.create(numero_of=f'OF-{i}', titre='Pièce', quantite_a_produire=20)
+            Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=self.postes[0], titre='Coupe',
+                                     machine_assignee=self.machine)
+            Operation.objects.create(ordre_fabrication=of, numero_phase=2, poste=self.postes[1], titre='Pliage',
+                                     type_operation='QUALITE')
+            self.ofs.append(of)
+
+    def _pointage(self, operation, operateur, fabrique, rebut, cloture=True, jours=0):
+        fin = self.maintenant - timedelta(days=jours)
+        return creer_pointage(operation, operateur, fin - timedelta(hours=1), fin if cloture else None,
+                              quantite_fabriquee=fabrique, quantite_rebut=rebut)
+
+    def _jeu_de_donnees(self):
+        for of in self.ofs:
+            coupe, pliage = of.operations.order_by('numero_phase')
+            self._pointage(coupe, self.operateurs[0], 15, 3, jours=40)
+            self._pointage(pliage, self.operateurs[1], 12, 2)
+        self._pointage(coupe, self.operateurs[1], 0, 0, cloture=False)
+
+    def test_rafraichissement_incremental_et_coherence(self):
+        self._jeu_de_donnees()
+        rafraichir_cube()
+        self.assertFalse(CubeRebutEnAttente.objects.exists())
+        self.assertEqual(ecarts_cube(), {})
+        # Mêmes totaux que le rapport des rebuts par OF
+        for of in queryset_rebuts_par_of():
+            self.assertEqual(sum(CubeRebut.objects.filter(ordre_fabrication_id=of.pk).values_list('quantite_rebut', flat=True)),
+                             of.total_rebut)
+
+        # Un nouveau pointage clôturé ne remet en file que son OF
+        self._pointage(self.ofs[0].operations.get(numero_phase=2), self.operateurs[0], 1, 4)
+        self.assertEqual(list(CubeRebutEnAttente.objects.values_list('pk', flat=True)), [self.ofs[0].pk])
+        self.assertEqual(rafraichir_cube(), 1)
+        self.assertEqual(ecarts_cube(), {})
+
+    def test_tranches_et_pareto(self):
+        self._jeu_de_donnees()
+        rafraichir_cube()
+        par_poste = tranche('poste')
+        self.assertEqual(par_poste.total_rebut, 10)
+        self.assertEqual([(t.ligne.libelle, t.rebut, t.cumul, t.pareto) for t in par_poste.pareto],
+                         [('Découpe', 6, 60.0, True), ('Pliage', 4, 100.0, True)])
+        self.assertEqual(par_poste.pareto[0].taux_rebut, 16.67)
+
+        croise = tranche('machine', 'type_operation')
+        self.assertEqual({(c.ligne.libelle, c.colonne.cle, c.rebut) for c in croise.cellules},
+                         {('Presse 1', 'PRODUCTION', 6), ('—', 'QUALITE', 4)})
+        self.assertEqual(tranche('operateur', filtres={'machine': 'aucune'}).total_rebut, 4)
+        self.assertEqual(tranche('of', filtres={'poste': str(self.postes[0].pk)}, debut=self.maintenant.date()).total_rebut, 0)
+        self.assertEqual(len(tranche('periode', granularite='jour').pareto), 2)
+        with self.assertRaises(ValueError):
+            tranche('poste', 'poste')
+
+    def test_archivage_conserve_le_cube(self):
+        self._jeu_de_donnees()
+        rafraichir_cube()
+        archiver_ofs(OrdreFabrication.objects.filter(pk=self.ofs[1].pk))
+        rafraichir_cube()
+        self.assertEqual(tranche('of').total_rebut, 10)
+        self.assertEqual({t.ligne.libelle for t in tranche('of').pareto}, {'OF-0', 'OF-1'})
+
+    def test_bornes_periode(self):
+        self.assertEqual(bornes_periode('2024-02-01', 'mois'), ('2024-02-01', '2024-02-29'))
+        self.assertEqual(bornes_periode('2024-02-05', 'semaine'), ('2024-02-05', '2024-02-11'))
+
+    def test_page_et_api(self):
+        connecter_manager(self.client)
+        self._jeu_de_donnees()
+        reponse = self.client.get('/rapports/rebuts/cube/?lignes=poste&colonnes=operateur')
+        self.assertContains(reponse, 'Découpe')
+        self.assertContains(reponse, 'lignes=machine')  # lien de drill-down
+        donnees = self.client.get('/api/rebuts/cube/?lignes=type_operation&granularite=semaine').json()
+        self.assertEqual(donnees['total_rebut'], 10)
+        self.assertEqual(self.client.get('/api/rebuts/cube/?lignes=inconnue').status_code, 400)
+
+    def test_revalidation_apres_rafraichissement_partiel(self):
+        connecter_manager(self.client)
+        self._jeu_de_donnees()
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch('suivi_production.views.CUBE_RAFRAICHISSEMENT_LECTURE', 1):
+            reponse = self.client.get('/api/rebuts/cube/')
+        self.assertEqual(reponse.json()['total_rebut'], 5)  # un seul des deux OFs recalculé
+        # Le reste de la file, recalculé à la lecture suivante, change la réponse : pas de 304
+        with self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.get('/api/rebuts/cube/', HTTP_IF_NONE_MATCH=reponse['ETag'])
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['total_rebut'], 10)
@@ -0,0 +1,105 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation, DelaiPhase, EnCoursPoste
+from ..services.archivage import archiver_ofs
+from ..services.delais import (
+    delais_of, delais_postes, photographier_en_cours, rafraichir_delais, reconstruire_en_cours, tendance_hebdomadaire,
+)
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+class DelaisTests(TestCase):
+    def setUp(self):
+        self.t0 = timezone.now().replace(microsecond=0) - timedelta(hours=10)
+        self.postes = creer_postes()
+        [self.operateur] = creer_operateurs()
+        self.of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.coupe = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=self.postes[0],
+                                              titre='Coupe', quantite_entree=10)
+        self.pliage = Operation.objects.create(ordre_fabrication=self.of, numero_phase=2, poste=self.postes[1], titre='Pliage')
+
+    def _pointage(self, operation, debut_h, fin_h=None):
+        return creer_pointage(operation, self.operateur, self.t0 + timedelta(hours=debut_h),
+                              self.t0 + timedelta(hours=fin_h) if fin_h is not None else None)
+
+    def _en_cours(self, poste):
+        e = EnCoursPoste.objects.get(poste=poste)
+        return e.operations_en_attente, e.operations_en_cours, e.pieces_en_attente, e.pieces_en_cours
+
+    def _derouler(self):
+        """Coupe de 0 h à 3 h (deux pointages), pliage débloqué puis pointé de 5 h à 6 h."""
+        self.coupe.statut = 'EN_COURS'
+        self.coupe.save()
+        self._pointage(self.coupe, 0, 1)
+        self._pointage(self.coupe, 2, 3)
+        self.coupe.statut = 'TERMINEE'
+        self.coupe.save()
+        self.pliage.quantite_entree = 10
+        self.pliage.save()
+        self._pointage(self.pliage, 5, 6)
+        self.pliage.statut = 'TERMINEE'
+        self.pliage.save()
+
+    def test_attente_et_traitement_par_phase(self):
+        self._derouler()
+        self.assertEqual(rafraichir_delais(), 1)
+        coupe, pliage = DelaiPhase.objects.order_by('numero_phase')
+        self.assertEqual((coupe.attente_secondes, coupe.traitement_secondes), (None, 3 * 3600))
+        self.assertEqual((pliage.attente_secondes, pliage.traitement_secondes), (2 * 3600, 3600))
+        detail = delais_of(self.of.pk)
+        self.assertEqual((detail['delai_h'], detail['attente_h'], detail['traitement_h']), (6.0, 2.0, 4.0))
+
+        # Phase commencée avant la fin de la précédente : pas d'attente négative ; en cours : pas de traitement
+        self.pliage.statut = 'EN_COURS'
+        self.pliage.save()
+        self._pointage(self.pliage, 2.5)
+        rafraichir_delais()
+        pliage = DelaiPhase.objects.get(numero_phase=2)
+        self.assertEqual((pliage.attente_secondes, pliage.traitement_secondes, pliage.fin), (0.0, None, None))
+
+    def test_en_cours_incremental(self):
+        self.assertEqual(self._en_cours(self.postes[0]), (1, 0, 10, 0))
+        self.assertFalse(EnCoursPoste.objects.filter(poste=self.postes[1]).exists())  # pliage bloqué
+        self.coupe.statut = 'EN_COURS'
+        self.coupe.save()
+        self.assertEqual(self._en_cours(self.postes[0]), (0, 1, 0, 10))
+        self.coupe.poste = self.postes[1]
+        self.coupe.save()
+        self.assertEqual(self._en_cours(self.postes[0]), (0, 0, 0, 0))
+        self.assertEqual(self._en_cours(self.postes[1]), (0, 1, 0, 10))
+        self.coupe.delete()
+        self.assertEqual(self._en_cours(self.postes[1]), (0, 0, 0, 0))
+
+        Operation.objects.create(ordre_fabrication=self.of, numero_phase=3, poste=self.postes[0], titre='Reprise',
+                                 quantite_entree=4)
+        self.assertEqual(self._en_cours(self.postes[0]), (1, 0, 4, 0))
+        reconstruire_en_cours()  # le recomptage complet retrouve les compteurs tenus au fil de l'eau
+        self.assertEqual(self._en_cours(self.postes[0]), (1, 0, 4, 0))
+
+    def test_rapport_par_poste_et_tendance(self):
+        self._derouler()
+        rafraichir_delais()
+        photographier_en_cours()
+        aujourd_hui = timezone.localdate()
+        lignes = {l.libelle: l for l in delais_postes(aujourd_hui - timedelta(days=30), aujourd_hui)}
+        self.assertEqual((lignes['Pliage'].attente_h, lignes['Pliage'].delai_h, lignes['Pliage'].rang), (2.0, 3.0, 1))
+        self.assertEqual((lignes['Découpe'].attente_h, lignes['Découpe'].delai_h, lignes['Découpe'].rang), (None, 3.0, 1))
+
+        [semaine] = tendance_hebdomadaire(aujourd_hui - timedelta(days=30), aujourd_hui, self.postes[1].pk)
+        self.assertEqual((semaine.phases, semaine.delai_h, semaine.evolution_h), (1, 3.0, None))
+
+        # Les délais d'un OF archivé restent dans les agrégats
+        archiver_ofs(OrdreFabrication.objects.all())
+        rafraichir_delais()
+        self.assertEqual(DelaiPhase.objects.count(), 2)
+
+    def test_page_et_api(self):
+        connecter_manager(self.client)
+        self._derouler()
+        self.assertContains(self.client.get('/rapports/delais/'), 'Pliage')
+        donnees = self.client.get(f'/api/delais/?poste={self.postes[1].pk}').json()
+        self.assertEqual(donnees['tendance'][0]['delai_h'], 3.0)
+        self.assertEqual(self.client.get(f'/api/delais/?of={self.of.pk}').json()['delai_h'], 6.0)
+        self.assertEqual(self.client.get('/api/delais/?poste=abc').status_code, 400)
@@ -0,0 +1,27 @@
+from django.db.models import Count, Q
+from django.test import TestCase
+from ..models import OrdreFabrication, Operation, Pointage
+from ..services.donnees_synthetiques import generer_atelier
+
+
+class GenerationAtelierTests(TestCase):
+    def test_volumes_et_coherence(self):
+        volumes = generer_atelier(60, graine=7)
+        self.assertEqual(volumes.ofs, 60)
+        self.assertEqual(OrdreFabrication.objects.count(), 60)
+        self.assertEqual(Operation.objects.count(), volumes.operations)
+        self.assertEqual(Pointage.objects.count(), volumes.pointages)
+        # Un OF terminé n'a que des phases terminées et une date de finalisation
+        termines = OrdreFabrication.objects.filter(statut='TERMINE').annotate(
+            non_terminees=Count('operations', filter=~Q(operations__statut='TERMINEE')))
+        self.assertTrue(termines.exists())
+        for of in termines:
+            self.assertEqual(of.non_terminees, 0)
+            self.assertIsNotNone(of.date_premiere_finalisation)
+        # Les pointages ouverts ne concernent que des opérations en cours
+        self.assertFalse(Pointage.objects.filter(heure_fin__isnull=True).exclude(operation__statut='EN_COURS').exists())
+
+    def test_generations_successives(self):
+        generer_atelier(10)
+        generer_atelier(10)
+        self.assertEqual(OrdreFabrication.objects.count(), 20)
@@ -0,0 +1,76 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from ..models import (
+    OrdreFabrication, Operation, MatierePremiere, MatiereRequise, EnCoursPoste, GammeType,
+)
+from ..services.gammes import ErreurGamme, gamme_depuis_of, inserer_ofs, instancier_gamme
+from .outils import connecter_manager, creer_postes
+
+
+class GammesTests(TestCase):
+    def setUp(self):
+        self.decoupe, self.pliage = creer_postes()
+        self.tole = MatierePremiere.objects.create(reference='TOLE', designation='Tôle')
+        self.modele = OrdreFabrication.objects.create(numero_of='OF-MODELE', titre='Support', quantite_a_produire=5)
+        coupe = Operation.objects.create(ordre_fabrication=self.modele, numero_phase=10, poste=self.decoupe,
+                                         titre='Coupe', temps_prevu_minutes=12, quantite_entree=5)
+        Operation.objects.create(ordre_fabrication=self.modele, numero_phase=20, poste=self.pliage, titre='Pliage')
+        MatiereRequise.objects.create(operation=coupe, matiere=self.tole, quantite_necessaire=Decimal('0.5'))
+        self.gamme = gamme_depuis_of(self.modele, 'Support standard')
+        connecter_manager(self.client)
+
+    def test_instanciation_en_masse(self):
+        demandes = [{'numero_of': f'OF-{i}'} for i in range(200)]
+        with CaptureQueriesContext(connection) as requetes:
+            ofs = instancier_gamme(self.gamme, demandes, quantite_a_produire=8)
+        self.assertEqual(len(ofs), 200)
+        self.assertLess(len(requetes), 30)  # quelques requêtes pour tout le lot, pas par OF
+        of = OrdreFabrication.objects.get(numero_of='OF-7')
+        self.assertEqual(of.titre, 'Support standard')
+        coupe, pliage = of.operations.order_by('numero_phase')
+        self.assertEqual((coupe.numero_phase, coupe.quantite_entree, coupe.temps_prevu_minutes), (10, 8, 12))
+        self.assertEqual(pliage.quantite_entree, 0)
+        self.assertEqual(MatiereRequise.objects.get(operation=coupe).quantite_necessaire, Decimal('0.5'))
+        self.assertEqual(EnCoursPoste.objects.get(poste=self.decoupe).operations_en_attente, 201)
+
+        # Tout ou rien : un OF existant bloque toute la demande
+        with self.assertRaises(ErreurGamme):
+            instancier_gamme(self.gamme, [{'numero_of': 'OF-NOUVEAU'}, {'numero_of': 'OF-7'}], quantite_a_produire=1)
+        with self.assertRaises(ErreurGamme):
+            instancier_gamme(self.gamme, [{'numero_of': 'OF-NOUVEAU', 'quantite_a_produire': 0}])
+        self.assertFalse(OrdreFabrication.objects.filter(numero_of='OF-NOUVEAU').exists())
+
+    def test_api(self):
+        reponse = self.client.post('/api/gammes/', json.dumps({'of_id': self.modele.pk, 'nom': 'Support standard'}),
+                                   content_type='application/json')
+        self.assertEqual(reponse.status_code, 400)
+        gammes = self.client.get('/api/gammes/').json()['gammes']
+        self.assertEqual(gammes[0]['phases'][0]['matieres'], {'TOLE': 0.5})
+
+        url = f'/api/gammes/{self.gamme.pk}/instancier/'
+        reponse = self.client.post(url, json.dumps({'prefixe': 'OF-2610-', 'nombre': 3, 'quantite_a_produire': 4,
+                                                    'date_fin_prevue': '2026-11-30'}), content_type='application/json')
+        self.assertEqual(reponse.status_code, 201)
+        self.assertEqual([of['numero_of'] for of in reponse.json()['ofs']], ['OF-2610-001', 'OF-2610-002', 'OF-2610-003'])
+        self.assertEqual(str(OrdreFabrication.objects.get(numero_of='OF-2610-002').date_fin_prevue), '2026-11-30')
+
+        reponse = self.client.post(url, json.dumps({'ofs': [{'numero_of': 'OF-X', 'date_fin_prevue': '30/11'}],
+                                                    'quantite_a_produire': 1}), content_type='application/json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertIn('date_fin_prevue', reponse.json()['message'])
+        self.assertEqual(GammeType.objects.count(), 1)
+
+        # Numéro pris par une écriture concurrente après la vérification : même erreur 400
+        def concurrent(ofs, gammes):
+            OrdreFabrication.objects.create(numero_of='OF-Y', titre='Concurrent')
+            return inserer_ofs(ofs, gammes)
+        with mock.patch('suivi_production.services.gammes.inserer_ofs', side_effect=concurrent):
+            reponse = self.client.post(url, json.dumps({'ofs': [{'numero_of': 'OF-Y'}], 'quantite_a_produire': 1}),
+                                       content_type='application/json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(reponse.json()['message'], 'OF(s) déjà existant(s) : OF-Y.')
@@ -0,0 +1,107 @@
+import io
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from ..models import OrdreFabrication, Operation, Machine, MatierePremiere, MatiereRequise, EnCoursPoste
+from ..services.gammes import inserer_ofs
+from ..services.import_ofs import ErreurImport, importer_ofs, lire_fichier
+from .outils import connecter_manager, creer_postes
+
+ENTETE = 'numero_of;titre;quantite_a_produire;numero_phase;poste;titre_operation;temps_prevu_minutes;machine;matiere;quantite_necessaire\n'
+
+
+class ImportOFsTests(TestCase):
+    def setUp(self):
+        self.decoupe, _ = creer_postes()
+        Machine.objects.create(nom='Laser')
+        self.tole = MatierePremiere.objects.create(reference='TOLE', designation='Tôle')
+        MatierePremiere.objects.create(reference='VIS', designation='Vis')
+        OrdreFabrication.objects.create(numero_of='OF-EXISTANT', titre='Déjà là')
+
+    def _importer(self, lignes, **kwargs):
+        return importer_ofs(lire_fichier((ENTETE + lignes).encode('utf-8'), 'ofs.csv'), **kwargs)
+
+    def test_import_gamme_et_matieres(self):
+        rapport = self._importer(
+            'OF-1;Support;50;1;Découpe;Coupe;120;Laser;TOLE;0,5\n'
+            'OF-1;;;1;;;;;VIS;4\n'
+            'OF-1;;;2;Pliage;Pliage;60;;;\n'
+            '\n'
+            'OF-2;Équerre;10;1;Découpe;Coupe;30;;;\n'
+        )
+        self.assertEqual((rapport.ofs, rapport.operations, rapport.matieres, rapport.nombre_erreurs), (2, 3, 2, 0))
+        of = OrdreFabrication.objects.get(numero_of='OF-1')
+        coupe, pliage = of.operations.order_by('numero_phase')
+        self.assertEqual((coupe.quantite_entree, pliage.quantite_entree), (50, 0))  # comme synchroniser_gamme
+        self.assertEqual(coupe.machine_assignee.nom, 'Laser')
+        self.assertEqual(MatiereRequise.objects.get(operation=coupe, matiere=self.tole).quantite_necessaire, Decimal('0.5'))
+        self.assertEqual(coupe.matieres_requises_json[str(self.tole.pk)], 0.5)
+        # Les premières phases débloquées comptent dans l'en-cours du poste
+        self.assertEqual(EnCoursPoste.objects.get(poste=self.decoupe).operations_en_attente, 2)
+
+    def test_erreurs_par_ligne_et_of_rejete(self):
+        rapport = self._importer(
+            'OF-1;Support;50;1;Découpe;Coupe;abc;;;\n'
+            'OF-1;;;2;Pliage;Pliage;60;;;\n'
+            'OF-2;Équerre;10;1;Soudure;Soudure;30;;INCONNUE;1\n'
+            'OF-EXISTANT;Doublon;10;1;Découpe;Coupe;30;;;\n'
+            'OF-3;Platine;5;1;Découpe;Coupe;30;;;\n',
+            taille_lot=2,
+        )
+        erreurs = {}
+        for erreur in rapport.erreurs:
+            erreurs.setdefault((erreur.ligne, erreur.numero_of), []).append(erreur.message)
+        self.assertIn('temps_prevu_minutes', erreurs[(2, 'OF-1')][0])
+        self.assertEqual(erreurs[(4, 'OF-2')], ['poste : inconnu (Soudure).', 'matiere : référence inconnue (INCONNUE).'])
+        self.assertIn('déjà existant', erreurs[(5, 'OF-EXISTANT')][0])
+        self.assertEqual((rapport.ofs, rapport.ofs_rejetes), (1, 3))
+        self.assertEqual(list(OrdreFabrication.objects.order_by('numero_of').values_list('numero_of', flat=True)), ['OF-3', 'OF-EXISTANT'])
+        self.assertFalse(Operation.objects.filter(ordre_fabrication__numero_of='OF-1').exists())
+
+    def test_of_cree_entre_validation_et_insertion(self):
+        def concurrent(ofs, gammes):
+            OrdreFabrication.objects.create(numero_of='OF-1', titre='Concurrent')
+            return inserer_ofs(ofs, gammes)
+        with mock.patch('suivi_production.services.import_ofs.inserer_ofs', side_effect=concurrent):
+            rapport = self._importer('OF-1;Support;50;1;Découpe;Coupe;120;;;\nOF-2;Équerre;10;1;Découpe;Coupe;30;;;\n')
+        # Le lot est rejeté en entier, avec le message de la vérification préalable
+        self.assertEqual((rapport.ofs, rapport.ofs_rejetes), (0, 2))
+        self.assertEqual(rapport.erreurs[0].message, 'OF(s) déjà existant(s) : OF-1.')
+        self.assertFalse(OrdreFabrication.objects.filter(numero_of='OF-2').exists())
+
+    def test_simulation_et_xlsx(self):
+        from openpyxl import Workbook
+        classeur = Workbook()
+        classeur.active.append(['numero_of', 'titre', 'quantite_a_produire', 'numero_phase', 'poste'])
+        classeur.active.append(['OF-X', 'Pièce', 5, 1, 'Découpe'])
+        contenu = io.BytesIO()
+        classeur.save(contenu)
+        rapport = importer_ofs(lire_fichier(contenu.getvalue(), 'ofs.xlsx'), simulation=True)
+        self.assertEqual((rapport.ofs, rapport.operations), (1, 1))
+        self.assertFalse(OrdreFabrication.objects.filter(numero_of='OF-X').exists())
+        importer_ofs(lire_fichier(contenu.getvalue(), 'ofs.xlsx'))
+        self.assertEqual(Operation.objects.get(ordre_fabrication__numero_of='OF-X').titre, 'Phase 1')
+
+    def test_encodage_et_fichier_illisible(self):
+        # CSV enregistré par Excel en Windows-1252 : accents relus tels quels
+        contenu = (ENTETE + 'OF-1;Pièce;5;1;Découpe;;;;;\n').encode('cp1252')
+        self.assertEqual(importer_ofs(lire_fichier(contenu, 'ofs.csv')).ofs, 1)
+        self.assertEqual(OrdreFabrication.objects.get(numero_of='OF-1').titre, 'Pièce')
+        with self.assertRaises(ErreurImport):
+            lire_fichier(b'numero_of\n\x81', 'ofs.csv')
+        with self.assertRaises(ErreurImport):
+            lire_fichier(b'pas une archive', 'ofs.xlsx')
+
+    def test_page_import(self):
+        connecter_manager(self.client)
+        self.assertContains(self.client.get('/gestion/of/'), '/gestion/of/importer/')
+        fichier = SimpleUploadedFile('ofs.csv', (ENTETE + 'OF-1;Support;50;1;Découpe;Coupe;120;;;\nOF-2;;;1;Découpe;;;;;\n').encode('utf-8'))
+        reponse = self.client.post('/gestion/of/importer/', {'fichier': fichier})
+        self.assertContains(reponse, 'titre : valeur obligatoire')
+        self.assertTrue(OrdreFabrication.objects.filter(numero_of='OF-1').exists())
+        fichier = SimpleUploadedFile('ofs.pdf', b'%PDF')
+        self.assertRedirects(self.client.post('/gestion/of/importer/', {'fichier': fichier}), '/gestion/of/importer/')
+        fichier = SimpleUploadedFile('ofs.xlsx', b'%PDF')
+        self.assertRedirects(self.client.post('/gestion/of/importer/', {'fichier': fichier}), '/gestion/of/importer/')
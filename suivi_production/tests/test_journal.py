@@ -0,0 +1,128 @@
+import json
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from ..models import (
+    OrdreFabrication, Operation, PosteDeTravail, Operateur, MatierePremiere, MatiereRequise, Profile,
+    ActiviteJournaliere, ConsommationMatiere, Evenement, PositionProjection,
+)
+from ..services.journal import projeter, publier, rejouer
+
+
+class JournalTests(TestCase):
+    def setUp(self):
+        self.poste = PosteDeTravail.objects.create(nom='Découpe')
+        self.operateur = Operateur.objects.create(code='OP1', nom='Nom', prenom='P')
+        self.operateur.postes_qualifies.add(self.poste)
+        self.of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.coupe = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=self.poste,
+                                              titre='Coupe', quantite_entree=10)
+        self.pliage = Operation.objects.create(ordre_fabrication=self.of, numero_phase=2, poste=self.poste, titre='Pliage')
+        self.tole = MatierePremiere.objects.create(reference='TOLE', designation='Tôle', quantite_stock=Decimal('100'))
+        MatiereRequise.objects.create(operation=self.coupe, matiere=self.tole, quantite_necessaire=Decimal('1.5'))
+        user = User.objects.create_user('poste', password='pwd')
+        Profile.objects.create(user=user, role='POSTE')
+        self.client.login(username='poste', password='pwd')
+
+    def _poster(self, url, donnees):
+        return self.client.post(url, json.dumps(donnees), content_type='application/json').json()
+
+    def _produire(self, bonnes=9, rebut=1, anomalie=True):
+        self._poster('/api/demarrer_tache/', {'action': 'valider_demarrage', 'operation_id': self.coupe.pk,
+                                             'operateur_id': self.operateur.pk, 'quantite_prise': 10})
+        pointage_id = self.coupe.pointages.get().pk
+        return self._poster('/api/terminer_tache/', {
+            'action': 'valider_fin', 'pointage_id': pointage_id, 'quantite_fabriquee': bonnes, 'quantite_rebut': rebut,
+            'probleme_signale': anomalie, 'probleme_description': 'Bavure',
+        })
+
+    def test_evenements_publies_avec_les_modifications(self):
+        self.assertEqual(self._produire()['status'], 'success')
+        self.assertEqual(list(Evenement.objects.values_list('type', flat=True)), [
+            'POINTAGE_DEMARRE', 'OF_STATUT', 'POINTAGE_TERMINE', 'ANOMALIE_SIGNALEE', 'OPERATION_TERMINEE',
+            'STOCK_CONSOMME', 'PHASE_DEBLOQUEE',
+        ])
+        consommation = Evenement.objects.get(type='STOCK_CONSOMME')
+        self.assertEqual(Decimal(consommation.donnees['quantite']), Decimal('15'))
+        self.assertEqual(Evenement.objects.get(type='PHASE_DEBLOQUEE').operation_id, self.pliage.pk)
+
+        # Le journal est en ajout seul, et annulé avec la transaction qui l'écrit
+        with self.assertRaises(ValueError):
+            consommation.save()
+        with self.assertRaises(ValueError):
+            consommation.delete()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            publier('OF_STATUT', self.of.pk, ancien='PRODUCTION', nouveau='TERMINE')
+            raise RuntimeError
+        self.assertEqual(Evenement.objects.count(), 7)
+
+    def test_projections_incrementales_et_rejeu(self):
+        self._produire()
+        self.assertEqual(projeter(), {'activite_journaliere': 7, 'consommation_matiere': 7})
+        activite = ActiviteJournaliere.objects.get()
+        self.assertEqual(
+            (activite.pointages_demarres, activite.pointages_termines, activite.pieces_bonnes, activite.pieces_rebut,
+             activite.operations_terminees, activite.phases_debloquees, activite.anomalies),
+            (1, 1, 9, 1, 1, 1, 1),
+        )
+        self.assertEqual(ConsommationMatiere.objects.get().quantite, Decimal('15'))
+        # Rien de nouveau : la position est conservée
+        self.assertEqual(projeter(), {'activite_journaliere': 0, 'consommation_matiere': 0})
+        self.assertEqual(PositionProjection.objects.get(nom='activite_journaliere').position, Evenement.objects.last().pk)
+
+        avant = list(ActiviteJournaliere.objects.values())
+        call_command('rejouer_journal', stdout=StringIO())
+        projeter()
+        apres = list(ActiviteJournaliere.objects.values())
+        self.assertEqual([{k: v for k, v in l.items() if k != 'id'} for l in avant],
+                         [{k: v for k, v in l.items() if k != 'id'} for l in apres])
+        with self.assertRaises(ValueError):
+            rejouer(['inconnue'])
+
+    def test_consommation_dans_l_ordre_des_transactions(self):
+        # La transaction 11 écrit l'identifiant inférieur mais n'est pas encore validée
+        premier = publier('ANOMALIE_SIGNALEE', self.of.pk, self.coupe.pk, poste_id=self.poste.pk)
+        second = publier('ANOMALIE_SIGNALEE', self.of.pk, self.coupe.pk, poste_id=self.poste.pk)
+        Evenement.objects.filter(pk=premier.pk).update(numero_transaction=11)
+        Evenement.objects.filter(pk=second.pk).update(numero_transaction=10)
+        with mock.patch('suivi_production.services.journal._definitifs',
+                        lambda evenements: evenements.filter(numero_transaction__lt=11)):
+            self.assertEqual(projeter(['activite_journaliere']), {'activite_journaliere': 1})
+        position = PositionProjection.objects.get(nom='activite_journaliere')
+        self.assertEqual((position.numero_transaction, position.position), (10, second.pk))
+        # Validée, elle est consommée malgré son identifiant inférieur à la position
+        self.assertEqual(projeter(['activite_journaliere']), {'activite_journaliere': 1})
+        self.assertEqual(ActiviteJournaliere.objects.get().anomalies, 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Numéros de transaction PostgreSQL')
+class JournalConcurrenceTests(TransactionTestCase):
+    def test_evenement_non_valide_d_identifiant_inferieur(self):
+        publies, publie, valider = [], threading.Event(), threading.Event()
+
+        def transaction_longue():
+            try:
+                with transaction.atomic():
+                    publies.append(publier('ANOMALIE_SIGNALEE', poste_id=1))
+                    publie.set()
+                    valider.wait(10)
+            finally:
+                connection.close()
+
+        fil = threading.Thread(target=transaction_longue)
+        fil.start()
+        publie.wait(10)
+        suivant = publier('ANOMALIE_SIGNALEE', poste_id=1)
+        self.assertGreater(suivant.pk, publies[0].pk)
+        # L'événement validé attend celui, d'identifiant inférieur, de la transaction en cours
+        self.assertEqual(projeter(['activite_journaliere']), {'activite_journaliere': 0})
+        valider.set()
+        fil.join()
+        self.assertEqual(projeter(['activite_journaliere']), {'activite_journaliere': 2})
+        self.assertEqual(ActiviteJournaliere.objects.get().anomalies, 2)
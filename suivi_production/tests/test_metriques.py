@@ -0,0 +1,43 @@
+from django.test import TestCase, override_settings
+from ..services.metriques import Registre, REGISTRE
+from .outils import creer_manager
+
+
+class RegistreTests(TestCase):
+    def test_histogramme_cumulatif(self):
+        registre = Registre()
+        registre.enregistrer('of_list', 200, 0.03, 4, 0.002)
+        registre.enregistrer('of_list', 200, 0.3, 60, 0.1)
+        texte = registre.exposer()
+        self.assertIn('gmao_requete_duree_secondes_bucket{vue="of_list",le="0.05"} 1', texte)
+        self.assertIn('gmao_requete_duree_secondes_bucket{vue="of_list",le="+Inf"} 2', texte)
+        self.assertIn('gmao_requete_sql_nombre_sum{vue="of_list"} 64.000000', texte)
+        self.assertIn('gmao_reponses_total{vue="of_list",code="200"} 2', texte)
+
+
+class MetriquesEndpointTests(TestCase):
+    def setUp(self):
+        REGISTRE.reinitialiser()
+        creer_manager()
+
+    def test_acces_refuse_sans_authentification(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRIQUES_JETON='secret')
+    def test_acces_par_jeton(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer mauvais').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_requetes_comptabilisees_par_vue(self):
+        self.client.login(username='manager', password='pwd')
+        self.client.get('/historique/')
+        texte = self.client.get('/metrics').content.decode()
+        self.assertIn('gmao_requete_duree_secondes_count{vue="historique"} 1', texte)
+        # Session, utilisateur, profil et rapports : au moins une requête SQL comptée
+        self.assertNotIn('gmao_requete_sql_nombre_sum{vue="historique"} 0.000000', texte)
+
+    @override_settings(METRIQUES_SERVER_TIMING=True)
+    def test_en_tete_server_timing(self):
+        self.client.login(username='manager', password='pwd')
+        reponse = self.client.get('/historique/')
+        self.assertRegex(reponse['Server-Timing'], r'^app;dur=[\d.]+, sql;dur=[\d.]+;desc="\d+ requetes"$')
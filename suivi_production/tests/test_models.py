@@ -0,0 +1,54 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation, PosteDeTravail, Operateur, Pointage
+
+
+class OrdreFabricationMetricsTests(TestCase):
+    def setUp(self):
+        poste = PosteDeTravail.objects.create(nom='Découpe')
+        self.operateur = Operateur.objects.create(code='OP1', nom='Durand', prenom='Alice')
+        self.of = OrdreFabrication.objects.create(numero_of='OF-M1', titre='OF métriques', quantite_a_produire=20)
+        self.op1 = Operation.objects.create(ordre_fabrication=self.of, numero_phase=1, poste=poste, titre='Coupe', statut='TERMINEE')
+        self.op2 = Operation.objects.create(ordre_fabrication=self.of, numero_phase=2, poste=poste, titre='Pliage', statut='TERMINEE')
+        Operation.objects.create(ordre_fabrication=self.of, numero_phase=3, poste=poste, titre='Contrôle')
+        debut = timezone.now() - datetime.timedelta(hours=2)
+        for op, fab, reb in ((self.op1, 18, 2), (self.op2, 10, 1), (self.op2, 5, 0)):
+            Pointage.objects.create(operation=op, operateur=self.operateur, heure_debut=debut, heure_fin=timezone.now(),
+                                    quantite_fabriquee=fab, quantite_rebut=reb)
+        OrdreFabrication.objects.create(numero_of='OF-M2', titre='OF vide', quantite_a_produire=0)
+
+    def test_with_metrics_matches_properties(self):
+        for annotated in OrdreFabrication.objects.with_metrics():
+            plain = OrdreFabrication.objects.get(pk=annotated.pk)
+            self.assertEqual(annotated.quantite_produite_actuelle, plain.quantite_produite_actuelle)
+            self.assertEqual(annotated.quantite_rebut_totale, plain.quantite_rebut_totale)
+            self.assertAlmostEqual(annotated.progression_production, plain.progression_production)
+
+    def test_with_metrics_values(self):
+        of = OrdreFabrication.objects.with_metrics().get(pk=self.of.pk)
+        self.assertEqual(of.qte_produite, 15)
+        self.assertEqual(of.qte_rebut, 3)
+        self.assertAlmostEqual(of.progression, 75.0)
+
+    def test_with_metrics_single_query(self):
+        with self.assertNumQueries(1):
+            for of in OrdreFabrication.objects.with_metrics():
+                of.progression_production, of.quantite_rebut_totale
+
+
+class PointageQuerySetTests(TestCase):
+    def test_filtres_par_jour_equivalents_a_date(self):
+        poste = PosteDeTravail.objects.create(nom='Soudure')
+        operateur = Operateur.objects.create(code='OP2', nom='Petit', prenom='Léa')
+        of = OrdreFabrication.objects.create(numero_of='OF-P1', titre='Cadre')
+        op = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=poste, titre='Soudure')
+        jour = datetime.date(2025, 3, 10)
+        minuit = timezone.make_aware(datetime.datetime.combine(jour, datetime.time.min))
+        for debut_h, fin_h in ((-2, 1), (0, 3), (23, 25), (5, None)):
+            Pointage.objects.create(operation=op, operateur=operateur,
+                                    heure_debut=minuit + datetime.timedelta(hours=debut_h),
+                                    heure_fin=minuit + datetime.timedelta(hours=fin_h) if fin_h is not None else None)
+        self.assertEqual(set(Pointage.objects.debutes_le(jour)), set(Pointage.objects.filter(heure_debut__date=jour)))
+        self.assertEqual(set(Pointage.objects.termines_le(jour)), set(Pointage.objects.filter(heure_fin__date=jour)))
+        self.assertEqual(Pointage.objects.termines_le(jour).count(), 2)
@@ -0,0 +1,111 @@
+from datetime import date, datetime, timedelta, timezone as tz
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation, Pointage
+from ..services import partitions
+from .outils import creer_operateurs, creer_pointage, creer_postes
+
+
+class CalendrierPartitionsTests(SimpleTestCase):
+    def test_arithmetique_des_mois(self):
+        self.assertEqual(partitions.ajouter_mois(date(2026, 11, 1), 3), date(2027, 2, 1))
+        self.assertEqual(partitions.ajouter_mois(date(2026, 1, 1), -1), date(2025, 12, 1))
+        self.assertEqual(partitions.ajouter_mois(date(2026, 3, 1), -15), date(2024, 12, 1))
+        self.assertEqual(partitions.ajouter_mois(date(2026, 12, 1), 0), date(2026, 12, 1))
+        self.assertEqual(partitions.ajouter_mois(date(2026, 12, 1), 24), date(2028, 12, 1))
+        self.assertEqual(partitions._mois_suivant(date(2026, 12, 1)), date(2027, 1, 1))
+        self.assertEqual(partitions._mois_suivant(date(2026, 1, 1)), date(2026, 2, 1))
+
+    def test_nom_et_lecture_des_partitions(self):
+        nom = partitions._nom_partition(date(2026, 3, 1))
+        self.assertEqual(nom, 'suivi_production_pointage_p2026_03')
+        self.assertEqual(partitions._mois_partition(nom), date(2026, 3, 1))
+        self.assertEqual(partitions._mois_partition(partitions._nom_partition(date(987, 12, 1))), date(987, 12, 1))
+        # Partition par défaut, ancienne table ou nom mal formé : pas de mois
+        for autre in (partitions.PARTITION_DEFAUT, partitions.TABLE_ANCIENNE, 'suivi_production_pointage_p2026_13',
+                      'suivi_production_pointage_p2026', 'suivi_production_operation_p2026_03'):
+            self.assertIsNone(partitions._mois_partition(autre), autre)
+
+
+@skipIf(connection.vendor == 'postgresql', 'Sans objet sous PostgreSQL')
+class PartitionsSQLiteTests(TestCase):
+    def test_commande_sans_effet(self):
+        sortie = StringIO()
+        call_command('partitions_pointage', '--initialiser', '--retention-mois', '6', stdout=sortie)
+        self.assertIn('uniquement sous PostgreSQL', sortie.getvalue())
+        self.assertFalse(partitions.est_partitionne())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitionnement PostgreSQL')
+class ConversionPartitionsTests(TestCase):
+    def setUp(self):
+        [poste] = creer_postes('Découpe')
+        self.operateurs = creer_operateurs(2)
+        of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.operation = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=poste, titre='Coupe')
+        self.mois_courant = timezone.now().date().replace(day=1)
+        self.mois_lointain = partitions.ajouter_mois(self.mois_courant, 6)
+        self.ancien = creer_pointage(self.operation, self.operateurs[0], timezone.now() - timedelta(days=400))
+        self.courant = creer_pointage(self.operation, self.operateurs[1], timezone.now())
+        self.lointain = creer_pointage(self.operation, self.operateurs[0],
+                                       datetime.combine(self.mois_lointain.replace(day=15), datetime.min.time(), tz.utc))
+
+    def _lignes(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _compter(self, table):
+        return self._lignes(f'SELECT count(*) FROM "{table}"')[0][0]
+
+    def test_conversion(self):
+        self.assertFalse(partitions.est_partitionne())
+        self.assertEqual(partitions.convertir_en_partitions(mois_avance=1), 3)
+        self.assertTrue(partitions.est_partitionne())
+
+        # Clé primaire (id, heure_debut) et clés étrangères recréées
+        [(cle_primaire,)] = self._lignes(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [partitions.TABLE],
+        )
+        self.assertEqual(cle_primaire, 'PRIMARY KEY (id, heure_debut)')
+        cles_etrangeres = {nom for (nom,) in self._lignes(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [partitions.TABLE],
+        )}
+        self.assertEqual(cles_etrangeres, {f'{partitions.TABLE}_operation_id_fk', f'{partitions.TABLE}_operateur_id_fk'})
+
+        # Index de Pointage.Meta recréés sur la table partitionnée
+        index = {nom for (nom,) in self._lignes('SELECT indexname FROM pg_indexes WHERE tablename = %s', [partitions.TABLE])}
+        self.assertLessEqual({i.name for i in Pointage._meta.indexes}, index)
+
+        # Un mois par partition, du premier pointage au mois courant + 1 ; le pointage lointain est dans le défaut
+        mois = [m for _, m in partitions.lister_partitions()]
+        premier = self.ancien.heure_debut.date().replace(day=1)
+        self.assertEqual(mois[0], premier)
+        self.assertEqual(mois[-1], partitions.ajouter_mois(self.mois_courant, 1))
+        self.assertEqual(len(mois), len(set(mois)))
+        self.assertEqual(self._compter(partitions.PARTITION_DEFAUT), 1)
+        self.assertEqual(self._compter(partitions._nom_partition(self.mois_courant)), 1)
+
+        # Sa partition créée plus tard, il y est déplacé
+        self.assertEqual(partitions.creer_partitions(self.mois_lointain, depuis=self.mois_lointain),
+                         [partitions._nom_partition(self.mois_lointain)])
+        self.assertEqual(self._compter(partitions.PARTITION_DEFAUT), 0)
+        self.assertEqual(self._compter(partitions._nom_partition(self.mois_lointain)), 1)
+
+        # L'ORM lit et écrit la table partitionnée ; les identifiants continuent la séquence
+        self.assertEqual(Pointage.objects.count(), 3)
+        nouveau = creer_pointage(self.operation, self.operateurs[1], timezone.now())
+        self.assertGreater(nouveau.pk, self.lointain.pk)
+        self.assertEqual(Pointage.objects.get(pk=self.ancien.pk).operateur, self.operateurs[0])
+
+        # Détachement : les tables détachées sont conservées
+        detachees = partitions.detacher_partitions(avant=self.mois_courant)
+        self.assertIn(partitions._nom_partition(premier), detachees)
+        self.assertEqual(Pointage.objects.count(), 3)
+        self.assertEqual(self._compter(partitions._nom_partition(premier)), 1)
@@ -0,0 +1,170 @@
+"""
+Tests de non-régression des plans d'exécution.
+
+On peuple la base avec des volumes réalistes, on capture chaque requête émise par
+les services de reporting et les APIs, puis on vérifie via EXPLAIN qu'aucune ne
+parcourt séquentiellement une des grosses tables.
+"""
+import datetime
+import json
+import re
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..models import (
+    OrdreFabrication, Operation, PosteDeTravail, Operateur, Pointage, Anomalie, MatierePremiere,
+)
+from ..services import couts, cube_rebuts, delais, temps_cycle
+from ..services.reporting import compute_kpis_for_date, build_7day_series, build_alertes, queryset_rebuts_par_of
+from .outils import creer_manager
+
+GROSSES_TABLES = ['pointage', 'operation', 'anomalie', 'ordrefabrication']
+NB_OFS = 400
+PHASES_PAR_OF = 4
+POINTAGES_PAR_OPERATION = 5
+
+
+def _tables_parcourues(plan: str):
+    """Tables de l'application lues par un parcours séquentiel dans un plan EXPLAIN."""
+    if connection.vendor == 'postgresql':
+        motif = r'Seq Scan on suivi_production_(\w+)'
+    else:
+        # SQLite : "SCAN <table>" sans index (les "SCAN ... USING INDEX" parcourent un index)
+        motif = r'SCAN suivi_production_(\w+)(?! USING (?:COVERING )?INDEX)(?:\s|$)'
+    return set(re.findall(motif, plan))
+
+
+def _expliquer(sql: str) -> str:
+    prefixe = 'EXPLAIN ' if connection.vendor == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefixe + sql)
+        return '\n'.join(' '.join(str(c) for c in row) for row in cursor.fetchall())
+
+
+class PlansExecutionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.jour = timezone.now().date()
+        postes = PosteDeTravail.objects.bulk_create([PosteDeTravail(nom=f'Poste {i}') for i in range(6)])
+        operateurs = Operateur.objects.bulk_create([Operateur(code=f'OP{i:03d}', nom=f'Nom{i}', prenom='P', cout_horaire=30) for i in range(40)])
+        cls.operateur = operateurs[0]
+        cls.operateur.postes_qualifies.set(postes)
+        MatierePremiere.objects.bulk_create([
+            MatierePremiere(reference=f'MAT-{i}', designation='Matière', quantite_stock=i, seuil_alerte=10) for i in range(300)
+        ])
+        ofs = OrdreFabrication.objects.bulk_create([
+            OrdreFabrication(numero_of=f'OF-{i:05d}', titre=f'Pièce {i}', quantite_a_produire=10,
+                             statut='TERMINE' if i % 3 else 'PRODUCTION',
+                             date_premiere_finalisation=cls.jour - datetime.timedelta(days=i % 120) if i % 3 else None)
+            for i in range(NB_OFS)
+        ])
+        operations = Operation.objects.bulk_create([
+            Operation(ordre_fabrication=of, numero_phase=n, poste=postes[n % len(postes)], titre=f'Phase {n}',
+                      quantite_entree=10, temps_prevu_minutes=30, statut='TERMINEE' if of.statut == 'TERMINE' else 'A_FAIRE')
+            for of in ofs for n in range(1, PHASES_PAR_OF + 1)
+        ])
+        maintenant = timezone.now()
+        pointages = []
+        for i, op in enumerate(operations):
+            for k in range(POINTAGES_PAR_OPERATION):
+                debut = maintenant - datetime.timedelta(days=(i + k) % 120, hours=k)
+                en_cours = op.statut == 'A_FAIRE' and k == 0 and i % 50 == 0
+                pointages.append(Pointage(operation=op, operateur=operateurs[(i + k) % len(operateurs)], heure_debut=debut,
+                                          heure_fin=None if en_cours else debut + datetime.timedelta(minutes=40),
+                                          quantite_prise_en_charge=2, quantite_fabriquee=2, quantite_rebut=k % 2))
+        Pointage.objects.bulk_create(pointages, batch_size=2000)
+        Anomalie.objects.bulk_create([
+            Anomalie(operation=op, operateur=cls.operateur, description='Défaut', statut='OUVERTE' if i % 10 == 0 else 'RESOLUE')
+            for i, op in enumerate(operations[::3])
+        ])
+        cls.operation = Operation.objects.filter(statut='A_FAIRE', pointages__heure_fin__isnull=True).first()
+        creer_manager()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.login(username='manager', password='pwd')
+
+    def _verifier_plans(self, capture):
+        self.assertTrue(capture.captured_queries)
+        echecs = []
+        for requete in capture.captured_queries:
+            sql = requete['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = _expliquer(sql)
+            parcourues = _tables_parcourues(plan) & set(GROSSES_TABLES)
+            if parcourues:
+                echecs.append(f"Parcours séquentiel de {sorted(parcourues)} :\n{sql}\n--- plan ---\n{plan}")
+        self.assertFalse(echecs, '\n\n'.join(echecs))
+
+    def test_services_reporting(self):
+        with CaptureQueriesContext(connection) as capture:
+            compute_kpis_for_date(self.jour)
+            build_7day_series(self.jour)
+            alertes = build_alertes(self.jour)
+            list(alertes['stock_bas'])
+            list(alertes['anomalies_ouvertes'])
+            list(queryset_rebuts_par_of(date_str=self.jour.isoformat()))
+        self._verifier_plans(capture)
+
+    def test_api_dashboard(self):
+        with CaptureQueriesContext(connection) as capture:
+            self.assertEqual(self.client.get('/api/dashboard-data/').status_code, 200)
+        self._verifier_plans(capture)
+
+    def test_api_pointage(self):
+        code = f"{self.operation.ordre_fabrication.numero_of}/{self.operation.numero_phase}"
+        corps = json.dumps({'code_operateur': self.operateur.code, 'code_of_operation': code})
+        with CaptureQueriesContext(connection) as capture:
+            self.client.post('/api/demarrer_tache/', corps, content_type='application/json')
+            self.client.post('/api/terminer_tache/', corps, content_type='application/json')
+        self._verifier_plans(capture)
+
+    def test_rapport_of_jour(self):
+        of = self.operation.ordre_fabrication
+        with CaptureQueriesContext(connection) as capture:
+            self.assertEqual(self.client.get(f'/rapport-production/{of.pk}/{self.jour.isoformat()}/').status_code, 200)
+        self._verifier_plans(capture)
+
+    def test_exports(self):
+        of = self.operation.ordre_fabrication
+        with CaptureQueriesContext(connection) as capture:
+            for url in (f'/suivi-atelier/of/{of.pk}/export/csv/',
+                        f'/suivi-atelier/of/{of.pk}/export/csv/?date_filtre={self.jour.isoformat()}&statut_filtre=termine',
+                        f'/rapports/rebuts/export/pdf/?date={self.jour.isoformat()}',
+                        f'/rapports/rebuts/export/xlsx/?date={self.jour.isoformat()}',
+                        f'/rapports/rebuts/export/xlsx/?numero={of.numero_of}'):
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+        self._verifier_plans(capture)
+
+    def test_rapports_rebuts(self):
+        of = self.operation.ordre_fabrication
+        with CaptureQueriesContext(connection) as capture:
+            for url in (f'/rapports/rebuts/?date={self.jour.isoformat()}', f'/rapports/rebuts/?numero={of.numero_of}',
+                        f'/rapports/rebuts/of/{of.pk}/'):
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+        self._verifier_plans(capture)
+
+    def test_recherche_ofs(self):
+        with CaptureQueriesContext(connection) as capture:
+            reponse = self.client.get('/gestion/of/?q=OF-0001')
+            self.assertTrue(reponse.context['ofs'])
+            self.client.get(f"/gestion/of/?q=OF-0001&apres={reponse.context['curseur_suivant']}")
+            self.assertEqual(self.client.get('/gestion/of/?q=Pièce').status_code, 200)
+        self._verifier_plans(capture)
+
+    def test_lectures_des_agregats(self):
+        # Des OFs et une clé de temps de cycle en file : le rafraîchissement à la lecture est aussi vérifié
+        ids = list(OrdreFabrication.objects.order_by('pk').values_list('pk', flat=True)[:5])
+        for service in (cube_rebuts, couts, delais):
+            service.marquer_ofs(ids)
+        temps_cycle.marquer([(self.operation.poste_id, self.operation.type_operation, self.operateur.pk)])
+        debut = (self.jour - datetime.timedelta(days=30)).isoformat()
+        with CaptureQueriesContext(connection) as capture:
+            for url in ('/api/rebuts/cube/?lignes=poste&colonnes=periode', '/api/couts/?axe=poste', '/api/delais/',
+                        '/api/temps-cycle/?axe=operateur', '/api/trs/', '/api/utilisation/?jours=30',
+                        f'/rapports/production-finale/?debut={debut}&fin={self.jour.isoformat()}&groupe=poste'):
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+        self._verifier_plans(capture)
@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..models import OrdreFabrication, Operation
+from ..services.archivage import archiver_ofs
+from ..services.production_finale import lignes, pointages_finaux, production_finale, totaux
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+class ProductionFinaleTests(TestCase):
+    def setUp(self):
+        self.decoupe, self.controle = creer_postes('Découpe', 'Contrôle')
+        [operateur] = creer_operateurs()
+        self.aujourd_hui = timezone.localdate()
+        maintenant = timezone.now().replace(hour=10, minute=0)
+        hier = maintenant - timedelta(days=1)
+        for numero, (bonnes_hier, bonnes_jour) in {'OF-1': (4, 6), 'OF-2': (0, 2)}.items():
+            of = OrdreFabrication.objects.create(numero_of=numero, titre='Pièce', quantite_a_produire=10)
+            coupe = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=self.decoupe, titre='Coupe')
+            finale = Operation.objects.create(ordre_fabrication=of, numero_phase=2, poste=self.controle, titre='Contrôle')
+            # La phase 1 ne compte pas : seules les pièces sorties de la dernière phase sont produites
+            creer_pointage(coupe, operateur, hier, hier + timedelta(hours=1), quantite_fabriquee=10)
+            if bonnes_hier:
+                creer_pointage(finale, operateur, hier, hier + timedelta(hours=2), quantite_fabriquee=bonnes_hier)
+            creer_pointage(finale, operateur, maintenant, maintenant + timedelta(hours=1), quantite_fabriquee=bonnes_jour, quantite_rebut=1)
+        creer_pointage(finale, operateur, maintenant)  # en cours
+
+    def test_groupes_et_periode(self):
+        hier = self.aujourd_hui - timedelta(days=1)
+        self.assertEqual(pointages_finaux(self.aujourd_hui, self.aujourd_hui).count(), 2)
+        with CaptureQueriesContext(connection) as requetes:
+            par_of = lignes(production_finale(hier, self.aujourd_hui, 'of'), 'of')
+        self.assertEqual(len(requetes), 2)  # une requête groupée par source : production, archives
+        self.assertEqual([(l.libelle, l.pieces_bonnes, l.pieces_rebut, l.rang) for l in par_of],
+                         [('OF-1', 10, 1, 1), ('OF-2', 2, 1, 2)])
+
+        par_jour = lignes(production_finale(hier, self.aujourd_hui, 'jour'), 'jour')
+        self.assertEqual([(l.cle, l.pieces_bonnes) for l in par_jour], [(hier, 4), (self.aujourd_hui, 8)])
+        [par_poste] = lignes(production_finale(hier, self.aujourd_hui, 'poste'), 'poste')
+        self.assertEqual((par_poste.libelle, par_poste.pieces_bonnes, par_poste.pointages), ('Contrôle', 12, 3))
+        self.assertEqual(totaux(self.aujourd_hui, self.aujourd_hui),
+                         {'pointages': 2, 'pieces_bonnes': 8, 'pieces_rebut': 2, 'ofs': 2})
+
+    def test_ofs_archives_comptes(self):
+        hier = self.aujourd_hui - timedelta(days=1)
+        avant = {groupe: [(l.cle, l.pieces_bonnes, l.pieces_rebut, l.pointages, l.rang)
+                          for l in lignes(production_finale(hier, self.aujourd_hui, groupe), groupe)]
+                 for groupe in ('of', 'jour', 'poste')}
+        archiver_ofs(OrdreFabrication.objects.filter(numero_of='OF-2'))
+        self.assertEqual(pointages_finaux(self.aujourd_hui, self.aujourd_hui).count(), 1)
+        # Jours et postes fusionnent production et archives ; l'OF archivé garde son rang
+        for groupe, attendu in avant.items():
+            self.assertEqual([(l.cle, l.pieces_bonnes, l.pieces_rebut, l.pointages, l.rang)
+                              for l in lignes(production_finale(hier, self.aujourd_hui, groupe), groupe)], attendu)
+        self.assertEqual([(l.libelle, l.archive) for l in lignes(production_finale(hier, self.aujourd_hui), 'of')],
+                         [('OF-1', False), ('OF-2', True)])
+        self.assertEqual(totaux(self.aujourd_hui, self.aujourd_hui),
+                         {'pointages': 2, 'pieces_bonnes': 8, 'pieces_rebut': 2, 'ofs': 2})
+
+        connecter_manager(self.client)
+        reponse = self.client.get('/rapports/production-finale/')
+        self.assertContains(reponse, 'Archivé')
+        self.assertContains(reponse, 'OF-1')
+
+    def test_vue(self):
+        connecter_manager(self.client)
+        reponse = self.client.get('/rapports/production-finale/')
+        self.assertContains(reponse, 'OF-1')
+        self.assertEqual(reponse.context['totaux']['pieces_bonnes'], 8)
+        hier = (self.aujourd_hui - timedelta(days=1)).isoformat()
+        # Bornes inversées : la période est remise dans l'ordre
+        reponse = self.client.get(f'/rapports/production-finale/?debut={self.aujourd_hui.isoformat()}&fin={hier}&groupe=poste')
+        self.assertEqual([l.pieces_bonnes for l in reponse.context['lignes']], [12])
+        # Date inexistante : période par défaut plutôt qu'une erreur 500
+        reponse = self.client.get('/rapports/production-finale/?debut=2026-02-30')
+        self.assertEqual((reponse.context['debut'], reponse.context['totaux']['pieces_bonnes']), (self.aujourd_hui, 8))
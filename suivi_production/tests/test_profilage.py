@@ -0,0 +1,67 @@
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from ..services.profilage import Echantillonneur, enregistrer_piles, agreger_piles, lister_profils
+from .outils import creer_manager
+
+
+def _calcul_long(arret):
+    while not arret.is_set():
+        sum(range(1000))
+
+
+class EchantillonneurTests(TestCase):
+    def test_piles_du_thread_suivi(self):
+        arret = threading.Event()
+        travail = threading.Thread(target=_calcul_long, args=(arret,))
+        travail.start()
+        echantillonneur = Echantillonneur(0.001)
+        echantillonneur.debuter(travail.ident)
+        time.sleep(0.05)
+        piles = echantillonneur.terminer(travail.ident)
+        arret.set()
+        travail.join()
+        self.assertTrue(piles)
+        self.assertTrue(all('_calcul_long' in pile for pile in piles))
+
+
+class StockageProfilsTests(TestCase):
+    def setUp(self):
+        self.repertoire = Path(tempfile.mkdtemp())
+
+    def test_agregation_et_rotation(self):
+        for _ in range(3):
+            enregistrer_piles(self.repertoire, 'api_dashboard_data', Counter({'a;b': 2, 'a;c': 1}), taille_max=10, rotations=1)
+        # Taille max dépassée à chaque écriture : un seul fichier de rotation est conservé
+        self.assertEqual(agreger_piles(self.repertoire, 'api_dashboard_data'), Counter({'a;b': 4, 'a;c': 2}))
+        [profil] = lister_profils(self.repertoire)
+        self.assertEqual((profil.vue, profil.echantillons), ('api_dashboard_data', 6))
+
+
+class ProfilageVuesTests(TestCase):
+    def setUp(self):
+        self.repertoire = Path(tempfile.mkdtemp())
+        creer_manager()
+        User.objects.create_user('operateur', password='pwd')
+
+    def test_requete_lente_profilee_puis_telechargee(self):
+        with override_settings(PROFILAGE_ACTIF=True, PROFILAGE_SEUIL_MS=0, PROFILAGE_REPERTOIRE=self.repertoire):
+            self.client.login(username='manager', password='pwd')
+            with mock.patch('suivi_production.middleware.Echantillonneur.terminer', return_value=Counter({'x;y': 3})):
+                self.client.get('/historique/')
+            self.assertEqual(agreger_piles(self.repertoire, 'historique'), Counter({'x;y': 3}))
+
+            self.assertContains(self.client.get('/profils/'), 'historique')
+            reponse = self.client.get('/profils/historique/telecharger/')
+            self.assertEqual(reponse.content, b'x;y 3\n')
+            self.assertEqual(self.client.get('/profils/inconnue/telecharger/').status_code, 404)
+
+    def test_page_reservee_aux_managers(self):
+        self.client.login(username='operateur', password='pwd')
+        self.assertEqual(self.client.get('/profils/').status_code, 403)
@@ -0,0 +1,51 @@
+from django.test import TestCase
+from ..models import OrdreFabrication
+from ..services.recherche import rechercher_ofs, annoter_recherche, filtrer_numero
+
+
+class RechercheOfTests(TestCase):
+    def setUp(self):
+        for i in range(30):
+            OrdreFabrication.objects.create(numero_of=f'OF-{i:03d}', titre=f'Support moteur {i}')
+        OrdreFabrication.objects.create(numero_of='OF-900', titre='Carter de turbine')
+        OrdreFabrication.objects.create(numero_of='OF-901', titre='Turbine basse pression', statut='ARCHIVE')
+
+    def test_recherche_par_titre_et_statut(self):
+        page = rechercher_ofs(OrdreFabrication.objects.exclude(statut='ARCHIVE'), 'turbine')
+        self.assertEqual([of.numero_of for of in page.resultats], ['OF-900'])
+        self.assertIsNone(page.curseur_suivant)
+
+    def test_index_suit_les_modifications(self):
+        of = OrdreFabrication.objects.get(numero_of='OF-900')
+        of.titre = 'Bride de fixation'
+        of.save()
+        self.assertFalse(annoter_recherche(OrdreFabrication.objects.all(), 'carter').exists())
+        self.assertTrue(annoter_recherche(OrdreFabrication.objects.all(), 'bride').exists())
+        of.delete()
+        self.assertFalse(annoter_recherche(OrdreFabrication.objects.all(), 'bride').exists())
+
+    def test_pagination_par_curseur(self):
+        vus = []
+        curseur = ''
+        while True:
+            page = rechercher_ofs(OrdreFabrication.objects.all(), 'moteur', curseur=curseur, limite=7)
+            vus.extend(of.pk for of in page.resultats)
+            if not page.curseur_suivant:
+                break
+            curseur = page.curseur_suivant
+        self.assertEqual(len(vus), 30)
+        self.assertEqual(len(set(vus)), 30)
+        # Rang entier calculé en base : le curseur en garde la valeur exacte
+        self.assertTrue(all(isinstance(of.rang, int) for of in annoter_recherche(OrdreFabrication.objects.all(), 'moteur')))
+
+    def test_termes_courts_sans_index(self):
+        page = rechercher_ofs(OrdreFabrication.objects.all(), 'OF 90')
+        self.assertEqual({of.numero_of for of in page.resultats}, {'OF-900', 'OF-901'})
+
+    def test_filtre_sur_le_numero(self):
+        # Mêmes OFs que numero_of__icontains : le titre n'est pas cherché, la casse est ignorée
+        numeros = lambda terme: sorted(filtrer_numero(OrdreFabrication.objects.all(), terme).values_list('numero_of', flat=True))
+        self.assertEqual(numeros('of-90'), ['OF-900', 'OF-901'])
+        self.assertEqual(numeros('turbine'), [])
+        self.assertEqual(numeros('29'), ['OF-029'])  # terme court : sans index
+        self.assertEqual(len(numeros(' 00 ')), 11)  # OF-000 à OF-009 et OF-900
@@ -0,0 +1,146 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from ..models import CycleEnAttente, OrdreFabrication, Operation, StatistiqueCycle
+from ..services.archivage import archiver_ofs
+from ..services.temps_cycle import (
+    ERREUR_RELATIVE, Esquisse, rafraichir_cycles, reconstruire, statistiques, suggestion,
+)
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+class EsquisseTests(TestCase):
+    def test_quantiles_a_erreur_relative_bornee(self):
+        rng = random.Random(1)
+        valeurs = sorted(rng.lognormvariate(1.5, 0.6) for _ in range(5000))
+        esquisse = Esquisse()
+        for v in valeurs:
+            esquisse.ajouter(v)
+        for q in (0.5, 0.9, 0.99):
+            exact = valeurs[int(q * (len(valeurs) - 1))]
+            self.assertLessEqual(abs(esquisse.quantile(q) - exact) / exact, ERREUR_RELATIVE)
+        self.assertLess(len(esquisse.en_json()), 200)
+
+    def test_fusion_equivalente_a_une_seule_esquisse(self):
+        a, b, tout = Esquisse(), Esquisse(), Esquisse()
+        for i in range(1, 200):
+            (a if i % 2 else b).ajouter(i / 10)
+            tout.ajouter(i / 10)
+        fusion = Esquisse(a.en_json()).fusionner(Esquisse(b.en_json()))
+        self.assertEqual(fusion.classes, tout.classes)
+        self.assertEqual(fusion.quantile(0.9), tout.quantile(0.9))
+        self.assertIsNone(Esquisse().quantile(0.5))
+
+
+class TempsCycleTests(TestCase):
+    def setUp(self):
+        self.maintenant = timezone.now()
+        self.postes = creer_postes()
+        self.operateurs = creer_operateurs(2)
+        of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        # 20 min prévues pour 10 pièces : 2 min/pièce
+        self.coupe = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=self.postes[0], titre='Coupe',
+                                              quantite_entree=10, temps_prevu_minutes=Decimal('20'))
+        self.controle = Operation.objects.create(ordre_fabrication=of, numero_phase=2, poste=self.postes[0],
+                                                 titre='Contrôle', type_operation='QUALITE')
+
+    def _pointage(self, operation, operateur, minutes, pieces, cloture=True):
+        return creer_pointage(operation, operateur, self.maintenant - timedelta(minutes=minutes),
+                              self.maintenant if cloture else None, quantite_fabriquee=pieces)
+
+    def test_mise_a_jour_a_la_cloture_seulement(self):
+        pointage = self._pointage(self.coupe, self.operateurs[0], 30, 10, cloture=False)
+        self.assertFalse(StatistiqueCycle.objects.exists())
+        self.assertFalse(CycleEnAttente.objects.exists())
+        # La clôture ne fait que mettre la clé en file, sans toucher aux esquisses
+        pointage.heure_fin = self.maintenant
+        with CaptureQueriesContext(connection) as requetes:
+            pointage.save()
+        self.assertFalse([q for q in requetes.captured_queries if 'statistiquecycle' in q['sql']])
+        pointage.save()  # une nouvelle sauvegarde ne recompte pas le pointage
+        self.assertEqual(list(CycleEnAttente.objects.values_list('poste_id', 'type_operation', 'operateur_id')),
+                         [(self.postes[0].pk, 'PRODUCTION', self.operateurs[0].pk)])
+        self.assertFalse(StatistiqueCycle.objects.exists())
+        self.assertEqual(rafraichir_cycles(), 1)
+        self.assertFalse(CycleEnAttente.objects.exists())
+        stat = StatistiqueCycle.objects.get()
+        self.assertEqual(stat.nombre, 1)
+        self.assertAlmostEqual(stat.somme_minutes, 3.0)
+        self._pointage(self.coupe, self.operateurs[0], 0, 0)  # ni durée ni pièce : ignoré
+        rafraichir_cycles()
+        self.assertEqual(StatistiqueCycle.objects.get().nombre, 1)
+
+    def test_statistiques_ecart_au_prevu_et_reconstruction(self):
+        for minutes in (20, 30, 30, 40):
+            self._pointage(self.coupe, self.operateurs[0], minutes, 10)
+        self._pointage(self.coupe, self.operateurs[1], 50, 10)
+        self._pointage(self.controle, self.operateurs[1], 10, 10)
+        self.assertEqual(rafraichir_cycles(taille_lot=2), 3)
+
+        [poste] = statistiques('poste')
+        self.assertEqual((poste.libelle, poste.nombre), ('Découpe', 6))
+        par_type = {l.cle: l for l in statistiques('type_operation', {'poste': self.postes[0].pk})}
+        production = par_type['PRODUCTION']
+        self.assertAlmostEqual(production.p50, 3.0, delta=3.0 * ERREUR_RELATIVE)
+        self.assertAlmostEqual(production.p90, 4.0, delta=4.0 * ERREUR_RELATIVE)  # rang 0,9 × 4 arrondi par défaut
+        self.assertEqual(production.prevu, 2.0)
+        self.assertAlmostEqual(production.ecart_pct, 50.0, delta=2 * 100 * ERREUR_RELATIVE)
+        self.assertIsNone(par_type['QUALITE'].prevu)  # pas de quantité d'entrée sur l'opération
+        self.assertEqual(len(statistiques('operateur', {'type_operation': 'PRODUCTION'})), 2)
+
+        avant = {(s.poste_id, s.type_operation, s.operateur_id): (s.esquisse, s.nombre) for s in StatistiqueCycle.objects.all()}
+        reconstruire()
+        apres = {(s.poste_id, s.type_operation, s.operateur_id): (s.esquisse, s.nombre) for s in StatistiqueCycle.objects.all()}
+        self.assertEqual(avant, apres)
+        with self.assertRaises(ValueError):
+            statistiques('machine')
+
+    def test_modification_et_suppression_d_un_pointage_compte(self):
+        pointage = self._pointage(self.coupe, self.operateurs[0], 30, 10)
+        self._pointage(self.coupe, self.operateurs[0], 40, 10)
+        pointage.heure_debut = self.maintenant - timedelta(minutes=20)
+        pointage.operateur = self.operateurs[1]
+        pointage.save()
+
+        def stats():
+            rafraichir_cycles()
+            return {s.operateur_id: (s.nombre, round(s.somme_minutes, 6)) for s in StatistiqueCycle.objects.all()}
+        self.assertEqual(stats(), {self.operateurs[0].pk: (1, 4.0), self.operateurs[1].pk: (1, 2.0)})
+
+        pointage.delete()
+        self.assertEqual(stats(), {self.operateurs[0].pk: (1, 4.0)})
+        # Une opération supprimée emporte ses pointages ; archivés, ils restent comptés
+        self.coupe.delete()
+        self.assertEqual(stats(), {})
+        self._pointage(self.controle, self.operateurs[0], 10, 10)
+        archiver_ofs(OrdreFabrication.objects.all())
+        self.assertEqual(stats(), {self.operateurs[0].pk: (1, 1.0)})
+
+    def test_suggestion(self):
+        for _ in range(5):
+            self._pointage(self.coupe, self.operateurs[0], 30, 10)
+        rafraichir_cycles()
+        proposee = suggestion(self.postes[0].pk, 'PRODUCTION', 20)
+        self.assertEqual(proposee['niveau'], 'poste_type')
+        self.assertAlmostEqual(proposee['temps_p50'], 60.0, delta=60.0 * ERREUR_RELATIVE)
+        # Type sans historique : repli sur le poste ; poste sans historique : rien
+        self.assertEqual(suggestion(self.postes[0].pk, 'LOGISTIQUE', 20)['niveau'], 'poste')
+        self.assertIsNone(suggestion(self.postes[1].pk, 'PRODUCTION', 20))
+
+    def test_page_et_api(self):
+        connecter_manager(self.client)
+        for _ in range(5):
+            self._pointage(self.coupe, self.operateurs[0], 30, 10)
+        self.assertContains(self.client.get('/rapports/temps-cycle/'), 'Découpe')
+        donnees = self.client.get('/api/temps-cycle/?axe=operateur').json()
+        self.assertEqual(donnees['lignes'][0]['libelle'], 'OP1')
+        reponse = self.client.get(f'/api/temps-cycle/suggestion/?poste={self.postes[0].pk}&type_operation=PRODUCTION&quantite=10')
+        self.assertAlmostEqual(reponse.json()['suggestion']['temps_p50'], 30.0, delta=1.0)
+        self.assertEqual(self.client.get('/api/temps-cycle/suggestion/?poste=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/temps-cycle/?axe=machine').status_code, 400)
+        self.assertContains(self.client.get('/gestion/of/creer/'), 'api/temps-cycle/suggestion/')
@@ -0,0 +1,140 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ..models import (
+    OrdreFabrication, Operation, Machine,
+    PeriodeStatutMachine, TRSEnAttente, TRSJournalier,
+)
+from ..services.trs import rafraichir_trs, trs, _union, _intersection
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+@override_settings(TRS_HEURE_OUVERTURE=6, TRS_HEURE_FERMETURE=22, TRS_JOURS_OUVRES=[0, 1, 2, 3, 4])
+class TRSTests(TestCase):
+    def setUp(self):
+        # Un lundi passé : la journée est entièrement écoulée
+        aujourd_hui = timezone.localdate()
+        self.lundi = aujourd_hui - timedelta(days=aujourd_hui.weekday() + 14)
+        self.postes = creer_postes()
+        self.machine = Machine.objects.create(nom='Presse 1')
+        [self.operateur] = creer_operateurs()
+        of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.coupe = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=self.postes[0], titre='Coupe',
+                                              machine_assignee=self.machine, quantite_entree=10,
+                                              temps_prevu_minutes=Decimal('60'))
+        self.pliage = Operation.objects.create(ordre_fabrication=of, numero_phase=2, poste=self.postes[1], titre='Pliage',
+                                               machine_assignee=self.machine, quantite_entree=8,
+                                               temps_prevu_minutes=Decimal('30'))
+
+    def _instant(self, jour, heure):
+        return timezone.make_aware(datetime.combine(jour, time(heure)))
+
+    def _pointage(self, operation, jour, debut, fin, fabrique, rebut):
+        return creer_pointage(operation, self.operateur, self._instant(jour, debut), self._instant(jour, fin),
+                              quantite_fabriquee=fabrique, quantite_rebut=rebut)
+
+    def _arret(self, statut, debut, fin):
+        PeriodeStatutMachine.objects.create(machine=self.machine, statut=statut,
+                                            debut=self._instant(self.lundi, debut), fin=self._instant(self.lundi, fin))
+
+    def test_intervalles(self):
+        t = lambda h: self._instant(self.lundi, h)
+        self.assertEqual(_union([(t(8), t(10)), (t(9), t(11)), (t(12), t(13))]), [(t(8), t(11)), (t(12), t(13))])
+        self.assertEqual(_intersection([(t(8), t(11)), (t(12), t(14))], [(t(10), t(13))]),
+                         [(t(10), t(11)), (t(12), t(13))])
+
+    def test_disponibilite_performance_qualite(self):
+        self._pointage(self.coupe, self.lundi, 8, 10, 8, 2)
+        self._arret('EN_PANNE', 12, 14)
+        self._arret('MAINTENANCE', 14, 16)
+        TRSEnAttente.objects.get_or_create(jour=self.lundi, machine=self.machine)
+        rafraichir_trs()
+        self.assertFalse(TRSEnAttente.objects.exists())
+
+        [ligne] = trs(self.lundi, self.lundi)
+        # Ouverture 16 h, dont 2 h de maintenance : 14 h requises, 12 h de fonctionnement.
+        # Temps net : 10 pièces à 6 min ; temps utile : 8 pièces bonnes.
+        self.assertEqual(ligne.temps_requis_h, 14.0)
+        self.assertEqual(ligne.temps_panne_h, 2.0)
+        self.assertEqual(ligne.disponibilite, round(12 * 100 / 14, 1))
+        self.assertEqual(ligne.performance, round(1 * 100 / 12, 1))
+        self.assertEqual(ligne.qualite, 80.0)
+        self.assertEqual(ligne.trs, round(0.8 * 100 / 14, 1))
+
+    def test_pointage_hors_ouverture_et_repartition_par_poste(self):
+        samedi = self.lundi + timedelta(days=5)
+        self._pointage(self.coupe, samedi, 8, 9, 10, 0)
+        self._pointage(self.pliage, samedi, 9, 12, 8, 0)
+        rafraichir_trs()  # journées marquées par la clôture des pointages
+
+        [machine] = trs(samedi, samedi)
+        # Le samedi n'est pas ouvré : seul le temps pointé est requis, sans arrêt
+        self.assertEqual(machine.temps_requis_h, 4.0)
+        self.assertEqual(machine.disponibilite, 100.0)
+        par_poste = {l.libelle: l for l in trs(samedi, samedi, axe='poste')}
+        self.assertEqual(par_poste['Découpe'].temps_requis_h, 1.0)
+        self.assertEqual(par_poste['Pliage'].temps_requis_h, 3.0)
+        self.assertEqual(par_poste['Découpe'].performance, 100.0)
+
+    def test_historique_des_statuts(self):
+        self.assertEqual(self.machine.periodes_statut.get().statut, 'DISPONIBLE')
+        self.machine.statut = 'EN_PANNE'
+        self.machine.save()
+        self.machine.save()  # statut inchangé : pas de nouvel intervalle
+        periodes = list(self.machine.periodes_statut.order_by('debut'))
+        self.assertEqual([p.statut for p in periodes], ['DISPONIBLE', 'EN_PANNE'])
+        self.assertIsNotNone(periodes[0].fin)
+        self.assertIsNone(periodes[1].fin)
+        self.assertTrue(TRSEnAttente.objects.filter(jour=timezone.localdate(), machine=self.machine).exists())
+
+        # Une panne en cours compte pour aujourd'hui même sans pointage
+        rafraichir_trs()
+        self.assertTrue(TRSJournalier.objects.filter(jour=timezone.localdate(), machine=self.machine).exists())
+
+    def test_recalcul_apres_nouveau_pointage(self):
+        self._pointage(self.coupe, self.lundi, 8, 10, 8, 2)
+        rafraichir_trs()
+        self._pointage(self.pliage, self.lundi, 10, 11, 8, 0)
+        self.assertEqual(rafraichir_trs(), 1)
+        self.assertEqual(TRSJournalier.objects.filter(jour=self.lundi).count(), 2)
+        [ligne] = trs(self.lundi, self.lundi)
+        self.assertEqual(ligne.pieces_bonnes, 16)
+
+    def test_recalcul_apres_changement_de_machine_et_suppression(self):
+        pointage = self._pointage(self.coupe, self.lundi, 8, 10, 8, 2)
+        rafraichir_trs()
+        tour = Machine.objects.create(nom='Tour 1')
+        self.coupe.machine_assignee = tour
+        self.coupe.save()
+        self.assertEqual(set(TRSEnAttente.objects.values_list('machine_id', flat=True)), {self.machine.pk, tour.pk})
+        rafraichir_trs()
+        bonnes = lambda: dict(TRSJournalier.objects.filter(jour=self.lundi).values('machine_id')
+                              .annotate(n=Sum('pieces_bonnes')).values_list('machine_id', 'n'))
+        # La journée de la presse, sans pointage restant, est recalculée à vide
+        self.assertEqual(bonnes(), {tour.pk: 8})
+
+        pointage.delete()
+        self.assertEqual(rafraichir_trs(), 1)
+        self.assertEqual(bonnes(), {})
+
+    def test_page_et_api(self):
+        self._pointage(self.coupe, self.lundi, 8, 10, 8, 2)
+        self.client.force_login(User.objects.create_user('operateur'))
+        self.assertEqual(self.client.get('/rapports/trs/').status_code, 403)
+        connecter_manager(self.client)
+        self.assertContains(self.client.get('/rapports/trs/?jours=30'), 'Presse 1')
+        donnees = self.client.get('/api/trs/?jours=30&axe=poste&granularite=semaine').json()
+        self.assertEqual([l['libelle'] for l in donnees['lignes']], ['Découpe'])
+        self.assertEqual(self.client.get('/api/trs/?granularite=annee').status_code, 400)
+
+    def test_pas_de_304_sur_une_journee_en_cours(self):
+        connecter_manager(self.client)
+        self.machine.statut = 'EN_PANNE'
+        self.machine.save()
+        # La panne en cours s'allonge sans nouvelle écriture : aucune réponse revalidée par version
+        self.assertNotIn('ETag', self.client.get('/api/trs/?jours=30'))
+        self.assertNotIn('ETag', self.client.get('/rapports/trs/'))
@@ -0,0 +1,120 @@
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from ..models import (
+    OrdreFabrication, Operation, Machine,
+    UtilisationEnAttente, UtilisationMachine,
+)
+from ..services.utilisation import (
+    IndexIntervalles, etat_machines, rafraichir_utilisation, reconstruire_utilisation, utilisation,
+)
+from .outils import connecter_manager, creer_operateurs, creer_pointage, creer_postes
+
+
+@override_settings(UTILISATION_EQUIPES='Matin:6-14,Après-midi:14-22', TRS_JOURS_OUVRES=[0, 1, 2, 3, 4])
+class UtilisationTests(TestCase):
+    def setUp(self):
+        # Un lundi passé : la journée est entièrement écoulée
+        aujourd_hui = timezone.localdate()
+        self.lundi = aujourd_hui - timedelta(days=aujourd_hui.weekday() + 14)
+        [poste] = creer_postes('Découpe')
+        self.presse = Machine.objects.create(nom='Presse 1')
+        self.tour = Machine.objects.create(nom='Tour 1')
+        self.operateurs = creer_operateurs(2)
+        of = OrdreFabrication.objects.create(numero_of='OF-1', titre='Pièce', quantite_a_produire=10)
+        self.coupe = Operation.objects.create(ordre_fabrication=of, numero_phase=1, poste=poste, titre='Coupe',
+                                              machine_assignee=self.presse)
+
+    def _instant(self, jour, heure):
+        return timezone.make_aware(datetime.combine(jour, time.min)) + timedelta(hours=heure)
+
+    def _pointage(self, operateur, debut, fin, jour=None):
+        jour = jour or self.lundi
+        return creer_pointage(self.coupe, self.operateurs[operateur], self._instant(jour, debut), self._instant(jour, fin))
+
+    def test_equipes_creux_et_chevauchements(self):
+        self._pointage(0, 8, 10)
+        self._pointage(1, 9, 11)
+        self._pointage(0, 15, 16)
+        self._pointage(1, 23, 23.5)
+        self.assertTrue(UtilisationEnAttente.objects.filter(jour=self.lundi, machine=self.presse).exists())
+        reconstruire_utilisation(self.lundi, self.lundi)
+
+        matin = UtilisationMachine.objects.get(jour=self.lundi, machine=self.presse, equipe='Matin')
+        self.assertEqual((matin.temps_ouvert, matin.temps_occupe, matin.temps_pointe, matin.temps_chevauchement),
+                         (8 * 3600, 3 * 3600, 4 * 3600, 3600))
+        self.assertEqual((matin.temps_creux, matin.creux_max, matin.pointages), (5 * 3600, 3 * 3600, 2))
+        apres_midi = UtilisationMachine.objects.get(jour=self.lundi, machine=self.presse, equipe='Après-midi')
+        self.assertEqual((apres_midi.temps_occupe, apres_midi.creux_max), (3600, 6 * 3600))
+        hors = UtilisationMachine.objects.get(jour=self.lundi, machine=self.presse, equipe='')
+        self.assertEqual((hors.temps_ouvert, hors.temps_occupe), (0, 1800))
+        # Une machine sans pointage a ses équipes, entièrement en creux
+        self.assertEqual(UtilisationMachine.objects.filter(jour=self.lundi, machine=self.tour).count(), 2)
+
+        presse, tour = utilisation(self.lundi, self.lundi)
+        self.assertEqual((presse.libelle, presse.taux_utilisation, presse.heures_hors_equipe, presse.taux_chevauchement),
+                         ('Presse 1', 25.0, 0.5, 22.2))
+        self.assertEqual((tour.taux_utilisation, tour.heures_creux), (0.0, 16.0))
+        [atelier] = utilisation(self.lundi, self.lundi, axe=None)
+        self.assertEqual(atelier.taux_utilisation, 12.5)
+        self.assertEqual([(l.libelle, l.heures_occupees + l.heures_hors_equipe) for l in utilisation(self.lundi, self.lundi, axe='equipe')],
+                         [('Après-midi', 1.0), ('Hors équipe', 0.5), ('Matin', 3.0)])
+
+    @override_settings(UTILISATION_EQUIPES='Jour:6-18,Nuit:18-30')
+    def test_equipe_de_nuit_index_et_etat(self):
+        mardi = self.lundi + timedelta(days=1)
+        pointage = self._pointage(0, 2, 3, jour=mardi)
+        # Le pointage de mardi 2 h appartient à l'équipe de nuit de lundi
+        self.assertTrue(UtilisationEnAttente.objects.filter(jour=self.lundi, machine=self.presse).exists())
+        reconstruire_utilisation(self.lundi, mardi)
+        nuit = UtilisationMachine.objects.get(jour=self.lundi, machine=self.presse, equipe='Nuit')
+        self.assertEqual((nuit.temps_ouvert, nuit.temps_occupe), (12 * 3600, 3600))
+        self.assertFalse(UtilisationMachine.objects.filter(jour=mardi, machine=self.presse, equipe='').exists())
+
+        t = lambda h: self._instant(self.lundi, h)
+        index = IndexIntervalles([(t(4), t(6)), (t(1), t(3)), (t(2), t(5))])
+        self.assertEqual(index.temps(t(0), t(24)), (5 * 3600, 7 * 3600, 2 * 3600))
+        self.assertEqual(index.temps(t(2.5), t(4.5)), (2 * 3600, 3 * 3600, 3600))
+        self.assertEqual((index.niveau(t(4.5)), index.niveau(t(7)), index.nombre(t(3), t(4))), (2, 0, 1))
+        self.assertEqual(index.creux(t(0), t(8)), [(t(0), t(1)), (t(6), t(8))])
+
+        # État en direct : la presse est occupée dès qu'un pointage y est ouvert
+        self.assertEqual([(e.libelle, e.occupee) for e in etat_machines()], [('Presse 1', False), ('Tour 1', False)])
+        pointage.heure_debut, pointage.heure_fin = timezone.now() - timedelta(minutes=5), None
+        pointage.save()
+        self.assertTrue(etat_machines()[0].occupee)
+
+    def test_recalcul_apres_changement_de_machine_et_suppression(self):
+        pointage = self._pointage(0, 8, 10)
+        rafraichir_utilisation()
+        self.coupe.machine_assignee = self.tour
+        self.coupe.save()
+        self.assertEqual(set(UtilisationEnAttente.objects.filter(jour=self.lundi).values_list('machine_id', flat=True)),
+                         {self.presse.pk, self.tour.pk})
+        rafraichir_utilisation()
+        occupe = lambda: dict(UtilisationMachine.objects.filter(jour=self.lundi, equipe='Matin')
+                              .values_list('machine_id', 'temps_occupe'))
+        self.assertEqual(occupe(), {self.presse.pk: 0, self.tour.pk: 2 * 3600})
+
+        pointage.delete()
+        self.assertTrue(UtilisationEnAttente.objects.filter(jour=self.lundi, machine=self.tour).exists())
+        rafraichir_utilisation()
+        self.assertEqual(occupe(), {self.presse.pk: 0, self.tour.pk: 0})
+
+    def test_api(self):
+        connecter_manager(self.client)
+        self._pointage(0, 8, 10)
+        self.assertContains(self.client.get('/rapports/utilisation/?jours=30'), 'Presse 1')
+        donnees = self.client.get(f'/api/utilisation/?jours=30&granularite=jour&machine={self.presse.pk}').json()
+        self.assertIn({'periode': self.lundi.isoformat(), 'heures_occupees': 2.0},
+                      [{'periode': l['periode'], 'heures_occupees': l['heures_occupees']} for l in donnees['lignes']])
+        self.assertEqual(len(donnees['etat']), 2)
+        self.assertEqual(self.client.get('/api/utilisation/?granularite=heure').status_code, 400)
+
+    def test_pas_de_304_sur_un_pointage_ouvert(self):
+        connecter_manager(self.client)
+        creer_pointage(self.coupe, self.operateurs[0], timezone.now() - timedelta(minutes=30))
+        # Le pointage ouvert s'allonge sans nouvelle écriture : aucune réponse revalidée par version
+        self.assertNotIn('ETag', self.client.get('/api/utilisation/?jours=30'))
+        self.assertNotIn('ETag', self.client.get('/rapports/utilisation/'))
@@ -32,12 +32,17 @@ urlpatterns = [
     path('dashboard/manager/', views.dashboard_manager_view, name='dashboard_manager'),
     path('suivi-atelier/', views.suivi_of_list_view, name='suivi_atelier'),
     path('suivi-atelier/of/<int:pk>/', views.suivi_detail_of_view, name='suivi_detail_of'),
+    path('api/of/<int:pk>/chronologie/', views.api_chronologie_of, name='api_chronologie_of'),
+    path('api/operateurs/', views.api_operateurs, name='api_operateurs'),
     path('suivi-atelier/of/<int:pk>/export/csv/', views.export_suivi_csv, name='export_suivi_csv'),
     
     # URLs de gestion des OFs
     path('gestion/of/', views.of_list_view, name='of_list'),
     path('gestion/of/creer/', views.of_create_view, name='of_create'),
+    path('gestion/of/importer/', views.of_import_view, name='of_import'),
     path('gestion/of/<int:pk>/modifier/', views.of_update_view, name='of_update'),
+    path('api/gammes/', views.api_gammes, name='api_gammes'),
+    path('api/gammes/<int:pk>/instancier/', views.api_instancier_gamme, name='api_instancier_gamme'),
     path('of/<int:pk>/fiche/', views.fiche_of_view, name='fiche_of'),
 
     # URLs pour les APIs AJAX
@@ -45,6 +50,7 @@ urlpatterns = [
     path('api/terminer_tache/', views.api_terminer_tache, name='api_terminer_tache'),
         # NOUVELLES URLs POUR LES RAPPORTS
     path('rapports/production-du-jour/', rapport_production_par_of_view, name='rapport_production_par_of'),
+    path('rapports/production-finale/', views.rapport_production_view, name='rapport_production'),
     path('rapports/production-par-operation/<int:pk>/', views.rapport_production_par_operation_view, name='rapport_production_par_operation'),
     path('rapports/rebuts/', views.rapport_rebuts_par_of_view, name='rapport_rebuts'),
     path('rapports/rebuts/export/pdf/', views.export_rebuts_par_of_pdf, name='export_rebuts_par_of_pdf'),
@@ -52,11 +58,30 @@ urlpatterns = [
     path('gestion/operation/<int:pk>/modifier/', views.operation_update_view, name='operation_update'),
     path('gestion/of/<int:pk>/supprimer/', views.of_delete_view, name='of_delete'),
     path('gestion/operation/<int:pk>/fiche/', views.fiche_operation_view, name='fiche_operation'),
+    path('rapports/rebuts/cube/', views.cube_rebuts_view, name='cube_rebuts'),
+    path('api/rebuts/cube/', views.api_cube_rebuts, name='api_cube_rebuts'),
     path('rapports/rebuts/of/<int:pk>/', views.rapport_rebuts_par_operation_view, name='rapport_rebuts_par_operation'),
     path('api/anomalie/<int:pk>/', views.api_get_anomalie_detail, name='api_get_anomalie_detail'),
     path('api/anomalie/<int:pk>/resolve/', views.api_resolve_anomalie, name='api_resolve_anomalie'),
     path('rapport-production/<int:of_id>/<str:date_str>/', views.rapport_production_of_jour, name='rapport_production_of_jour'),
     path('api/dashboard-data/', api_dashboard_data, name='api_dashboard_data'),
     path('historique/', views.historique_view, name='historique'),
+    path('rapports/anomalies/', views.analyse_anomalies_view, name='analyse_anomalies'),
+    path('api/anomalies/analyse/', views.api_analyse_anomalies, name='api_analyse_anomalies'),
+    path('rapports/trs/', views.trs_view, name='trs'),
+    path('api/trs/', views.api_trs, name='api_trs'),
+    path('rapports/utilisation/', views.utilisation_view, name='utilisation'),
+    path('api/utilisation/', views.api_utilisation, name='api_utilisation'),
+    path('rapports/couts/', views.couts_view, name='couts'),
+    path('api/couts/', views.api_couts, name='api_couts'),
+    path('rapports/temps-cycle/', views.temps_cycle_view, name='temps_cycle'),
+    path('api/temps-cycle/', views.api_temps_cycle, name='api_temps_cycle'),
+    path('api/temps-cycle/suggestion/', views.api_suggestion_temps_prevu, name='api_suggestion_temps_prevu'),
+    path('rapports/delais/', views.delais_view, name='delais'),
+    path('api/delais/', views.api_delais, name='api_delais'),
+    path('api/v1/<str:ressource>/', views.api_lecture_view, name='api_lecture'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('profils/', views.profils_view, name='profils'),
+    path('profils/<str:vue>/telecharger/', views.telecharger_profil_view, name='telecharger_profil'),
 ]
 
@@ -1,16 +1,23 @@
 # --- Imports Django ---
 import json
 import csv
-from datetime import timedelta
+import hmac
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView
 from django.core.exceptions import PermissionDenied
-from django.db.models import Sum, F, Max, Q
-from django.http import HttpResponse, Http404, JsonResponse
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Sum, F, Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.utils import timezone
 from django.core.serializers import serialize
+from django.utils.dateparse import parse_date
 
 
 
@@ -18,13 +25,15 @@ from django.core.serializers import serialize
 # --- Imports Locaux ---
 from .models import (
     Operateur, OrdreFabrication, Operation, Pointage, 
-    MatierePremiere, MatiereRequise, Anomalie, DailyReport
+    MatierePremiere, MatiereRequise, Anomalie, DailyReport, PosteDeTravail,
+    OperationArchive, MatiereRequiseArchive, OrdreFabricationArchive, GammeType,
 )
 from .forms import (
     CustomUserCreationForm,
     OrdreFabricationForm,
     OperationFormSet,
     MatiereRequiseFormSet,
+    ImportOFForm,
 )
 
 from .services.reporting import (
@@ -32,7 +41,24 @@ from .services.reporting import (
     build_7day_series,
     build_alertes,
 )
+from .services.recherche import rechercher_ofs
+from .services.metriques import REGISTRE
+from .services.profilage import lister_profils, agreger_piles, exporter_piles
+from .services.analyse_anomalies import AXES, analyse_anomalies
+from .services import cube_rebuts
+from .services import trs as services_trs
+from .services import utilisation as services_utilisation
+from .services import couts as services_couts
+from .services import temps_cycle
+from .services import delais as services_delais
+from .services.journal import publier
+from .services.import_ofs import COLONNES as COLONNES_IMPORT, ErreurImport, importer_ofs, lire_fichier
+from .services import gammes as services_gammes
+from .services import api_lecture
+from .services import production_finale
+from .services import chronologie
 from .filters.of import OrdreFabricationFilter
+from .decorators import revalidation_par_version
 
 # Import optionnel pour les codes-barres (utilisé dans fiche_of_view)
 try:
@@ -42,6 +68,9 @@ except Exception:
     barcode = None
     SVGWriter = None
 
+# Taille de page des listes d'OFs (le coût d'une page reste borné par cette valeur)
+OFS_PAR_PAGE = 24
+
 # =============================================================================
 # VUES PRINCIPALES DE L'APPLICATION
 # =============================================================================
@@ -133,43 +162,119 @@ def dashboard_manager_view(request):
 @login_required
 def suivi_of_list_view(request):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
-    base = OrdreFabrication.objects.exclude(statut='ARCHIVE').order_by('date_creation')
+    base = OrdreFabrication.objects.exclude(statut='ARCHIVE').order_by('date_creation', 'pk')
     f = OrdreFabricationFilter(request.GET, queryset=base)
+    page_obj = Paginator(f.qs.with_metrics(), OFS_PAR_PAGE).get_page(request.GET.get('page'))
     context = {
-        'ofs': f.qs,
+        'ofs': page_obj,
+        'page_obj': page_obj,
         'filter': f,
         'filtre_numero': request.GET.get('numero', '').strip(),  # compat template existant
     }
     return render(request, 'suivi_production/suivi_of_list.html', context)
 
+# Pointages affichés par page dans le suivi détaillé d'un OF
+POINTAGES_PAR_PAGE = 100
+
+
+def _date_saisie(valeur):
+    """Date 'AAAA-MM-JJ' d'un paramètre, None si vide, mal formée ou inexistante (2026-02-30)."""
+    try:
+        return parse_date(valeur or '')
+    except ValueError:
+        return None
+
+
+def _pointages_suivi(request, of):
+    """Pointages d'un OF selon les filtres du suivi détaillé (date, opérateur, statut)."""
+    pointages_list = Pointage.objects.filter(operation__ordre_fabrication=of).select_related('operation', 'operateur', 'operation__machine_assignee').avec_cout()
+    if _date_saisie(request.GET.get('date_filtre')): pointages_list = pointages_list.debutes_le(_date_saisie(request.GET['date_filtre']))
+    if request.GET.get('operateur_filtre', '').isdigit(): pointages_list = pointages_list.filter(operateur_id=request.GET['operateur_filtre'])
+    if request.GET.get('statut_filtre') == 'en_cours': pointages_list = pointages_list.filter(heure_fin__isnull=True)
+    elif request.GET.get('statut_filtre') == 'termine': pointages_list = pointages_list.filter(heure_fin__isnull=False)
+    return pointages_list
+
+
 @login_required
 def suivi_detail_of_view(request, pk):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
     try:
         of = OrdreFabrication.objects.get(pk=pk)
-        pointages_list = Pointage.objects.filter(operation__ordre_fabrication=of).select_related('operation', 'operateur', 'operation__machine_assignee')
-        if request.GET.get('date_filtre'): pointages_list = pointages_list.filter(heure_debut__date=request.GET.get('date_filtre'))
-        if request.GET.get('operateur_filtre'): pointages_list = pointages_list.filter(operateur_id=request.GET.get('operateur_filtre'))
-        if request.GET.get('statut_filtre') == 'en_cours': pointages_list = pointages_list.filter(heure_fin__isnull=True)
-        elif request.GET.get('statut_filtre') == 'termine': pointages_list = pointages_list.filter(heure_fin__isnull=False)
-        context = {'of': of, 'pointages': pointages_list.order_by('operation__numero_phase', 'heure_debut'), 'operateurs': Operateur.objects.all(), 'valeurs_filtres': request.GET}
+        pointages_list = _pointages_suivi(request, of).order_by('operation__numero_phase', 'heure_debut', 'pk')
+        page_obj = Paginator(pointages_list, POINTAGES_PAR_PAGE).get_page(request.GET.get('page'))
+        operateur = Operateur.objects.filter(pk=request.GET['operateur_filtre']).first() if request.GET.get('operateur_filtre', '').isdigit() else None
+        context = {'of': of, 'pointages': page_obj, 'page_obj': page_obj, 'operateur': operateur, 'valeurs_filtres': request.GET}
         return render(request, 'suivi_production/suivi_detail_of.html', context)
     except OrdreFabrication.DoesNotExist: raise Http404("Ordre de Fabrication non trouvé")
 
+
+# Suggestions renvoyées par l'autocomplétion des opérateurs
+OPERATEURS_SUGGERES = 20
+
+
+@login_required
+def api_operateurs(request):
+    """Autocomplétion des opérateurs : ?q=<début du code, nom ou prénom>."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    q = request.GET.get('q', '').strip()
+    operateurs = Operateur.objects.order_by('code')
+    if q:
+        operateurs = operateurs.filter(Q(code__istartswith=q) | Q(nom__istartswith=q) | Q(prenom__istartswith=q))
+    return JsonResponse({'status': 'success', 'operateurs': list(operateurs.values('id', 'code', 'nom', 'prenom')[:OPERATEURS_SUGGERES])})
+
+
 @login_required
+def api_chronologie_of(request, pk):
+    """
+    Chronologie (Gantt) d'un OF : par opération, intervalles occupés, niveaux de
+    parallélisme et creux. ?debut=AAAA-MM-JJ&fin=AAAA-MM-JJ[&operation=<id>]
+    Sans ETag par version : un pointage ouvert compte jusqu'à maintenant.
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    of = OrdreFabrication.objects.filter(pk=pk).values('pk', 'numero_of', 'titre', 'statut').first()
+    if of is None:
+        return JsonResponse({'status': 'error', 'message': 'OF introuvable.'}, status=404)
+    debut, fin = _date_saisie(request.GET.get('debut')), _date_saisie(request.GET.get('fin'))
+    if (request.GET.get('debut') and not debut) or (request.GET.get('fin') and not fin):
+        return JsonResponse({'status': 'error', 'message': 'Date invalide (AAAA-MM-JJ).'}, status=400)
+    operation = request.GET.get('operation', '')
+    if operation and not operation.isdigit():
+        return JsonResponse({'status': 'error', 'message': 'Opération invalide.'}, status=400)
+    operations = chronologie.chronologie_of(pk, debut, fin, int(operation) if operation else None)
+    return JsonResponse({'of': of, 'operations': [o.as_dict() for o in operations]})
+
+@login_required
+@revalidation_par_version
 def rapport_production_view(request):
+    """
+    Production finale (pièces sorties de la dernière phase des OFs) :
+    ?debut=AAAA-MM-JJ&fin=AAAA-MM-JJ (aujourd'hui par défaut) &groupe=of|jour|poste &page=N
+    """
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
     today = timezone.now().date()
-    pointages_finaux_du_jour = []
-    pointages_termines_today = Pointage.objects.filter(heure_fin__date=today).select_related('operation__ordre_fabrication')
-    for p in pointages_termines_today:
-        derniere_phase_numero = p.operation.ordre_fabrication.operations.aggregate(max_phase=Max('numero_phase'))['max_phase']
-        if p.operation.numero_phase == derniere_phase_numero:
-            pointages_finaux_du_jour.append(p)
-    context = {'pointages': pointages_finaux_du_jour, 'date': today}
+    debut = _date_saisie(request.GET.get('debut')) or today
+    fin = _date_saisie(request.GET.get('fin')) or debut
+    if debut > fin:
+        debut, fin = fin, debut
+    groupe = request.GET.get('groupe', 'of')
+    if groupe not in production_finale.GROUPES:
+        groupe = 'of'
+    page_obj = Paginator(production_finale.production_finale(debut, fin, groupe), production_finale.LIGNES_PAR_PAGE).get_page(request.GET.get('page'))
+    context = {
+        'lignes': production_finale.lignes(page_obj, groupe),
+        'page_obj': page_obj,
+        'totaux': production_finale.totaux(debut, fin),
+        'debut': debut,
+        'fin': fin,
+        'groupe': groupe,
+        'groupes': [('of', 'OF'), ('jour', 'Jour'), ('poste', 'Poste')],
+    }
     return render(request, 'suivi_production/rapports/rapport_production.html', context)
 
 @login_required
+@revalidation_par_version
 def rapport_rebuts_par_of_view(request):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
         raise PermissionDenied
@@ -209,12 +314,14 @@ def export_rebuts_par_of_xlsx(request):
     return export_rebuts_xlsx(numero=numero, date_str=date_str)
 
 @login_required
+@revalidation_par_version
 def rapport_rebuts_par_operation_view(request, pk):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
     of = OrdreFabrication.objects.get(pk=pk)
     operations_avec_rebut = of.operations.filter(pointages__quantite_rebut__gt=0).distinct().annotate(total_rebut_op=Sum('pointages__quantite_rebut'), total_fab_op=Sum('pointages__quantite_fabriquee')).select_related('ordre_fabrication')
     return render(request, 'suivi_production/rapports/rapport_rebuts_par_operation.html', {'of': of, 'operations': operations_avec_rebut})
 
+@transaction.atomic
 def synchroniser_gamme(ordre_fabrication):
     operations = ordre_fabrication.operations.order_by('numero_phase')
     for i, op in enumerate(operations):
@@ -226,6 +333,9 @@ def synchroniser_gamme(ordre_fabrication):
             if op_precedente.statut == 'TERMINEE':
                 quantite_entree_calculee = op_precedente.quantite_sortie_bonne
         if op.statut == 'A_FAIRE':
+            if i > 0 and op.quantite_entree == 0 and quantite_entree_calculee > 0:
+                publier('PHASE_DEBLOQUEE', ordre_fabrication.pk, op.pk, poste_id=op.poste_id,
+                        numero_phase=op.numero_phase, quantite_entree=quantite_entree_calculee)
             op.quantite_entree = quantite_entree_calculee
         op.save()
 
@@ -233,23 +343,107 @@ def synchroniser_gamme(ordre_fabrication):
 def of_list_view(request):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
     
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
     
     # On exclut les OFs archivés
-    base_queryset = OrdreFabrication.objects.exclude(statut='ARCHIVE')
+    base_queryset = OrdreFabrication.objects.exclude(statut='ARCHIVE').with_metrics().prefetch_related('operations')
     
     if query:
-        # On recherche sur les champs qui existent : numero_of et titre
-        search_results = base_queryset.filter(
-            Q(numero_of__icontains=query) |
-            Q(titre__icontains=query)
-        )
-    else:
-        search_results = base_queryset.all()
+        # Recherche indexée sur numero_of et titre, classée et paginée par curseur
+        resultats = rechercher_ofs(base_queryset, query, curseur=request.GET.get('apres', ''), limite=OFS_PAR_PAGE)
+        return render(request, 'suivi_production/gestion/of_list.html', {
+            'ofs': resultats.resultats,
+            'curseur_suivant': resultats.curseur_suivant,
+        })
         
-    ofs = search_results.order_by('-date_creation')
+    ofs = base_queryset.order_by('-date_creation', '-pk')
+    page_obj = Paginator(ofs, OFS_PAR_PAGE).get_page(request.GET.get('page'))
     
-    return render(request, 'suivi_production/gestion/of_list.html', {'ofs': ofs})
+    return render(request, 'suivi_production/gestion/of_list.html', {'ofs': page_obj, 'page_obj': page_obj})
+
+@login_required
+def of_import_view(request):
+    """Import en masse d'OFs, d'opérations et de matières depuis un fichier CSV ou XLSX."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
+    rapport = None
+    form = ImportOFForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        fichier = form.cleaned_data['fichier']
+        try:
+            rapport = importer_ofs(lire_fichier(fichier.read(), fichier.name), simulation=form.cleaned_data['simulation'])
+        except ErreurImport as e:
+            messages.error(request, str(e))
+            return redirect('of_import')
+        if rapport.simulation:
+            messages.info(request, f"Simulation : {rapport.ofs} OF(s) valide(s), {rapport.ofs_rejetes} rejeté(s).")
+        elif rapport.ofs:
+            messages.success(request, f"{rapport.ofs} OF(s) et {rapport.operations} opération(s) importé(s).")
+        if rapport.nombre_erreurs:
+            messages.warning(request, f"{rapport.nombre_erreurs} erreur(s) : {rapport.ofs_rejetes} OF(s) non importé(s).")
+    return render(request, 'suivi_production/gestion/of_import.html', {
+        'form': form, 'rapport': rapport, 'colonnes': COLONNES_IMPORT,
+    })
+
+@login_required
+def api_gammes(request):
+    """
+    Bibliothèque des gammes types. GET : gammes et leurs phases. POST {"of_id", "nom",
+    "description"} : enregistre la gamme d'un OF existant comme gamme type.
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
+    if request.method == 'GET':
+        return JsonResponse({'status': 'success', 'gammes': services_gammes.lister_gammes()})
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Méthode non autorisée'}, status=405)
+    try:
+        data = json.loads(request.body)
+        of = OrdreFabrication.objects.get(pk=data.get('of_id'))
+        nom = str(data.get('nom') or '').strip()
+        if not nom:
+            return JsonResponse({'status': 'error', 'message': 'Nom de gamme obligatoire.'}, status=400)
+        if GammeType.objects.filter(nom=nom).exists():
+            return JsonResponse({'status': 'error', 'message': f"La gamme '{nom}' existe déjà."}, status=400)
+        gamme = services_gammes.gamme_depuis_of(of, nom, str(data.get('description') or ''))
+    except (json.JSONDecodeError, ValueError, OrdreFabrication.DoesNotExist) as e:
+        message = str(e) if isinstance(e, services_gammes.ErreurGamme) else 'OF ou données invalides.'
+        return JsonResponse({'status': 'error', 'message': message}, status=400)
+    return JsonResponse({'status': 'success', 'gamme_id': gamme.pk}, status=201)
+
+@login_required
+def api_instancier_gamme(request, pk):
+    """
+    Crée des OFs depuis une gamme type, en une requête. Corps JSON : soit
+    {"ofs": [{"numero_of", "titre", "quantite_a_produire", ...}, ...]}, soit
+    {"prefixe": "OF-2610-", "nombre": 200} ; les autres clés (quantite_a_produire, titre,
+    date_debut_prevu, date_fin_prevue) servent de valeurs par défaut à chaque OF.
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER': raise PermissionDenied
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Méthode non autorisée'}, status=405)
+    try:
+        gamme = GammeType.objects.get(pk=pk)
+    except GammeType.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Gamme non trouvée'}, status=404)
+    try:
+        data = json.loads(request.body)
+        if 'ofs' in data:
+            demandes = data.pop('ofs')
+        else:
+            nombre = int(data.pop('nombre', 0))
+            if not 0 < nombre <= services_gammes.OFS_MAX:
+                raise services_gammes.ErreurGamme(f"nombre : entre 1 et {services_gammes.OFS_MAX}.")
+            demandes = services_gammes.demandes_numerotees(str(data.pop('prefixe', '')), nombre, int(data.pop('premier', 1)))
+        defauts = {cle: data[cle] for cle in ('titre', 'quantite_a_produire', 'date_debut_prevu', 'date_fin_prevue') if cle in data}
+        ofs = services_gammes.instancier_gamme(gamme, demandes, **defauts)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'JSON invalide.'}, status=400)
+    except (TypeError, ValueError) as e:
+        message = str(e) if isinstance(e, services_gammes.ErreurGamme) else 'Demande invalide.'
+        return JsonResponse({'status': 'error', 'message': message}, status=400)
+    return JsonResponse({
+        'status': 'success', 'gamme': gamme.nom,
+        'ofs': [{'id': of.pk, 'numero_of': of.numero_of} for of in ofs],
+    }, status=201)
 
 @login_required
 def of_create_view(request):
@@ -458,21 +652,26 @@ def api_demarrer_tache(request):
                 }, status=400)
             # ===================== FIN DE LA CORRECTION PRINCIPALE (Phase 2) =====================
 
-            Pointage.objects.create(
-                operation=operation, 
-                operateur=operateur, 
-                heure_debut=timezone.now(), 
-                quantite_prise_en_charge=quantite_prise
-            )
-            
-            # Mise à jour du statut de l'opération et de l'OF
-            operation.statut = 'EN_COURS'
-            operation.save()
-            
-            of = operation.ordre_fabrication
-            if of.statut == 'PLANIFIE':
-                of.statut = 'PRODUCTION'
-                of.save()
+            # Pointage, statuts et événements du journal sont validés ensemble
+            with transaction.atomic():
+                pointage = Pointage.objects.create(
+                    operation=operation, 
+                    operateur=operateur, 
+                    heure_debut=timezone.now(), 
+                    quantite_prise_en_charge=quantite_prise
+                )
+                publier('POINTAGE_DEMARRE', operation.ordre_fabrication_id, operation.pk, pointage_id=pointage.pk,
+                        operateur_id=operateur.pk, poste_id=operation.poste_id, quantite_prise=quantite_prise)
+                
+                # Mise à jour du statut de l'opération et de l'OF
+                operation.statut = 'EN_COURS'
+                operation.save()
+                
+                of = operation.ordre_fabrication
+                if of.statut == 'PLANIFIE':
+                    of.statut = 'PRODUCTION'
+                    of.save()
+                    publier('OF_STATUT', of.pk, ancien='PLANIFIE', nouveau='PRODUCTION')
 
             return JsonResponse({'status': 'success', 'message': 'Démarrage de la tâche enregistré.'})
 
@@ -552,47 +751,60 @@ def api_terminer_tache(request):
                     'message': f"La somme ({qty_fabriquee + qty_rebut}) doit être égale à la quantité prise en charge ({pointage.quantite_prise_en_charge})."
                 }, status=400)
             
-            # Sauvegarde du pointage
-            pointage.heure_fin = timezone.now()
-            pointage.quantite_fabriquee = qty_fabriquee
-            pointage.quantite_rebut = qty_rebut
-            pointage.save()
-
-            # Création de l'anomalie si elle a été signalée
-            probleme_signale = data.get('probleme_signale', False)
-            if probleme_signale:
-                Anomalie.objects.create(
-                    operation=pointage.operation,
-                    operateur=pointage.operateur,
-                    description=data.get('probleme_description', 'Non spécifié')
-                )
-
-            operation = pointage.operation
-            of = operation.ordre_fabrication
-            
-            # Vérification si l'opération globale est terminée
-            total_declare_pour_op = operation.quantite_sortie_bonne + operation.quantite_sortie_rebut
-            if total_declare_pour_op >= operation.quantite_entree:
-                operation.statut = 'TERMINEE'
-                operation.save()
+            # Pointage, statuts, stock et événements du journal sont validés ensemble
+            with transaction.atomic():
+                # Sauvegarde du pointage
+                pointage.heure_fin = timezone.now()
+                pointage.quantite_fabriquee = qty_fabriquee
+                pointage.quantite_rebut = qty_rebut
+                pointage.save()
+
+                operation = pointage.operation
+                of = operation.ordre_fabrication
+                publier('POINTAGE_TERMINE', of.pk, operation.pk, pointage_id=pointage.pk, operateur_id=pointage.operateur_id,
+                        poste_id=operation.poste_id, quantite_fabriquee=qty_fabriquee, quantite_rebut=qty_rebut,
+                        duree_secondes=(pointage.heure_fin - pointage.heure_debut).total_seconds())
+
+                # Création de l'anomalie si elle a été signalée
+                probleme_signale = data.get('probleme_signale', False)
+                if probleme_signale:
+                    anomalie = Anomalie.objects.create(
+                        operation=pointage.operation,
+                        operateur=pointage.operateur,
+                        description=data.get('probleme_description', 'Non spécifié')
+                    )
+                    publier('ANOMALIE_SIGNALEE', of.pk, operation.pk, anomalie_id=anomalie.pk,
+                            operateur_id=pointage.operateur_id, poste_id=operation.poste_id)
                 
-                # Décrémentation du stock (uniquement si c'est la première phase)
-                premiere_phase = of.operations.order_by('numero_phase').first()
-                if premiere_phase and operation == premiere_phase:
-                    matieres_a_decrementer = operation.matiererequise_set.all()
-                    for item in matieres_a_decrementer:
-                        quantite_a_retirer = item.quantite_necessaire * operation.quantite_entree
-                        MatierePremiere.objects.filter(pk=item.matiere.pk).update(quantite_stock=F('quantite_stock') - quantite_a_retirer)
+                # Vérification si l'opération globale est terminée
+                total_bon, total_rebut = operation.quantite_sortie_bonne, operation.quantite_sortie_rebut
+                if total_bon + total_rebut >= operation.quantite_entree:
+                    operation.statut = 'TERMINEE'
+                    operation.save()
+                    publier('OPERATION_TERMINEE', of.pk, operation.pk, poste_id=operation.poste_id,
+                            quantite_bonne=total_bon, quantite_rebut=total_rebut)
+                    
+                    # Décrémentation du stock (uniquement si c'est la première phase)
+                    premiere_phase = of.operations.order_by('numero_phase').first()
+                    if premiere_phase and operation == premiere_phase:
+                        matieres_a_decrementer = operation.matiererequise_set.all()
+                        for item in matieres_a_decrementer:
+                            quantite_a_retirer = item.quantite_necessaire * operation.quantite_entree
+                            MatierePremiere.objects.filter(pk=item.matiere_id).update(
+                                quantite_stock=F('quantite_stock') - quantite_a_retirer, date_modification=timezone.now())
+                            publier('STOCK_CONSOMME', of.pk, operation.pk, matiere_id=item.matiere_id, quantite=quantite_a_retirer)
+                    
+                    # Déblocage de l'opération suivante
+                    op_suivante = of.operations.filter(numero_phase__gt=operation.numero_phase).order_by('numero_phase').first()
+                    if op_suivante:
+                        op_suivante.quantite_entree = total_bon
+                        op_suivante.statut = 'A_FAIRE'
+                        op_suivante.save()
+                        publier('PHASE_DEBLOQUEE', of.pk, op_suivante.pk, poste_id=op_suivante.poste_id,
+                                numero_phase=op_suivante.numero_phase, quantite_entree=total_bon)
                 
-                # Déblocage de l'opération suivante
-                op_suivante = of.operations.filter(numero_phase__gt=operation.numero_phase).order_by('numero_phase').first()
-                if op_suivante:
-                    op_suivante.quantite_entree = operation.quantite_sortie_bonne
-                    op_suivante.statut = 'A_FAIRE'
-                    op_suivante.save()
-            
-            # On met à jour le statut global de l'OF à la fin
-            of.update_statut()
+                # On met à jour le statut global de l'OF à la fin
+                of.update_statut()
             
             return JsonResponse({'status': 'success', 'message': f"FIN de travail enregistrée pour '{operation.titre}'."})
 
@@ -632,10 +844,15 @@ def fiche_operation_view(request, pk):
     try:
         operation = Operation.objects.select_related('ordre_fabrication', 'machine_assignee').get(pk=pk)
         matieres_requises = MatiereRequise.objects.filter(operation=operation).select_related('matiere')
-        context = {'operation': operation, 'of': operation.ordre_fabrication, 'matieres_requises': matieres_requises}
-        return render(request, 'suivi_production/gestion/fiche_operation.html', context)
     except Operation.DoesNotExist:
-        raise Http404("Opération non trouvée")
+        # Les opérations des OFs archivés conservent leur identifiant dans les tables d'archive
+        try:
+            operation = OperationArchive.objects.select_related('ordre_fabrication', 'machine_assignee').get(pk=pk)
+            matieres_requises = MatiereRequiseArchive.objects.filter(operation=operation).select_related('matiere')
+        except OperationArchive.DoesNotExist:
+            raise Http404("Opération non trouvée")
+    context = {'operation': operation, 'of': operation.ordre_fabrication, 'matieres_requises': matieres_requises}
+    return render(request, 'suivi_production/gestion/fiche_operation.html', context)
 
 @login_required
 def export_suivi_csv(request, pk):
@@ -646,19 +863,15 @@ def export_suivi_csv(request, pk):
         response.write(u'\ufeff'.encode('utf8'))
         writer = csv.writer(response, delimiter=';')
         writer.writerow(['OF', 'Titre OF', 'Phase', 'Opération', 'Machine', 'Opérateur', 'Date Début', 'Heure Début', 'Date Fin', 'Heure Fin', 'Durée (min)', 'Qté Fabriquée', 'Qté Rebut', 'Coût M.O. (€)'])
-        pointages_list = Pointage.objects.filter(operation__ordre_fabrication=of).select_related('operation', 'operateur', 'operation__machine_assignee')
-        if request.GET.get('date_filtre'): pointages_list = pointages_list.filter(heure_debut__date=request.GET.get('date_filtre'))
-        if request.GET.get('operateur_filtre'): pointages_list = pointages_list.filter(operateur_id=request.GET.get('operateur_filtre'))
-        if request.GET.get('statut_filtre') == 'en_cours': pointages_list = pointages_list.filter(heure_fin__isnull=True)
-        elif request.GET.get('statut_filtre') == 'termine': pointages_list = pointages_list.filter(heure_fin__isnull=False)
+        pointages_list = _pointages_suivi(request, of)
         for p in pointages_list.order_by('operation__numero_phase', 'heure_debut'):
             writer.writerow([
                 p.operation.ordre_fabrication.numero_of, p.operation.ordre_fabrication.titre, p.operation.numero_phase,
                 p.operation.titre, p.operation.machine_assignee.nom if p.operation.machine_assignee else '', p.operateur.code,
                 p.heure_debut.strftime('%d/%m/%Y'), p.heure_debut.strftime('%H:%M'),
                 p.heure_fin.strftime('%d/%m/%Y') if p.heure_fin else '', p.heure_fin.strftime('%H:%M') if p.heure_fin else '',
-                f"{p.duree_minutes:.2f}".replace('.', ','), p.quantite_fabriquee, p.quantite_rebut,
-                f"{p.cout_mo:.2f}".replace('.', ',')
+                f"{p.duree_secondes / 60:.2f}".replace('.', ','), p.quantite_fabriquee, p.quantite_rebut,
+                f"{p.cout:.2f}".replace('.', ',')
             ])
         return response
     except OrdreFabrication.DoesNotExist:
@@ -673,8 +886,8 @@ def export_suivi_global_csv(request):
     writer = csv.writer(response, delimiter=';')
     writer.writerow(['OF', 'Titre OF', 'Phase', 'Opération', 'Machine', 'Opérateur', 'Date Début', 'Heure Début', 'Date Fin', 'Heure Fin', 'Durée (min)', 'Qté Fabriquée', 'Qté Rebut', 'Coût M.O. (€)'])
     
-    pointages_list = Pointage.objects.select_related('operation__ordre_fabrication', 'operateur', 'operation__machine_assignee')
-    if request.GET.get('date_filtre'): pointages_list = pointages_list.filter(heure_debut__date=request.GET.get('date_filtre'))
+    pointages_list = Pointage.objects.select_related('operation__ordre_fabrication', 'operateur', 'operation__machine_assignee').avec_cout()
+    if _date_saisie(request.GET.get('date_filtre')): pointages_list = pointages_list.debutes_le(_date_saisie(request.GET['date_filtre']))
     
     for p in pointages_list:
         writer.writerow([
@@ -682,12 +895,13 @@ def export_suivi_global_csv(request):
             p.operation.titre, p.operation.machine_assignee.nom if p.operation.machine_assignee else '', p.operateur.code,
             p.heure_debut.strftime('%d/%m/%Y'), p.heure_debut.strftime('%H:%M'),
             p.heure_fin.strftime('%d/%m/%Y') if p.heure_fin else '', p.heure_fin.strftime('%H:%M') if p.heure_fin else '',
-            f"{p.duree_minutes:.2f}".replace('.', ','), p.quantite_fabriquee, p.quantite_rebut,
-            f"{p.cout_mo:.2f}".replace('.', ',')
+            f"{p.duree_secondes / 60:.2f}".replace('.', ','), p.quantite_fabriquee, p.quantite_rebut,
+            f"{p.cout:.2f}".replace('.', ',')
         ])
     return response
 
 @login_required
+@revalidation_par_version
 def api_get_anomalie_detail(request, pk):
     """API pour récupérer les détails d'une anomalie spécifique."""
     try:
@@ -712,12 +926,13 @@ def api_resolve_anomalie(request, pk):
         anomalie.statut = 'RESOLUE'
         anomalie.resolu_par = request.user if request.user.is_authenticated else None
         anomalie.date_resolution = timezone.now()
-        anomalie.save(update_fields=['statut', 'resolu_par', 'date_resolution'])
+        anomalie.save(update_fields=['statut', 'resolu_par', 'date_resolution', 'date_modification'])
         return JsonResponse({'status': 'success'})
     except Anomalie.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Anomalie non trouvée'}, status=404)
 
 @login_required
+@revalidation_par_version
 def rapport_production_of_jour(request, of_id, date_str):
     """
     Affiche le détail des opérations terminées pour un OF spécifique à une date donnée.
@@ -729,9 +944,8 @@ def rapport_production_of_jour(request, of_id, date_str):
     except OrdreFabrication.DoesNotExist:
         raise Http404("L'Ordre de Fabrication n'existe pas.")
 
-    pointages_du_jour = Pointage.objects.filter(
+    pointages_du_jour = Pointage.objects.termines_le(date_production).filter(
         operation__ordre_fabrication=ordre_fabrication,
-        heure_fin__date=date_production
     ).select_related(
         'operation', 
         'operateur'
@@ -749,6 +963,7 @@ def rapport_production_of_jour(request, of_id, date_str):
 
 # Vue pour la Page 1 : Liste des OFs terminés aujourd'hui
 @login_required
+@revalidation_par_version
 def rapport_production_par_of_view(request):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
         raise PermissionDenied
@@ -782,6 +997,7 @@ def rapport_production_par_of_view(request):
 
 # Vue pour la Page 2 : Détail des opérations pour un OF
 @login_required
+@revalidation_par_version
 def rapport_production_par_operation_view(request, pk):
     if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
         raise PermissionDenied
@@ -802,23 +1018,24 @@ def rapport_production_par_operation_view(request, pk):
 
 @login_required
 def liste_archives_view(request):
-    query = request.GET.get('q', '')
+    query = request.GET.get('q', '').strip()
     
-    # On ne prend que les OFs archivés
-    base_queryset = OrdreFabrication.objects.filter(statut='ARCHIVE')
+    # Les OFs archivés sont lus dans les tables d'archive (quantités finales figées)
+    base_queryset = OrdreFabricationArchive.objects.prefetch_related('operations')
     
     if query:
-        # On recherche sur les champs qui existent : numero_of et titre
-        archives = base_queryset.filter(
-            Q(numero_of__icontains=query) |
-            Q(titre__icontains=query)
-        ).order_by('-date_creation') # <-- CORRIGÉ
-    else:
-        archives = base_queryset.all().order_by('-date_creation') # <-- CORRIGÉ
-    return render(request, 'suivi_production/gestion/liste_archives.html', {'archives': archives})
+        # Recherche indexée sur numero_of et titre, classée et paginée par curseur
+        resultats = rechercher_ofs(base_queryset, query, curseur=request.GET.get('apres', ''), limite=OFS_PAR_PAGE)
+        return render(request, 'suivi_production/gestion/liste_archives.html', {
+            'archives': resultats.resultats,
+            'curseur_suivant': resultats.curseur_suivant,
+        })
+    page_obj = Paginator(base_queryset.order_by('-date_creation', '-pk'), OFS_PAR_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'suivi_production/gestion/liste_archives.html', {'archives': page_obj, 'page_obj': page_obj})
 
 
 @login_required
+@revalidation_par_version
 def api_dashboard_data(request):
     """
     Vue API qui renvoie toutes les données dynamiques du tableau de bord au format JSON.
@@ -892,6 +1109,7 @@ def api_dashboard_data(request):
     return JsonResponse({'kpis': kpis, 'chart': chart_data, 'alertes': alertes})
 
 @login_required
+@revalidation_par_version
 def historique_view(request):
     # Par défaut, on affiche les 30 derniers jours
     jours_a_afficher = int(request.GET.get('jours', 30))
@@ -917,4 +1135,509 @@ def historique_view(request):
             'taux_rebut_data': taux_rebut_data,
         }
     }
-    return render(request, 'suivi_production/historique.html', context)
\ No newline at end of file
+    return render(request, 'suivi_production/historique.html', context)
+
+
+PERIODES_ANALYSE = (30, 90, 365)
+
+
+def _periode_analyse(request):
+    """Période [debut, fin] demandée par ?jours= (une des PERIODES_ANALYSE, 90 par défaut)."""
+    try:
+        jours = int(request.GET.get('jours', 90))
+    except ValueError:
+        jours = 90
+    if jours not in PERIODES_ANALYSE:
+        jours = 90
+    fin = timezone.now().date()
+    return jours, fin - timedelta(days=jours - 1), fin
+
+
+@login_required
+@revalidation_par_version
+def analyse_anomalies_view(request):
+    """Ventilation des anomalies par poste, machine, opérateur et OF, avec Pareto et tendance."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    jours, debut, fin = _periode_analyse(request)
+    analyse = analyse_anomalies(debut, fin)
+    axe = request.GET.get('axe', 'poste')
+    if axe not in AXES:
+        axe = 'poste'
+    context = {
+        'analyse': analyse,
+        'axe': axe,
+        'axes': [('poste', 'Poste'), ('machine', 'Machine'), ('operateur', 'Opérateur'), ('of', 'OF')],
+        'lignes': analyse.ventilations[axe],
+        'jours_a_afficher': jours,
+        'periodes': PERIODES_ANALYSE,
+        'tendance': [asdict(s) for s in analyse.tendance],
+    }
+    return render(request, 'suivi_production/analyse_anomalies.html', context)
+
+
+@login_required
+@revalidation_par_version
+def api_analyse_anomalies(request):
+    """Même analyse au format JSON (toutes les ventilations)."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    _, debut, fin = _periode_analyse(request)
+    return JsonResponse(analyse_anomalies(debut, fin).as_dict())
+
+
+# Nombre d'OFs du cube recalculés au plus lors d'une lecture (le reste par la tâche cron)
+CUBE_RAFRAICHISSEMENT_LECTURE = 500
+
+
+def _parametres_cube(request):
+    """Dimensions, filtres et période d'une tranche du cube des rebuts, lus dans la requête."""
+    lignes = request.GET.get('lignes', 'poste')
+    colonnes = request.GET.get('colonnes', '') or None
+    granularite = request.GET.get('granularite', 'mois')
+    filtres = {d: request.GET.get(d, '').strip() for d in cube_rebuts.DIMENSIONS}
+    debut = parse_date(request.GET.get('debut', ''))
+    fin = parse_date(request.GET.get('fin', ''))
+    return dict(lignes=lignes, colonnes=colonnes, granularite=granularite,
+                filtres={d: v for d, v in filtres.items() if v}, debut=debut, fin=fin)
+
+
+def _tranche_cube(request):
+    cube_rebuts.rafraichir_cube(limite=CUBE_RAFRAICHISSEMENT_LECTURE)
+    return cube_rebuts.tranche(**_parametres_cube(request))
+
+
+@login_required
+@revalidation_par_version
+def cube_rebuts_view(request):
+    """Rebuts par poste, machine, opérateur, type d'opération, OF ou période, avec drill-down."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        resultat = _tranche_cube(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('cube_rebuts')
+    # Colonnes du tableau croisé : les plus gros contributeurs seulement
+    colonnes = []
+    if resultat.colonnes:
+        totaux = {}
+        for c in resultat.cellules:
+            totaux[(c.colonne.cle, c.colonne.libelle)] = totaux.get((c.colonne.cle, c.colonne.libelle), 0) + c.rebut
+        colonnes = [cle for cle, _ in sorted(totaux.items(), key=lambda t: -t[1])[:10]]
+    croise = {}
+    for c in resultat.cellules:
+        croise.setdefault(c.ligne.cle, {})[c.colonne.cle] = c.rebut
+    suivante = cube_rebuts.DIMENSION_SUIVANTE[resultat.lignes]
+    lignes = []
+    for t in resultat.pareto:
+        # Drill-down : la ligne devient un filtre (une période devient les dates de début/fin)
+        params = request.GET.copy()
+        params['lignes'] = suivante
+        if resultat.lignes == 'periode':
+            params['debut'], params['fin'] = cube_rebuts.bornes_periode(t.ligne.cle, resultat.granularite)
+        else:
+            params[resultat.lignes] = t.ligne.cle if t.ligne.cle is not None else 'aucune'
+        lignes.append({
+            'total': t,
+            'valeurs': [croise.get(t.ligne.cle, {}).get(cle) for cle, _ in colonnes],
+            'detail': '?' + params.urlencode(),
+        })
+    context = {
+        'tranche': resultat,
+        'lignes': lignes,
+        'colonnes': colonnes,
+        'dimensions': [('periode', 'Période'), ('poste', 'Poste'), ('machine', 'Machine'),
+                       ('operateur', 'Opérateur'), ('type_operation', "Type d'opération"), ('of', 'OF')],
+        'granularites': list(cube_rebuts.GRANULARITES),
+        'suivante': suivante,
+        'debut': request.GET.get('debut', ''),
+        'fin': request.GET.get('fin', ''),
+        'en_attente': cube_rebuts.CubeRebutEnAttente.objects.count(),
+    }
+    return render(request, 'suivi_production/rapports/cube_rebuts.html', context)
+
+
+@login_required
+@revalidation_par_version
+def api_cube_rebuts(request):
+    """
+    Tranche du cube des rebuts en JSON : ?lignes=<dimension>[&colonnes=<dimension>]
+    [&granularite=jour|semaine|mois][&debut=AAAA-MM-JJ][&fin=AAAA-MM-JJ][&<dimension>=<valeur>...]
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        resultat = _tranche_cube(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse(resultat.as_dict())
+
+
+# Journées machine recalculées au plus lors d'une lecture (le reste par la tâche cron).
+# La journée en cours et les arrêts en cours avancent avec l'heure : pas d'ETag par version.
+TRS_RAFRAICHISSEMENT_LECTURE = 500
+
+
+def _parametres_trs(request):
+    axe = request.GET.get('axe', 'machine')
+    if axe not in services_trs.AXES:
+        axe = 'machine'
+    jours, debut, fin = _periode_analyse(request)
+    services_trs.rafraichir_trs(limite=TRS_RAFRAICHISSEMENT_LECTURE)
+    return axe, jours, debut, fin
+
+
+@login_required
+def trs_view(request):
+    """TRS (disponibilité, performance, qualité) par machine ou par poste, et tendance sur 12 mois."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    axe, jours, debut, fin = _parametres_trs(request)
+    global_ = services_trs.trs(debut, fin, axe=None)
+    context = {
+        'axe': axe,
+        'axes': [('machine', 'Machine'), ('poste', 'Poste')],
+        'lignes': services_trs.trs(debut, fin, axe=axe),
+        'global': global_[0] if global_ else None,
+        'jours_a_afficher': jours,
+        'periodes': PERIODES_ANALYSE,
+        'tendance': [l.as_dict() for l in services_trs.tendance_mensuelle()],
+    }
+    return render(request, 'suivi_production/rapports/trs.html', context)
+
+
+@login_required
+def api_trs(request):
+    """TRS en JSON : ?axe=machine|poste&jours=30|90|365[&granularite=jour|semaine|mois]."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    axe, _, debut, fin = _parametres_trs(request)
+    try:
+        lignes = services_trs.trs(debut, fin, axe=axe, granularite=request.GET.get('granularite') or None)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'debut': debut.isoformat(), 'fin': fin.isoformat(), 'axe': axe,
+                         'lignes': [l.as_dict() for l in lignes]})
+
+
+# Journées machine dont l'utilisation est recalculée au plus lors d'une lecture (le reste par la tâche cron).
+# La journée en cours, les pointages ouverts et l'état en direct avancent avec l'heure : pas d'ETag par version.
+UTILISATION_RAFRAICHISSEMENT_LECTURE = 500
+
+
+def _parametres_utilisation(request):
+    axe = request.GET.get('axe', 'machine')
+    if axe not in services_utilisation.AXES:
+        axe = 'machine'
+    jours, debut, fin = _periode_analyse(request)
+    services_utilisation.rafraichir_utilisation(limite=UTILISATION_RAFRAICHISSEMENT_LECTURE)
+    return axe, jours, debut, fin
+
+
+@login_required
+def utilisation_view(request):
+    """Utilisation des machines (occupation, creux, chevauchements) par machine ou par équipe, et état en direct."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    axe, jours, debut, fin = _parametres_utilisation(request)
+    global_ = services_utilisation.utilisation(debut, fin, axe=None)
+    context = {
+        'axe': axe,
+        'axes': [('machine', 'Machine'), ('equipe', 'Équipe')],
+        'lignes': services_utilisation.utilisation(debut, fin, axe=axe),
+        'global': global_[0] if global_ else None,
+        'etat': services_utilisation.etat_machines(),
+        'jours_a_afficher': jours,
+        'periodes': PERIODES_ANALYSE,
+    }
+    return render(request, 'suivi_production/rapports/utilisation.html', context)
+
+
+@login_required
+def api_utilisation(request):
+    """
+    Utilisation des machines en JSON : ?axe=machine|equipe&jours=30|90|365
+    [&granularite=jour|mois][&machine=<id>], avec l'état en direct des machines.
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        machine_id = int(request.GET['machine']) if request.GET.get('machine') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Machine invalide.'}, status=400)
+    axe, _, debut, fin = _parametres_utilisation(request)
+    try:
+        lignes = services_utilisation.utilisation(debut, fin, axe=axe, granularite=request.GET.get('granularite') or None,
+                                                  machine_id=machine_id)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'debut': debut.isoformat(), 'fin': fin.isoformat(), 'axe': axe,
+                         'lignes': [l.as_dict() for l in lignes],
+                         'etat': [e.as_dict() for e in services_utilisation.etat_machines()]})
+
+
+# OFs dont les coûts sont recalculés au plus lors d'une lecture (le reste par la tâche cron)
+COUTS_RAFRAICHISSEMENT_LECTURE = 500
+
+
+def _mois(valeur):
+    """Premier jour du mois 'AAAA-MM' (champ <input type="month">), None si vide."""
+    if not valeur:
+        return None
+    try:
+        return datetime.strptime(valeur, '%Y-%m').date()
+    except ValueError:
+        raise ValueError(f"Mois invalide : {valeur} (format attendu : AAAA-MM)")
+
+
+def _couts(request):
+    services_couts.rafraichir_couts(limite=COUTS_RAFRAICHISSEMENT_LECTURE)
+    filtres = {axe: request.GET.get(axe, '').strip() for axe in services_couts.AXES if axe != 'mois'}
+    return services_couts.couts(
+        axe=request.GET.get('axe', 'of'), filtres=filtres,
+        debut=_mois(request.GET.get('debut')), fin=_mois(request.GET.get('fin')),
+    )
+
+
+@login_required
+@revalidation_par_version
+def couts_view(request):
+    """Coûts de main-d'œuvre réels et prévus par OF, opération, poste, opérateur ou mois."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        resultat = _couts(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('couts')
+    suivant = services_couts.AXE_SUIVANT[resultat.axe]
+    lignes = []
+    for ligne in resultat.lignes:
+        # Drill-down : la ligne devient un filtre (un mois devient la période)
+        params = request.GET.copy()
+        params['axe'] = suivant
+        if resultat.axe == 'mois':
+            params['debut'] = params['fin'] = ligne.cle[:7]
+        else:
+            params[resultat.axe] = ligne.cle
+        lignes.append({'ligne': ligne, 'detail': '?' + params.urlencode()})
+    context = {
+        'couts': resultat,
+        'lignes': lignes,
+        'axes': [('of', 'OF'), ('operation', 'Opération'), ('poste', 'Poste'), ('operateur', 'Opérateur'), ('mois', 'Mois')],
+        'debut': request.GET.get('debut', ''),
+        'fin': request.GET.get('fin', ''),
+        'en_attente': services_couts.CoutEnAttente.objects.count(),
+    }
+    return render(request, 'suivi_production/rapports/couts.html', context)
+
+
+@login_required
+@revalidation_par_version
+def api_couts(request):
+    """
+    Coûts de main-d'œuvre en JSON : ?axe=of|operation|poste|operateur|mois
+    [&debut=AAAA-MM][&fin=AAAA-MM][&of=<id>][&operation=<id>][&poste=<id>][&operateur=<id>]
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        resultat = _couts(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse(resultat.as_dict())
+
+
+# Clés de temps de cycle recalculées au plus lors d'une lecture (le reste par la tâche cron)
+CYCLES_RAFRAICHISSEMENT_LECTURE = 50
+
+
+def _statistiques_cycle(request):
+    temps_cycle.rafraichir_cycles(limite=CYCLES_RAFRAICHISSEMENT_LECTURE)
+    axe = request.GET.get('axe', 'poste')
+    filtres = {cle: request.GET[cle] for cle in temps_cycle.AXES if request.GET.get(cle)}
+    return axe, filtres, temps_cycle.statistiques(axe, filtres)
+
+
+@login_required
+@revalidation_par_version
+def temps_cycle_view(request):
+    """Temps de cycle réels (médiane, p90) par poste, type d'opération ou opérateur, comparés au prévu."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        axe, filtres, lignes = _statistiques_cycle(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('temps_cycle')
+    context = {
+        'axe': axe,
+        'axes': [('poste', 'Poste'), ('type_operation', "Type d'opération"), ('operateur', 'Opérateur')],
+        'filtres': filtres,
+        'lignes': lignes,
+    }
+    return render(request, 'suivi_production/rapports/temps_cycle.html', context)
+
+
+@login_required
+@revalidation_par_version
+def api_temps_cycle(request):
+    """Temps de cycle en JSON : ?axe=poste|type_operation|operateur[&poste=<id>][&type_operation=<type>][&operateur=<id>]."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        axe, filtres, lignes = _statistiques_cycle(request)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'axe': axe, 'filtres': filtres, 'lignes': [l.as_dict() for l in lignes]})
+
+
+@login_required
+@revalidation_par_version
+def api_suggestion_temps_prevu(request):
+    """Temps prévu suggéré pour une opération du formulaire d'OF : ?poste=<id>&type_operation=<type>&quantite=<n>."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        poste_id = int(request.GET.get('poste', ''))
+        quantite = int(request.GET.get('quantite') or 1)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Poste ou quantité invalide.'}, status=400)
+    temps_cycle.rafraichir_cycles(limite=CYCLES_RAFRAICHISSEMENT_LECTURE)
+    suggestion = temps_cycle.suggestion(poste_id, request.GET.get('type_operation', ''), max(quantite, 1))
+    return JsonResponse({'status': 'success', 'suggestion': suggestion})
+
+
+# OFs dont les délais sont recalculés au plus lors d'une lecture (le reste par la tâche cron)
+DELAIS_RAFRAICHISSEMENT_LECTURE = 500
+
+
+def _parametres_delais(request):
+    jours, debut, fin = _periode_analyse(request)
+    services_delais.rafraichir_delais(limite=DELAIS_RAFRAICHISSEMENT_LECTURE)
+    if not services_delais.EnCoursJournalier.objects.filter(jour=fin).exists():
+        services_delais.photographier_en_cours(fin)
+    return jours, debut, fin
+
+
+@login_required
+@revalidation_par_version
+def delais_view(request):
+    """Délais moyens (attente, traitement) et en-cours par poste, avec leur tendance hebdomadaire."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    jours, debut, fin = _parametres_delais(request)
+    try:
+        poste_id = int(request.GET['poste']) if request.GET.get('poste') else None
+    except ValueError:
+        messages.error(request, "Poste invalide.")
+        return redirect('delais')
+    context = {
+        'lignes': services_delais.delais_postes(debut, fin),
+        'tendance': [l.as_dict() for l in services_delais.tendance_hebdomadaire(debut, fin, poste_id)],
+        'poste': PosteDeTravail.objects.filter(pk=poste_id).first() if poste_id else None,
+        'jours_a_afficher': jours,
+        'periodes': PERIODES_ANALYSE,
+    }
+    return render(request, 'suivi_production/rapports/delais.html', context)
+
+
+@login_required
+@revalidation_par_version
+def api_delais(request):
+    """
+    Délais et en-cours en JSON : ?jours=30|90|365[&poste=<id>] (par poste et tendance
+    hebdomadaire), ou ?of=<id> (phases d'un OF).
+    """
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    try:
+        of_id = int(request.GET['of']) if request.GET.get('of') else None
+        poste_id = int(request.GET['poste']) if request.GET.get('poste') else None
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'OF ou poste invalide.'}, status=400)
+    if of_id is not None:
+        return JsonResponse(services_delais.delais_of(of_id))
+    _, debut, fin = _parametres_delais(request)
+    return JsonResponse({
+        'debut': debut.isoformat(), 'fin': fin.isoformat(),
+        'postes': [l.as_dict() for l in services_delais.delais_postes(debut, fin)],
+        'tendance': [l.as_dict() for l in services_delais.tendance_hebdomadaire(debut, fin, poste_id)],
+    })
+
+
+def _jeton_valide(request, jeton):
+    fourni = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(jeton) and hmac.compare_digest(fourni.encode(), jeton.encode())
+
+
+def metrics_view(request):
+    """
+    Métriques Prometheus du processus courant. Accès par jeton (en-tête
+    "Authorization: Bearer <METRIQUES_JETON>") pour le collecteur, ou par un manager connecté.
+    """
+    autorise_par_jeton = _jeton_valide(request, getattr(settings, 'METRIQUES_JETON', ''))
+    est_manager = hasattr(request.user, 'profile') and request.user.profile.role == 'MANAGER'
+    if not (autorise_par_jeton or est_manager):
+        raise PermissionDenied
+    return HttpResponse(REGISTRE.exposer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def api_lecture_view(request, ressource):
+    """
+    API de lecture des intégrations, version 1 : /api/v1/<ressource>/ (ofs, operations,
+    pointages, anomalies, stock, ofs_archives). Paramètres : curseur, updated_since (ISO 8601),
+    fields (colonnes séparées par des virgules), limite, format=ndjson pour les grandes pages.
+    Accès par jeton ("Authorization: Bearer <API_LECTURE_JETON>") ou par un manager connecté.
+    """
+    est_manager = hasattr(request.user, 'profile') and request.user.profile.role == 'MANAGER'
+    if not (_jeton_valide(request, getattr(settings, 'API_LECTURE_JETON', '')) or est_manager):
+        raise PermissionDenied
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Méthode non autorisée'}, status=405)
+    parametres = {
+        'curseur': request.GET.get('curseur', ''), 'updated_since': request.GET.get('updated_since', ''),
+        'fields': request.GET.get('fields', ''), 'limite': request.GET.get('limite'),
+    }
+    try:
+        if request.GET.get('format') == 'ndjson':
+            lignes, curseur, fin = api_lecture.page_ndjson(ressource, **parametres)
+        else:
+            return JsonResponse(api_lecture.page(ressource, **parametres).as_dict())
+    except api_lecture.ErreurRequete as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    encodeur = DjangoJSONEncoder(ensure_ascii=False)
+    reponse = StreamingHttpResponse((encodeur.encode(l) + '\n' for l in lignes), content_type='application/x-ndjson')
+    reponse['X-API-Version'] = str(api_lecture.VERSION)
+    reponse['X-Curseur'] = curseur
+    reponse['X-Fin'] = 'true' if fin else 'false'
+    return reponse
+
+
+@login_required
+def profils_view(request):
+    """Liste des profils d'échantillonnage enregistrés, par vue."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    context = {
+        'profils': lister_profils(settings.PROFILAGE_REPERTOIRE),
+        'profilage_actif': settings.PROFILAGE_ACTIF,
+        'seuil_ms': settings.PROFILAGE_SEUIL_MS,
+        'vues_echantillonnees': settings.PROFILAGE_VUES,
+        'fraction': settings.PROFILAGE_FRACTION,
+    }
+    return render(request, 'suivi_production/profils.html', context)
+
+
+@login_required
+def telecharger_profil_view(request, vue):
+    """Piles cumulées d'une vue au format collapsed (flamegraph.pl, speedscope)."""
+    if not hasattr(request.user, 'profile') or request.user.profile.role != 'MANAGER':
+        raise PermissionDenied
+    piles = agreger_piles(settings.PROFILAGE_REPERTOIRE, vue)
+    if not piles:
+        raise Http404("Aucun profil pour cette vue.")
+    response = HttpResponse(exporter_piles(piles), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{vue}.folded"'
+    return response